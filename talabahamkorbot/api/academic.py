@@ -1,8 +1,12 @@
 from fastapi_cache.decorator import cache
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from services.hemis_service import HemisService
+from services.schedule_service import ScheduleService
+from services.qr_attendance import QRAttendanceQueue
+from services.student_cache_codec import grades_view
+from utils.serialization import fast_json
 from services.university_service import UniversityService
 from database.db_connect import get_session
 from api.dependencies import get_current_student, get_student_or_staff
@@ -64,7 +68,7 @@ async def get_grades(
     sem_code = await resolve_semester(student, semester, refresh=refresh)
     base_url = UniversityService.get_api_url(student.hemis_login)
 
-    subjects_data = await HemisService.get_student_subject_list(
+    subjects = await HemisService.get_subject_list_entry(
         token, 
         semester_code=sem_code, 
         student_id=student.id,
@@ -72,25 +76,19 @@ async def get_grades(
         base_url=base_url
     )
 
+    # Normalized at cache write time: decode and return
+    is_jmcu = (student.hemis_login[:3] == "395")
     results = []
-    for item in (subjects_data or []):
-        subject_info = item.get("curriculumSubject", {})
-        sub_details = subject_info.get("subject", {})
-        name = sub_details.get("name") or item.get("subject", {}).get("name", "Nomsiz fan")
-        s_id = sub_details.get("id") or item.get("subject", {}).get("id")
-
-        is_jmcu = (student.hemis_login[:3] == "395")
-        detailed_dict = HemisService.parse_grades_detailed(item, skip_conversion=not is_jmcu)
-        on = detailed_dict.get("ON", {"val_5": 0, "raw": 0})
-        yn = detailed_dict.get("YN", {"val_5": 0, "raw": 0})
-        jn = detailed_dict.get("JN", {"val_5": 0, "raw": 0})
+    for rec in ((subjects.records if subjects else None) or []):
+        detailed_dict = grades_view(rec, skip_conversion=not is_jmcu)
+        on, yn, jn = detailed_dict["ON"], detailed_dict["YN"], detailed_dict["JN"]
         
         # Convert to list for frontend compatibility
-        detailed_list = [v for k, v in detailed_dict.items() if k in ["JN", "ON", "YN"]]
+        detailed_list = [jn, on, yn]
 
         results.append({
-            "id": s_id, "subject": name, "name": name,
-            "overall_grade": item.get("overallScore", {}).get("grade", 0),
+            "id": rec["id"], "subject": rec["name"], "name": rec["name"],
+            "overall_grade": rec["overall_grade"],
             "on": on, "yn": yn, "jn": jn, "detailed": detailed_list
         })
     return {"success": True, "data": results}
@@ -200,61 +198,44 @@ async def get_subjects(
     sem_code = await resolve_semester(student, semester, refresh=refresh)
     base_url = UniversityService.get_api_url(student.hemis_login)
     
-    subjects_task = HemisService.get_student_subject_list(student.hemis_token, semester_code=sem_code, student_id=student.id, force_refresh=refresh, base_url=base_url)
-    absence_task = HemisService.get_student_absence(student.hemis_token, semester_code=sem_code, student_id=student.id, force_refresh=refresh, base_url=base_url)
-    schedule_task = HemisService.get_student_schedule_cached(student.hemis_token, semester_code=sem_code, student_id=student.id, force_refresh=refresh, base_url=base_url)
+    subjects_task = HemisService.get_subject_list_entry(student.hemis_token, semester_code=sem_code, student_id=student.id, force_refresh=refresh, base_url=base_url)
+    absence_task = HemisService.get_absence_entry(student.hemis_token, semester_code=sem_code, student_id=student.id, force_refresh=refresh, base_url=base_url)
+    schedule_task = HemisService.get_schedule_entry(student.hemis_token, semester_code=sem_code, student_id=student.id, force_refresh=refresh, base_url=base_url)
     
-    subjects_data, attendance_result, schedule_data = await asyncio.gather(
+    subjects, absence, schedule = await asyncio.gather(
         subjects_task, absence_task, schedule_task
     )
 
-    
-    abs_map = {}
-    if isinstance(attendance_result, (tuple, list)) and len(attendance_result) >= 4:
-        att_items = attendance_result[3]
-        for item in att_items:
-            s_name = item.get("subject", {}).get("name")
-            if s_name:
-                s_name_lower = s_name.lower().strip()
-                abs_map[s_name_lower] = abs_map.get(s_name_lower, 0) + item.get("hour", 2)
+    abs_map = (absence.records or {}).get("by_subject", {}) if absence else {}
 
     teacher_map = {}
-    if schedule_data:
-        for item in schedule_data:
-            s_name = item.get("subject", {}).get("name")
-            if not s_name: continue
-            s_name_lower = s_name.lower().strip()
-            t_name = item.get("employee", {}).get("name")
-            if not t_name: continue
-            train_type = item.get("trainingType", {}).get("name", "Boshqa")
-            if s_name_lower not in teacher_map:
-                teacher_map[s_name_lower] = {"lecturer": None, "seminar": None}
-            if "ma'ruza" in train_type.lower() or "lecture" in train_type.lower():
-                teacher_map[s_name_lower]["lecturer"] = t_name
-            else:
-                teacher_map[s_name_lower]["seminar"] = t_name
+    for lesson in ((schedule.records["slots"] if schedule else None) or []):
+        s_name, t_name = lesson["subject"], lesson["employee"]
+        if not s_name or not t_name: continue
+        s_name_lower = s_name.lower().strip()
+        train_type = (lesson["training_type"] or "Boshqa").lower()
+        slot = teacher_map.setdefault(s_name_lower, {"lecturer": None, "seminar": None})
+        if "ma'ruza" in train_type or "lecture" in train_type:
+            slot["lecturer"] = t_name
+        else:
+            slot["seminar"] = t_name
 
+    is_jmcu = (student.hemis_login[:3] == "395")
     results = []
-    for item in (subjects_data or []):
-        subject_info = item.get("curriculumSubject", {})
-        sub_details = subject_info.get("subject", {})
-        name = sub_details.get("name", "Nomsiz fan")
-        s_id = sub_details.get("id")
+    for rec in ((subjects.records if subjects else None) or []):
+        name = rec["name"]
         name_lower = name.lower().strip()
         t_info = teacher_map.get(name_lower, {})
-        is_jmcu = (student.hemis_login[:3] == "395")
-        detailed_dict = HemisService.parse_grades_detailed(item, skip_conversion=not is_jmcu)
-        on = detailed_dict.get("ON", {"val_5": 0, "raw": 0})
-        yn = detailed_dict.get("YN", {"val_5": 0, "raw": 0})
-        jn = detailed_dict.get("JN", {"val_5": 0, "raw": 0})
+        detailed_dict = grades_view(rec, skip_conversion=not is_jmcu)
+        on, yn, jn = detailed_dict["ON"], detailed_dict["YN"], detailed_dict["JN"]
         
         # Convert to list for frontend compatibility
-        detailed_list = [v for k, v in detailed_dict.items() if k in ["JN", "ON", "YN"]]
+        detailed_list = [jn, on, yn]
         
         results.append({
-            "id": s_id, "name": name, "lecturer": t_info.get("lecturer"),
+            "id": rec["id"], "name": name, "lecturer": t_info.get("lecturer"),
             "seminar": t_info.get("seminar"), "absent_hours": abs_map.get(name_lower, 0),
-            "overall_grade": item.get("overallScore", {}).get("grade", 0),
+            "overall_grade": rec["overall_grade"],
             "grades": {"ON": on, "YN": yn, "JN": jn, "detailed": detailed_list}
         })
     return {"success": True, "data": results}
@@ -279,70 +260,40 @@ async def get_schedule(
         raise HTTPException(status_code=401, detail="HEMIS_AUTH_ERROR")
 
     sem_code = await resolve_semester(student, semester, refresh=refresh)
-    schedule_data = await HemisService.get_student_schedule_cached(
-        token, semester_code=sem_code, student_id=student.id, force_refresh=refresh, base_url=base_url
+    # Week index is built at cache write time; missing topics are filled concurrently
+    lessons = await ScheduleService.week_view(
+        token, student, sem_code, target_date=target_date, refresh=refresh, base_url=base_url
     )
+    return {"success": True, "data": lessons}
 
+@router.get("/schedule/export")
+async def export_schedule(
+    semester: str = None,
+    format: str = "json",
+    student: Student = Depends(get_student_or_staff),
+):
+    """Full-semester timetable for offline use: compact JSON or ICS (calendar import)."""
+    if isinstance(student, Staff):
+        return {"success": True, "data": None}
 
-    if not schedule_data: return {"success": True, "data": []}
-
-    # Filter to Target Week (Monday - Sunday) using Tashkent Timezone
-    try:
-        from datetime import timedelta, datetime
-        import pytz
-        
-        tz = pytz.timezone('Asia/Tashkent')
-        if target_date:
-            naive_dt = datetime.strptime(target_date, "%Y-%m-%d")
-            now = tz.localize(naive_dt)
-        else:
-            now = datetime.now(tz)
-            
-        # Find Monday (0)
-        start_of_week = now - timedelta(days=now.weekday())
-        start_of_week = start_of_week.replace(hour=0, minute=0, second=0, microsecond=0)
-        # Find Sunday (6)
-        end_of_week = start_of_week + timedelta(days=6)
-        end_of_week = end_of_week.replace(hour=23, minute=59, second=59, microsecond=999999)
-        
-        start_ts = start_of_week.timestamp()
-        end_ts = end_of_week.timestamp()
-        
-        filtered_data = []
-        for item in schedule_data:
-            l_date = item.get("lesson_date")
-            if l_date and start_ts <= l_date <= end_ts:
-                filtered_data.append(item)
-        
-        schedule_data = filtered_data
-    except Exception as e:
-        import logging
-        logging.getLogger(__name__).error(f"Schedule filter error: {e}")
+    token = getattr(student, 'hemis_token', None)
+    if not token:
+        return {"success": False, "message": "No Token"}
 
-    lessons_by_group = {}
-    for item in schedule_data:
-        s_id, t_type = str(item.get("subject", {}).get("id") or ""), str(item.get("trainingType", {}).get("code") or "")
-        if not s_id: continue
-        key = (s_id, t_type)
-        if key not in lessons_by_group: lessons_by_group[key] = []
-        lessons_by_group[key].append(item)
+    base_url = UniversityService.get_api_url(student.hemis_login)
+    if await HemisService.check_auth_status(token, base_url=base_url) == "AUTH_ERROR":
+        raise HTTPException(status_code=401, detail="HEMIS_AUTH_ERROR")
 
-    for key, group in lessons_by_group.items():
-        group.sort(key=lambda x: (int(x.get("lesson_date") or 0), x.get("start_time") or ""))
+    sem_code = await resolve_semester(student, semester)
+    slots = await ScheduleService.semester_slots(token, student, sem_code, base_url=base_url)
 
-    unique_subjects = set(k[0] for k in lessons_by_group.keys())
-    base_url = UniversityService.get_api_url(student.hemis_login)
-    for s_id in unique_subjects:
-        for t_code in set(k[1] for k in lessons_by_group.keys() if k[0] == s_id):
-            topics = await HemisService.get_curriculum_topics(token, subject_id=s_id, semester_code=sem_code, training_type_code=t_code, student_id=student.id, base_url=base_url)
-
-            if topics:
-                group = lessons_by_group[(s_id, t_code)]
-                for idx, lesson_item in enumerate(group):
-                    current_topic = lesson_item.get("lesson_topic") or lesson_item.get("theme") or ""
-                    if (not current_topic or current_topic == "Mavzu kiritilmagan") and idx < len(topics):
-                        lesson_item["lesson_topic"] = topics[idx].get("name") or lesson_item.get("lesson_topic")
-    return {"success": True, "data": schedule_data}
+    if format == "ics":
+        return Response(
+            content=ScheduleService.export_ics(slots, sem_code),
+            media_type="text/calendar; charset=utf-8",
+            headers={"Content-Disposition": f'attachment; filename="jadval_{sem_code}.ics"'},
+        )
+    return fast_json({"success": True, "data": ScheduleService.export_json(slots, sem_code)})
 
 @router.get("/attendance")
 async def get_attendance(
@@ -366,55 +317,40 @@ async def get_attendance(
     base_url = UniversityService.get_api_url(student.hemis_login)
     
     try:
-        _, _, _, data = await HemisService.get_student_absence(
+        absence = await HemisService.get_absence_entry(
             token, semester_code=sem_code, student_id=student.id, force_refresh=refresh, base_url=base_url
         )
         
         # Fetch schedule to discover which class types (Ma'ruza/Amaliy) exist for each subject
-        schedule = await HemisService.get_student_schedule_cached(
+        schedule = await HemisService.get_schedule_entry(
             token, semester_code=sem_code, student_id=student.id, force_refresh=refresh, base_url=base_url
         )
         
         # New approach: Use subject-list for total_acload math
-        subjects = await HemisService.get_student_subject_list(
+        subjects = await HemisService.get_subject_list_entry(
             token, semester_code=sem_code, student_id=student.id, force_refresh=refresh, base_url=base_url
         )
         
+        types_by_subject = {}
+        for lesson in ((schedule.records["slots"] if schedule else None) or []):
+            if lesson["training_type"]:
+                types_by_subject.setdefault(str(lesson["subject_id"]), set()).add(lesson["training_type"])
+
         subject_active_hours = {}
         subject_training_hours = {}
         
-        for subj_item in subjects:
-            s_id = str(subj_item.get("subject", {}).get("id") or subj_item.get("curriculumSubject", {}).get("subject", {}).get("id"))
-            if not s_id: continue
-            
-            # Find which types are taught for this subject in the schedule
-            types_in_schedule = set()
-            for s in schedule:
-                if str(s.get("subject", {}).get("id")) == s_id:
-                    t_type = s.get("trainingType", {}).get("name")
-                    if t_type: types_in_schedule.add(t_type)
-            
-            cs = subj_item.get("curriculumSubject", {})
-            training_info = cs.get("training_hours", [])
-            if not isinstance(training_info, list):
-                # Sometime Hemis returns None or empty dicts
-                training_info = []
-                
-            subject_training_hours[s_id] = {}
-            total_active = 0
+        for rec in ((subjects.records if subjects else None) or []):
+            if not rec["id"]: continue
+            s_id = str(rec["id"])
             
             # Map the exact official hours returned by Hemis per class type
-            for item in training_info:
-                t_name = item.get("trainingType", {}).get("name")
-                hrs = item.get("hour", 0)
-                if t_name and hrs > 0:
-                    subject_training_hours[s_id][t_name] = hrs
-                    total_active += hrs
+            subject_training_hours[s_id] = dict(rec["training_hours"])
+            total_active = sum(rec["training_hours"].values())
             
             # Fallback if training_hours array is empty but we have acload
             if total_active == 0:
-                total_acload = int(cs.get("total_acload") or 0)
-                auditorium_hours = total_acload // 2
+                types_in_schedule = types_by_subject.get(s_id, set())
+                auditorium_hours = rec["total_acload"] // 2
                 
                 if len(types_in_schedule) > 0 and auditorium_hours > 0:
                     per_type = auditorium_hours // len(types_in_schedule)
@@ -425,19 +361,15 @@ async def get_attendance(
             subject_active_hours[s_id] = total_active
         
         parsed = []
-        for item in (data or []):
-            hours = item.get("absent_on", 0) + item.get("absent_off", 0)
-            if hours == 0: hours = item.get("hour", 2)
-            
-            s_name = item.get("subject", {}).get("name", "Fan")
-            s_id = str(item.get("subject", {}).get("id", ""))
+        for item in (((absence.records or {}).get("items") if absence else None) or []):
+            s_id = str(item["subject_id"] if item["subject_id"] is not None else "")
             
             parsed.append({
-                "subject": s_name,
-                "date": datetime.fromtimestamp(item.get("lesson_date")).strftime("%Y-%m-%d") if item.get("lesson_date") else "",
-                "theme": item.get("trainingType", {}).get("name", ""), 
-                "hours": hours, 
-                "is_excused": item.get("explicable", False),
+                "subject": item["subject"],
+                "date": datetime.fromtimestamp(item["lesson_date"]).strftime("%Y-%m-%d") if item["lesson_date"] else "",
+                "theme": item["training_type"], 
+                "hours": item["hours"], 
+                "is_excused": item["explicable"],
                 "total_subject_hours": subject_active_hours.get(s_id, 0),
                 "total_training_hours": subject_training_hours.get(s_id, {})
             })
@@ -454,27 +386,65 @@ class QRAttendanceSchema(BaseModel):
     token: str
     code: str
 
+QR_INLINE_WAIT = 5.0  # sekund (eski klientlar uchun)
+
 @router.post("/qr-attendance")
 async def process_qr_attendance(
     payload: QRAttendanceSchema,
+    request: Request,
+    mode: str = "wait",
     student: Student = Depends(get_current_student),
     db: AsyncSession = Depends(get_session)
 ):
+    """
+    Submission goes through QRAttendanceQueue (priority HEMIS lane, idempotent per QR).
+    mode=wait (default, old clients): waits up to INLINE_WAIT for the result and answers
+    {success, message}; if still pending - 202 with a status URL.
+    mode=async: 202 immediately; result via GET /qr-attendance/{id} or push.
+    """
     token = getattr(student, 'hemis_token', None)
     if not token:
         return {"success": False, "message": "No Token"}
 
     base_url = UniversityService.get_api_url(student.hemis_login)
-    if await HemisService.check_auth_status(token, base_url=base_url) == "AUTH_ERROR":
+    state = await QRAttendanceQueue.submit(
+        student.id, token, payload.token, payload.code,
+        base_url=base_url, fcm_token=getattr(student, "fcm_token", None)
+    )
+    if mode != "async" and state["status"] == "pending":
+        state = await QRAttendanceQueue.wait(state["id"], QR_INLINE_WAIT) or state
+
+    if state["status"] == "pending":
+        return fast_json({
+            "success": True,
+            "status": "pending",
+            "submission_id": state["id"],
+            # Same mount as this request (/student or /education); url_for would pick the first one
+            "status_url": str(request.url.replace(path=f"{request.url.path.rstrip('/')}/{state['id']}", query="")),
+            "message": state["message"],
+        }, status_code=202)
+
+    if state.get("http_status") in (401, 403):
         raise HTTPException(status_code=401, detail="HEMIS_AUTH_ERROR")
+    return {
+        "success": state["status"] == "success",
+        "status": state["status"],
+        "submission_id": state["id"],
+        "message": state["message"],
+    }
 
-    result = await HemisService.send_qr_attendance(
-        token=token,
-        qr_token=payload.token,
-        qr_code=payload.code,
-        base_url=base_url
-    )
-    return result
+@router.get("/qr-attendance/{submission_id}")
+async def get_qr_attendance_status(submission_id: str, student: Student = Depends(get_current_student)):
+    state = await QRAttendanceQueue.get_status(submission_id)
+    if not state or state.get("student_id") != student.id:
+        raise HTTPException(status_code=404, detail="Topilmadi")
+    return {
+        "success": state["status"] == "success",
+        "status": state["status"],
+        "submission_id": state["id"],
+        "message": state["message"],
+        "attempts": state["attempts"],
+    }
 
 @router.get("/resources/{subject_id}")
 
@@ -145,7 +145,9 @@ async def chat_with_ai(
         stream=False, 
         system_context=system_context,
         role="owner" if is_admin else getattr(student, 'role', 'student'),
-        user_name=first_name
+        user_name=first_name,
+        user_id=student.id,
+        cache_ttl=0 # Shaxsiy suhbat keshlanmaydi
     )
     
     # Save Assistant Message
@@ -161,7 +163,7 @@ import shutil
 import os
 import time
 from services.ai_service import summarize_konspekt
-from utils.document_parser import extract_text_from_file
+from utils.document_parser import DocumentExtractor, MAX_BYTES, MSG_TOO_LARGE
 
 @router.post("/summarize")
 async def summarize_content(
@@ -210,9 +212,11 @@ async def summarize_content(
         try:
             file_ext = file.filename.split(".")[-1]
             
-            # Use the SpooledTemporaryFile directly without saving to disk
-            from utils.document_parser import extract_text_from_stream
-            content_to_summarize = extract_text_from_stream(file.file, file_ext)
+            # In-memory (no disk write); parsing runs in the extractor process pool
+            data = await file.read(MAX_BYTES + 1)
+            if len(data) > MAX_BYTES:
+                return {"success": False, "message": MSG_TOO_LARGE}
+            content_to_summarize = await DocumentExtractor.extract(data, file_ext)
             
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Faylni o'qishda xatolik: {str(e)}")
@@ -231,7 +235,7 @@ async def summarize_content(
 
     # 4. Generate Summary
     try:
-        summary = await summarize_konspekt(msg)
+        summary = await summarize_konspekt(msg, user_id=student.id)
         
         # Increment Usage
         student.ai_usage_count += 1
@@ -320,7 +324,7 @@ async def predict_grant_analysis(
         """
         
         # 3. Generate AI Response
-        ai_response = await generate_answer_by_key("grant_calc", prompt)
+        ai_response = await generate_answer_by_key("grant_calc", prompt, user_id=student.id)
         
         if not ai_response:
              return {"success": False, "message": "AI javob bera olmadi."}
@@ -414,17 +418,13 @@ async def predict_sentiment_analysis(
             return {"success": False, "message": "So'nggi 24 soat ichida tahlil qilish uchun yetarli ma'lumot (post, izoh yoki murojaat) topilmadi."}
 
         # 4. Generate AI Response
-        ai_response = await generate_answer_by_key("sentiment_analysis", custom_prompt=None)
-        
-        # Replace placeholder in prompt manually or use updated service? 
-        # Actually generate_answer_by_key takes key. But prompt has {context_text}.
-        # We need to format the prompt first.
+        # Prompt has {context_text} placeholder, so format it first
         from data.ai_prompts import AI_PROMPTS
         base_prompt = AI_PROMPTS.get("sentiment_analysis")
         final_prompt = base_prompt.format(context_text=context_text)
         
         # Call directly
-        ai_response = await generate_answer_by_key("sentiment_analysis", custom_prompt=final_prompt)
+        ai_response = await generate_answer_by_key("sentiment_analysis", custom_prompt=final_prompt, user_id=student.id, role="rahbariyat")
         
         if not ai_response:
              return {"success": False, "message": "AI tahlil qila olmadi."}
@@ -454,74 +454,73 @@ async def cluster_appeals_ai(
     if not is_mgmt:
         return {"success": False, "message": "Faqat rahbariyat uchun"}
 
-    # Fetch pending appeals with NULL ai_topic
-    stmt = select(StudentFeedback).where(
+    # Fetch the whole pending backlog with NULL ai_topic (id + text only)
+    stmt = select(StudentFeedback.id, StudentFeedback.text).where(
         StudentFeedback.ai_topic == None,
         StudentFeedback.status.in_(['pending', 'processing'])
-    ).limit(20) # Batch size
+    ).order_by(StudentFeedback.id)
     
-    appeals = (await db.execute(stmt)).scalars().all()
+    appeals = (await db.execute(stmt)).all()
     
     if not appeals:
         return {"success": True, "message": "Tahlil qilish uchun yangi murojaatlar yo'q", "count": 0}
         
-    # Prepare text
-    text_data = ""
-    for a in appeals:
-        text_data += f"[ID: {a.id}] {a.text[:150]}\n"
-        
-    prompt = (
+    instruction = (
         "Quyidagi talabalar murojaatlarini umumiy mazmuniga ko'ra qisqa mavzularga (topic) ajrat.\n"
         "Mavzular ro'yxati: Hemis, Kontrakt, Yotoqxona, Stipendiya, Dars Jadvali, Baholar, Dekanat, Tizim, Boshqa.\n"
-        "Har bir ID uchun bitta mos mavzuni tanla.\n\n"
-        f"MA'LUMOTLAR:\n{text_data}\n\n"
-        "JAVOB FORMATI (Faqat JSON):\n"
-        "{\n"
-        '  "ID_RAQAM": "Mavzu",\n'
-        '  "101": "Hemis"\n'
-        "}"
+        "Har bir ID uchun bitta mos mavzuni tanla."
     )
     
     try:
-        # Call AI
-        # model=OPENAI_MODEL_TASKS is usually gpt-4o-mini
-        from config import OPENAI_MODEL_TASKS
-        ai_response = await generate_response(prompt, model=OPENAI_MODEL_TASKS)
-        
-        # Parse JSON
-        import json
-        import re
-        
-        json_str = ai_response
-        # Extract JSON from code blocks if present
-        if "```" in json_str:
-             match = re.search(r"```(?:json)?(.*?)```", json_str, re.DOTALL)
-             if match:
-                 json_str = match.group(1).strip()
-        
-        # Cleanup
-        if "{" not in json_str and "}" not in json_str: 
-             # AI might respond with text if failed to follow instructions
-             raise ValueError("AI Valid JSON qaytarmadi")
-
-        data = json.loads(json_str)
+        # Batched: ~100 appeals per AI call, calls run concurrently (AIGateway limits)
+        from services.ai_service import classify_texts
+        from sqlalchemy import update
+        topics = await classify_texts(
+            {a.id: (a.text or "")[:150] for a in appeals},
+            instruction,
+            batch_size=100,
+            user_id=student.id,
+            role="rahbariyat"
+        )
+        
+        # One UPDATE per topic instead of per appeal
+        by_topic = {}
+        for appeal_id, topic in topics.items():
+            if topic and str(appeal_id).isdigit():
+                by_topic.setdefault(str(topic)[:100], []).append(int(appeal_id))
         
         updated_count = 0
-        for appeal in appeals:
-            topic = data.get(str(appeal.id))
-            if topic:
-                appeal.ai_topic = topic
-                updated_count += 1
+        for topic, ids in by_topic.items():
+            await db.execute(
+                update(StudentFeedback)
+                .where(StudentFeedback.id.in_(ids), StudentFeedback.ai_topic == None)
+                .values(ai_topic=topic)
+            )
+            updated_count += len(ids)
                 
         await db.commit()
         
         return {
             "success": True, 
             "message": f"{updated_count} ta murojaat mavzusi aniqlandi", 
-            "count": updated_count
+            "count": updated_count,
+            "total_pending": len(appeals)
         }
         
     except Exception as e:
         import traceback
         traceback.print_exc()
         return {"success": False, "message": "AI tahlilida xatolik", "error": str(e)}
+
+from api.dependencies import get_owner
+
+@router.get("/metrics")
+async def get_ai_metrics(owner: Student = Depends(get_owner)):
+    """
+    AIGateway metrics for this worker: cache hit rate, upstream latency, token usage,
+    plus document extraction time per format.
+    """
+    from services.ai_gateway import AIGateway
+    data = AIGateway.metrics()
+    data["document_extraction"] = DocumentExtractor.stats()
+    return {"success": True, "data": data}
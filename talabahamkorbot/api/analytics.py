@@ -7,7 +7,7 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-from database.db_connect import get_db
+from database.db_connect import get_db, read_replica
 from database.models import Student, Staff, UserActivity, Faculty, StaffRole
 from api.dependencies import get_current_staff
 
@@ -51,6 +51,7 @@ DEAN_LEVEL_ROLES = [StaffRole.DEKAN, StaffRole.DEKAN_ORINBOSARI, StaffRole.DEKAN
 GLOBAL_MGMT_ROLES = [StaffRole.RAHBARIYAT, StaffRole.REKTOR, StaffRole.PROREKTOR, StaffRole.YOSHLAR_PROREKTOR, StaffRole.OWNER, StaffRole.DEVELOPER]
 
 @router.get("/dashboard", response_model=DashboardStatsResponse)
+@read_replica
 async def get_dashboard_stats(
     staff: Staff = Depends(get_current_staff),
     db: AsyncSession = Depends(get_db)
@@ -132,6 +133,7 @@ async def get_dashboard_stats(
     }
 
 @router.get("/recent-submissions", response_model=List[RecentSubmissionItem])
+@read_replica
 async def get_recent_submissions(
     limit: int = 10,
     staff: Staff = Depends(get_current_staff),
@@ -205,6 +207,7 @@ async def get_recent_submissions(
     return items
 
 @router.get("/faculties", response_model=List[dict])
+@read_replica
 async def get_faculty_activity_stats(
     staff: Staff = Depends(get_current_staff),
     db: AsyncSession = Depends(get_db)
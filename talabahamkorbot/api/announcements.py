@@ -1,11 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, Body
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, or_, and_, desc
+from sqlalchemy import select, and_
 from typing import List
 from datetime import datetime
 
 from api.dependencies import get_current_user, get_db
 from database.models import Announcement, AnnouncementRead, User
+from services.content_delivery import ContentDeliveryService
 
 router = APIRouter(prefix="/announcements", tags=["Announcements"])
 
@@ -17,41 +18,22 @@ async def get_announcements(
     """
     Fetch unread announcements for the user.
     If priority >= 100 (Superadmin), they might be forced or always show first.
+    Active announcements come from ContentDeliveryService cache; only the user's
+    reads among those candidates are looked up.
     """
-    # 1. Get IDs of announcements already read by user
-    read_stmt = select(AnnouncementRead.announcement_id).where(AnnouncementRead.user_id == user.id)
-    read_res = await db.execute(read_stmt)
-    read_ids = read_res.scalars().all()
+    announcements = await ContentDeliveryService.unread_announcements(db, user.id, user.university_id)
 
-    # 2. Fetch active announcements
-    now = datetime.utcnow()
-    stmt = (
-        select(Announcement)
-        .where(
-            and_(
-                Announcement.is_active == True,
-                or_(Announcement.expires_at == None, Announcement.expires_at > now),
-                or_(Announcement.university_id == None, Announcement.university_id == user.university_id)
-            )
-        )
-        .where(~Announcement.id.in_(read_ids) if read_ids else True)
-        .order_by(desc(Announcement.priority), desc(Announcement.created_at))
-    )
-    
-    res = await db.execute(stmt)
-    announcements = res.scalars().all()
-    
     return {
         "success": True,
         "data": [
             {
-                "id": a.id,
-                "title": a.title,
-                "content": a.content,
-                "image_url": a.image_url,
-                "link": a.link,
-                "priority": a.priority,
-                "created_at": a.created_at.isoformat()
+                "id": a["id"],
+                "title": a["title"],
+                "content": a["content"],
+                "image_url": a["image_url"],
+                "link": a["link"],
+                "priority": a["priority"],
+                "created_at": a["created_at"].isoformat()
             }
             for a in announcements
         ]
@@ -115,5 +97,28 @@ async def create_announcement(
     db.add(new_a)
     await db.commit()
     await db.refresh(new_a)
+    await ContentDeliveryService.invalidate()
     
     return {"success": True, "id": new_a.id}
+
+@router.post("/{announcement_id}/toggle")
+async def toggle_announcement(
+    announcement_id: int,
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Admin only: Activate / deactivate an announcement.
+    """
+    if user.role not in ["admin", "owner", "developer"]:
+        raise HTTPException(status_code=403, detail="Permission denied")
+
+    announcement = await db.get(Announcement, announcement_id)
+    if not announcement:
+        raise HTTPException(status_code=404, detail="E'lon topilmadi")
+
+    announcement.is_active = not announcement.is_active
+    await db.commit()
+    await ContentDeliveryService.invalidate()
+
+    return {"success": True, "is_active": announcement.is_active}
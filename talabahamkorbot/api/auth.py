@@ -817,14 +817,11 @@ async def login_via_hemis(
     if raw_role == "student":
         profile_data['role'] = "Talaba"
     
-    # [NEW] Prefetch Data in Background
-    import asyncio
-    try:
-        # Use the fresh Hemis token instead of the null student attribute
-        asyncio.create_task(HemisService.prefetch_data(token, student.id, base_url=base_url))
-        logger.info("Background prefetch task created")
-    except Exception as e:
-        logger.error(f"Failed to create prefetch task: {e}")
+    # [NEW] Prefetch Data in Background (shared queue: dedupe + per-host budget)
+    from services.prefetch_scheduler import PrefetchScheduler, LANE_PREFETCH
+    # Use the fresh Hemis token instead of the null student attribute
+    result = await PrefetchScheduler.enqueue(student.id, token, base_url=base_url, lane=LANE_PREFETCH)
+    logger.info(f"Prefetch enqueued: {result}")
 
     # Update last login
     from datetime import datetime
@@ -833,7 +830,7 @@ async def login_via_hemis(
     
     # [NEW] Log Activity (Login)
     from services.activity_service import ActivityService, ActivityType
-    # Background task preferred, but for now direct await
+    # Queued; written by the activity flusher
     try:
         await ActivityService.log_activity(
             db=db,
@@ -1,10 +1,8 @@
-
 from fastapi import APIRouter, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc, update
 
 from api.dependencies import get_db
-from database.models import Banner
+from services.content_delivery import ContentDeliveryService
 
 router = APIRouter(prefix="/banner", tags=["Banner"])
 
@@ -15,31 +13,21 @@ async def get_active_banner(
     """
     Fetch the currently active banner.
     Returns the latest created banner that is_active=True.
+    Served from cache; the view is counted in the BannerAnalyticsService buffer (no DB write).
     """
-    stmt = (
-        select(Banner)
-        .where(Banner.is_active == True)
-        .order_by(desc(Banner.id))
-        .limit(1)
-    )
-    result = await db.execute(stmt)
-    banner = result.scalar_one_or_none()
-    
-    
-    # Increment view count directly
-    if banner:
-        await db.execute(update(Banner).where(Banner.id == banner.id).values(views=Banner.views + 1))
-        await db.commit()
-    
-    if not banner:
+    banners = await ContentDeliveryService.active_banners(db)
+    if not banners:
         return {"active": False}
-        
+
+    banner = banners[0]
+    await ContentDeliveryService.record_banner_view(banner["id"])
+
     return {
-        "id": banner.id,
+        "id": banner["id"],
         "active": True,
-        "image_file_id": banner.image_file_id,
-        "link": banner.link,
-        "created_at": banner.created_at.isoformat()
+        "image_file_id": banner["image_file_id"],
+        "link": banner["link"],
+        "created_at": banner["created_at"].isoformat()
     }
 
 @router.get("/list")
@@ -49,26 +37,20 @@ async def get_all_active_banners(
     """
     Fetch ALL active banners for the carousel.
     """
-    stmt = (
-        select(Banner)
-        .where(Banner.is_active == True)
-        .order_by(desc(Banner.id))
-    )
-    result = await db.execute(stmt)
-    banners = result.scalars().all()
-    
-    data = []
-    for b in banners:
-        # Increment view count for each (optional, or do it on client side when viewed)
-        # For now, we won't auto-increment on fetch to avoid spamming analytics
-        data.append({
-            "id": b.id,
+    banners = await ContentDeliveryService.active_banners(db)
+
+    # View count is not incremented here to avoid spamming analytics
+    data = [
+        {
+            "id": b["id"],
             "active": True,
-            "image_file_id": b.image_file_id,
-            "link": b.link,
-            "created_at": b.created_at.isoformat() if b.created_at else None
-        })
-        
+            "image_file_id": b["image_file_id"],
+            "link": b["link"],
+            "created_at": b["created_at"].isoformat() if b["created_at"] else None
+        }
+        for b in banners
+    ]
+
     return {
         "success": True,
         "data": data
@@ -76,12 +58,10 @@ async def get_all_active_banners(
 
 @router.post("/click/{banner_id}")
 async def track_banner_click(
-    banner_id: int,
-    db: AsyncSession = Depends(get_db)
+    banner_id: int
 ):
     """
-    Increment click count for a banner
+    Increment click count for a banner (buffered, flushed periodically)
     """
-    await db.execute(update(Banner).where(Banner.id == banner_id).values(clicks=Banner.clicks + 1))
-    await db.commit()
+    await ContentDeliveryService.record_banner_click(banner_id)
     return {"status": "ok"}
@@ -9,7 +9,10 @@ from database.db_connect import AsyncSessionLocal
 from database.models import Student, Staff, ChoyxonaPost, ChoyxonaPostLike, ChoyxonaPostRepost, ChoyxonaComment, ChoyxonaPostView
 from api.dependencies import get_current_student, get_student_or_staff, get_db, require_action_token
 from utils.student_utils import format_name
-from api.schemas import PostCreateSchema, PostResponseSchema, CommentCreateSchema, CommentResponseSchema
+from api.schemas import PostCreateSchema, PostResponseSchema, CommentCreateSchema, CommentResponseSchema, CommentPageSchema
+from services.comment_service import CommentService
+from services.post_feed_service import PostFeedService
+from utils.serialization import fast_json
 from services.notification_service import NotificationService
 from database.models import ChoyxonaCommentLike # Fix for NameError
 
@@ -202,10 +205,8 @@ async def get_posts(
     """
     try:
         # Create valid query
-        query = select(ChoyxonaPost).options(
-            selectinload(ChoyxonaPost.student),
-            selectinload(ChoyxonaPost.staff)
-        ).order_by(desc(ChoyxonaPost.created_at))
+        # Lean projection: post + author columns (no ORM graph)
+        query = PostFeedService.projection().order_by(desc(ChoyxonaPost.created_at))
         
         if author_id:
             from sqlalchemy import or_
@@ -293,7 +294,7 @@ async def get_posts(
         query = query.offset(skip).limit(limit)
             
         result = await db.execute(query)
-        posts = result.scalars().all()
+        posts = result.all()
         
         if not posts:
             return []
@@ -327,7 +328,11 @@ async def get_posts(
             reposted_ids = set(r_result.scalars().all())
         
         
-        return [_map_post_optimized(p, student, p.id in liked_ids, p.id in reposted_ids) for p in posts]
+        # Trusted path: dicts already match PostResponseSchema - no second validation
+        return fast_json([
+            PostFeedService.map_row(p, student.id, is_staff, p.id in liked_ids, p.id in reposted_ids)
+            for p in posts
+        ])
     except Exception as e:
         import traceback
         import datetime
@@ -349,9 +354,8 @@ async def get_reposted_posts(
     """
     from sqlalchemy import or_
     # Join Reposts -> Posts -> Student (Author)
-    stmt = select(ChoyxonaPost).join(ChoyxonaPostRepost).options(
-        selectinload(ChoyxonaPost.student),
-        selectinload(ChoyxonaPost.staff)
+    stmt = PostFeedService.projection().join(
+        ChoyxonaPostRepost, ChoyxonaPostRepost.post_id == ChoyxonaPost.id
     ).where(
         or_(
             ChoyxonaPostRepost.student_id == target_student_id,
@@ -360,7 +364,7 @@ async def get_reposted_posts(
     ).order_by(desc(ChoyxonaPostRepost.created_at)).offset(skip).limit(limit)
     
     result = await db.execute(stmt)
-    posts = result.scalars().all()
+    posts = result.all()
 
     if not posts:
         return []
@@ -392,30 +396,17 @@ async def get_reposted_posts(
         )
         reposted_ids = set(r_result.scalars().all())
     
-    return [_map_post_optimized(p, student, p.id in liked_ids, p.id in reposted_ids) for p in posts]
+    return fast_json([
+        PostFeedService.map_row(p, student.id, isinstance(student, Staff), p.id in liked_ids, p.id in reposted_ids)
+        for p in posts
+    ])
 
 def format_name(student: Student):
     if not student: return "Unknown"
     
     # We want "First Last" for community posts as requested
     # Database full_name is stored as "Last First [Patronymic]"
-    
-    f_name = (student.full_name or "").strip()
-    if f_name and len(f_name.split()) >= 2:
-        parts = f_name.split()
-        # parts[0] is Last, parts[1] is First
-        # Return "First Last"
-        from utils.text_utils import format_uzbek_name
-        return format_uzbek_name(f"{parts[1]} {parts[0]}")
-    
-    # Fallback to short_name
-    s_name = (student.short_name or "").strip()
-    
-    from utils.text_utils import format_uzbek_name
-    if f_name: return format_uzbek_name(f_name)
-    if s_name: return format_uzbek_name(s_name)
-    
-    return "Talaba"
+    return PostFeedService.author_name(student.full_name, student.short_name)
 
 def _map_post_optimized(post: ChoyxonaPost, current_user, is_liked: bool, is_reposted: bool):
     author = post.student or post.staff
@@ -858,6 +849,8 @@ async def create_comment(
     
     db.add(new_comment)
     post.comments_count += 1 
+    if final_reply_to_id:
+        parent_comment.replies_count = ChoyxonaComment.replies_count + 1
     
     # Create Notification
     try:
@@ -899,21 +892,11 @@ async def create_comment(
             ref_id=new_comment.id
         )
     
-    # Reload for response mapping
+    # Reload for response mapping (lean row, a new comment has no likes yet)
     try:
-        query = select(ChoyxonaComment).options(
-            selectinload(ChoyxonaComment.student),
-            selectinload(ChoyxonaComment.reply_to_user), # Eager load reply user
-            selectinload(ChoyxonaComment.parent_comment),
-            selectinload(ChoyxonaComment.likes), # Required for _map_comment
-            selectinload(ChoyxonaComment.post)   # Required for _map_comment (author check)
-        ).where(ChoyxonaComment.id == new_comment.id)
-        
-        result = await db.execute(query)
-        new_comment = result.scalar_one()
-
-        # [FIX] Match _map_comment signature (comment, current_user)
-        return _map_comment(new_comment, student)
+        row = await CommentService.get_row(db, new_comment.id)
+        targets = await CommentService.reply_targets(db, [row])
+        return _map_comment_row(row, student, False, targets.get(row.id))
     except Exception as e:
         import traceback
         logger.error(f"--- ERROR in create_comment (Mapping/Response): {str(e)} ---\n{traceback.format_exc()}")
@@ -927,78 +910,77 @@ async def get_comments(
     db: AsyncSession = Depends(get_db)
 ):
     """
-    Get comments for a post.
+    Get all comments for a post (flat, ranked). Kept for older app versions -
+    new clients use /comments/page and /comments/{id}/replies.
     """
     try:
-        from database.models import ChoyxonaComment
-        
-        post = await db.get(ChoyxonaPost, post_id)
-        if not post:
+        if not await db.scalar(select(ChoyxonaPost.id).where(ChoyxonaPost.id == post_id)):
             raise HTTPException(status_code=404, detail="Post topilmadi")
 
-
-        # Eager load student, parent, likes, and post (for owner check)
-        query = select(ChoyxonaComment).options(
-            selectinload(ChoyxonaComment.student),
-            selectinload(ChoyxonaComment.staff),
-            selectinload(ChoyxonaComment.parent_comment).selectinload(ChoyxonaComment.student),
-            selectinload(ChoyxonaComment.parent_comment).selectinload(ChoyxonaComment.staff),
-            selectinload(ChoyxonaComment.reply_to_user),
-            selectinload(ChoyxonaComment.reply_to_staff),
-            selectinload(ChoyxonaComment.post)
-        ).where(ChoyxonaComment.post_id == post_id)
-        
-        result = await db.execute(query)
-        all_comments = result.scalars().all()
-        
-        # Sort by Likes (Desc) then Created Date (Asc)
-        all_comments.sort(key=lambda x: (-(x.likes_count or 0), x.created_at))
-        
-        if not all_comments:
+        # Lean projection, sorted by Likes (Desc) then Created Date (Asc) in SQL
+        rows = await CommentService.all_comments(db, post_id)
+        if not rows:
             return []
 
-        # Optimize Access: Batch fetch liked status
-        comment_ids = [c.id for c in all_comments]
-        is_staff = isinstance(student, Staff)
-        liked_ids = set()
-        liked_by_author_ids = set()
-        
-        if comment_ids:
-            from database.models import ChoyxonaCommentLike
-            
-            # 1. Liked by Current User?
-            cl_query = select(ChoyxonaCommentLike.comment_id).where(ChoyxonaCommentLike.comment_id.in_(comment_ids))
-            if is_staff:
-                cl_query = cl_query.where(ChoyxonaCommentLike.staff_id == student.id)
-            else:
-                cl_query = cl_query.where(ChoyxonaCommentLike.student_id == student.id)
-                
-            cl_result = await db.execute(cl_query)
-            liked_ids = set(cl_result.scalars().all())
-            
-            # 2. Liked by Post Author? (Hearted)
-            pa_sid = post.student_id
-            pa_fid = post.staff_id
-            
-            if pa_sid or pa_fid:
-                hla_query = select(ChoyxonaCommentLike.comment_id).where(ChoyxonaCommentLike.comment_id.in_(comment_ids))
-                if pa_fid:
-                    hla_query = hla_query.where(ChoyxonaCommentLike.staff_id == pa_fid)
-                else:
-                    hla_query = hla_query.where(ChoyxonaCommentLike.student_id == pa_sid)
-                    
-                hla_result = await db.execute(hla_query)
-                liked_by_author_ids = set(hla_result.scalars().all())
-
-        return [_map_comment_optimized(c, student, c.id in liked_ids, c.id in liked_by_author_ids) for c in all_comments]
+        liked_ids = await CommentService.liked_ids(db, student, [r.id for r in rows])
+        targets = await CommentService.reply_targets(db, rows)
+        return [_map_comment_row(r, student, r.id in liked_ids, targets.get(r.id)) for r in rows]
+    except HTTPException:
+        raise
     except Exception as e:
-        import traceback
-        with open("api_debug.log", "a") as f:
-            f.write(f"\n--- ERROR {datetime.now()} in get_comments({post_id}) ---\n")
-            f.write(traceback.format_exc())
-            f.write("-" * 40 + "\n")
+        logger.error(f"get_comments({post_id}) failed: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/posts/{post_id}/comments/page", response_model=CommentPageSchema)
+async def get_comments_page(
+    post_id: int,
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+    student: Student = Depends(get_student_or_staff),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Top-level comments ranked by likes, keyset-paginated (pass next_cursor back as cursor).
+    Replies are loaded lazily per comment via /comments/{comment_id}/replies.
+    """
+    if not await db.scalar(select(ChoyxonaPost.id).where(ChoyxonaPost.id == post_id)):
+        raise HTTPException(status_code=404, detail="Post topilmadi")
+
+    try:
+        rows, next_cursor = await CommentService.top_level_page(db, post_id, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    liked_ids = await CommentService.liked_ids(db, student, [r.id for r in rows])
+    targets = await CommentService.reply_targets(db, rows)
+    return CommentPageSchema(
+        items=[_map_comment_row(r, student, r.id in liked_ids, targets.get(r.id)) for r in rows],
+        next_cursor=next_cursor
+    )
+
+@router.get("/comments/{comment_id}/replies", response_model=CommentPageSchema)
+async def get_comment_replies(
+    comment_id: int,
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+    student: Student = Depends(get_student_or_staff),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Direct replies of a comment, oldest first, keyset-paginated.
+    """
+    try:
+        rows, next_cursor = await CommentService.replies_page(db, comment_id, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    liked_ids = await CommentService.liked_ids(db, student, [r.id for r in rows])
+    targets = await CommentService.reply_targets(db, rows)
+    return CommentPageSchema(
+        items=[_map_comment_row(r, student, r.id in liked_ids, targets.get(r.id)) for r in rows],
+        next_cursor=next_cursor
+    )
+
 @router.post("/comments/{comment_id}/like")
 async def toggle_comment_like(
     comment_id: int,
@@ -1037,6 +1019,11 @@ async def toggle_comment_like(
         comment.likes_count = ChoyxonaComment.likes_count + 1
         liked = True
 
+    # Precomputed "author hearted" flag
+    post_author = await CommentService.get_post_author(db, comment.post_id)
+    if CommentService.is_post_author(post_author, student):
+        comment.liked_by_author = liked
+
     await db.commit()
     # Refresh to get the actual integer value after SQL update
     await db.refresh(comment)
@@ -1095,6 +1082,7 @@ async def delete_comment(
 
     # Now delete the main comment
     await db.delete(comment)
+    await CommentService.adjust_replies_count(db, comment.reply_to_comment_id, -1)
     
     # Update Post Comment Count
     if comment.post_id:
@@ -1126,21 +1114,12 @@ async def edit_comment(
     await db.commit()
     await db.refresh(comment)
     
-    # Reload relationships for mapping
+    # Reload as a lean row for mapping
     # We need to return the full object for consistent UI updates
-    from sqlalchemy.orm import selectinload
-    query = select(ChoyxonaComment).options(
-        selectinload(ChoyxonaComment.student),
-        selectinload(ChoyxonaComment.reply_to_user),
-        selectinload(ChoyxonaComment.parent_comment),
-        selectinload(ChoyxonaComment.likes),
-        selectinload(ChoyxonaComment.post)
-    ).where(ChoyxonaComment.id == comment.id)
-    
-    result = await db.execute(query)
-    updated_comment = result.scalar_one()
-
-    return _map_comment(updated_comment, student, student.id)
+    row = await CommentService.get_row(db, comment.id)
+    liked_ids = await CommentService.liked_ids(db, student, [row.id])
+    targets = await CommentService.reply_targets(db, [row])
+    return _map_comment_row(row, student, row.id in liked_ids, targets.get(row.id))
 
 
 
@@ -1200,6 +1179,69 @@ def _map_comment_optimized(comment: "ChoyxonaComment", current_user, is_liked: b
         reply_to_content=reply_content
     )
 
+def _map_comment_row(row, current_user, is_liked: bool, target: Optional[dict] = None):
+    """
+    Map a CommentService projection row (no ORM graph) to CommentResponseSchema.
+    target: reply info from CommentService.reply_targets
+    """
+    from types import SimpleNamespace
+    current_user_id = getattr(current_user, 'id', 0)
+    is_staff_user = isinstance(current_user, Staff)
+
+    if row.student_id:
+        author_id, prefix = row.student_id, "s_"
+    elif row.staff_id:
+        author_id, prefix = row.staff_id, "f_"
+    else:
+        author_id, prefix = 0, None
+
+    def a(field):
+        return getattr(row, prefix + field) if prefix else None
+
+    # Reply info (same rules as _map_comment_optimized)
+    reply_user = None
+    reply_content = None
+    if target:
+        t_author = SimpleNamespace(full_name=target.get("full_name"), short_name=target.get("short_name"))
+        if target.get("username"):
+            reply_user = f"@{target['username']}"
+        else:
+            reply_user = format_name(t_author) if target.get("found") else "Noma'lum"
+        content = target.get("content")
+        if content is not None:
+            reply_content = content[:50] + "..." if len(content) > 50 else content
+
+    is_mine = False
+    if row.staff_id and is_staff_user and row.staff_id == current_user_id:
+        is_mine = True
+    elif row.student_id and not is_staff_user and row.student_id == current_user_id:
+        is_mine = True
+
+    image = a("image_url")
+    return CommentResponseSchema(
+        id=row.id,
+        post_id=row.post_id,
+        content=row.content,
+        author_id=author_id,
+        author_name=format_name(SimpleNamespace(full_name=a("full_name"), short_name=a("short_name"))) if prefix else "Noma'lum",
+        author_username=a("username"),
+        author_avatar=image,
+        author_image=image,
+        image=image,
+        author_role=(a("role") or ("staff" if prefix == "f_" else "student")) if prefix else "student",
+        author_is_premium=bool(a("is_premium")),
+        author_custom_badge=a("custom_badge"),
+        created_at=row.created_at,
+        likes_count=row.likes_count or 0,
+        is_liked=is_liked,
+        is_liked_by_author=bool(row.liked_by_author),
+        is_mine=is_mine,
+        replies_count=row.replies_count or 0,
+        reply_to_comment_id=row.reply_to_comment_id,
+        reply_to_username=reply_user,
+        reply_to_content=reply_content
+    )
+
 def _map_comment(comment: "ChoyxonaComment", current_user):
     # Fallback
     is_liked = False
@@ -1,19 +1,15 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
 
 from api.dependencies import get_current_student, get_db
 from api.schemas import StudentDashboardSchema
-from database.models import Student, Staff, UserActivity, ClubMembership, Election, RatingActivation, RatingRecord
+from database.models import Student, Staff
 
 router = APIRouter()
 
 from typing import Optional
-from services.sync_service import sync_student_data
-from utils.student_utils import get_election_info
+from services.dashboard_summary import DashboardSummaryService
 from services.hemis_service import HemisService
-from sqlalchemy import and_
-from datetime import datetime
 
 @router.get("/", response_model=StudentDashboardSchema)
 async def get_dashboard_stats(
@@ -23,20 +19,9 @@ async def get_dashboard_stats(
 ):
     """
     Get statistics for the student dashboard.
+    Counters: one student_dashboard_summary lookup; election/rating: per-university snapshot.
+    refresh=true queues the HEMIS sync and returns the current snapshot with refreshing=true.
     """
-    if refresh:
-        from services.sync_service import sync_student_data
-        await sync_student_data(db, student.id)
-        await db.commit() # Ensure changes are saved!
-        # Re-fetch student to get updated values
-        await db.refresh(student)
-    
-    # 1. Activities Count
-    activities_count = await db.scalar(
-        select(func.count(UserActivity.id))
-        .where(UserActivity.student_id == student.id)
-    ) or 0
-    
     # [FIX] Skip student-specific queries for Staff
     if isinstance(student, Staff):
         total_st = await HemisService.get_total_student_count(student.hemis_token)
@@ -56,24 +41,13 @@ async def get_dashboard_stats(
             "total_employees": total_emp
         }
 
-    # 2. Approved Activities Count
-    approved_count = await db.scalar(
-        select(func.count(UserActivity.id))
-        .where(
-            UserActivity.student_id == student.id, 
-            UserActivity.status == 'approved'
-        )
-    ) or 0
-    
-    # 3. Clubs Count
-    clubs_count = await db.scalar(
-        select(func.count(ClubMembership.id))
-        .where(ClubMembership.student_id == student.id)
-    ) or 0
-    
-    # 4. GPA & Absence (Use stored data as primary source for speed)
-    # 4. GPA & Absence (Use stored data as primary source for speed)
-    # [FIX] Handle Staff object which doesn't have GPA/Attendance
+    refreshing = False
+    if refresh:
+        refreshing = await DashboardSummaryService.request_refresh(student.id)
+
+    summary = await DashboardSummaryService.get_summary(db, student.id)
+
+    # GPA & Absence: stored on the Student row (already loaded by auth)
     gpa = getattr(student, 'gpa', 0.0) or 0.0
     missed_total = getattr(student, 'missed_hours', 0) or 0
     missed_excused = getattr(student, 'missed_hours_excused', 0) or 0
@@ -82,65 +56,31 @@ async def get_dashboard_stats(
     # Extra safety sync for Jami logic
     if missed_total < (missed_excused + missed_unexcused):
         missed_total = missed_excused + missed_unexcused
-    
-    # Optional: If data is 0 or very old, user can trigger refresh via mobile app pull-to-refresh
-    # For now, we trust the background sync.
-    
-    # 5. Election Info
-    _, has_active_election = await get_election_info(student, db)
-    active_election_id = None
-    if has_active_election:
-        active_election = await db.scalar(
-            select(Election).where(
-                and_(
-                    Election.university_id == student.university_id,
-                    Election.status == "active"
-                )
-            ).order_by(Election.created_at.desc())
-        )
-        if active_election:
-            active_election_id = active_election.id
 
-    # 6. Rating Info (Enhanced)
-    act_query = select(RatingActivation).where(
-        RatingActivation.university_id == student.university_id,
-        RatingActivation.is_active == True
-    ).order_by(RatingActivation.created_at.desc())
-    
-    act_res = await db.execute(act_query)
-    activations = act_res.scalars().all()
-    has_active_rating = len(activations) > 0
-    active_roles = [a.role_type for a in activations]
-    
+    # Election & Rating Info (university snapshot)
+    flags = await DashboardSummaryService.university_flags(db, student.university_id)
+    activations = flags["activations"]
+
     # Prioritize 'water' role if multiple exist
-    main_act = next((a for a in activations if a.role_type == 'water'), activations[0]) if activations else None
-    
-    # Check if already voted for the primary one
-    has_voted = False
-    if main_act:
-        vote_query = select(RatingRecord).where(
-            RatingRecord.user_id == student.id,
-            RatingRecord.activation_id == main_act.id
-        ).limit(1)
-        v_res = await db.execute(vote_query)
-        if v_res.scalar_one_or_none():
-            has_voted = True
+    main_act = next((a for a in activations if a["role_type"] == 'water'), activations[0]) if activations else None
+    has_voted = bool(main_act) and main_act["id"] in (summary.voted_activation_ids or [])
 
     return StudentDashboardSchema(
         gpa=gpa,
         missed_hours=missed_total,
         missed_hours_excused=missed_excused,
         missed_hours_unexcused=missed_unexcused,
-        activities_count=activities_count,
-        clubs_count=clubs_count,
-        activities_approved_count=approved_count,
-        has_active_election=has_active_election,
-        active_election_id=active_election_id,
-        has_active_rating=has_active_rating,
-        active_rating_roles=active_roles,
-        expires_at=main_act.expires_at if main_act else None,
-        active_rating_id=main_act.id if main_act else None,
-        active_rating_title=(main_act.title if main_act and main_act.title else "So'rovnoma") if main_act else None,
-        active_rating_questions=main_act.questions if main_act else None,
-        has_voted=has_voted
+        activities_count=summary.activities_count,
+        clubs_count=summary.clubs_count,
+        activities_approved_count=summary.activities_approved_count,
+        has_active_election=flags["election_id"] is not None,
+        active_election_id=flags["election_id"],
+        has_active_rating=bool(activations),
+        active_rating_roles=[a["role_type"] for a in activations],
+        expires_at=main_act["expires_at"] if main_act else None,
+        active_rating_id=main_act["id"] if main_act else None,
+        active_rating_title=(main_act["title"] or "So'rovnoma") if main_act else None,
+        active_rating_questions=main_act["questions"] if main_act else None,
+        has_voted=has_voted,
+        refreshing=refreshing
     )
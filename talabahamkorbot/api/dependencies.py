@@ -1,13 +1,21 @@
 from fastapi import Header, HTTPException, Depends, Request, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from database.db_connect import AsyncSessionLocal
+from database.db_connect import AsyncSessionLocal, WRITE_DEPENDENCIES, get_read_session, read_replica
 from database.models import TgAccount, Student, User, StudentNotification
 
 async def get_db():
     async with AsyncSessionLocal() as session:
         yield session
 
+WRITE_DEPENDENCIES.add(get_db)
+
+
+async def get_read_db():
+    """Read-only endpoints: replica session while its lag is acceptable, else primary."""
+    async for session in get_read_session():
+        yield session
+
 
 async def get_current_user_token_data(
     request: Request = None, 
@@ -288,7 +296,7 @@ async def require_action_token(
 ):
     """
     Dependency that enforces One-Time Action Token (Shifr).
-    Consumes the token immediately.
+    Consumes the token immediately (v2: HMAC + Redis nonce, no DB round-trip).
     """
     if not action_token:
         # [DEBUG] Allow bypassing if explicitly disabled (e.g. for some legacy clients during migration?)
@@ -306,7 +314,8 @@ async def require_action_token(
     path = request.url.path
     meta = f"{method}:{path}"
     
-    success = await TokenService.consume_token(db, action_token, student.id, action_meta=meta)
+    user_type = "staff" if isinstance(student, Staff) else "student"
+    success = await TokenService.consume_token(db, action_token, student.id, action_meta=meta, user_type=user_type)
     
     if not success:
          raise HTTPException(status_code=403, detail="Yaroqsiz yoki ishlatilgan shifr (Invalid Action Token)")
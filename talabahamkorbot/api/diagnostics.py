@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from utils.string_formatter import StringFormatter
 
@@ -31,3 +31,26 @@ async def test_format(payload: DiagnosticPayload):
     if decrypted is None:
        return {"success": False, "error": "Formatting failed"}
     return {"success": True, "snippet": decrypted[:5] + "***"}
+
+
+from api.dependencies import get_owner
+
+@router.get("/db-pools")
+async def get_db_pool_metrics(owner=Depends(get_owner)):
+    """
+    Connection pools of this worker: checkout wait times (avg/max/histogram), timeouts,
+    checked-out connections, plus read-replica routing and lag.
+    """
+    from database.db_connect import ReplicaRouter
+    from database.pool_metrics import PoolMetrics
+    return {"success": True, "data": {"pools": PoolMetrics.snapshot(), "replica": ReplicaRouter.stats()}}
+
+
+@router.get("/sql")
+async def get_sql_metrics(owner=Depends(get_owner)):
+    """
+    SQL of this worker: routes by queries per request, slowest statement fingerprints
+    and N+1 findings (same statement shape repeated within one request).
+    """
+    from database.query_metrics import QueryMetrics
+    return {"success": True, "data": QueryMetrics.stats()}
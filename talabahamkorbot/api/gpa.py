@@ -3,11 +3,12 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 
 from api.dependencies import get_current_student, get_db
-from api.schemas import GPAResultSchema
+from api.schemas import GPAResultSchema, GPARankSchema
 from database.models import Student
 from services.hemis_service import HemisService
 from services.university_service import UniversityService
 from services.gpa_calculator import GPACalculator
+from services.gpa_engine import CohortGPAEngine
 
 router = APIRouter()
 
@@ -143,3 +144,33 @@ async def get_cumulative_gpa(
     result = GPACalculator.calculate_cumulative(all_subjects, retake_policy=retake_policy)
     
     return result.dict()
+
+@router.get("/rank", response_model=GPARankSchema)
+async def get_gpa_rank(
+    student: Student = Depends(get_current_student),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Student's position in the faculty/course GPA leaderboard.
+    Served from precomputed StudentGpaRank rows (see CohortGPAEngine), no HEMIS calls.
+    """
+    from database.models import Staff
+    if isinstance(student, Staff):
+        return {"ranked": False}
+
+    row = await CohortGPAEngine.get_student_rank(db, student)
+    if not row:
+        # Baholar hali keshda yo'q (yoki reyting hali qayta hisoblanmagan): keyingi rebuild'da qo'shiladi
+        return {"ranked": False, "pending": True}
+
+    top = await CohortGPAEngine.get_leaderboard(db, row.scope, limit=10)
+    return {
+        "ranked": True,
+        "rank": row.rank,
+        "cohort_size": row.cohort_size,
+        "gpa": row.gpa,
+        "total_credits": row.total_credits,
+        "semester_gpa": row.semester_gpa,
+        "computed_at": row.computed_at,
+        "top": top,
+    }
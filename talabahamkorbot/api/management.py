@@ -15,10 +15,11 @@ import re
 logger = logging.getLogger(__name__)
 
 from api.dependencies import get_current_student, get_current_staff
-from database.db_connect import get_db
+from database.db_connect import get_db, read_replica
 from database.models import Student, Staff, TgAccount, UserActivity, TutorGroup, User, StudentDocument, UserCertificate
 from database.models import StaffRole
 from services.analytics_service import get_management_analytics
+from services.student360_service import Student360Service
 from services.ai_service import generate_answer_by_key
 from data.ai_prompts import AI_PROMPTS
 import json
@@ -32,6 +33,7 @@ router.include_router(analytics_router, prefix="/analytics", tags=["Analytics"])
 
 
 @router.get("/dashboard")
+@read_replica
 async def get_management_dashboard(
     staff: Any = Depends(get_current_staff),
     db: AsyncSession = Depends(get_db)
@@ -590,6 +592,7 @@ def calculate_public_filtered_count(
     return jami.get("Erkak", 0) + jami.get("Ayol", 0)
 
 @router.get("/students/search")
+@read_replica
 async def search_mgmt_students(
     query: str = None,
     faculty_id: int = None,
@@ -730,6 +733,7 @@ async def search_mgmt_students(
 # Duplicate removed
 
 @router.get("/staff/search")
+@read_replica
 async def search_mgmt_staff(
     query: str = None,
     faculty_id: int = None,
@@ -945,79 +949,37 @@ async def get_mgmt_groups_simple(
 @router.get("/students/{student_id}/full-details")
 async def get_mgmt_student_details(
     student_id: int,
+    refresh: bool = False,
     staff: Any = Depends(get_current_staff),
     db: AsyncSession = Depends(get_db)
 ):
+    """
+    Student 360: sections are read concurrently (Student360Service) and cached briefly;
+    academic data comes from the HEMIS cache only. data.sections has per-section
+    status / as_of, so the UI can show partial results.
+    """
     try:
-        from database.models import UserActivity, StudentDocument, StudentFeedback
-        
         student = await db.get(Student, student_id)
         if not student: raise HTTPException(status_code=404, detail="Talaba topilmadi")
 
         # Security: Ensure student belongs to staff's university
         uni_id = getattr(staff, 'university_id', None)
         current_role = getattr(staff, 'role', None)
-        from database.models import StaffRole
         if current_role not in [StaffRole.OWNER, StaffRole.DEVELOPER]:
             if student.university_id != uni_id:
                 raise HTTPException(status_code=403, detail="Boshqa universitet talabasi ma'lumotlarini ko'rish imkonsiz")
 
-        # 1. Appeals (Feedbacks) - parent_id=None are top-level threads
-        appeals_result = await db.execute(
-            select(StudentFeedback)
-            .where(StudentFeedback.student_id == student_id, StudentFeedback.parent_id == None)
-            .order_by(StudentFeedback.created_at.desc())
-        )
-        appeals = appeals_result.scalars().all()
-
-        # 2. Activities (With Images Eagerly Loaded)
-        activities_result = await db.execute(
-            select(UserActivity)
-            .where(UserActivity.student_id == student_id)
-            .options(selectinload(UserActivity.images))
-            .order_by(UserActivity.created_at.desc())
-        )
-        activities = activities_result.scalars().all()
+        view = await Student360Service.get_view(student, refresh=refresh)
+        sections = view["sections"]
 
-        # 3. Documents (Unified Table)
-        all_docs_result = await db.execute(
-            select(StudentDocument)
-            .where(StudentDocument.student_id == student_id)
-            .order_by(StudentDocument.uploaded_at.desc())
-        )
-        all_docs = all_docs_result.scalars().all()
-        
-        docs = [d for d in all_docs if d.file_type == "document"]
-        certs = [d for d in all_docs if d.file_type == "certificate"]
+        def section(name, default):
+            data = sections[name]["data"]
+            return default if data is None else data
 
-        def safe_isoformat(dt):
-            if not dt: return None
-            if isinstance(dt, str): return dt
-            try:
-                return dt.isoformat()
-            except:
-                return str(dt)
-
-        # [NEW] Fetch Live Academic Data if token available
-        from database.models import User
-        user = await db.scalar(select(User).where(User.hemis_login == student.hemis_login))
-        user_token = user.hemis_token if user else None
-        
-        attendance_str = "Noma'lum"
-        if user_token:
-            try:
-                from services.hemis_service import HemisService
-                t, e, u, _ = await HemisService.get_student_absence(user_token, student_id=student.id)
-                attendance_str = f"Jami: {t} soat (Sababli: {e}, Sababsiz: {u})"
-                
-                # Update GPA if 0
-                if student.gpa == 0.0:
-                    live_gpa = await HemisService.get_student_gpa(user_token, student_id=student.id)
-                    if live_gpa:
-                        student.gpa = live_gpa
-                        await db.commit()
-            except:
-                pass
+        account = section("account", {})
+        academic = section("academic", {})
+        att = academic.get("attendance")
+        attendance_str = f"Jami: {att['total']} soat (Sababli: {att['excused']}, Sababsiz: {att['unexcused']})" if att else "Noma'lum"
 
         return {
             "success": True,
@@ -1031,66 +993,34 @@ async def get_mgmt_student_details(
                     "group_number": getattr(student, 'group_number', None),
                     "image_url": getattr(student, 'image_url', None),
                     "phone": getattr(student, 'phone', None),
-                    "gpa": getattr(student, 'gpa', 0.0),
+                    "gpa": student.gpa or academic.get("gpa") or 0.0,
                     "attendance": attendance_str,
-                    # [NEW] Enhanced Fields
                     "education_type": getattr(student, 'education_type', None),
                     "specialty_name": getattr(student, 'specialty_name', None),
                     "level_name": getattr(student, 'level_name', None),
                     "education_form": getattr(student, 'education_form', None),
-                    "is_app_user": bool(user_token),
+                    "is_app_user": account.get("is_app_user", False),
                     "last_active": student.last_login.isoformat() if getattr(student, 'last_login', None) else None
                 },
-                "appeals": [
-                    {
-                        "id": a.id, 
-                        "text": a.text, 
-                        "status": getattr(a, 'status', 'pending'), 
-                        "date": safe_isoformat(getattr(a, 'created_at', None)),
-                        "file_id": getattr(a, 'file_id', None),
-                        "file_type": getattr(a, 'file_type', 'photo')
-                    } for a in appeals
-                ],
-                "activities": [
-                    {
-                        "id": act.id, 
-                        "title": getattr(act, 'name', getattr(act, 'title', 'Benoq')), 
-                        "status": getattr(act, 'status', 'pending'), 
-                        "date": safe_isoformat(getattr(act, 'created_at', None)),
-                        "images": [{"file_id": img.file_id, "file_type": img.file_type} for img in getattr(act, 'images', [])]
-                    } for act in activities
-                ],
-                "documents": [
-                    {
-                        "id": d.id, 
-                        "title": d.file_name, 
-                        "created_at": safe_isoformat(d.uploaded_at),
-                        "file_id": d.telegram_file_id,
-                        "file_url": f"/api/v1/management/documents/{d.id}/download",
-                        "file_type": d.file_type or "document",
-                        "status": "approved"
-                    } for d in docs
-                ],
-                "certificates": [
-                    {
-                        "id": c.id, 
-                        "title": c.file_name, 
-                        "created_at": safe_isoformat(c.uploaded_at),
-                        "file_id": c.telegram_file_id,
-                        "file_url": f"/api/v1/management/documents/{c.id}/download",
-                        "file_type": c.file_type or "certificate",
-                        "status": "approved"
-                    } for c in certs
-                ]
+                "appeals": section("appeals", []),
+                "activities": section("activities", []),
+                "documents": section("documents", []),
+                "certificates": section("certificates", []),
+                "academic": academic,
+                "sections": {
+                    name: {"status": s["status"], "as_of": s["as_of"], "ms": s["ms"]}
+                    for name, s in sections.items()
+                },
+                "built_at": view["built_at"],
+                "cached": view["cached"],
             }
         }
     except Exception as e:
-        import traceback
-        print(f"ERROR in get_mgmt_student_details: {e}")
-        traceback.print_exc()
+        logger.error(f"ERROR in get_mgmt_student_details: {e}")
         return {"success": False, "message": str(e)}
 
 @router.get("/analytics")
+@read_replica
 async def get_mgmt_analytics(
     staff: Any = Depends(get_current_staff),
     db: AsyncSession = Depends(get_db)
@@ -1363,6 +1293,7 @@ async def download_student_document(
         raise HTTPException(status_code=500, detail=f"Telegramdan faylni yuklab olishda xatolik: {str(e)}")
 
 @router.get("/archive")
+@read_replica
 async def get_mgmt_documents_archive(
     query: str = None,
     faculty_id: int = None,
@@ -1739,6 +1670,7 @@ class ActivityModerationRequest(BaseModel):
     comment: Optional[str] = None
 
 @router.get("/activities")
+@read_replica
 async def get_management_activities(
     status: Optional[str] = None,
     category: Optional[str] = None,
@@ -424,10 +424,11 @@ async def resolve_appeal(
     from services.activity_service import ActivityService, ActivityType
     await ActivityService.log_activity(
         db=db,
-        user_id=staff.id, # Assuming 'staff' is the user resolving the appeal
-        role='management', # Or appropriate role for staff
-        activity_type=ActivityType.APPEAL_RESOLUTION, # A new activity type for resolution
-        ref_id=appeal.id
+        user_id=staff.id,
+        role='staff',
+        activity_type=ActivityType.APPEAL,
+        ref_id=appeal.id,
+        meta_data={"action": "resolve"}
     )
     
     return {"success": True, "message": "Murojaat yopildi"}
@@ -0,0 +1,40 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+
+from config import METRICS_TOKEN
+
+router = APIRouter(tags=["System"])
+
+
+def _check_access(request: Request):
+    if METRICS_TOKEN:
+        if request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+            raise HTTPException(status_code=401, detail="Unauthorized")
+    elif request.client is None or request.client.host not in ("127.0.0.1", "::1"):
+        raise HTTPException(status_code=403, detail="Access Denied")
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def prometheus_metrics(request: Request):
+    """
+    Prometheus scrape endpoint (this worker): per-route request / SQL histograms, slow queries,
+    N+1 findings, connection pools, replica routing and in-process queues.
+    """
+    _check_access(request)
+    from database.db_connect import ReplicaRouter
+    from database.pool_metrics import PoolMetrics
+    from database.query_metrics import QueryMetrics
+    from services.activity_service import ActivityService
+    from services.ai_gateway import AIGateway
+    from services.employee_directory import EmployeeDirectory
+    from services.qr_attendance import QRAttendanceQueue
+
+    gauges = {
+        "db_pool": PoolMetrics.snapshot(),
+        "db_replica": ReplicaRouter.stats(),
+        "activity_queue": ActivityService.stats(),
+        "qr_attendance": QRAttendanceQueue.stats(),
+        "employee_directory": EmployeeDirectory.stats(),
+        "ai_gateway": AIGateway.metrics(),
+    }
+    return PlainTextResponse(QueryMetrics.render_prometheus(gauges), media_type="text/plain; version=0.0.4")
@@ -101,6 +101,7 @@ class StudentDashboardSchema(BaseModel):
     active_rating_title: Optional[str] = None # [NEW]
     active_rating_questions: Optional[list] = None # [NEW]
     has_voted: bool = False # [NEW]
+    refreshing: bool = False # HEMIS sync queued (refresh=true)
 
 class ClubSchema(BaseModel):
     id: int
@@ -313,11 +314,17 @@ class CommentResponseSchema(BaseModel):
     reply_to_username: Optional[str] = None
     reply_to_content: Optional[str] = None
     
+    replies_count: int = 0 # Lazy reply pages: GET /comments/{id}/replies
+    
     is_mine: bool = False
     
     class Config:
         from_attributes = True
 
+class CommentPageSchema(BaseModel):
+    items: list[CommentResponseSchema]
+    next_cursor: Optional[str] = None
+
 class SubscriptionPlanSchema(BaseModel):
     id: int
     name: str
@@ -348,6 +355,23 @@ class GPAResultSchema(BaseModel):
     total_points: float
     subjects: list[GPASubjectResultSchema]
 
+class GPALeaderboardEntrySchema(BaseModel):
+    rank: int
+    gpa: float
+    student_id: int
+    full_name: str
+
+class GPARankSchema(BaseModel):
+    ranked: bool
+    pending: bool = False  # not ranked yet: no cached grades or waiting for the next rebuild
+    rank: Optional[int] = None
+    cohort_size: Optional[int] = None
+    gpa: Optional[float] = None
+    total_credits: Optional[float] = None
+    semester_gpa: Optional[dict] = None
+    computed_at: Optional[datetime] = None
+    top: list[GPALeaderboardEntrySchema] = []
+
 
 # ============================================================
 # ELECTION SCHEMAS
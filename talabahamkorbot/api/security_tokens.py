@@ -1,8 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.ext.asyncio import AsyncSession
-from api.dependencies import get_current_student, get_db
-from database.models import Student
+from api.dependencies import get_current_student
+from database.models import Student, Staff
 from services.token_service import TokenService
+from config import ACTION_TOKEN_TTL_HOURS
 import logging
 
 router = APIRouter(prefix="/security/tokens", tags=["Security"])
@@ -11,12 +11,12 @@ logger = logging.getLogger(__name__)
 @router.post("/request")
 async def request_tokens(
     count: int = 50, # Default count
-    student: Student = Depends(get_current_student),
-    db: AsyncSession = Depends(get_db)
+    scope: str = "*", # "*" or "METHOD:/path/prefix"
+    student: Student = Depends(get_current_student)
 ):
     """
     Request a batch of implementation tokens (shifrs).
-    Maximum 500 per request.
+    Maximum 500 per request. Tokens are signed, not stored (no DB write).
     """
     if count > 500:
         count = 500
@@ -24,11 +24,13 @@ async def request_tokens(
         count = 1
         
     try:
-        tokens = await TokenService.generate_batch(db, student.id, "student", count)
+        user_type = "staff" if isinstance(student, Staff) else "student"
+        tokens = TokenService.generate_batch(student.id, user_type, count, scope=scope)
         return {
             "success": True, 
             "tokens": tokens, 
             "count": len(tokens),
+            "expires_in": ACTION_TOKEN_TTL_HOURS * 3600,
             "message": "Tokens generated successfully"
         }
     except Exception as e:
@@ -232,11 +232,10 @@ async def get_my_profile(
     # [NEW] Opportunistic Prefetch for existing users (Triggered on App Start)
     # This ensures users who are ALREADY logged in get the benefit of cache warming
     # without needing to re-login.
-    import asyncio
-    from services.hemis_service import HemisService
+    from services.prefetch_scheduler import PrefetchScheduler, LANE_SYNC
     from services.university_service import UniversityService
     base_url = UniversityService.get_api_url(student.hemis_login)
-    asyncio.create_task(HemisService.prefetch_data(student.hemis_token, student.id, base_url=base_url))
+    await PrefetchScheduler.enqueue(student.id, student.hemis_token, base_url=base_url, lane=LANE_SYNC)
 
     return data
 
@@ -250,13 +249,12 @@ async def sync_data(
     Force synchronization of Hemis data.
     Useful for 'Pull to Refresh' or error recovery.
     """
-    import asyncio
-    from services.hemis_service import HemisService
+    from services.prefetch_scheduler import PrefetchScheduler, LANE_INTERACTIVE
     
-    # Trigger background prefetch
+    # Trigger background prefetch (user asked for it - highest lane)
     from services.university_service import UniversityService
     base_url = UniversityService.get_api_url(student.hemis_login)
-    asyncio.create_task(HemisService.prefetch_data(student.hemis_token, student.id, base_url=base_url))
+    await PrefetchScheduler.enqueue(student.id, getattr(student, "hemis_token", None), base_url=base_url, lane=LANE_INTERACTIVE)
     
     return {"success": True, "message": "Ma'lumotlar yangilanmoqda..."}
 
@@ -424,8 +422,10 @@ async def set_username(
     elif current_staff_id:
         current_taken = await db.scalar(select(TakenUsername).where(TakenUsername.staff_id == current_staff_id))
     
+    released_username = None
     if current_taken:
         # Update existing record
+        released_username = current_taken.username
         current_taken.username = username_lower
     else:
         # Insert new (always lowercase for uniqueness)
@@ -452,6 +452,10 @@ async def set_username(
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=400, detail=f"Xatolik: {str(e)}")
+
+    from services.username_index import UsernameIndex
+    UsernameIndex.release([released_username])
+    await UsernameIndex.claim(username_lower, current_student_id, current_staff_id)
     
     return {"success": True, "username": raw_username}
 
@@ -462,14 +466,16 @@ async def check_username_availability(
     db: AsyncSession = Depends(get_db)
 ):
     """Check if username is available (True if available)"""
-    username = username.strip().lower()
+    from services.username_index import UsernameIndex
+
+    username = UsernameIndex.normalize(username)
     if not username: 
         return {"available": False}
         
-    from database.models import TakenUsername
-    existing = await db.scalar(select(TakenUsername).where(TakenUsername.username == username))
+    # Bloom filter: "definitely free" without DB; otherwise LRU / one indexed lookup
+    owner = await UsernameIndex.get_owner(db, username)
     
-    if existing and authorization:
+    if owner and authorization:
         # If taken, check if it's ME
         try:
             token = authorization.replace("Bearer ", "")
@@ -490,19 +496,24 @@ async def check_username_availability(
                     student_id = tg_acc.student_id
                     staff_id = tg_acc.staff_id
 
-            if student_id and existing.student_id == student_id:
+            if student_id and owner[0] == student_id:
                 return {"available": True}
-            if staff_id and existing.staff_id == staff_id:
+            if staff_id and owner[1] == staff_id:
                 return {"available": True}
                 
         except:
              pass
     
-    return {"available": existing is None}
+    if owner is None:
+        return {"available": True}
+    return {"available": False, "suggestions": await UsernameIndex.suggest(db, username)}
 
 from sqlalchemy import or_
 from fastapi_cache.decorator import cache
 from pydantic import BaseModel
+from utils.serialization import schema_columns, row_to_dict
+
+_PROFILE_COLUMNS, _PROFILE_DEFAULTS = schema_columns(Student, StudentProfileSchema)
 
 @router.get("/search")
 # Cache reduced to 1 second to fetch fresh avatar/name updates immediately
@@ -523,7 +534,8 @@ async def search_students(
     
     # Priority: Username match > Name match
     # We can just fetch all matches
-    stmt = select(Student).where(
+    # Lean projection: only StudentProfileSchema columns (no ORM load / selectin relations)
+    stmt = select(*_PROFILE_COLUMNS).where(
         or_(
             Student.username.ilike(search_term),
             Student.full_name.ilike(search_term)
@@ -531,18 +543,17 @@ async def search_students(
     ).limit(20)
     
     result = await db.execute(stmt)
-    students = result.scalars().all()
     
     from utils.student_utils import format_name
     
     encoded = []
-    for s in students:
-        data = StudentProfileSchema.model_validate(s).model_dump()
+    for row in result.all():
+        data = row_to_dict(row, _PROFILE_DEFAULTS)
         # Override name with friendly format
-        data['full_name'] = format_name(s.full_name)
+        data['full_name'] = format_name(row.full_name)
         
         # Ensure HTTPS for images
-        raw_image = s.image_url
+        raw_image = row.image_url
         if raw_image and raw_image.startswith("http://"):
             raw_image = raw_image.replace("http://", "https://")
             
@@ -552,7 +563,7 @@ async def search_students(
         data['avatar'] = raw_image # Alias for frontend compatibility
         
         # ensure role passed
-        data['role'] = s.hemis_role or "student"
+        data['role'] = row.hemis_role or "student"
         encoded.append(data)
         
     return encoded
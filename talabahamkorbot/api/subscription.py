@@ -1,11 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete, func
-from sqlalchemy.orm import selectinload
-from database.db_connect import AsyncSessionLocal
+from sqlalchemy import select
 from database.models import Student, StudentSubscription, StudentNotification
 from api.dependencies import get_current_student, get_db
-from api.schemas import StudentProfileSchema
+from services.social_graph_service import SocialGraphService
+from utils.serialization import fast_json
 import logging
 
 router = APIRouter()
@@ -29,57 +28,44 @@ async def toggle_subscription(
         
     print(f"Subs Toggle: {student.id} -> {target_id}")
         
-    target_student = await db.get(Student, target_id)
-    if not target_student:
+    target_exists = await db.scalar(select(Student.id).where(Student.id == target_id))
+    if not target_exists:
         raise HTTPException(status_code=404, detail="Target student not found")
         
     # Check existing
     existing = await db.scalar(
-        select(StudentSubscription).where(
+        select(StudentSubscription.id).where(
             StudentSubscription.follower_id == student.id,
             StudentSubscription.target_id == target_id
         )
     )
     
-    subscribed = False
-    
     if existing:
-        # Unfollow
-        await db.delete(existing)
+        # Unfollow (edge + both counters in one transaction)
+        _, count = await SocialGraphService.unfollow(db, student.id, target_id)
         subscribed = False
     else:
         # Follow
-        new_sub = StudentSubscription(
-            follower_id=student.id,
-            target_id=target_id
-        )
-        db.add(new_sub)
+        created, count = await SocialGraphService.follow(db, student.id, target_id)
         subscribed = True
         
         # Send Notification to Target
-        try:
-            from services.notification_service import NotificationService
-            # NotificationService is async? Or synchronous? Usually we just add DB record
-            # Let's add DB record properly
-            notif = StudentNotification(
-                student_id=target_id,
-                title="Yangi obunachi! 👤",
-                body=f"{student.full_name} sizga obuna bo'ldi.",
-                type="social" # New type
-            )
-            db.add(notif)
-            # Potentially trigger FCM via background task/celery later, 
-            # but for now let's rely on polling or direct DB insert which mobile picks up
-        except Exception as e:
-            logger.error(f"Failed to create notification: {e}")
+        if created:
+            try:
+                notif = StudentNotification(
+                    student_id=target_id,
+                    title="Yangi obunachi! 👤",
+                    body=f"{student.full_name} sizga obuna bo'ldi.",
+                    type="social" # New type
+                )
+                db.add(notif)
+                # Potentially trigger FCM via background task/celery later, 
+                # but for now let's rely on polling or direct DB insert which mobile picks up
+            except Exception as e:
+                logger.error(f"Failed to create notification: {e}")
 
     await db.commit()
     
-    # Get Updated Count
-    count = await db.scalar(
-        select(func.count(StudentSubscription.id)).where(StudentSubscription.target_id == target_id)
-    )
-    
     return {
         "subscribed": subscribed,
         "followers_count": count
@@ -90,15 +76,28 @@ async def get_counts(
     target_id: int,
     db: AsyncSession = Depends(get_db)
 ):
-    """Get followers and following count for a user"""
-    followers = await db.scalar(
-        select(func.count(StudentSubscription.id)).where(StudentSubscription.target_id == target_id)
-    )
-    following = await db.scalar(
-        select(func.count(StudentSubscription.id)).where(StudentSubscription.follower_id == target_id)
-    )
+    """Get followers and following count for a user (denormalized counters, no COUNT scan)"""
+    counts = await SocialGraphService.get_counts(db, target_id)
+    followers, following = counts or (0, 0)
     return {"followers": followers, "following": following}
 
+@router.get("/relations")
+async def get_relations(
+    ids: str = Query(..., description="Comma separated student ids, e.g. 1,2,3"),
+    student: Student = Depends(get_current_student),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Batch follow status for feed rendering:
+    {"<id>": {"following": bool, "followed_by": bool, "mutual": bool}}
+    """
+    try:
+        other_ids = [int(i) for i in ids.split(",") if i.strip()][:200]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be comma separated integers")
+    relations = await SocialGraphService.relations(db, student.id, other_ids)
+    return {str(k): v for k, v in relations.items()}
+
 @router.get("/check-subscription/{target_id}")
 async def check_subscription(
     target_id: int,
@@ -114,57 +113,65 @@ async def check_subscription(
     )
     return {"subscribed": exists is not None}
 
-def _map_student_profile(student: Student) -> dict:
-    """Helper to convert Student model to response format expected by Mobile UI"""
-    if not student:
-        return {}
-        
-    # Start with Schema
-    data = StudentProfileSchema.model_validate(student).model_dump()
-    
-    # Force 'image' and 'role' keys for frontend compatibility (Matches student.py logic)
-    data['image'] = student.image_url
-    data['role'] = student.hemis_role or "student"
-    
-    # Ensure image_url is also present
-    if not data.get('image_url'):
-        data['image_url'] = student.image_url
-        
-    # Format Name (Clean up parentheses and reorder)
+def _map_student_row(row) -> dict:
+    """Slim list item from a SocialGraphService.list_page row (no ORM load, no schema re-validation)"""
     from utils.student_utils import format_name
-    data['full_name'] = format_name(student.full_name)
-        
-    return data
+    return {
+        "id": row.id,
+        "full_name": format_name(row.full_name),
+        "short_name": row.short_name,
+        "username": row.username,
+        "image_url": row.image_url,
+        "image": row.image_url,
+        "role": row.hemis_role or "student",
+        "hemis_role": row.hemis_role,
+        "faculty_name": row.faculty_name,
+        "specialty_name": row.specialty_name,
+        "level_name": row.level_name,
+        "is_premium": bool(row.is_premium),
+        "custom_badge": row.custom_badge,
+        "followed_at": row.followed_at,
+    }
+
+async def _list_page(db: AsyncSession, target_id: int, direction: str, cursor: int | None, limit: int) -> dict:
+    rows, next_cursor = await SocialGraphService.list_page(db, target_id, direction, cursor, limit)
+    return {"items": [_map_student_row(r) for r in rows], "next_cursor": next_cursor}
+
+@router.get("/followers/{target_id}")
+async def get_followers_page(
+    target_id: int,
+    cursor: int = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(50, ge=1, le=200),
+    db: AsyncSession = Depends(get_db)
+):
+    """Followers of target_id, newest first, keyset-paginated"""
+    return fast_json(await _list_page(db, target_id, "followers", cursor, limit))
+
+@router.get("/following/{target_id}")
+async def get_following_page(
+    target_id: int,
+    cursor: int = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(50, ge=1, le=200),
+    db: AsyncSession = Depends(get_db)
+):
+    """Users target_id follows, newest first, keyset-paginated"""
+    return fast_json(await _list_page(db, target_id, "following", cursor, limit))
 
 @router.get("/followers-list/{target_id}")
 async def get_followers_list(
     target_id: int,
+    limit: int = Query(200, ge=1, le=200),
     db: AsyncSession = Depends(get_db)
 ):
-    """Get list of users following the target_id"""
-    query = select(StudentSubscription).options(
-        selectinload(StudentSubscription.follower)
-    ).where(StudentSubscription.target_id == target_id)
-    
-    result = await db.execute(query)
-    subs = result.scalars().all()
-    
-    # Return list of students mapped to profile schema
-    return [_map_student_profile(s.follower) for s in subs]
+    """Get list of users following the target_id (first page only; use /followers/{id} for more)"""
+    return fast_json((await _list_page(db, target_id, "followers", None, limit))["items"])
 
 
 @router.get("/following-list/{target_id}")
 async def get_following_list(
     target_id: int,
+    limit: int = Query(200, ge=1, le=200),
     db: AsyncSession = Depends(get_db)
 ):
-    """Get list of users target_id is following"""
-    query = select(StudentSubscription).options(
-        selectinload(StudentSubscription.target)
-    ).where(StudentSubscription.follower_id == target_id)
-    
-    result = await db.execute(query)
-    subs = result.scalars().all()
-    
-    # Return list of students mapped to profile schema
-    return [_map_student_profile(s.target) for s in subs]
+    """Get list of users target_id is following (first page only; use /following/{id} for more)"""
+    return fast_json((await _list_page(db, target_id, "following", None, limit))["items"])
@@ -502,6 +502,73 @@ async def get_tutor_dashboard(
         }
     }
 
+@router.get("/kpi/leaderboard")
+async def get_tutor_kpi_leaderboard(
+    quarter: Optional[int] = None,
+    year: Optional[int] = None,
+    limit: int = 50,
+    db: AsyncSession = Depends(get_session),
+    tutor: Staff = Depends(get_current_staff)
+):
+    """
+    Universitet tyutorlari reytingi - faqat saqlangan TyutorKPI natijalaridan o'qiladi
+    (hisoblash services/kpi_calculator.calculate_university_kpi da).
+    """
+    now = datetime.now()
+    quarter = quarter or (now.month - 1) // 3 + 1
+    year = year or now.year
+    if quarter not in (1, 2, 3, 4):
+        raise HTTPException(status_code=400, detail="Chorak 1-4 oralig'ida bo'lishi kerak")
+    limit = max(1, min(limit, 200))
+
+    rows = (await db.execute(
+        select(
+            TyutorKPI.tyutor_id, Staff.full_name, Staff.image_url,
+            TyutorKPI.total_kpi, TyutorKPI.coverage_score, TyutorKPI.risk_detection_score,
+            TyutorKPI.activity_score, TyutorKPI.parent_contact_score, TyutorKPI.discipline_score,
+            TyutorKPI.updated_at,
+        )
+        .join(Staff, Staff.id == TyutorKPI.tyutor_id)
+        .where(
+            TyutorKPI.quarter == quarter,
+            TyutorKPI.year == year,
+            Staff.university_id == tutor.university_id
+        )
+        .order_by(TyutorKPI.total_kpi.desc(), Staff.full_name)
+    )).all()
+
+    items = []
+    me = None
+    for rank, r in enumerate(rows, start=1):
+        item = {
+            "rank": rank,
+            "tutor_id": r.tyutor_id,
+            "full_name": r.full_name,
+            "image_url": r.image_url,
+            "total_kpi": r.total_kpi or 0,
+            "coverage_score": r.coverage_score or 0,
+            "risk_detection_score": r.risk_detection_score or 0,
+            "activity_score": r.activity_score or 0,
+            "parent_contact_score": r.parent_contact_score or 0,
+            "discipline_score": r.discipline_score or 0,
+        }
+        if r.tyutor_id == tutor.id:
+            me = item
+        if rank <= limit:
+            items.append(item)
+
+    return {
+        "success": True,
+        "data": {
+            "quarter": quarter,
+            "year": year,
+            "total": len(rows),
+            "items": items,
+            "me": me,
+            "updated_at": max((r.updated_at for r in rows if r.updated_at), default=None)
+        }
+    }
+
 @router.get("/students")
 async def get_tutor_students(
     group: Optional[str] = None,
@@ -23,6 +23,7 @@ OPENAI_API_KEY_OWNER = os.environ.get("OPENAI_API_KEY_OWNER")
 OPENAI_MODEL_TASKS = "gpt-4o-mini"    # Konspekt va senariylar uchun (User: 4.1 mini)
 OPENAI_MODEL_CHAT = "gpt-4o-mini"     # Shunchaki suhbat uchun (User: Nano O'zbekchada yaxshi emas -> Mini ga qaytarildi)
 OPENAI_MODEL_OWNER = "gpt-4o"        # Owner va Admin uchun maxsus model
+OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL") # Lokal test uchun (scripts/fake_openai_server.py)
 
 # 🐘 --- PostgreSQL Sozlamalari --- 🐘
 DB_HOST = os.environ.get("DB_HOST", "localhost")
@@ -41,6 +42,32 @@ DATABASE_URL = (
     f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 )
 
+# Read-replica (ixtiyoriy): berilmasa o'qish so'rovlari ham asosiy bazaga boradi
+DB_REPLICA_HOST = os.environ.get("DB_REPLICA_HOST")
+DB_REPLICA_PORT = os.environ.get("DB_REPLICA_PORT", DB_PORT)
+DATABASE_REPLICA_URL = (
+    f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_REPLICA_HOST}:{DB_REPLICA_PORT}/{DB_NAME}"
+    if DB_REPLICA_HOST else None
+)
+# Replika shu sekunddan ko'p orqada qolsa o'qishlar asosiy bazaga qaytadi
+DB_REPLICA_MAX_LAG = float(os.environ.get("DB_REPLICA_MAX_LAG", 5))
+
+# Har bir worker (uvicorn/celery jarayoni) uchun pool o'lchamlari.
+# 4 uvicorn worker: 4 x (interactive 20+10, replica 20+10, batch 3+2) = 260 ulanishgacha
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 20))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+DB_BATCH_POOL_SIZE = int(os.environ.get("DB_BATCH_POOL_SIZE", 3))
+DB_BATCH_MAX_OVERFLOW = int(os.environ.get("DB_BATCH_MAX_OVERFLOW", 2))
+# PgBouncer (transaction pooling) orqali ulanilsa: prepared statement keshi o'chiriladi
+DB_PGBOUNCER = os.environ.get("DB_PGBOUNCER", "false").lower() == "true"
+
+# SQL monitoring: shu millisekunddan sekin so'rovlar "sql.slow" logiga yoziladi
+DB_SLOW_QUERY_MS = float(os.environ.get("DB_SLOW_QUERY_MS", 200))
+# Bitta request ichida bir xil so'rov shakli shuncha marta takrorlansa N+1 deb belgilanadi
+DB_N_PLUS_ONE_THRESHOLD = int(os.environ.get("DB_N_PLUS_ONE_THRESHOLD", 10))
+# /metrics (Prometheus): berilsa "Authorization: Bearer <token>" talab qilinadi, aks holda faqat localhost
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
 # 🌐 --- Webhook Sozlamalari --- 🌐
 DOMAIN = os.environ.get("DOMAIN", "tengdoshbozor.uz")
 WEBHOOK_BASE_PATH = "/webhook/bot"
@@ -84,3 +111,16 @@ UZUM_CHECKOUT_URL = "https://www.uzumbank.uz/open-service"
 
 
 
+
+# 🔏 --- Action Token (Shifr) Sozlamalari --- 🔏
+# HMAC kalit: alohida berilmasa JWT SECRET_KEY ishlatiladi
+ACTION_TOKEN_SECRET = os.environ.get("ACTION_TOKEN_SECRET") or os.environ.get("SECRET_KEY", "talabahamkor_insecure_dev_key_PLEASE_CHANGE_IN_PROD")
+ACTION_TOKEN_TTL_HOURS = int(os.environ.get("ACTION_TOKEN_TTL_HOURS", 72))
+# Eski (DB dagi) shifrlar shu sanagacha qabul qilinadi, keyin cleanup ularni o'chiradi
+LEGACY_ACTION_TOKENS_UNTIL = os.environ.get("LEGACY_ACTION_TOKENS_UNTIL", "2026-11-20")
+
+# 🗄 --- Log jadvallar: arxiv va saqlash muddati --- 🗄
+# Eski oylik bo'laklar shu papkaga .jsonl.gz qilib yoziladi, keyin o'chiriladi
+LOG_ARCHIVE_DIR = os.environ.get("LOG_ARCHIVE_DIR", "archive/logs")
+# Jadval bo'yicha muddatni almashtirish (oy): "activity_logs=24,private_messages=36"
+LOG_RETENTION_MONTHS = os.environ.get("LOG_RETENTION_MONTHS", "")
@@ -1,5 +1,13 @@
-from typing import AsyncGenerator
+import asyncio
+import inspect
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, Optional
+from uuid import uuid4
 
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import (
     AsyncSession,
     async_sessionmaker,
@@ -7,20 +15,62 @@ from sqlalchemy.ext.asyncio import (
 )
 from sqlalchemy.orm import declarative_base
 
-from config import DATABASE_URL, LOG_LEVEL
+from config import (
+    DATABASE_URL, DATABASE_REPLICA_URL, DB_REPLICA_MAX_LAG, LOG_LEVEL,
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_BATCH_POOL_SIZE, DB_BATCH_MAX_OVERFLOW, DB_PGBOUNCER,
+)
+from database.pool_metrics import TimedQueuePool
+from database.query_metrics import QueryMetrics
+
+logger = logging.getLogger(__name__)
 
 # Agar DEBUG bo‘lsa SQL so‘rovlar loglanadi
 echo_sql = LOG_LEVEL.upper() == "DEBUG"
 
-engine = create_async_engine(
-    DATABASE_URL,
-    echo=echo_sql,
-    future=True,
-    pool_size=200,
-    max_overflow=20,
-    pool_timeout=60,
-    pool_recycle=1800,
+
+def _make_engine(url: str, name: str, pool_size: int, max_overflow: int, pool_timeout: int,
+                 connect_timeout: Optional[float] = None):
+    """
+    Engine per workload; pools are lazy, so an unused engine opens no connections.
+    PgBouncer (transaction pooling): asyncpg prepared statement caches off, unique statement names.
+    """
+    connect_args = {"server_settings": {"application_name": f"talabahamkor-{name}"}}
+    if connect_timeout:
+        connect_args["timeout"] = connect_timeout  # asyncpg default: 60s
+    if DB_PGBOUNCER:
+        url = make_url(url).update_query_dict({"prepared_statement_cache_size": "0"})
+        connect_args.update(
+            statement_cache_size=0,
+            prepared_statement_name_func=lambda: f"__asyncpg_{uuid4()}__",
+        )
+    return create_async_engine(
+        url,
+        echo=echo_sql,
+        future=True,
+        poolclass=TimedQueuePool,
+        pool_logging_name=name,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        pool_recycle=1800,
+        pool_pre_ping=DB_PGBOUNCER,
+        connect_args=connect_args,
+    )
+
+
+# Interactive (API / bot requests) - primary
+engine = _make_engine(DATABASE_URL, "primary", DB_POOL_SIZE, DB_MAX_OVERFLOW, 30)
+# Batch (scheduler / Celery jobs, exports) - primary, small pool so jobs cannot starve requests
+batch_engine = _make_engine(DATABASE_URL, "batch", DB_BATCH_POOL_SIZE, DB_BATCH_MAX_OVERFLOW, 120)
+# Read-only endpoints (dashboards, archive, search, analytics) - replica if configured
+replica_engine = (
+    _make_engine(DATABASE_REPLICA_URL, "replica", DB_POOL_SIZE, DB_MAX_OVERFLOW, 30, connect_timeout=5)
+    if DATABASE_REPLICA_URL else None
 )
+# SQL timing, per-request attribution, slow-query log (database/query_metrics.py)
+for _engine in (engine, batch_engine, replica_engine):
+    if _engine is not None:
+        QueryMetrics.install(_engine)
 
 # Session factory
 AsyncSessionLocal = async_sessionmaker(
@@ -28,6 +78,11 @@ AsyncSessionLocal = async_sessionmaker(
     expire_on_commit=False,
     class_=AsyncSession,
 )
+BatchSessionLocal = async_sessionmaker(batch_engine, expire_on_commit=False, class_=AsyncSession)
+ReplicaSessionLocal = (
+    async_sessionmaker(replica_engine, expire_on_commit=False, class_=AsyncSession)
+    if replica_engine is not None else None
+)
 
 # Barcha modellarning asosiy bazasi
 Base = declarative_base()
@@ -52,6 +107,108 @@ def get_session_factory():
     return AsyncSessionLocal
 
 
+# ------------------------------------------------------------
+# Read replica routing
+# ------------------------------------------------------------
+
+class ReplicaRouter:
+    """
+    Picks the session factory for read-only work: the replica while its replay lag is
+    below DB_REPLICA_MAX_LAG, otherwise (or without a replica) the primary.
+    Lag is probed at most every CHECK_INTERVAL seconds per process, by one request at a
+    time and for at most PROBE_TIMEOUT seconds; other requests use the last known value
+    meanwhile, so a dead replica never makes reads wait.
+    """
+
+    CHECK_INTERVAL = 5
+    PROBE_TIMEOUT = 1.5
+    LAG_SQL = text(
+        "SELECT CASE WHEN NOT pg_is_in_recovery() THEN 0 "
+        "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+        "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+    )
+
+    _lag: Optional[float] = None
+    _checked_at = 0.0
+    _lock: Optional[asyncio.Lock] = None
+    _stats = {"replica_reads": 0, "primary_reads": 0, "lag_checks": 0, "lag_errors": 0}
+
+    @classmethod
+    async def _probe(cls) -> float:
+        async with ReplicaSessionLocal() as session:
+            return float(await session.scalar(cls.LAG_SQL) or 0)
+
+    @classmethod
+    async def lag(cls) -> Optional[float]:
+        """Replica lag in seconds; None if the replica is unreachable."""
+        if time.monotonic() - cls._checked_at < cls.CHECK_INTERVAL:
+            return cls._lag
+        if cls._lock is None:
+            cls._lock = asyncio.Lock()
+        if cls._lock.locked():
+            return cls._lag  # boshqa request tekshiryapti: oxirgi qiymat (None => primary)
+        async with cls._lock:
+            if time.monotonic() - cls._checked_at >= cls.CHECK_INTERVAL:
+                cls._stats["lag_checks"] += 1
+                try:
+                    cls._lag = await asyncio.wait_for(cls._probe(), cls.PROBE_TIMEOUT)
+                except Exception as e:
+                    cls._stats["lag_errors"] += 1
+                    cls._lag = None
+                    logger.warning(f"Replica lag check failed, reading from primary: {e!r}")
+                cls._checked_at = time.monotonic()
+        return cls._lag
+
+    @classmethod
+    async def read_sessionmaker(cls):
+        if ReplicaSessionLocal is not None:
+            lag = await cls.lag()
+            if lag is not None and lag <= DB_REPLICA_MAX_LAG:
+                cls._stats["replica_reads"] += 1
+                return ReplicaSessionLocal
+        cls._stats["primary_reads"] += 1
+        return AsyncSessionLocal
+
+    @classmethod
+    def stats(cls) -> dict:
+        return dict(cls._stats, lag=cls._lag, replica_configured=ReplicaSessionLocal is not None)
+
+
+@asynccontextmanager
+async def read_session():
+    """Session for read-only work (replica when healthy)."""
+    factory = await ReplicaRouter.read_sessionmaker()
+    async with factory() as session:
+        session.info["read_only"] = True
+        yield session
+
+
+async def get_read_session() -> AsyncGenerator[AsyncSession, None]:
+    """Dependency: read-only endpoints (dashboards, archive, search, analytics)."""
+    async with read_session() as session:
+        yield session
+
+
+# Dependencies that read_replica() swaps for get_read_session (api.dependencies adds its get_db)
+WRITE_DEPENDENCIES = {get_session}
+
+
+def read_replica(endpoint):
+    """
+    Route decorator, placed under @router.get(...): the endpoint's Depends(get_db)
+    parameters get a read session instead. Sub-dependencies (auth) stay on the primary.
+    """
+    from fastapi import params
+
+    signature = inspect.signature(endpoint)
+    endpoint.__signature__ = signature.replace(parameters=[
+        p.replace(default=params.Depends(get_read_session))
+        if isinstance(p.default, params.Depends) and p.default.dependency in WRITE_DEPENDENCIES else p
+        for p in signature.parameters.values()
+    ])
+    return endpoint
+
+
 async def create_tables():
     """
     Database jadvallarini yaratish.
@@ -7,8 +7,11 @@ from sqlalchemy import (
     Column,
     DateTime,
     ForeignKey,
+    Index,
     Integer,
     Float,
+    LargeBinary,
+    SmallInteger,
     String,
     Text,
     UniqueConstraint,
@@ -83,6 +86,11 @@ class StudentSubscription(Base):
     target: Mapped["Student"] = relationship("Student", foreign_keys=[target_id], back_populates="followers")
 
 
+# Keyset pages of followers / following (newest edge first)
+Index("ix_student_subscriptions_target_edge", StudentSubscription.target_id, StudentSubscription.id)
+Index("ix_student_subscriptions_follower_edge", StudentSubscription.follower_id, StudentSubscription.id)
+
+
 # ============================================================
 # PRIVATE CHAT SYSTEM
 # ============================================================
@@ -277,7 +285,10 @@ class StudentCache(Base):
         Integer, ForeignKey("students.id", ondelete="CASCADE"), nullable=False
     )
     key: Mapped[str] = mapped_column(String(64), nullable=False) # e.g. "subjects_11", "attendance_11"
-    data: Mapped[dict] = mapped_column(JSON, nullable=False)
+    data: Mapped[dict] = mapped_column(JSON, nullable=False) # raw JSON yoki (compact) summary
+    # Compact rows (services.student_cache_codec): normalized records + raw, compressed
+    schema_version: Mapped[int] = mapped_column(SmallInteger, nullable=True)
+    payload: Mapped[bytes] = mapped_column(LargeBinary, nullable=True)
     updated_at: Mapped[datetime] = mapped_column(DateTime(), default=datetime.utcnow, onupdate=datetime.utcnow)
 
     student: Mapped["Student"] = relationship("Student", backref="caches")
@@ -286,6 +297,36 @@ class StudentCache(Base):
         return f"<Faculty {self.faculty_code}>"
 
 
+# ============================================================
+# GPA REYTING (KOHORTA BO'YICHA)
+# ============================================================
+
+class StudentGpaRank(Base):
+    """Fakultet/kurs kesimida oldindan hisoblangan GPA reytingi"""
+    __tablename__ = "student_gpa_ranks"
+    __table_args__ = (
+        UniqueConstraint("student_id", "scope", name="uq_student_gpa_rank_scope"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    student_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("students.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    scope: Mapped[str] = mapped_column(String(128), nullable=False, index=True) # e.g. "faculty:12:1-kurs"
+
+    gpa: Mapped[float] = mapped_column(Float, default=0.0)
+    total_credits: Mapped[float] = mapped_column(Float, default=0.0)
+    semester_gpa: Mapped[dict | None] = mapped_column(JSON, nullable=True) # {"11": 4.5, "12": 4.2}
+
+    rank: Mapped[int] = mapped_column(Integer, nullable=False)
+    cohort_size: Mapped[int] = mapped_column(Integer, nullable=False)
+    retake_policy: Mapped[str] = mapped_column(String(16), default="latest")
+
+    computed_at: Mapped[datetime] = mapped_column(DateTime(), default=datetime.utcnow)
+
+    student: Mapped["Student"] = relationship("Student")
+
+
 # ============================================================
 # XODIM MODELI
 # ============================================================
@@ -440,6 +481,7 @@ class Student(Base):
     # --- AI Context ---
     ai_context: Mapped[str | None] = mapped_column(Text, nullable=True) # Summarized info for AI
     last_context_update: Mapped[datetime | None] = mapped_column(DateTime(), nullable=True)
+    ai_context_hash: Mapped[str | None] = mapped_column(String(32), nullable=True) # Fingerprint of context inputs
     
     # --- Premium Features ---
     is_premium: Mapped[bool] = mapped_column(Boolean, default=False)
@@ -452,6 +494,14 @@ class Student(Base):
     ai_limit: Mapped[int] = mapped_column(Integer, default=25)
     ai_last_reset: Mapped[datetime | None] = mapped_column(DateTime(), nullable=True)
     custom_badge: Mapped[str | None] = mapped_column(String(32), nullable=True)
+    # Premium lifecycle idempotency: last notified stage (1=expired, 3=features closed, 7=removed)
+    # and the premium_expiry it was sent for (renewal => new expiry => markers reset)
+    premium_notice_stage: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    premium_notice_expiry: Mapped[datetime | None] = mapped_column(DateTime(), nullable=True)
+
+    # --- Follow Counters (maintained by SocialGraphService) ---
+    followers_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    following_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
 
     # --- Activity Metrics ---
     last_active_at: Mapped[datetime | None] = mapped_column(DateTime(), nullable=True, index=True)
@@ -1254,6 +1304,8 @@ class ChoyxonaComment(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime(), default=datetime.utcnow, index=True)
     
     likes_count: Mapped[int] = mapped_column(Integer, default=0)
+    replies_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0") # Direct replies
+    liked_by_author: Mapped[bool] = mapped_column(Boolean, default=False, server_default="false") # Post muallifi "yurakcha" bosganmi
 
     # Relationships
     post: Mapped["ChoyxonaPost"] = relationship("ChoyxonaPost", back_populates="comments")
@@ -1268,6 +1320,18 @@ class ChoyxonaComment(Base):
         return f"<Comment {self.id} on Post {self.post_id}>"
 
 
+# Ranked top-level thread: ORDER BY likes_count DESC, created_at, id (keyset pagination)
+Index(
+    "ix_choyxona_comments_post_rank",
+    ChoyxonaComment.post_id, ChoyxonaComment.likes_count.desc(), ChoyxonaComment.created_at, ChoyxonaComment.id,
+)
+# Reply pages per parent
+Index(
+    "ix_choyxona_comments_parent_created",
+    ChoyxonaComment.reply_to_comment_id, ChoyxonaComment.created_at, ChoyxonaComment.id,
+)
+
+
 class ChoyxonaCommentLike(Base):
     __tablename__ = "choyxona_comment_likes"
     __table_args__ = (UniqueConstraint('comment_id', 'student_id', name='_user_comment_like_uc'),)
@@ -1698,30 +1762,6 @@ class SecurityToken(Base):
     staff: Mapped["Staff"] = relationship("Staff")
 
 
-# ============================================================
-# PENDING UPLOAD (TELEGRAM BOT SYNC)
-# ============================================================
-
-    session_id: Mapped[str] = mapped_column(String(64), primary_key=True) # UUID
-    
-    student_id: Mapped[int] = mapped_column(
-        Integer, ForeignKey("students.id", ondelete="CASCADE"), nullable=False, index=True
-    )
-    
-    category: Mapped[str | None] = mapped_column(String(64), nullable=True) # certificate, document, etc.
-    title: Mapped[str | None] = mapped_column(String(255), nullable=True)
-    
-    file_ids: Mapped[str | None] = mapped_column(Text, nullable=True) # Comma separated
-    file_unique_id: Mapped[str | None] = mapped_column(String(128), nullable=True)
-    mime_type: Mapped[str | None] = mapped_column(String(128), nullable=True)
-    file_size: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
-
-    status: Mapped[str] = mapped_column(String(32), default="pending")
-    created_at: Mapped[datetime] = mapped_column(DateTime(), default=datetime.utcnow)
-
-    student: Mapped["Student"] = relationship("Student")
-
-
 # ============================================================
 # CLICK TRANSACTIONS
 # ============================================================
@@ -1789,3 +1829,24 @@ class RatingRecord(Base):
 
     user: Mapped["Student"] = relationship("Student")
     rated_person: Mapped["Staff"] = relationship("Staff")
+
+
+# ============================================================
+# DASHBOARD XULOSASI (per-student, event-maintained)
+# ============================================================
+
+class StudentDashboardSummary(Base):
+    """
+    Dashboard counters of one student; recomputed by services.dashboard_summary
+    after commits touching activities / club memberships / rating votes.
+    """
+    __tablename__ = "student_dashboard_summary"
+
+    student_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("students.id", ondelete="CASCADE"), primary_key=True
+    )
+    activities_count: Mapped[int] = mapped_column(Integer, default=0)
+    activities_approved_count: Mapped[int] = mapped_column(Integer, default=0)
+    clubs_count: Mapped[int] = mapped_column(Integer, default=0)
+    voted_activation_ids: Mapped[list | None] = mapped_column(JSON, default=[], nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(), default=datetime.utcnow, onupdate=datetime.utcnow)
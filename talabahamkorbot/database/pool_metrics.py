@@ -0,0 +1,70 @@
+import time
+from typing import Dict
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+# Checkout wait histogram buckets (seconds), cumulative like Prometheus
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+class PoolMetrics:
+    """Per-pool connection checkout wait times (all engines of this process)."""
+
+    _pools: Dict[str, dict] = {}
+    _live: Dict[str, "TimedQueuePool"] = {}
+
+    @classmethod
+    def _entry(cls, name: str) -> dict:
+        entry = cls._pools.get(name)
+        if entry is None:
+            entry = cls._pools[name] = {
+                "checkouts": 0, "timeouts": 0, "wait_sum": 0.0, "wait_max": 0.0,
+                "buckets": [0] * len(WAIT_BUCKETS),
+            }
+        return entry
+
+    @classmethod
+    def observe(cls, name: str, wait: float, timed_out: bool = False):
+        entry = cls._entry(name)
+        if timed_out:
+            entry["timeouts"] += 1
+            return
+        entry["checkouts"] += 1
+        entry["wait_sum"] += wait
+        entry["wait_max"] = max(entry["wait_max"], wait)
+        for i, bound in enumerate(WAIT_BUCKETS):
+            if wait <= bound:
+                entry["buckets"][i] += 1
+
+    @classmethod
+    def snapshot(cls) -> Dict[str, dict]:
+        result = {}
+        for name, entry in cls._pools.items():
+            s = dict(entry, buckets=dict(zip(WAIT_BUCKETS, entry["buckets"])))
+            s["wait_avg_ms"] = round(entry["wait_sum"] / entry["checkouts"] * 1000, 3) if entry["checkouts"] else 0.0
+            pool = cls._live.get(name)
+            if pool is not None:
+                s.update(size=pool.size(), checked_out=pool.checkedout(), overflow=pool.overflow())
+            result[name] = s
+        return result
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool that records how long each checkout waited (pool_logging_name = metric name)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        name = self.logging_name or "default"
+        PoolMetrics._entry(name)
+        PoolMetrics._live[name] = self
+
+    def connect(self):
+        t0 = time.perf_counter()
+        try:
+            conn = super().connect()
+        except exc.TimeoutError:
+            PoolMetrics.observe(self.logging_name or "default", time.perf_counter() - t0, timed_out=True)
+            raise
+        PoolMetrics.observe(self.logging_name or "default", time.perf_counter() - t0)
+        return conn
@@ -0,0 +1,333 @@
+import hashlib
+import logging
+import re
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+
+from config import DB_N_PLUS_ONE_THRESHOLD, DB_SLOW_QUERY_MS
+
+logger = logging.getLogger(__name__)
+slow_logger = logging.getLogger("sql.slow")
+
+# Histogram buckets, cumulative like Prometheus
+DURATION_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+# ------------------------------------------------------------
+# SQL fingerprints
+# ------------------------------------------------------------
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_PARAM_RE = re.compile(r"\$\d+|%\(\w+\)s|(?<![:\w]):\w+|\?")
+_NUMBER_RE = re.compile(r"(?<![\w$])\d+(?:\.\d+)?\b")
+_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_ROWS_RE = re.compile(r"\(\?\)(?:\s*,\s*\(\?\))+")
+_SPACE_RE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(sql: str) -> str:
+    """
+    Statement shape: literals and bind parameters -> ?, IN lists and multi-row VALUES
+    collapsed, whitespace normalised. Same shape = same fingerprint, whatever the values.
+    """
+    fp = _STRING_RE.sub("?", sql)
+    fp = _PARAM_RE.sub("?", fp)
+    fp = _NUMBER_RE.sub("?", fp)
+    fp = _LIST_RE.sub("(?)", fp)
+    fp = _ROWS_RE.sub("(?), ...", fp)
+    return _SPACE_RE.sub(" ", fp).strip()
+
+
+def fingerprint_id(fp: str) -> str:
+    return hashlib.md5(fp.encode()).hexdigest()[:12]
+
+
+# ------------------------------------------------------------
+# Per-request accounting (contextvars)
+# ------------------------------------------------------------
+
+@dataclass
+class RequestQueryStats:
+    route: str
+    queries: int = 0
+    db_time: float = 0.0
+    shapes: Dict[str, int] = field(default_factory=dict)
+    slowest: List[Tuple[float, str]] = field(default_factory=list)
+
+    def add(self, fp: str, duration: float):
+        self.queries += 1
+        self.db_time += duration
+        self.shapes[fp] = self.shapes.get(fp, 0) + 1
+        if len(self.slowest) < QueryMetrics.KEEP_SLOWEST or duration > self.slowest[-1][0]:
+            self.slowest.append((duration, fp))
+            self.slowest.sort(key=lambda s: -s[0])
+            del self.slowest[QueryMetrics.KEEP_SLOWEST:]
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Statement shapes executed at least `threshold` times (N+1 candidates)."""
+        return sorted(((fp, n) for fp, n in self.shapes.items() if n >= threshold), key=lambda s: -s[1])
+
+
+_current: ContextVar[Optional[RequestQueryStats]] = ContextVar("request_query_stats", default=None)
+
+
+def current_stats() -> Optional[RequestQueryStats]:
+    return _current.get()
+
+
+class QueryMetrics:
+    """
+    SQL instrumentation for this worker:
+      - every statement on an instrumented engine is timed and attributed to the current
+        request (contextvar, also set inside the session's greenlet and copied into tasks)
+      - statements slower than SLOW_QUERY_MS go to the "sql.slow" log with their fingerprint
+      - a request repeating one statement shape N_PLUS_ONE_THRESHOLD+ times is flagged as N+1
+      - per-route histograms (duration, queries, DB time) for /metrics
+    """
+
+    SLOW_QUERY_MS = DB_SLOW_QUERY_MS
+    N_PLUS_ONE_THRESHOLD = DB_N_PLUS_ONE_THRESHOLD
+    KEEP_SLOWEST = 3
+    MAX_FINGERPRINTS = 500  # slow / N+1 tables: bounded, least seen dropped
+    SQL_PREVIEW = 300
+
+    _totals = {"queries": 0, "db_time": 0.0, "unattributed_queries": 0}
+    _routes: Dict[Tuple[str, str], dict] = {}
+    _slow: Dict[str, dict] = {}
+    _n_plus_one: Dict[Tuple[str, str], dict] = {}
+
+    # ------------------------------------------------------------
+    # Engine hooks
+    # ------------------------------------------------------------
+
+    @classmethod
+    def install(cls, async_engine):
+        target = getattr(async_engine, "sync_engine", async_engine)
+        if event.contains(target, "before_cursor_execute", cls._before):
+            return
+        event.listen(target, "before_cursor_execute", cls._before)
+        event.listen(target, "after_cursor_execute", cls._after)
+
+    @staticmethod
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._query_started = time.perf_counter()
+
+    @classmethod
+    def _after(cls, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_query_started", None)
+        if started is None:
+            return
+        duration = time.perf_counter() - started
+        fp = fingerprint(statement)
+        cls._totals["queries"] += 1
+        cls._totals["db_time"] += duration
+        stats = _current.get()
+        if stats is not None:
+            stats.add(fp, duration)
+        else:
+            cls._totals["unattributed_queries"] += 1
+        if duration * 1000 >= cls.SLOW_QUERY_MS:
+            cls._record_slow(fp, duration, stats.route if stats else None)
+
+    @classmethod
+    def _bounded(cls, table: dict, key):
+        if key not in table and len(table) >= cls.MAX_FINGERPRINTS:
+            del table[min(table, key=lambda k: table[k]["count"])]
+
+    @classmethod
+    def _record_slow(cls, fp: str, duration: float, route: Optional[str]):
+        fid = fingerprint_id(fp)
+        cls._bounded(cls._slow, fid)
+        entry = cls._slow.setdefault(fid, {"count": 0, "time_sum": 0.0, "time_max": 0.0,
+                                           "sql": fp[:cls.SQL_PREVIEW]})
+        entry["count"] += 1
+        entry["time_sum"] += duration
+        entry["time_max"] = max(entry["time_max"], duration)
+        slow_logger.warning(f"🐢 {duration * 1000:.1f}ms [{fid}] route={route or '-'} | {fp[:cls.SQL_PREVIEW]}")
+
+    # ------------------------------------------------------------
+    # Request scope
+    # ------------------------------------------------------------
+
+    @staticmethod
+    def start(route: str = "-"):
+        """Starts attributing queries of the current context; returns a token for finish()."""
+        return _current.set(RequestQueryStats(route))
+
+    @classmethod
+    def finish(cls, token, method: str, route: str, status: int, duration: float) -> RequestQueryStats:
+        stats = _current.get()
+        _current.reset(token)
+        stats.route = route
+        cls._observe(method, route, status, duration, stats)
+        for fp, n in stats.repeated(cls.N_PLUS_ONE_THRESHOLD):
+            fid = fingerprint_id(fp)
+            key = (route, fid)
+            cls._bounded(cls._n_plus_one, key)
+            entry = cls._n_plus_one.setdefault(key, {"count": 0, "max_repeats": 0, "sql": fp[:cls.SQL_PREVIEW]})
+            entry["count"] += 1
+            entry["max_repeats"] = max(entry["max_repeats"], n)
+            logger.warning(f"🔁 N+1: {method} {route} ran [{fid}] {n}x | {fp[:cls.SQL_PREVIEW]}")
+        return stats
+
+    @classmethod
+    def _observe(cls, method: str, route: str, status: int, duration: float, stats: RequestQueryStats):
+        entry = cls._routes.get((method, route))
+        if entry is None:
+            entry = cls._routes[(method, route)] = {
+                "requests": 0, "errors": 0,
+                "duration": _histogram(DURATION_BUCKETS),
+                "queries": _histogram(QUERY_COUNT_BUCKETS),
+                "db_time": _histogram(DURATION_BUCKETS),
+            }
+        entry["requests"] += 1
+        if status >= 500:
+            entry["errors"] += 1
+        _observe(entry["duration"], DURATION_BUCKETS, duration)
+        _observe(entry["queries"], QUERY_COUNT_BUCKETS, stats.queries)
+        _observe(entry["db_time"], DURATION_BUCKETS, stats.db_time)
+
+    # ------------------------------------------------------------
+    # Reports
+    # ------------------------------------------------------------
+
+    @classmethod
+    def stats(cls) -> dict:
+        top_routes = sorted(cls._routes.items(), key=lambda r: -r[1]["queries"]["sum"])[:20]
+        return {
+            "totals": dict(cls._totals),
+            "routes": {
+                f"{method} {route}": {
+                    "requests": e["requests"],
+                    "queries_avg": round(e["queries"]["sum"] / e["requests"], 2),
+                    "db_time_avg_ms": round(e["db_time"]["sum"] / e["requests"] * 1000, 2),
+                    "duration_avg_ms": round(e["duration"]["sum"] / e["requests"] * 1000, 2),
+                }
+                for (method, route), e in top_routes
+            },
+            "slow_queries": dict(sorted(cls._slow.items(), key=lambda s: -s[1]["time_sum"])[:20]),
+            "n_plus_one": [
+                dict(e, route=route, fingerprint=fid)
+                for (route, fid), e in sorted(cls._n_plus_one.items(), key=lambda s: -s[1]["count"])[:20]
+            ],
+        }
+
+    @classmethod
+    def render_prometheus(cls, gauges: Dict[str, dict] = None) -> str:
+        """
+        Prometheus text format. Counters are per worker process; scrape each worker
+        (or aggregate by instance) - there is no shared registry between uvicorn workers.
+        """
+        out: List[str] = []
+        histograms = (
+            ("http_request_duration_seconds", "duration", "Request duration", DURATION_BUCKETS),
+            ("http_request_db_queries", "queries", "SQL statements per request", QUERY_COUNT_BUCKETS),
+            ("http_request_db_seconds", "db_time", "SQL time per request", DURATION_BUCKETS),
+        )
+        for metric, key, help_text, buckets in histograms:
+            out += [f"# HELP {metric} {help_text}", f"# TYPE {metric} histogram"]
+            for (method, route), entry in cls._routes.items():
+                labels = f'method="{method}",route="{_escape(route)}"'
+                h = entry[key]
+                for bound, n in zip(buckets, h["buckets"]):
+                    out.append(f'{metric}_bucket{{{labels},le="{bound}"}} {n}')
+                out.append(f'{metric}_bucket{{{labels},le="+Inf"}} {h["count"]}')
+                out.append(f"{metric}_sum{{{labels}}} {h['sum']}")
+                out.append(f"{metric}_count{{{labels}}} {h['count']}")
+
+        out += ["# HELP http_request_errors_total Responses with status >= 500",
+                "# TYPE http_request_errors_total counter"]
+        for (method, route), entry in cls._routes.items():
+            out.append(f'http_request_errors_total{{method="{method}",route="{_escape(route)}"}} {entry["errors"]}')
+
+        out += ["# HELP db_queries_total SQL statements executed", "# TYPE db_queries_total counter",
+                f"db_queries_total {cls._totals['queries']}",
+                "# HELP db_query_seconds_total Time spent in SQL statements", "# TYPE db_query_seconds_total counter",
+                f"db_query_seconds_total {cls._totals['db_time']}"]
+
+        out += ["# HELP db_slow_queries_total Statements slower than DB_SLOW_QUERY_MS",
+                "# TYPE db_slow_queries_total counter"]
+        for fid, e in cls._slow.items():
+            out.append(f'db_slow_queries_total{{fingerprint="{fid}"}} {e["count"]}')
+
+        out += ["# HELP db_n_plus_one_total Requests repeating one statement shape",
+                "# TYPE db_n_plus_one_total counter"]
+        for (route, fid), e in cls._n_plus_one.items():
+            out.append(f'db_n_plus_one_total{{route="{_escape(route)}",fingerprint="{fid}"}} {e["count"]}')
+
+        for section, values in (gauges or {}).items():
+            out += _gauges(section, values)
+        return "\n".join(out) + "\n"
+
+    @classmethod
+    def reset(cls):
+        cls._totals = {"queries": 0, "db_time": 0.0, "unattributed_queries": 0}
+        cls._routes.clear()
+        cls._slow.clear()
+        cls._n_plus_one.clear()
+
+
+def _histogram(buckets) -> dict:
+    return {"buckets": [0] * len(buckets), "sum": 0.0, "count": 0}
+
+
+def _observe(h: dict, buckets, value: float):
+    h["count"] += 1
+    h["sum"] += value
+    for i, bound in enumerate(buckets):
+        if value <= bound:
+            h["buckets"][i] += 1
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def _gauges(section: str, values: dict, labels: str = "") -> List[str]:
+    """Numeric fields of a stats() dict as gauges; one level of nested dicts becomes a `name` label."""
+    lines = []
+    for key, value in values.items():
+        if isinstance(value, dict):
+            if not labels:
+                lines += _gauges(section, value, f'name="{_escape(str(key))}"')
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            metric = re.sub(r"\W", "_", f"{section}_{key}")
+            lines.append(f"{metric}{{{labels}}} {value}" if labels else f"{metric} {value}")
+    return lines
+
+
+# ------------------------------------------------------------
+# HTTP middleware
+# ------------------------------------------------------------
+
+async def sql_metrics_middleware(request, call_next):
+    """
+    Attributes SQL to the request: X-DB-Queries / X-DB-Time-ms / Server-Timing headers,
+    request.state.db_stats for the audit log, per-route histograms and N+1 detection.
+    """
+    token = QueryMetrics.start()
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        route = getattr(request.scope.get("route"), "path", None) or "unmatched"
+        stats = QueryMetrics.finish(token, request.method, route, status, time.perf_counter() - started)
+        request.state.db_stats = stats
+    db_ms = stats.db_time * 1000
+    if db_ms >= QueryMetrics.SLOW_QUERY_MS:
+        slowest = ", ".join(f"[{fingerprint_id(fp)}] {d * 1000:.1f}ms" for d, fp in stats.slowest)
+        logger.info(f"⏱ {request.method} {stats.route}: {stats.queries} queries, {db_ms:.1f}ms in DB; slowest {slowest}")
+    response.headers["X-DB-Queries"] = str(stats.queries)
+    response.headers["X-DB-Time-ms"] = f"{db_ms:.1f}"
+    response.headers["Server-Timing"] = f'db;dur={db_ms:.1f};desc="{stats.queries} queries"'
+    return response
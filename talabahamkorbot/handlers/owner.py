@@ -31,6 +31,7 @@ from database.models import (
 )
 
 from models.states import OwnerStates
+from services.content_delivery import ContentDeliveryService
 
 from keyboards.inline_kb import (
     get_start_role_inline_kb,
@@ -1504,6 +1505,7 @@ async def cb_owner_banner_toggle(call: CallbackQuery, session: AsyncSession):
         # Deactivate
         banner.is_active = False
         await session.commit()
+        await ContentDeliveryService.invalidate()
         await call.answer("⏹ Banner nofaol qilindi.")
     else:
         # Activate (and deactivate others)
@@ -1511,6 +1513,7 @@ async def cb_owner_banner_toggle(call: CallbackQuery, session: AsyncSession):
         await session.execute(update(Banner).where(Banner.is_active == True).values(is_active=False))
         banner.is_active = True
         await session.commit()
+        await ContentDeliveryService.invalidate()
         await call.answer("✅ Banner faollashtirildi!")
         
     # Refresh view
@@ -1548,6 +1551,7 @@ async def cb_owner_banner_delete(call: CallbackQuery, session: AsyncSession):
         
     await session.delete(banner)
     await session.commit()
+    await ContentDeliveryService.invalidate()
     
     await call.answer("🗑 Banner o'chirildi!", show_alert=True)
     
@@ -1626,6 +1630,7 @@ async def owner_process_banner_link(message: Message, state: FSMContext, session
     )
     session.add(new_banner)
     await session.commit()
+    await ContentDeliveryService.invalidate()
     
     await message.answer(
         "✅ <b>Banner muvaffaqiyatli o'rnatildi!</b>\n\n"
@@ -53,9 +53,12 @@ async def audit_logger(request: Request, response: Response, execution_time: flo
         # Note: Auth middleware usually sets user in state, but depends on impl.
         # Ideally, we'd have a standard AuditMiddleware class, but simple logging here works for now.
         
+        db_stats = getattr(request.state, "db_stats", None)
+        db_info = f"{db_stats.queries}q/{db_stats.db_time * 1000:.1f}ms" if db_stats else "-"
+
         log_entry = (
             f"AUDIT | {datetime.now()} | {client_ip} | {request.method} {request.url.path} "
-            f"| Status: {response.status_code} | Time: {execution_time:.4f}s | UA: {user_agent}"
+            f"| Status: {response.status_code} | Time: {execution_time:.4f}s | DB: {db_info} | UA: {user_agent}"
         )
         
         # Write to separate audit log file
@@ -117,6 +120,30 @@ async def lifespan(app: FastAPI):
                 logger.info("✅ Webhook already correctly set.")
         except Exception as e:
             logger.warning(f"⚠️ Webhook check/setup failed: {e}")
+
+    # Banner impressions/clicks are buffered in memory and flushed periodically
+    from services.banner_analytics import BannerAnalyticsService, run_banner_analytics_flusher
+    banner_flusher = asyncio.create_task(run_banner_analytics_flusher())
+
+    # Activity events (likes, posts, logins...) are queued and written in batches
+    from services.activity_service import ActivityService, run_activity_flusher
+    activity_flusher = asyncio.create_task(run_activity_flusher())
+
+    # Login / app-start cache warming queue (shared via Redis)
+    from services.prefetch_scheduler import run_prefetch_worker
+    prefetch_worker = asyncio.create_task(run_prefetch_worker())
+
+    # Staff directory (HEMIS employees, indexed snapshot shared via Redis)
+    from services.employee_directory import run_employee_directory_refresher
+    employee_refresher = asyncio.create_task(run_employee_directory_refresher())
+
+    # Username availability index (Bloom filter in Redis) - built in background
+    from services.username_index import run_username_index_rebuild
+    asyncio.create_task(run_username_index_rebuild())
+
+    # Daily maintenance jobs (APScheduler below is not started)
+    from services.daily_jobs import DailyJobScheduler
+    DailyJobScheduler.start()
     
     yield
     
@@ -124,13 +151,25 @@ async def lifespan(app: FastAPI):
     logger.info("🛑 Shutting down...")
     await bot.session.close()
 
+    banner_flusher.cancel()
+    prefetch_worker.cancel()
+    employee_refresher.cancel()
+    activity_flusher.cancel()
+    DailyJobScheduler.stop()
+    await BannerAnalyticsService().flush()
+    await ActivityService.flush()
+
+    from utils.document_parser import DocumentExtractor
+    DocumentExtractor.shutdown()
+
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from database.models import Student
 from sqlalchemy import select
 
 scheduler = AsyncIOScheduler()
 
-app = FastAPI(lifespan=lifespan)
+from utils.serialization import FastJSONResponse
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 app.state.limiter = limiter # Register limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
@@ -156,6 +195,10 @@ async def honeypot_trap(request: Request):
     SecurityWatchdog.ban_ip(ip, f"Honeypot Triggered: {request.url.path}")
     return JSONResponse(status_code=403, content={"error": "Access Denied"})
 
+# SQL per request: X-DB-Queries / X-DB-Time-ms headers, N+1 and slow-query log (inside security_middleware)
+from database.query_metrics import sql_metrics_middleware
+app.middleware("http")(sql_metrics_middleware)
+
 @app.middleware("http")
 async def security_middleware(request: Request, call_next):
     start_time = time.time()
@@ -212,6 +255,8 @@ async def start_scheduler():
     # for h, m in attendance_times:
     #     scheduler.add_job(lambda: run_sync_all_students.delay(), 'cron', hour=h, minute=m)
 
+    # Grade check needs a stored/refreshed HEMIS token source (grade_checker.register_token_provider);
+    # HEMIS tokens are only injected per request, so the job stays off until one exists.
     # scheduler.add_job(lambda: run_check_new_grades.delay(), 'interval', minutes=30)
     
     # [NEW] Lesson Reminder System
@@ -227,6 +272,8 @@ async def start_scheduler():
     
     # [NEW] Premium Expiry & Grace Period Checker (Daily 00:10)
     # scheduler.add_job(run_premium_checker, 'cron', hour=0, minute=10)
+
+    # Token cleanup, log partitions, follow counters, tutor KPI, username index: services.daily_jobs (lifespan), not this scheduler
     
     # scheduler.start()
     logger.info("⏰ Background Task Scheduler DISABLED by User Request")
@@ -292,6 +339,9 @@ app.include_router(announcements_router, prefix="/api/v1")
 from api.diagnostics import router as security_router
 app.include_router(security_router, prefix="/api/v1")
 
+from api.metrics import router as metrics_router
+app.include_router(metrics_router) # Prometheus: /metrics
+
 from api.support import router as support_router
 app.include_router(support_router, prefix="/api")
 
@@ -0,0 +1,15 @@
+
+import asyncio
+from sqlalchemy import text
+from database.db_connect import engine
+
+async def add_ai_context_hash():
+    async with engine.begin() as conn:
+        try:
+            await conn.execute(text("ALTER TABLE students ADD COLUMN ai_context_hash VARCHAR(32);"))
+            print("Added ai_context_hash")
+        except Exception as e:
+            print(f"ai_context_hash error (maybe exists): {e}")
+
+if __name__ == "__main__":
+    asyncio.run(add_ai_context_hash())
@@ -0,0 +1,40 @@
+
+import asyncio
+from sqlalchemy import text
+from database.db_connect import engine
+
+async def add_comment_thread_columns():
+    statements = [
+        ("replies_count", "ALTER TABLE choyxona_comments ADD COLUMN IF NOT EXISTS replies_count INTEGER NOT NULL DEFAULT 0;"),
+        ("liked_by_author", "ALTER TABLE choyxona_comments ADD COLUMN IF NOT EXISTS liked_by_author BOOLEAN NOT NULL DEFAULT FALSE;"),
+        ("likes_count nulls", "UPDATE choyxona_comments SET likes_count = 0 WHERE likes_count IS NULL;"),
+        ("ix_choyxona_comments_post_rank",
+         "CREATE INDEX IF NOT EXISTS ix_choyxona_comments_post_rank "
+         "ON choyxona_comments (post_id, likes_count DESC, created_at, id);"),
+        ("ix_choyxona_comments_parent_created",
+         "CREATE INDEX IF NOT EXISTS ix_choyxona_comments_parent_created "
+         "ON choyxona_comments (reply_to_comment_id, created_at, id);"),
+        # Backfill denormalized counters/flags
+        ("replies_count backfill",
+         "UPDATE choyxona_comments c SET replies_count = r.cnt FROM ("
+         "  SELECT reply_to_comment_id AS id, COUNT(*) AS cnt FROM choyxona_comments"
+         "  WHERE reply_to_comment_id IS NOT NULL GROUP BY reply_to_comment_id"
+         ") r WHERE c.id = r.id;"),
+        ("liked_by_author backfill",
+         "UPDATE choyxona_comments c SET liked_by_author = TRUE "
+         "FROM choyxona_posts p, choyxona_comment_likes l "
+         "WHERE p.id = c.post_id AND l.comment_id = c.id AND ("
+         "  (p.staff_id IS NOT NULL AND l.staff_id = p.staff_id) OR "
+         "  (p.staff_id IS NULL AND p.student_id IS NOT NULL AND l.student_id = p.student_id)"
+         ");"),
+    ]
+    for name, sql in statements:
+        async with engine.begin() as conn:
+            try:
+                await conn.execute(text(sql))
+                print(f"Done: {name}")
+            except Exception as e:
+                print(f"{name} error: {e}")
+
+if __name__ == "__main__":
+    asyncio.run(add_comment_thread_columns())
@@ -0,0 +1,33 @@
+
+import asyncio
+import sys
+import os
+
+# Add parent dir to path to import services
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from database.db_connect import engine, AsyncSessionLocal
+from services.social_graph_service import SocialGraphService
+
+async def add_follow_counters():
+    statements = [
+        "ALTER TABLE students ADD COLUMN IF NOT EXISTS followers_count INTEGER NOT NULL DEFAULT 0;",
+        "ALTER TABLE students ADD COLUMN IF NOT EXISTS following_count INTEGER NOT NULL DEFAULT 0;",
+        "CREATE INDEX IF NOT EXISTS ix_student_subscriptions_target_edge ON student_subscriptions (target_id, id);",
+        "CREATE INDEX IF NOT EXISTS ix_student_subscriptions_follower_edge ON student_subscriptions (follower_id, id);",
+    ]
+    for sql in statements:
+        async with engine.begin() as conn:
+            try:
+                await conn.execute(text(sql))
+                print(f"Done: {sql}")
+            except Exception as e:
+                print(f"Error ({sql}): {e}")
+
+    # Backfill counters from existing subscriptions
+    async with AsyncSessionLocal() as db:
+        print(await SocialGraphService.reconcile_counters(db))
+
+if __name__ == "__main__":
+    asyncio.run(add_follow_counters())
@@ -0,0 +1,27 @@
+import asyncio
+import sys
+import os
+
+# Add parent dir to path to import services
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from database.db_connect import engine
+
+async def add_premium_notice_markers():
+    statements = [
+        "ALTER TABLE students ADD COLUMN IF NOT EXISTS premium_notice_stage INTEGER NOT NULL DEFAULT 0;",
+        "ALTER TABLE students ADD COLUMN IF NOT EXISTS premium_notice_expiry TIMESTAMP WITHOUT TIME ZONE;",
+        # Lifecycle cohorts only scan premium rows
+        "CREATE INDEX IF NOT EXISTS ix_students_premium_expiry ON students (premium_expiry) WHERE is_premium;",
+    ]
+    for sql in statements:
+        async with engine.begin() as conn:
+            try:
+                await conn.execute(text(sql))
+                print(f"Done: {sql}")
+            except Exception as e:
+                print(f"Error ({sql}): {e}")
+
+if __name__ == "__main__":
+    asyncio.run(add_premium_notice_markers())
@@ -0,0 +1,27 @@
+import asyncio
+import sys
+import os
+
+# Add parent dir to path to import services
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from database.db_connect import engine
+
+async def add_student_cache_payload():
+    statements = [
+        "ALTER TABLE student_cache ADD COLUMN IF NOT EXISTS schema_version SMALLINT;",
+        "ALTER TABLE student_cache ADD COLUMN IF NOT EXISTS payload BYTEA;",
+        # payload is already compressed - skip TOAST pglz
+        "ALTER TABLE student_cache ALTER COLUMN payload SET STORAGE EXTERNAL;",
+    ]
+    for sql in statements:
+        async with engine.begin() as conn:
+            try:
+                await conn.execute(text(sql))
+                print(f"Done: {sql}")
+            except Exception as e:
+                print(f"Error ({sql}): {e}")
+
+if __name__ == "__main__":
+    asyncio.run(add_student_cache_payload())
@@ -0,0 +1,81 @@
+import asyncio
+import random
+import sys
+import os
+import time
+from datetime import datetime
+
+# Add parent dir to path to import services
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from unittest.mock import patch
+
+from database.models import ActivityLog, Base, Student
+from services import activity_service
+from services.activity_service import ActivityService, ActivityType
+
+DB_URL = os.environ.get("BENCH_DB_URL", "sqlite+aiosqlite:///:memory:")
+STUDENTS = int(os.environ.get("BENCH_STUDENTS", 2000))
+EVENTS = int(os.environ.get("BENCH_EVENTS", 5000))
+KINDS = [ActivityType.LIKE, ActivityType.LIKE, ActivityType.LIKE, ActivityType.COMMENT, ActivityType.POST]
+
+
+async def setup():
+    engine = create_async_engine(DB_URL)
+    async with engine.begin() as conn:
+        # Full schema: db.get(Student) in the legacy path eager-loads its relationships
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    Session = async_sessionmaker(engine, expire_on_commit=False)
+    async with Session() as db:
+        await db.execute(insert(Student), [
+            {"id": i, "full_name": f"S{i}", "hemis_login": f"s{i}", "faculty_id": i % 8 + 1, "total_activity_count": 0}
+            for i in range(1, STUDENTS + 1)
+        ])
+        await db.commit()
+    return engine, Session
+
+
+async def legacy(Session, events):
+    """Previous log_activity: db.get(Student) + UPDATE students + INSERT, committed per request."""
+    for sid, kind in events:
+        async with Session() as db:
+            student = await db.get(Student, sid)
+            db.add(ActivityLog(activity_type=kind.value, student_id=sid, faculty_id=student.faculty_id,
+                               created_at=datetime.utcnow()))
+            await db.execute(update(Student).where(Student.id == sid).values(
+                last_active_at=datetime.utcnow(), total_activity_count=Student.total_activity_count + 1))
+            await db.commit()
+
+
+async def main():
+    rnd = random.Random(47)
+    events = [(rnd.randint(1, STUDENTS), rnd.choice(KINDS)) for _ in range(EVENTS)]
+    print(f"{EVENTS} events from {STUDENTS} students on {DB_URL.split(':')[0]}\n")
+
+    engine, Session = await setup()
+    t0 = time.perf_counter()
+    await legacy(Session, events)
+    a = time.perf_counter() - t0
+    print(f"{'inline (per request)':<32} {EVENTS / a:10.0f} events/s   {a / EVENTS * 1e6:8.1f} us on request path")
+    await engine.dispose()
+
+    engine, Session = await setup()
+    with patch.object(activity_service, "AsyncSessionLocal", Session):
+        t0 = time.perf_counter()
+        for sid, kind in events:
+            await ActivityService.log_activity(user_id=sid, role="student", activity_type=kind)
+        enqueue = time.perf_counter() - t0
+        await ActivityService.flush()
+        b = time.perf_counter() - t0
+    stats = ActivityService.stats()
+    print(f"{'queued + batched flush':<32} {EVENTS / b:10.0f} events/s   {enqueue / EVENTS * 1e6:8.1f} us on request path")
+    print(f"{'':<32} {stats['batches']} batches, last flush {stats['last_flush_ms']} ms, "
+          f"max lag {stats['max_lag_s']} s   x{a / b:.0f}")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,160 @@
+import asyncio
+import json
+import random
+import sys
+import os
+import time
+from datetime import datetime, timedelta
+
+# Add parent dir to path to import services
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import selectinload
+
+from database.db_connect import Base
+from database.models import ChoyxonaComment, ChoyxonaCommentLike, ChoyxonaPost, Staff, Student
+from services.comment_service import CommentService
+
+# BENCH_DB_URL=postgresql+asyncpg://... to run against Postgres (tables must exist, data is seeded)
+DB_URL = os.environ.get("BENCH_DB_URL", "sqlite+aiosqlite:///:memory:")
+COMMENTS = int(os.environ.get("BENCH_COMMENTS", 10_000))
+USERS = 500
+
+def create_tables(conn):
+    # Student/Staff eager-load other tables (clubs, ...), so create everything the dialect supports
+    for table in Base.metadata.sorted_tables:
+        try:
+            table.create(conn, checkfirst=True)
+        except Exception:
+            pass  # e.g. JSONB columns on SQLite
+
+async def seed(session: AsyncSession) -> int:
+    rnd = random.Random(7)
+    await session.execute(insert(Student), [
+        {"id": i, "full_name": f"Familiya{i} Ism{i}", "hemis_login": f"s{i}", "username": f"user{i}"}
+        for i in range(1, USERS + 1)
+    ])
+    await session.execute(insert(ChoyxonaPost), [{
+        "id": 1, "student_id": 1, "content": "Viral post", "category_type": "university", "comments_count": COMMENTS,
+    }])
+    base = datetime(2025, 1, 1)
+    top = int(COMMENTS * 0.8)
+    rows = []
+    for cid in range(1, COMMENTS + 1):
+        parent = rnd.randint(1, top) if cid > top else None
+        rows.append({
+            "id": cid, "post_id": 1, "student_id": rnd.randint(1, USERS),
+            "content": "Izoh matni " * rnd.randint(1, 12),
+            "reply_to_comment_id": parent,
+            "likes_count": int(rnd.paretovariate(1.5)) - 1,
+            "created_at": base + timedelta(seconds=cid * 7),
+        })
+    for r in rows:
+        if r["reply_to_comment_id"]:
+            rows[r["reply_to_comment_id"] - 1]["replies_count"] = rows[r["reply_to_comment_id"] - 1].get("replies_count", 0) + 1
+    for r in rows:
+        r.setdefault("replies_count", 0)
+    await session.execute(insert(ChoyxonaComment), rows)
+    likes = [{"comment_id": cid, "student_id": rnd.randint(1, USERS)} for cid in rnd.sample(range(1, COMMENTS + 1), COMMENTS // 5)]
+    await session.execute(insert(ChoyxonaCommentLike), likes)
+    await session.commit()
+    return top
+
+async def legacy(session: AsyncSession):
+    """Previous get_comments: full ORM graph + Python sort + two like lookups."""
+    post = await session.get(ChoyxonaPost, 1)
+    query = select(ChoyxonaComment).options(
+        selectinload(ChoyxonaComment.student),
+        selectinload(ChoyxonaComment.staff),
+        selectinload(ChoyxonaComment.parent_comment).selectinload(ChoyxonaComment.student),
+        selectinload(ChoyxonaComment.parent_comment).selectinload(ChoyxonaComment.staff),
+        selectinload(ChoyxonaComment.reply_to_user),
+        selectinload(ChoyxonaComment.reply_to_staff),
+        selectinload(ChoyxonaComment.post)
+    ).where(ChoyxonaComment.post_id == 1)
+    comments = (await session.execute(query)).scalars().all()
+    comments.sort(key=lambda x: (-(x.likes_count or 0), x.created_at))
+    ids = [c.id for c in comments]
+    await session.execute(select(ChoyxonaCommentLike.comment_id).where(ChoyxonaCommentLike.comment_id.in_(ids), ChoyxonaCommentLike.student_id == 2))
+    await session.execute(select(ChoyxonaCommentLike.comment_id).where(ChoyxonaCommentLike.comment_id.in_(ids), ChoyxonaCommentLike.student_id == post.student_id))
+    return [shape(c.id, c.content, c.student.full_name, c.likes_count, c.created_at,
+                  c.parent_comment.content if c.parent_comment else None)
+            for c in comments]
+
+def shape(cid, content, author, likes, created_at, reply_to):
+    """Same response fields for every variant so payload sizes are comparable."""
+    return {"id": cid, "content": content, "author": author, "likes": likes,
+            "created_at": created_at.isoformat(), "reply_to": reply_to[:50] if reply_to else None}
+
+async def lean(session, rows):
+    await CommentService.liked_ids(session, Student(id=2), [r.id for r in rows])
+    targets = await CommentService.reply_targets(session, rows)
+    return [shape(r.id, r.content, r.s_full_name, r.likes_count, r.created_at,
+                  (targets.get(r.id) or {}).get("content")) for r in rows]
+
+async def timed(factory, label, fn, repeat=5):
+    best = None
+    result = None
+    for _ in range(repeat):
+        async with factory() as session:
+            t0 = time.perf_counter()
+            result = await fn(session)
+            dt = time.perf_counter() - t0
+            best = dt if best is None else min(best, dt)
+    size = len(json.dumps(result, default=str).encode())
+    print(f"{label:<34} {best * 1000:9.1f} ms   payload {size / 1024:8.1f} KB")
+    return result
+
+async def main():
+    engine = create_async_engine(DB_URL)
+    async with engine.begin() as conn:
+        await conn.run_sync(create_tables)
+    factory = async_sessionmaker(engine, expire_on_commit=False)
+    async with factory() as session:
+        top = await seed(session)
+    print(f"Post with {COMMENTS} comments ({top} top-level) on {engine.dialect.name}\n")
+
+    async with factory() as session:
+        busiest = await session.scalar(
+            select(ChoyxonaComment.id).order_by(ChoyxonaComment.replies_count.desc()).limit(1)
+        )
+
+    async def first_page(session):
+        rows, _ = await CommentService.top_level_page(session, 1, None, 20)
+        return await lean(session, rows)
+
+    async def deep_page(session):
+        cursor = None
+        for _ in range(50):
+            rows, cursor = await CommentService.top_level_page(session, 1, cursor, 20)
+        return await lean(session, rows)
+
+    async def replies(session):
+        rows, _ = await CommentService.replies_page(session, busiest, None, 20)
+        return await lean(session, rows)
+
+    async def lean_all(session):
+        return await lean(session, await CommentService.all_comments(session, 1))
+
+    await timed(factory, "legacy: full ORM graph + sort", legacy)
+    await timed(factory, "lean projection: all comments", lean_all)
+    await timed(factory, "keyset: first page (20)", first_page)
+    await timed(factory, "keyset: 50 pages walked", deep_page, repeat=1)
+    await timed(factory, "replies page (20)", replies)
+
+    # Correctness: walking every page == ranked SQL list of top-level comments
+    async with factory() as session:
+        walked, cursor = [], None
+        while True:
+            rows, cursor = await CommentService.top_level_page(session, 1, cursor, 100)
+            walked.extend(r.id for r in rows)
+            if not cursor:
+                break
+        expected = [r.id for r in await CommentService.all_comments(session, 1) if r.reply_to_comment_id is None]
+    print(f"\nkeyset walk matches ranked list: {walked == expected} ({len(walked)} top-level comments)")
+    await engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,62 @@
+import asyncio
+import io
+import sys
+import os
+import time
+
+# Add parent dir to path to import utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.document_parser import DocumentExtractor, extract_text_from_stream
+
+PAGES = int(os.environ.get("BENCH_PAGES", 200))
+
+def make_pdf(pages: int) -> bytes:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+    buf = io.BytesIO()
+    c = canvas.Canvas(buf, pagesize=A4)
+    for p in range(pages):
+        for line in range(45):
+            c.drawString(40, 800 - line * 17, f"Sahifa {p + 1}, qator {line + 1}: konspekt uchun namuna matn.")
+        c.showPage()
+    c.save()
+    return buf.getvalue()
+
+async def ticker(stop: asyncio.Event, stalls: list):
+    """Measures the longest event loop stall while extraction runs."""
+    last = time.perf_counter()
+    while not stop.is_set():
+        await asyncio.sleep(0.01)
+        now = time.perf_counter()
+        stalls.append(now - last - 0.01)
+        last = now
+
+async def run_case(name, coro_factory):
+    stop = asyncio.Event()
+    stalls = []
+    tick = asyncio.create_task(ticker(stop, stalls))
+    await asyncio.sleep(0.02)
+    t0 = time.perf_counter()
+    text = await coro_factory()
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    await tick
+    print(f"{name:<28} {elapsed * 1000:9.1f} ms   max loop stall {max(stalls) * 1000:8.1f} ms   chars={len(text)}")
+
+async def main():
+    data = make_pdf(PAGES)
+    print(f"PDF: {PAGES} pages, {len(data) // 1024} KB\n")
+
+    async def inline():
+        return extract_text_from_stream(io.BytesIO(data), "pdf")
+
+    await run_case("inline (blocks loop)", inline)
+    await run_case("process pool (cold)", lambda: DocumentExtractor.extract(data, "pdf"))
+    await run_case("process pool (cached)", lambda: DocumentExtractor.extract(data, "pdf"))
+
+    print("\nPer-format stats:", DocumentExtractor.stats())
+    DocumentExtractor.shutdown()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,70 @@
+import random
+import sys
+import os
+import time
+
+# Add parent dir to path to import services
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.gpa_calculator import GPACalculator
+from services.gpa_engine import CohortGPAEngine
+
+STUDENTS = int(os.environ.get("BENCH_STUDENTS", 2000))
+SEMESTERS = 6
+SUBJECTS_PER_SEMESTER = 8
+
+def make_cohort(seed: int = 42):
+    rnd = random.Random(seed)
+    cohort = {}
+    for sid in range(1, STUDENTS + 1):
+        items = []
+        for sem in range(11, 11 + SEMESTERS):
+            for n in range(SUBJECTS_PER_SEMESTER):
+                subj_id = sem * 100 + n
+                items.append({
+                    "subject": {"id": str(subj_id), "name": f"Fan {subj_id}", "credit": rnd.choice([0, 2, 4, 6])},
+                    "overallScore": {"grade": rnd.choice([0, rnd.randint(40, 100)])},
+                    "semester": {"code": str(sem)},
+                })
+            # occasional retake of a previous-semester subject
+            if sem > 11 and rnd.random() < 0.2:
+                retake = dict(items[rnd.randrange(len(items) - SUBJECTS_PER_SEMESTER)])
+                retake["overallScore"] = {"grade": rnd.randint(56, 100)}
+                retake["semester"] = {"code": str(sem)}
+                items.append(retake)
+        cohort[sid] = items
+    return cohort
+
+def bench_loop(cohort):
+    start = time.perf_counter()
+    board = []
+    for sid, items in cohort.items():
+        res = GPACalculator.calculate_cumulative(items)
+        board.append((res.gpa, sid))
+    board.sort(key=lambda x: x[0], reverse=True)
+    return time.perf_counter() - start, {sid: g for g, sid in board}
+
+def bench_engine(cohort):
+    start = time.perf_counter()
+    frame = CohortGPAEngine.build_frame(cohort)
+    t_frame = time.perf_counter() - start
+    res = CohortGPAEngine.cumulative_gpa(frame)
+    CohortGPAEngine.semester_gpa(frame)
+    CohortGPAEngine.rank(res)
+    total = time.perf_counter() - start
+    return total, t_frame, {int(s): float(g) for s, g in zip(res.student_ids, res.gpa)}
+
+if __name__ == "__main__":
+    cohort = make_cohort()
+    rows = sum(len(v) for v in cohort.values())
+    print(f"Cohort: {STUDENTS} students, {rows} subject rows")
+
+    t_loop, loop_gpa = bench_loop(cohort)
+    print(f"Per-student loop (calculate_cumulative): {t_loop:.3f}s")
+
+    t_engine, t_frame, engine_gpa = bench_engine(cohort)
+    print(f"CohortGPAEngine (cumulative + semester + rank): {t_engine:.3f}s (normalize {t_frame:.3f}s)")
+    print(f"Speedup: {t_loop / t_engine:.1f}x")
+
+    mismatches = sum(1 for sid in loop_gpa if abs(loop_gpa[sid] - engine_gpa[sid]) > 0.005)
+    print(f"GPA mismatches: {mismatches}")
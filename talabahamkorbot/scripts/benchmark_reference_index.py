@@ -0,0 +1,96 @@
+import random
+import re
+import sys
+import os
+import time
+
+# Add parent dir to path to import services
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.hemis_service import HemisService
+from services.reference_index import GroupIndex
+
+GROUPS = int(os.environ.get("BENCH_GROUPS", 5000))
+QUERIES = int(os.environ.get("BENCH_QUERIES", 300))
+
+SPECIALTIES = ["Axborot texnologiyalari", "Iqtisodiyot", "Filologiya va tillarni o'qitish", "Psixologiya",
+               "Boshlang'ich ta'lim", "Jismoniy madaniyat", "Tarix", "Matematika", "Moliya va moliyaviy texnologiyalar"]
+FORMS = [("kunduzgi", "11"), ("kechki", "12"), ("sirtqi", "13")]
+
+
+def make_groups(rnd):
+    groups = []
+    for i in range(GROUPS):
+        form, code = rnd.choice(FORMS)
+        groups.append({
+            "id": 1000 + i,
+            "name": f"{rnd.randint(10, 99)}-{rnd.randint(20, 25)} {rnd.choice(SPECIALTIES)} ({form})",
+            "department": {"id": rnd.choice([4, 5, 6, 16, 35])},
+            "educationForm": {"code": code},
+        })
+    return groups
+
+
+def legacy_resolve(all_groups, group_name):
+    """The previous HemisService.resolve_group_id scan (without its per-name dict cache)."""
+    req_norm = HemisService._normalize_name(group_name)
+    for g in all_groups:
+        g_norm = HemisService._normalize_name(g.get("name", ""))
+        if req_norm == g_norm or req_norm in g_norm or g_norm in req_norm:
+            return g.get("id")
+    match = re.search(r'(\d{2}-\d{2})', group_name)
+    if match:
+        group_prefix = match.group(1)
+        candidates = [g for g in all_groups if group_prefix in g.get("name", "")]
+
+        def clean_name(n):
+            n = HemisService._normalize_name(n)
+            return n.replace(group_prefix.replace("-", ""), "").replace("kunduzgi", "").replace("kechki", "").replace("sirtqi", "")
+        req_clean = clean_name(group_name)
+        for g in candidates:
+            g_clean = clean_name(g.get("name", ""))
+            if req_clean in g_clean or g_clean in req_clean:
+                return g.get("id")
+    base_name = re.sub(r'\(.*?\)', '', group_name).strip()
+    if base_name != group_name:
+        base_norm = HemisService._normalize_name(base_name)
+        for g in all_groups:
+            if base_norm in HemisService._normalize_name(g.get("name", "")):
+                return g.get("id")
+    return None
+
+
+def timed(label, fn, rounds):
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    dt = (time.perf_counter() - t0) / rounds
+    print(f"{label:<44} {dt * 1e6:11.1f} us")
+    return dt
+
+
+def main():
+    rnd = random.Random(46)
+    groups = make_groups(rnd)
+    # Mix of exact names, names without the form suffix and names that match nothing
+    queries = []
+    for _ in range(QUERIES):
+        g = rnd.choice(groups)["name"]
+        queries.append(rnd.choice([g, g.upper(), re.sub(r'\s*\(.*?\)', '', g), "99-99 Mavjud emas (kunduzgi)"]))
+    print(f"{GROUPS} groups, {QUERIES} distinct resolve calls\n")
+
+    t0 = time.perf_counter()
+    index = GroupIndex(groups)
+    print(f"{'index build (once per refresh)':<44} {(time.perf_counter() - t0) * 1e3:11.1f} ms\n")
+
+    it = iter(queries)
+    a = timed("legacy linear scan per resolve", lambda: legacy_resolve(groups, next(it)), QUERIES)
+    it = iter(queries)
+    b = timed("index resolve (cold)", lambda: index.resolve(next(it)), QUERIES)
+    it = iter(queries)
+    c = timed("index resolve (memoized)", lambda: index.resolve(next(it)), QUERIES)
+    print(f"{'':<44} x{a / b:.0f} cold, x{a / c:.0f} memoized")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import json
+import random
+import sys
+import os
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import List
+
+# Add parent dir to path to import services
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from api.schemas import PostResponseSchema, StudentProfileSchema
+from services.post_feed_service import PostFeedService
+from utils import serialization
+from utils.serialization import dumps
+
+PAGE = int(os.environ.get("BENCH_PAGE", 100))
+ROUNDS = int(os.environ.get("BENCH_ROUNDS", 200))
+
+def stdlib_render(content) -> bytes:
+    """What JSONResponse did before: jsonable_encoder + json.dumps."""
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False,
+                      indent=None, separators=(",", ":")).encode("utf-8")
+
+def student(i, rnd):
+    base = datetime(2025, 9, 1)
+    return SimpleNamespace(
+        id=i, full_name=f"FAMILIYA{i} ISM{i} OTASI", phone="+998901234567", hemis_login=f"3952{i:08d}",
+        group_number="101-22", faculty_id=3, faculty_name="Jurnalistika fakulteti", specialty_name="Jurnalistika",
+        first_name=f"Ism{i}", short_name=f"Ism{i} F.", image_url=f"https://cdn.example.uz/avatars/{i}.jpg",
+        level_name="2-kurs", semester_name="3-semestr", education_form="Kunduzgi", education_type="Bakalavr",
+        payment_form="Kontrakt", student_status="O'qimoqda", email=None, province_name="Toshkent",
+        district_name="Chilonzor", accommodation_name=None, is_registered_bot=True, username=f"user{i}",
+        hemis_role="student", role="student", balance=rnd.randint(0, 50000), trial_used=False,
+        is_premium=rnd.random() < 0.2, premium_expiry=None, custom_badge=None,
+        created_at=base + timedelta(minutes=i),
+    )
+
+def post_row(i, rnd):
+    """Flat row as returned by PostFeedService.projection()."""
+    s = student(i, rnd)
+    return SimpleNamespace(
+        id=i, content="Post matni " * rnd.randint(5, 40), category_type="university",
+        student_id=s.id, staff_id=None, created_at=s.created_at,
+        target_university_id=1, target_faculty_id=3, target_specialty_name="Jurnalistika",
+        likes_count=rnd.randint(0, 500), comments_count=rnd.randint(0, 80),
+        reposts_count=rnd.randint(0, 20), views_count=rnd.randint(0, 5000),
+        s_id=s.id, s_full_name=s.full_name, s_short_name=s.short_name, s_username=s.username,
+        s_image_url=s.image_url, s_role="student", s_is_premium=s.is_premium, s_custom_badge=None,
+        f_id=None, f_full_name=None, f_short_name=None, f_username=None, f_image_url=None,
+        f_role=None, f_is_premium=None, f_custom_badge=None,
+    )
+
+def timed(label, fn):
+    fn()  # warm-up
+    t0 = time.perf_counter()
+    for _ in range(ROUNDS):
+        body = fn()
+    dt = (time.perf_counter() - t0) / ROUNDS
+    print(f"{label:<46} {dt * 1000:8.3f} ms/page   {len(body) / 1024:7.1f} KB")
+    return dt
+
+def main():
+    rnd = random.Random(11)
+    students = [student(i, rnd) for i in range(1, PAGE + 1)]
+    rows = [post_row(i, rnd) for i in range(1, PAGE + 1)]
+    profile_dicts = [{k: v for k, v in vars(s).items()} for s in students]
+    posts_adapter = TypeAdapter(List[PostResponseSchema])
+    print(f"{PAGE}-item pages, {ROUNDS} rounds (orjson: {serialization.orjson is not None})\n")
+
+    # /student/search
+    legacy = timed("search: model_validate+dump, stdlib", lambda: stdlib_render(
+        [StudentProfileSchema.model_validate(s).model_dump() for s in students]))
+    lean = timed("search: row dicts, orjson", lambda: dumps(profile_dicts))
+    print(f"{'':<46} x{legacy / lean:.1f}\n")
+
+    # /community/posts
+    def posts_legacy():
+        objs = [PostResponseSchema(**PostFeedService.map_row(r, 1, False, False, False)) for r in rows]
+        validated = posts_adapter.validate_python(objs, from_attributes=True)  # response_model pass
+        return stdlib_render(posts_adapter.dump_python(validated))
+    legacy = timed("posts: schema objects + response_model, stdlib", posts_legacy)
+    lean = timed("posts: map_row dicts, fast_json", lambda: dumps(
+        [PostFeedService.map_row(r, 1, False, False, False) for r in rows]))
+    print(f"{'':<46} x{legacy / lean:.1f}\n")
+
+    # /subscription/followers
+    items = {"items": profile_dicts, "next_cursor": 123}
+    legacy = timed("followers: dicts, jsonable_encoder+stdlib", lambda: stdlib_render(items))
+    lean = timed("followers: dicts, fast_json", lambda: dumps(items))
+    print(f"{'':<46} x{legacy / lean:.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import json
+import random
+import sys
+import os
+import time
+
+# Add parent dir to path to import services
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import student_cache_codec as codec
+from services.hemis_service import HemisService
+
+SUBJECTS = int(os.environ.get("BENCH_SUBJECTS", 12))
+LESSONS = int(os.environ.get("BENCH_LESSONS", 400))
+ABSENCES = int(os.environ.get("BENCH_ABSENCES", 60))
+ROUNDS = int(os.environ.get("BENCH_ROUNDS", 500))
+
+TRAINING = [{"code": "11", "name": "Ma'ruza"}, {"code": "12", "name": "Amaliy"}, {"code": "13", "name": "Seminar"}]
+
+def ref(rnd, i, name):
+    return {"id": i, "name": name, "code": str(i)}
+
+def subject_item(i, rnd):
+    """Roughly the size of a real /education/subject-list item."""
+    sub = ref(rnd, 1000 + i, f"Fan nomi {i} (chuqurlashtirilgan kurs)")
+    return {
+        "id": 50000 + i, "subject": sub,
+        "curriculumSubject": {
+            "id": 7000 + i, "subject": sub, "credit": rnd.choice([3, 4, 5, 6]),
+            "total_acload": rnd.choice([90, 120, 150, 180]),
+            "subjectType": ref(rnd, 11, "Majburiy"), "examFinish": ref(rnd, 12, "Imtihon"),
+            "training_hours": [{"trainingType": t, "hour": rnd.choice([0, 30, 44])} for t in TRAINING],
+        },
+        "semester": {"code": "11", "name": "1-semestr", "id": 11},
+        "overallScore": {"grade": rnd.randint(55, 100), "label": "Yaxshi", "max_ball": 100},
+        "gradesByExam": [
+            {"examType": {"code": c, "name": n}, "grade": rnd.randint(0, m), "max_ball": m,
+             "employee": ref(rnd, 300 + i, "Domla F.I.Sh."), "created_at": 1700000000 + i}
+            for c, n, m in (("11", "Joriy nazorat", 30), ("12", "Oraliq nazorat", 20), ("13", "Yakuniy nazorat", 50))
+        ],
+    }
+
+def absence_item(i, rnd):
+    return {
+        "id": 90000 + i, "subject": ref(rnd, 1000 + rnd.randrange(SUBJECTS), "Fan nomi"),
+        "trainingType": rnd.choice(TRAINING), "lessonPair": {"name": "2", "start_time": "10:00", "end_time": "11:20"},
+        "employee": ref(rnd, 300, "Domla F.I.Sh."), "lesson_date": 1700000000 + i * 86400,
+        "absent_on": 2, "absent_off": 0, "hour": 2, "explicable": rnd.random() < 0.3,
+        "absent_status": {"code": rnd.choice(["11", "12", "13"]), "name": rnd.choice(["Sababsiz", "Kasallik"])},
+        "semester": {"code": "11", "name": "1-semestr"},
+    }
+
+def lesson_item(i, rnd):
+    return {
+        "id": 80000 + i, "subject": ref(rnd, 1000 + rnd.randrange(SUBJECTS), "Fan nomi"),
+        "trainingType": rnd.choice(TRAINING), "employee": ref(rnd, 300, "Domla F.I.Sh."),
+        "lessonPair": {"name": str(i % 6 + 1), "start_time": "08:30", "end_time": "09:50"},
+        "auditorium": {"code": 204, "name": "204-xona", "building": {"id": 1, "name": "Bosh bino"}},
+        "faculty": ref(rnd, 3, "Jurnalistika fakulteti"), "department": ref(rnd, 9, "Kafedra"),
+        "group": ref(rnd, 77, "101-22"), "educationYear": {"code": "2025", "name": "2025-2026"},
+        "lesson_date": 1700000000 + (i // 4) * 86400, "weekStartTime": 1700000000, "weekEndTime": 1700600000,
+        "lesson_topic": None,
+    }
+
+def timed(label, fn):
+    fn()  # warm-up
+    t0 = time.perf_counter()
+    for _ in range(ROUNDS):
+        fn()
+    dt = (time.perf_counter() - t0) / ROUNDS
+    print(f"{label:<44} {dt * 1e6:9.1f} us/request")
+    return dt
+
+def main():
+    rnd = random.Random(39)
+    data = {
+        "subjects_11": [subject_item(i, rnd) for i in range(SUBJECTS)],
+        "attendance_11": [absence_item(i, rnd) for i in range(ABSENCES)],
+        "schedule_11": [lesson_item(i, rnd) for i in range(LESSONS)],
+    }
+    print(f"{SUBJECTS} subjects, {ABSENCES} absences, {LESSONS} lessons, {ROUNDS} rounds "
+          f"(zstd: {codec.zstandard is not None}, orjson: {codec.orjson is not None})\n")
+
+    rows = {}
+    total_old = total_new = 0
+    for key, raw in data.items():
+        old = json.dumps(raw, ensure_ascii=False).encode()
+        summary, payload, _ = codec.encode(key, raw)
+        new = len(payload) + len(json.dumps(summary).encode())
+        total_old += len(old)
+        total_new += new
+        rows[key] = (old, summary, payload)
+        print(f"{key:<16} raw JSON {len(old) / 1024:8.1f} KB   compact {new / 1024:7.1f} KB   x{len(old) / new:.1f}")
+    print(f"{'total':<16} raw JSON {total_old / 1024:8.1f} KB   compact {total_new / 1024:7.1f} KB   x{total_old / total_new:.1f}\n")
+
+    # /academic/grades: JSON column decode + parse_grades_detailed per subject
+    old, summary, payload = rows["subjects_11"]
+    def grades_legacy():
+        return [HemisService.parse_grades_detailed(i, skip_conversion=True) for i in json.loads(old)]
+    def grades_compact():
+        entry = codec.CacheEntry("subjects_11", summary, payload, codec.SCHEMA_VERSION)
+        return [codec.grades_view(r, skip_conversion=True) for r in entry.records]
+    a, b = timed("grades: raw JSON + parse_grades_detailed", grades_legacy), timed("grades: decode records", grades_compact)
+    print(f"{'':<44} x{a / b:.1f}\n")
+
+    # get_student_absence cache hit: JSON decode + calculate_totals
+    old, summary, payload = rows["attendance_11"]
+    a = timed("absence: raw JSON + totals", lambda: codec.attendance_totals(json.loads(old)))
+    b = timed("absence: stored summary", lambda: codec.CacheEntry("attendance_11", summary, payload, 1).get_summary())
+    print(f"{'':<44} x{a / b:.1f}\n")
+
+    # /academic/subjects teacher map: schedule decode
+    old, summary, payload = rows["schedule_11"]
+    a = timed("schedule: raw JSON decode", lambda: json.loads(old))
+    b = timed("schedule: decode slots", lambda: codec.decode_records(payload))
+    print(f"{'':<44} x{a / b:.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import asyncio
+import random
+import sys
+import os
+import time
+
+# Add parent dir to path to import services
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from database.models import TakenUsername
+from services.username_index import BloomFilter, LocalBitmap, UsernameIndex
+
+# BENCH_DB_URL=postgresql+asyncpg://... to run against Postgres (table must exist, data is seeded)
+DB_URL = os.environ.get("BENCH_DB_URL", "sqlite+aiosqlite:///:memory:")
+TAKEN = int(os.environ.get("BENCH_TAKEN", 200_000))
+CHECKS = int(os.environ.get("BENCH_CHECKS", 20_000))
+
+def keystrokes(rnd, taken):
+    """Username picker traffic: prefixes of new names (mostly free) + some taken names."""
+    for _ in range(CHECKS):
+        if rnd.random() < 0.1:
+            yield rnd.choice(taken)
+        else:
+            name = f"yangi_{rnd.randint(0, 10**9):x}"
+            yield name[:rnd.randint(5, len(name))]
+
+async def timed(label, fn, checks):
+    t0 = time.perf_counter()
+    result = await fn()
+    dt = time.perf_counter() - t0
+    print(f"{label:<32} {dt * 1000:9.1f} ms   {dt / checks * 1e6:7.1f} us/check")
+    return result
+
+async def main():
+    rnd = random.Random(3)
+    engine = create_async_engine(DB_URL)
+    async with engine.begin() as conn:
+        await conn.run_sync(lambda c: TakenUsername.__table__.create(c, checkfirst=True))
+    factory = async_sessionmaker(engine, expire_on_commit=False)
+
+    taken = [f"talaba_{i}" for i in range(TAKEN)]
+    async with factory() as session:
+        for i in range(0, TAKEN, 10_000):
+            await session.execute(insert(TakenUsername), [{"username": n} for n in taken[i:i + 10_000]])
+        await session.commit()
+    names = list(keystrokes(rnd, taken))
+    print(f"{TAKEN} taken usernames, {CHECKS} checks on {engine.dialect.name}\n")
+
+    async with factory() as session:
+        async def db_only():
+            return [await session.scalar(select(TakenUsername.id).where(TakenUsername.username == n)) is not None
+                    for n in names]
+
+        async def indexed():
+            return [await UsernameIndex.get_owner(session, n) is not None for n in names]
+
+        truth = await timed("SELECT per keystroke", db_only, CHECKS)
+        t0 = time.perf_counter()
+        await UsernameIndex.rebuild(session, backend=LocalBitmap(BloomFilter(UsernameIndex.BITS, UsernameIndex.HASHES)))
+        print(f"{'filter rebuild':<32} {(time.perf_counter() - t0) * 1000:9.1f} ms")
+        answers = await timed("Bloom + LRU + DB on hit", indexed, CHECKS)
+
+    stats = UsernameIndex.stats()
+    print(f"\nanswers match DB: {answers == truth}")
+    print(f"DB lookups avoided: {stats['bloom_negatives']}/{stats['checks']}, "
+          f"false positives: {stats['false_positives']}, LRU hits: {stats['lru_hits']}")
+    await engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
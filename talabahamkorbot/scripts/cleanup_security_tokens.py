@@ -0,0 +1,12 @@
+import asyncio
+import sys
+import os
+
+# Add parent dir to path to import services
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.token_service import run_security_token_cleanup
+
+if __name__ == "__main__":
+    deleted = asyncio.run(run_security_token_cleanup())
+    print(f"Removed {deleted} legacy security_tokens rows")
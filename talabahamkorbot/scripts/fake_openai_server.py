@@ -0,0 +1,80 @@
+"""
+Lokal (offline) OpenAI mock serveri.
+
+Ishga tushirish:
+    python scripts/fake_openai_server.py            # http://127.0.0.1:8765
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=test uvicorn main:app
+
+/v1/chat/completions so'rovlariga deterministik javob qaytaradi:
+ - promptda "[ID: n]" qatorlari bo'lsa -> {"n": "Boshqa", ...} JSON (murojaat tasnifi)
+ - aks holda promptning qisqa "xulosasi"
+Har bir javobda usage (prompt/completion tokens) bor, shuning uchun AIGateway
+budget va metrikalarini ham tekshirish mumkin.
+"""
+import asyncio
+import json
+import os
+import re
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+
+app = FastAPI()
+LATENCY_SEC = float(os.environ.get("FAKE_OPENAI_LATENCY", "0.2"))
+STATS = {"calls": 0}
+
+TOPIC_WORDS = {
+    "Kontrakt": ["kontrakt", "to'lov", "pul"],
+    "Yotoqxona": ["yotoqxona", "ttj"],
+    "Stipendiya": ["stipendiya"],
+    "Hemis": ["hemis", "parol", "login"],
+    "Baholar": ["baho", "ball"],
+    "Dars Jadvali": ["jadval"],
+}
+
+def _topic(text: str) -> str:
+    low = text.lower()
+    for topic, words in TOPIC_WORDS.items():
+        if any(w in low for w in words):
+            return topic
+    return "Boshqa"
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    STATS["calls"] += 1
+    await asyncio.sleep(LATENCY_SEC)
+
+    prompt = body["messages"][-1]["content"]
+    items = re.findall(r"\[ID: (\d+)\] (.*)", prompt)
+    if items:
+        content = json.dumps({i: _topic(t) for i, t in items}, ensure_ascii=False)
+    else:
+        content = f"[fake:{body.get('model')}] " + " ".join(prompt.split()[:30])
+
+    prompt_tokens = sum(len(m["content"]) for m in body["messages"]) // 4
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(content) // 4,
+            "total_tokens": prompt_tokens + len(content) // 4,
+        },
+    }
+
+@app.get("/stats")
+async def stats():
+    return STATS
+
+if __name__ == "__main__":
+    uvicorn.run(app, host="127.0.0.1", port=int(os.environ.get("FAKE_OPENAI_PORT", 8765)))
@@ -0,0 +1,126 @@
+"""
+QR attendance burst against a local fake HEMIS (aiohttp):
+  - STUDENTS submissions arrive within BURST seconds (one lecture)
+  - fake HEMIS answers after LATENCY +- jitter, fails FAIL_RATE of requests with 503
+    and serves at most HEMIS_CONCURRENCY requests at once (like the real server)
+  - compares the legacy path (HemisService.send_qr_attendance, shared client +
+    fetch_with_retry) with QRAttendanceQueue (priority client, deadline-aware retries)
+Run: python scripts/loadtest_qr_attendance.py
+"""
+
+import asyncio
+import logging
+import random
+import sys
+import os
+import time
+
+# Add parent dir to path to import services
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp import web
+
+from services.hemis_service import HemisService
+from services.qr_attendance import QRAttendanceQueue
+
+STUDENTS = int(os.environ.get("QR_STUDENTS", 150))
+BURST = float(os.environ.get("QR_BURST", 3.0))
+LATENCY = float(os.environ.get("QR_LATENCY", 0.4))
+FAIL_RATE = float(os.environ.get("QR_FAIL_RATE", 0.15))
+HEMIS_CONCURRENCY = int(os.environ.get("QR_HEMIS_CONCURRENCY", 30))
+QR_VALIDITY = float(os.environ.get("QR_VALIDITY", 15))
+PORT = int(os.environ.get("QR_PORT", 18088))
+
+
+class _RedisDown:
+    async def set(self, *args, **kwargs):
+        raise ConnectionError("load test: local state only")
+
+    async def get(self, *args, **kwargs):
+        raise ConnectionError("load test: local state only")
+
+
+async def start_fake_hemis():
+    rnd = random.Random(42)
+    gate = asyncio.Semaphore(HEMIS_CONCURRENCY)
+    counters = {"requests": 0, "failed": 0}
+
+    async def qr_attendance(request):
+        counters["requests"] += 1
+        async with gate:
+            await asyncio.sleep(max(0.01, rnd.gauss(LATENCY, LATENCY / 4)))
+            if rnd.random() < FAIL_RATE:
+                counters["failed"] += 1
+                return web.json_response({"success": False, "message": "busy"}, status=503)
+            return web.json_response({"success": True, "message": "Davomat muvaffaqiyatli belgilandi"})
+
+    app = web.Application()
+    app.router.add_post("/rest/v1/student/qr-attendance", qr_attendance)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", PORT).start()
+    return runner, counters
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def report(name, rows, counters):
+    ok = [lat for lat, status in rows if status == "success"]
+    late = sum(1 for lat, status in rows if status == "success" and lat > QR_VALIDITY)
+    failed = sum(1 for _, status in rows if status != "success")
+    print(f"{name:<8} success={len(ok) - late:>4}  too_late={late:>3}  failed/expired={failed:>3}  "
+          f"p50={percentile(ok, 0.5):6.2f}s  p95={percentile(ok, 0.95):6.2f}s  "
+          f"max={max(ok, default=0):6.2f}s  hemis_requests={counters['requests']}")
+
+
+async def burst(submit_one):
+    rnd = random.Random(7)
+    offsets = sorted(rnd.uniform(0, BURST) for _ in range(STUDENTS))
+    start = time.monotonic()
+
+    async def student(i, offset):
+        await asyncio.sleep(offset)
+        t0 = time.monotonic()
+        status = await submit_one(i)
+        return time.monotonic() - t0, status
+
+    rows = await asyncio.gather(*[student(i, o) for i, o in enumerate(offsets)])
+    return rows, time.monotonic() - start
+
+
+async def main():
+    logging.basicConfig(level=logging.ERROR)
+    runner, counters = await start_fake_hemis()
+    base_url = f"http://127.0.0.1:{PORT}/rest/v1"
+    print(f"{STUDENTS} students in {BURST}s, HEMIS latency {LATENCY}s, fail rate {FAIL_RATE:.0%}, "
+          f"QR validity {QR_VALIDITY}s\n")
+    try:
+        async def legacy(i):
+            result = await HemisService.send_qr_attendance("t", f"qr-{i}", "code", base_url=base_url)
+            return "success" if result.get("success") else "failed"
+
+        rows, _ = await burst(legacy)
+        report("legacy", rows, counters)
+
+        counters.update(requests=0, failed=0)
+        QRAttendanceQueue._redis = _RedisDown()
+        QRAttendanceQueue.QR_VALIDITY = QR_VALIDITY
+
+        async def queued(i):
+            state = await QRAttendanceQueue.submit(i, "t", f"qr-{i}", "code", base_url=base_url)
+            state = await QRAttendanceQueue.wait(state["id"], QR_VALIDITY + 5)
+            return state["status"]
+
+        rows, _ = await burst(queued)
+        report("queue", rows, counters)
+        print("\nqueue stats:", QRAttendanceQueue.stats())
+    finally:
+        await HemisService.close_client()
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
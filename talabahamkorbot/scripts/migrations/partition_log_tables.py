@@ -0,0 +1,95 @@
+import sys, os; sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+# Converts the log tables listed in services.partition_manager.POLICIES (partitioned=True)
+# into monthly RANGE-partitioned tables on Postgres:
+#
+#   1. t -> t_legacy (its indexes/PK renamed *_legacy)
+#   2. new t PARTITION BY RANGE (time column), PK (id, time column), same FKs/indexes
+#   3. one partition per month of existing data + PREMAKE_MONTHS ahead + t_default
+#   4. rows copied with one INSERT ... SELECT (routed by Postgres), id sequence re-owned
+#
+# Each table is converted in one transaction (writes to it wait until commit), so run it
+# in a maintenance window. t_legacy is kept for checking; --drop-legacy removes it.
+# Usage: python scripts/migrations/partition_log_tables.py [--drop-legacy] [table ...]
+
+import asyncio
+import logging
+from datetime import datetime
+
+from sqlalchemy import text
+from sqlalchemy.schema import AddConstraint, CreateIndex
+
+import database.models  # noqa: F401  (registers tables in Base.metadata)
+from database.db_connect import Base, engine
+from services.partition_manager import PartitionManager, add_months, get_policies, month_start
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def convert(conn, policy, drop_legacy: bool):
+    t, col = policy.table, policy.column
+    legacy = f"{t}_legacy"
+    model = Base.metadata.tables[t]
+
+    await conn.execute(text(f"ALTER TABLE {t} RENAME TO {legacy}"))
+    indexes = (await conn.execute(text(
+        "SELECT indexname FROM pg_indexes WHERE tablename = :t"), {"t": legacy})).scalars().all()
+    for name in indexes:
+        await conn.execute(text(f'ALTER INDEX "{name}" RENAME TO "{name}_legacy"'))
+
+    await conn.execute(text(
+        f"CREATE TABLE {t} (LIKE {legacy} INCLUDING DEFAULTS) PARTITION BY RANGE ({col})"))
+    await conn.execute(text(f"ALTER TABLE {t} ALTER COLUMN {col} SET NOT NULL"))
+    await conn.execute(text(f"ALTER TABLE {t} ALTER COLUMN {col} SET DEFAULT (now() at time zone 'utc')"))
+    await conn.execute(text(f"ALTER TABLE {t} ADD PRIMARY KEY (id, {col})"))
+    for fk in model.foreign_key_constraints:
+        await conn.execute(AddConstraint(fk))
+    for index in model.indexes:
+        if index.columns.keys() != ["id"]:    # covered by the primary key
+            await conn.execute(CreateIndex(index))
+
+    bounds = (await conn.execute(text(f"SELECT min({col}), max({col}) FROM {legacy}"))).one()
+    now = datetime.utcnow()
+    month = month_start(bounds[0] or now)
+    last = add_months(month_start(max(bounds[1] or now, now)), PartitionManager.PREMAKE_MONTHS)
+    while month <= last:
+        await conn.execute(text(PartitionManager.partition_ddl(t, month)))
+        month = add_months(month, 1)
+    await conn.execute(text(f"CREATE TABLE IF NOT EXISTS {t}_default PARTITION OF {t} DEFAULT"))
+
+    columns = ", ".join(c.name for c in model.columns)
+    values = ", ".join(f"COALESCE({c.name}, now() at time zone 'utc')" if c.name == col else c.name
+                       for c in model.columns)
+    copied = (await conn.execute(text(
+        f"INSERT INTO {t} ({columns}) SELECT {values} FROM {legacy}"))).rowcount
+
+    seq = (await conn.execute(text("SELECT pg_get_serial_sequence(:t, 'id')"), {"t": legacy})).scalar()
+    if seq:
+        await conn.execute(text(f"ALTER SEQUENCE {seq} OWNED BY {t}.id"))
+    if drop_legacy:
+        await conn.execute(text(f"DROP TABLE {legacy}"))
+    logger.info(f"✅ {t}: {copied} rows copied into monthly partitions"
+                + ("" if drop_legacy else f" ({legacy} kept)"))
+
+
+async def migrate(tables, drop_legacy: bool):
+    if engine.dialect.name != "postgresql":
+        logger.info("Not Postgres: log tables stay plain tables, retention uses batched DELETE.")
+        return
+    for policy in get_policies():
+        if not policy.partitioned or (tables and policy.table not in tables):
+            continue
+        try:
+            async with engine.begin() as conn:
+                if await PartitionManager.is_partitioned(conn, policy.table):
+                    logger.info(f"{policy.table}: already partitioned")
+                    continue
+                await convert(conn, policy, drop_legacy)
+        except Exception as e:
+            logger.error(f"Migration failed for {policy.table}: {e}")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    asyncio.run(migrate([a for a in args if not a.startswith("--")], "--drop-legacy" in args))
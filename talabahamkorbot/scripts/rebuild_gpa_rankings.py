@@ -0,0 +1,24 @@
+import asyncio
+import logging
+import sys
+import os
+
+# Add parent dir to path to import services
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.db_connect import AsyncSessionLocal
+from services.gpa_engine import CohortGPAEngine
+
+logging.basicConfig(level=logging.INFO)
+
+async def main():
+    # Usage: python scripts/rebuild_gpa_rankings.py [university_id] [latest|best]
+    university_id = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    retake_policy = sys.argv[2] if len(sys.argv) > 2 else "latest"
+
+    async with AsyncSessionLocal() as session:
+        total = await CohortGPAEngine.rebuild_all(session, university_id=university_id, retake_policy=retake_policy)
+    print(f"✅ GPA leaderboards rebuilt for {total} students.")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,27 @@
+import asyncio
+import argparse
+import sys
+import os
+from datetime import date
+
+# Add parent dir to path to import services
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.db_connect import AsyncSessionLocal
+from services.kpi_calculator import recompute_kpi_range
+
+
+async def recompute(university_id, start: date, end: date):
+    async with AsyncSessionLocal() as session:
+        summary = await recompute_kpi_range(session, start, end, university_id=university_id)
+    for period, tutors in summary.items():
+        print(f"{period}: {tutors} tutors")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tyutor KPI ni sana oralig'i bo'yicha qayta hisoblash")
+    parser.add_argument("--university", type=int, default=None, help="University ID (default: hammasi)")
+    parser.add_argument("--from", dest="start", type=date.fromisoformat, default=date.today())
+    parser.add_argument("--to", dest="end", type=date.fromisoformat, default=date.today())
+    args = parser.parse_args()
+    asyncio.run(recompute(args.university, args.start, args.end))
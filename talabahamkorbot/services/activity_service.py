@@ -1,81 +1,328 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update
-from datetime import datetime
+from sqlalchemy import select, update, insert, case, func, Float, cast, exc as sa_exc
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Deque, Dict, List, Optional, Tuple
+import asyncio
+import json
 import logging
+import os
+import time
 
+from config import LOG_ARCHIVE_DIR
 from database.models import ActivityLog, ActivityType, Student, DailyActivityStats
+from database.db_connect import AsyncSessionLocal
 
 logger = logging.getLogger(__name__)
 
+# ActivityType -> DailyActivityStats counter
+STAT_COLUMNS = {
+    ActivityType.LOGIN.value: "total_logins",
+    ActivityType.POST.value: "total_posts",
+    ActivityType.LIKE.value: "total_likes",
+    ActivityType.COMMENT.value: "total_comments",
+    ActivityType.CERTIFICATE.value: "total_certificates",
+    ActivityType.APPEAL.value: "total_appeals",
+}
+COUNTER_FIELDS = ("total_active_students",) + tuple(STAT_COLUMNS.values())
+
+
+def _day(ts: datetime) -> datetime:
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
 class ActivityService:
+    """
+    Activity events are not written on the request path any more:
+      - log_activity only appends a small tuple to a per-worker ring buffer (no DB I/O)
+      - run_activity_flusher drains it in batches: one bulk INSERT into activity_logs,
+        one UPDATE students (CASE id ...) for total_activity_count / last_active_at deltas,
+        one upsert of DailyActivityStats counters per batch
+      - when the buffer is full the oldest events are dropped (counted in stats)
+      - a failed batch waits in a separate retry queue (not back in the ring buffer):
+        DB unreachable -> retried on the next flush; any other error -> retried up to
+        MAX_ATTEMPTS times, then bisected, and a single event that still fails goes to
+        the dead-letter file, so one bad event cannot block the rest
+    """
+
+    BUFFER_SIZE = 50000
+    BATCH_SIZE = 1000
+    FLUSH_INTERVAL = 2
+    MAX_ATTEMPTS = 3
+    DEAD_LETTER_PATH = os.path.join(LOG_ARCHIVE_DIR, "activity_dead_letter.jsonl")
+
+    # (student_id, staff_id, activity_type, reference_id, meta_data, created_at)
+    _buffer: Deque[tuple] = deque(maxlen=BUFFER_SIZE)
+    _retry: Deque[Tuple[int, List[tuple]]] = deque()   # (failed attempts, batch)
+    _wakeup: Optional[asyncio.Event] = None
+    _flush_lock: Optional[asyncio.Lock] = None
+    _started_at = time.monotonic()
+    _stats = {"enqueued": 0, "flushed": 0, "dropped": 0, "unknown_students": 0, "batches": 0,
+              "failed_batches": 0, "dead_lettered": 0, "last_flush_ms": 0.0, "last_lag_s": 0.0, "max_lag_s": 0.0}
+
     @staticmethod
     async def log_activity(
-        db: AsyncSession,
-        user_id: int, 
-        role: str, # 'student' or 'staff'
-        activity_type: ActivityType,
+        db: AsyncSession = None,
+        user_id: int = None,
+        role: str = None, # 'student' or 'staff'
+        activity_type: ActivityType = None,
         ref_id: int = None,
         meta_data: dict = None
     ):
         """
-        Logs a user activity and updates the user's last_active_at timestamp.
-        Designed to be fire-and-forget or awaited.
+        Queues a user activity; the flusher writes the log and updates last_active_at.
+        `db` is kept for existing callers and not used.
         """
         try:
-            # 1. Create Log Entry
-            log = ActivityLog(
-                activity_type=activity_type,
-                reference_id=ref_id,
-                meta_data=meta_data,
-                created_at=datetime.utcnow()
-            )
-            
-            is_student = role == 'student'
-            is_staff = role == 'staff'
-            
-            if is_student:
-                log.student_id = user_id
-                # Fetch student to get faculty_id for aggregation
-                student = await db.get(Student, user_id)
-                if student:
-                    log.faculty_id = student.faculty_id
-                    
-                    # 2. Update Student Activity Metrics
-                    # We use direct update to avoid race conditions on count
-                    stmt = (
-                        update(Student)
-                        .where(Student.id == user_id)
-                        .values(
-                            last_active_at=datetime.utcnow(),
-                            total_activity_count=Student.total_activity_count + 1
-                        )
-                    )
-                    await db.execute(stmt)
-            elif is_staff:
-                log.staff_id = user_id
-                # Staff metrics logic can be added here if needed
-
-            db.add(log)
-            # We don't commit here immediately if part of a larger transaction, 
-            # but usually activity logging is side-effect.
-            # Assuming the caller handles commit or we do it here.
-            # Ideally, the caller (API endpoint) commits.
-            
-            # If we want to ensure it's saved regardless of main transaction success,
-            # we'd need a separate session, but for now we attach to current session.
-            
+            ActivityService.enqueue(user_id, role, activity_type, ref_id, meta_data)
         except Exception as e:
             logger.error(f"Failed to log activity: {e}")
 
+    @classmethod
+    def enqueue(cls, user_id: int, role: str, activity_type, ref_id: int = None,
+                meta_data: dict = None, created_at: datetime = None):
+        if len(cls._buffer) == cls._buffer.maxlen:
+            cls._stats["dropped"] += 1
+        kind = activity_type.value if isinstance(activity_type, ActivityType) else str(activity_type)
+        cls._buffer.append((
+            user_id if role == "student" else None,
+            user_id if role == "staff" else None,
+            kind, ref_id, meta_data, created_at or datetime.utcnow(),
+        ))
+        cls._stats["enqueued"] += 1
+        if len(cls._buffer) >= cls.BATCH_SIZE and cls._wakeup is not None:
+            cls._wakeup.set()
+
+    # ------------------------------------------------------------
+    # Flush
+    # ------------------------------------------------------------
+
+    @classmethod
+    async def flush(cls) -> int:
+        """Writes everything buffered so far in BATCH_SIZE chunks. Returns written events."""
+        if cls._flush_lock is None:
+            cls._flush_lock = asyncio.Lock()
+        written = 0
+        async with cls._flush_lock:
+            while cls._retry or cls._buffer:
+                if cls._retry:
+                    attempts, batch = cls._retry.popleft()
+                else:
+                    attempts, batch = 0, [cls._buffer.popleft() for _ in range(min(cls.BATCH_SIZE, len(cls._buffer)))]
+                t0 = time.perf_counter()
+                lag = (datetime.utcnow() - batch[0][5]).total_seconds()
+                try:
+                    async with AsyncSessionLocal() as session:
+                        written += await cls._write_batch(session, batch)
+                        await session.commit()
+                except Exception as e:
+                    cls._stats["failed_batches"] += 1
+                    if cls._is_unavailable(e):
+                        logger.error(f"Activity flush failed, DB unavailable ({len(batch)} events kept): {e}")
+                        cls._retry.appendleft((attempts, batch))
+                        break
+                    await cls._handle_failed_batch(batch, attempts + 1, e)
+                    continue
+                cls._stats["batches"] += 1
+                cls._stats["last_flush_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+                cls._stats["last_lag_s"] = round(lag, 3)
+                cls._stats["max_lag_s"] = max(cls._stats["max_lag_s"], round(lag, 3))
+        cls._stats["flushed"] += written
+        return written
+
+    @staticmethod
+    def _is_unavailable(error: Exception) -> bool:
+        """Connection-level failure: the batch itself is fine, retry it later as is."""
+        transient = (ConnectionError, OSError, asyncio.TimeoutError, sa_exc.TimeoutError)
+        return isinstance(error, transient) or isinstance(getattr(error, "orig", None), transient) or \
+            getattr(error, "connection_invalidated", False)
+
+    @classmethod
+    async def _handle_failed_batch(cls, batch: List[tuple], attempts: int, error: Exception):
+        if attempts < cls.MAX_ATTEMPTS:
+            logger.error(f"Activity flush failed ({len(batch)} events, attempt {attempts}): {error}")
+            cls._retry.appendleft((attempts, batch))
+        elif len(batch) > 1:
+            # Bisect: halves get one more try each, good events get through
+            mid = len(batch) // 2
+            cls._retry.appendleft((cls.MAX_ATTEMPTS - 1, batch[mid:]))
+            cls._retry.appendleft((cls.MAX_ATTEMPTS - 1, batch[:mid]))
+        else:
+            logger.error(f"Activity event dead-lettered after {attempts} attempts: {batch[0]!r} ({error})")
+            cls._stats["dead_lettered"] += 1
+            try:
+                await asyncio.to_thread(cls._write_dead_letter, batch[0], str(error))
+            except Exception as e:
+                logger.error(f"Activity dead-letter write failed: {e}")
+
+    @classmethod
+    def _write_dead_letter(cls, event: tuple, error: str):
+        os.makedirs(os.path.dirname(cls.DEAD_LETTER_PATH) or ".", exist_ok=True)
+        keys = ("student_id", "staff_id", "activity_type", "reference_id", "meta_data", "created_at")
+        with open(cls.DEAD_LETTER_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(dict(zip(keys, event), error=error), default=str, ensure_ascii=False) + "\n")
+
+    @classmethod
+    async def _write_batch(cls, session: AsyncSession, batch: List[tuple]) -> int:
+        student_ids = {e[0] for e in batch if e[0] is not None}
+        faculties: Dict[int, Optional[int]] = {}
+        if student_ids:
+            rows = await session.execute(select(Student.id, Student.faculty_id).where(Student.id.in_(student_ids)))
+            faculties = dict(rows.all())
+        unknown = student_ids - faculties.keys()
+        if unknown:
+            cls._stats["unknown_students"] += sum(1 for e in batch if e[0] in unknown)
+            batch = [e for e in batch if e[0] not in unknown]
+        if not batch:
+            return 0
+
+        # Students already active on that day (before this batch) - for total_active_students
+        days = {_day(e[5]) for e in batch if e[0] is not None}
+        seen = set()
+        for day in days:
+            rows = await session.execute(
+                select(ActivityLog.student_id).distinct()
+                .where(ActivityLog.student_id.in_(faculties.keys()),
+                       ActivityLog.created_at >= day, ActivityLog.created_at < day + timedelta(days=1))
+            )
+            seen.update((sid, day) for sid in rows.scalars())
+
+        # 1. activity_logs: one executemany INSERT (Core insert - ORM bulk insert splits by NULL columns)
+        await session.execute(insert(ActivityLog.__table__), [
+            {"student_id": sid, "staff_id": staff_id, "faculty_id": faculties.get(sid),
+             "activity_type": kind, "reference_id": ref_id, "meta_data": meta, "created_at": ts}
+            for sid, staff_id, kind, ref_id, meta, ts in batch
+        ])
+
+        # 2. students: aggregated deltas in one UPDATE
+        deltas: Dict[int, int] = {}
+        last_seen: Dict[int, datetime] = {}
+        stats: Dict[tuple, Dict[str, int]] = {}
+        for sid, _, kind, _, _, ts in batch:
+            if sid is None:
+                continue
+            deltas[sid] = deltas.get(sid, 0) + 1
+            last_seen[sid] = max(last_seen.get(sid, ts), ts)
+            faculty_id = faculties.get(sid)
+            if faculty_id is None:
+                continue
+            day = _day(ts)
+            row = stats.setdefault((day, faculty_id), dict.fromkeys(COUNTER_FIELDS, 0))
+            if (sid, day) not in seen:
+                seen.add((sid, day))
+                row["total_active_students"] += 1
+            if kind in STAT_COLUMNS:
+                row[STAT_COLUMNS[kind]] += 1
+        if deltas:
+            await session.execute(
+                update(Student)
+                .where(Student.id.in_(deltas.keys()))
+                .values(
+                    total_activity_count=func.coalesce(Student.total_activity_count, 0)
+                    + case(deltas, value=Student.id, else_=0),
+                    last_active_at=case(last_seen, value=Student.id, else_=Student.last_active_at),
+                )
+                .execution_options(synchronize_session=False)
+            )
+
+        # 3. daily_activity_stats: counters incremented in place
+        if stats:
+            await cls._upsert_daily(session, [
+                dict(counters, date=day, faculty_id=faculty_id) for (day, faculty_id), counters in stats.items()
+            ], increment=True)
+        return len(batch)
+
+    @staticmethod
+    async def _upsert_daily(session: AsyncSession, rows: List[dict], increment: bool):
+        """INSERT ... ON CONFLICT (date, faculty_id) DO UPDATE; adds to or replaces the counters."""
+        dialect = session.bind.dialect.name if session.bind is not None else "postgresql"
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+
+        now = datetime.utcnow()
+        for row in rows:
+            row.update(created_at=now, updated_at=now)
+        table = DailyActivityStats.__table__
+        stmt = dialect_insert(DailyActivityStats)
+        set_ = {
+            field: (table.c[field] + stmt.excluded[field]) if increment else stmt.excluded[field]
+            for field in COUNTER_FIELDS
+        }
+        set_["updated_at"] = stmt.excluded.updated_at
+        await session.execute(stmt.on_conflict_do_update(index_elements=["date", "faculty_id"], set_=set_), rows)
+
+        # Average events per active student for the touched days
+        events = sum((table.c[c] for c in STAT_COLUMNS.values()), 0)
+        await session.execute(
+            update(DailyActivityStats)
+            .where(DailyActivityStats.date.in_({r["date"] for r in rows}))
+            .values(avg_activity_score=case(
+                (DailyActivityStats.total_active_students > 0,
+                 cast(events, Float) / DailyActivityStats.total_active_students),
+                else_=0.0,
+            ))
+            .execution_options(synchronize_session=False)
+        )
+
+    @classmethod
+    def stats(cls) -> dict:
+        s = dict(cls._stats)
+        s["buffered"] = len(cls._buffer)
+        s["retrying"] = sum(len(batch) for _, batch in cls._retry)
+        uptime = max(time.monotonic() - cls._started_at, 1e-9)
+        s["events_per_sec"] = round(s["flushed"] / uptime, 2)
+        s["current_lag_s"] = round((datetime.utcnow() - cls._buffer[0][5]).total_seconds(), 3) if cls._buffer else 0.0
+        return s
+
     @staticmethod
     async def aggregate_daily_stats(db: AsyncSession, date: datetime = None):
         """
-        Aggregates logs into DailyActivityStats.
-        Should be called by a cron job or scheduled task.
+        Recomputes DailyActivityStats for one day from activity_logs (backfill / repair).
+        The flusher keeps the same rows up to date incrementally.
         """
         if not date:
-            date = datetime.utcnow().date()
-            
-        # Implementation of aggregation logic...
-        # For now, we focus on real-time logging.
-        pass
+            date = datetime.utcnow()
+        day = _day(date)
+
+        rows = (await db.execute(
+            select(ActivityLog.faculty_id, ActivityLog.activity_type, func.count(ActivityLog.id))
+            .where(ActivityLog.faculty_id.is_not(None),
+                   ActivityLog.created_at >= day, ActivityLog.created_at < day + timedelta(days=1))
+            .group_by(ActivityLog.faculty_id, ActivityLog.activity_type)
+        )).all()
+        active = dict((await db.execute(
+            select(ActivityLog.faculty_id, func.count(ActivityLog.student_id.distinct()))
+            .where(ActivityLog.faculty_id.is_not(None),
+                   ActivityLog.created_at >= day, ActivityLog.created_at < day + timedelta(days=1))
+            .group_by(ActivityLog.faculty_id)
+        )).all())
+
+        stats: Dict[int, Dict[str, int]] = {}
+        for faculty_id, kind, count in rows:
+            row = stats.setdefault(faculty_id, dict.fromkeys(COUNTER_FIELDS, 0))
+            row["total_active_students"] = active.get(faculty_id, 0)
+            if kind in STAT_COLUMNS:
+                row[STAT_COLUMNS[kind]] = count
+        if stats:
+            await ActivityService._upsert_daily(db, [
+                dict(counters, date=day, faculty_id=faculty_id) for faculty_id, counters in stats.items()
+            ], increment=False)
+            await db.commit()
+        return len(stats)
+
+
+async def run_activity_flusher(interval: int = ActivityService.FLUSH_INTERVAL):
+    """Background loop (started in lifespan): flushes every `interval` s or as soon as a batch is full."""
+    ActivityService._wakeup = asyncio.Event()
+    while True:
+        try:
+            await asyncio.wait_for(ActivityService._wakeup.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+        ActivityService._wakeup.clear()
+        try:
+            await ActivityService.flush()
+        except Exception as e:
+            logger.error(f"Activity flusher error: {e}")
@@ -0,0 +1,333 @@
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import redis.asyncio as redis
+from config import REDIS_URL
+
+logger = logging.getLogger(__name__)
+
+
+class AIBudgetExceeded(Exception):
+    pass
+
+
+class AIGateway:
+    """
+    Single entry point for OpenAI chat completions:
+      - exact + normalized prompt cache (Redis with TTL, small in-process L1)
+      - per-user/role daily token budgets (Redis counters, reserved before the call)
+      - process-wide concurrency limit
+      - latency / token / cache metrics
+      - batched classification (one call per `batch_size` items)
+    """
+
+    CACHE_PREFIX = "ai_cache:"
+    BUDGET_PREFIX = "ai_tokens:"
+    DEFAULT_TTL = 24 * 3600
+    MAX_CONCURRENCY = 8
+    L1_SIZE = 512
+    COMPLETION_RESERVE = 500   # reserved for the answer until the real usage is known
+
+    # Daily token budget per role (None = unlimited)
+    TOKEN_BUDGETS: Dict[str, Optional[int]] = {
+        "student": 60_000,
+        "staff": 200_000,
+        "rahbariyat": 400_000,
+        "owner": None,
+        "admin": None,
+    }
+
+    _redis = None
+    _semaphore: Optional[asyncio.Semaphore] = None
+    _l1: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, text)
+    _metrics = {
+        "requests": 0,
+        "cache_hits_exact": 0,
+        "cache_hits_normalized": 0,
+        "upstream_calls": 0,
+        "upstream_errors": 0,
+        "budget_rejections": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "latency_sum_ms": 0.0,
+        "latency_max_ms": 0.0,
+    }
+
+    # ------------------------------------------------------------
+    # Infrastructure
+    # ------------------------------------------------------------
+
+    @classmethod
+    async def get_redis(cls):
+        if cls._redis is None:
+            cls._redis = redis.from_url(REDIS_URL, decode_responses=True)
+        return cls._redis
+
+    @classmethod
+    def _get_semaphore(cls) -> asyncio.Semaphore:
+        if cls._semaphore is None:
+            cls._semaphore = asyncio.Semaphore(cls.MAX_CONCURRENCY)
+        return cls._semaphore
+
+    @staticmethod
+    def normalize_prompt(prompt: str) -> str:
+        """Whitespace/case-insensitive form so trivially different prompts share a cache entry."""
+        return re.sub(r"\s+", " ", prompt or "").strip().casefold()
+
+    @staticmethod
+    def cache_key(model: str, system: str, prompt: str) -> str:
+        digest = hashlib.sha256(f"{model}\x00{system}\x00{prompt}".encode()).hexdigest()
+        return f"{AIGateway.CACHE_PREFIX}{digest}"
+
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        # ~4 chars per token is close enough for budgeting
+        return max(1, len(text or "") // 4)
+
+    # ------------------------------------------------------------
+    # Cache
+    # ------------------------------------------------------------
+
+    @classmethod
+    def _l1_get(cls, key: str) -> Optional[str]:
+        item = cls._l1.get(key)
+        if not item:
+            return None
+        if item[0] < time.time():
+            cls._l1.pop(key, None)
+            return None
+        cls._l1.move_to_end(key)
+        return item[1]
+
+    @classmethod
+    def _l1_set(cls, key: str, value: str, ttl: int):
+        cls._l1[key] = (time.time() + ttl, value)
+        cls._l1.move_to_end(key)
+        while len(cls._l1) > cls.L1_SIZE:
+            cls._l1.popitem(last=False)
+
+    @classmethod
+    async def _cache_get(cls, keys: List[str]) -> tuple:
+        for i, key in enumerate(keys):
+            hit = cls._l1_get(key)
+            if hit is not None:
+                return i, hit
+        try:
+            r = await cls.get_redis()
+            values = await r.mget(keys)
+            for i, value in enumerate(values):
+                if value is not None:
+                    cls._l1_set(keys[i], value, 300)
+                    return i, value
+        except Exception as e:
+            logger.warning(f"AI cache read failed: {e}")
+        return None, None
+
+    @classmethod
+    async def _cache_set(cls, keys: List[str], value: str, ttl: int):
+        for key in keys:
+            cls._l1_set(key, value, min(ttl, 300))
+        try:
+            r = await cls.get_redis()
+            async with r.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.set(key, value, ex=ttl)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"AI cache write failed: {e}")
+
+    # ------------------------------------------------------------
+    # Budgets
+    # ------------------------------------------------------------
+
+    @classmethod
+    def _budget_key(cls, role: str, user_id) -> str:
+        return f"{cls.BUDGET_PREFIX}{role}:{user_id}:{datetime.utcnow().strftime('%Y%m%d')}"
+
+    @classmethod
+    async def reserve_budget(cls, role: str, user_id, estimated: int) -> int:
+        """
+        Reserves `estimated` tokens up front (INCRBY, then compare; rolled back if over budget),
+        so concurrent requests cannot all pass a check and overspend.
+        Returns the reserved amount (0: unlimited / not tracked / Redis unavailable).
+        """
+        budget = cls.TOKEN_BUDGETS.get(role, cls.TOKEN_BUDGETS["student"])
+        if budget is None or user_id is None:
+            return 0
+        key = cls._budget_key(role, user_id)
+        try:
+            r = await cls.get_redis()
+            used = await r.incrby(key, estimated)
+            if used > budget:
+                await r.decrby(key, estimated)
+            else:
+                await r.expire(key, 2 * 86400)
+        except Exception as e:
+            logger.warning(f"AI budget reservation failed (allowing): {e}")
+            return 0
+        if used > budget:
+            cls._metrics["budget_rejections"] += 1
+            raise AIBudgetExceeded(f"{role}:{user_id} used {used - estimated}/{budget} tokens today")
+        return estimated
+
+    @classmethod
+    async def settle_budget(cls, role: str, user_id, reserved: int, actual: int):
+        """Replaces the reservation with the actual usage (actual=0 refunds it, e.g. upstream error)."""
+        if user_id is None or cls.TOKEN_BUDGETS.get(role, cls.TOKEN_BUDGETS["student"]) is None:
+            return
+        delta = actual - reserved
+        if not delta:
+            return
+        try:
+            r = await cls.get_redis()
+            key = cls._budget_key(role, user_id)
+            await r.incrby(key, delta)
+            await r.expire(key, 2 * 86400)
+        except Exception as e:
+            logger.warning(f"AI budget settle failed: {e}")
+
+    # ------------------------------------------------------------
+    # Completions
+    # ------------------------------------------------------------
+
+    @classmethod
+    async def complete(
+        cls,
+        client,
+        model: str,
+        system: str,
+        prompt: str,
+        role: str = "student",
+        user_id=None,
+        cache_ttl: Optional[int] = None,
+    ) -> str:
+        """
+        Cached, budgeted, concurrency-limited chat completion.
+        cache_ttl=0 disables caching (e.g. personal chat).
+        """
+        cls._metrics["requests"] += 1
+        ttl = cls.DEFAULT_TTL if cache_ttl is None else cache_ttl
+        keys = []
+        if ttl > 0:
+            keys = [
+                cls.cache_key(model, system, prompt),
+                cls.cache_key(model, system, cls.normalize_prompt(prompt)),
+            ]
+            idx, cached = await cls._cache_get(keys)
+            if cached is not None:
+                cls._metrics["cache_hits_exact" if idx == 0 else "cache_hits_normalized"] += 1
+                return cached
+
+        estimated = cls.estimate_tokens(system) + cls.estimate_tokens(prompt) + cls.COMPLETION_RESERVE
+        reserved = await cls.reserve_budget(role, user_id, estimated)
+
+        started = time.perf_counter()
+        async with cls._get_semaphore():
+            try:
+                cls._metrics["upstream_calls"] += 1
+                completion = await client.chat.completions.create(
+                    model=model,
+                    messages=[
+                        {"role": "system", "content": system},
+                        {"role": "user", "content": prompt}
+                    ]
+                )
+            except Exception:
+                cls._metrics["upstream_errors"] += 1
+                await cls.settle_budget(role, user_id, reserved, 0)
+                raise
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        cls._metrics["latency_sum_ms"] += elapsed_ms
+        cls._metrics["latency_max_ms"] = max(cls._metrics["latency_max_ms"], elapsed_ms)
+
+        text = completion.choices[0].message.content or ""
+        usage = getattr(completion, "usage", None)
+        prompt_tokens = getattr(usage, "prompt_tokens", None) or cls.estimate_tokens(system + prompt)
+        completion_tokens = getattr(usage, "completion_tokens", None) or cls.estimate_tokens(text)
+        cls._metrics["prompt_tokens"] += prompt_tokens
+        cls._metrics["completion_tokens"] += completion_tokens
+        await cls.settle_budget(role, user_id, reserved, prompt_tokens + completion_tokens)
+
+        if keys and text:
+            await cls._cache_set(keys, text, ttl)
+        return text
+
+    @classmethod
+    async def classify_batch(
+        cls,
+        client,
+        model: str,
+        system: str,
+        items: Dict[int, str],
+        instruction: str,
+        batch_size: int = 100,
+        role: str = "staff",
+        user_id=None,
+    ) -> Dict[str, str]:
+        """
+        Classifies {id: text} in chunks of `batch_size` items per call (chunks run concurrently,
+        bounded by MAX_CONCURRENCY). The model must answer with a JSON object {"<id>": "<label>"}.
+        Partial results are returned (missing ids = unanswered chunks); AIBudgetExceeded is
+        raised only when no chunk succeeded.
+        """
+        ids = list(items.keys())
+        chunks = [ids[i:i + batch_size] for i in range(0, len(ids), batch_size)]
+
+        async def run(chunk):
+            data = "\n".join(f"[ID: {i}] {items[i]}" for i in chunk)
+            prompt = (
+                f"{instruction}\n\n"
+                f"MA'LUMOTLAR:\n{data}\n\n"
+                "JAVOB FORMATI (Faqat JSON):\n"
+                "{\n"
+                '  "ID_RAQAM": "Mavzu"\n'
+                "}"
+            )
+            raw = await cls.complete(client, model, system, prompt, role=role, user_id=user_id)
+            return cls.parse_json_object(raw)
+
+        # Chunks already answered (and paid for) are kept even if others fail or hit the budget
+        result: Dict[str, str] = {}
+        failed, over_budget = 0, None
+        for chunk, part in zip(chunks, await asyncio.gather(*(run(c) for c in chunks), return_exceptions=True)):
+            if isinstance(part, AIBudgetExceeded):
+                failed, over_budget = failed + 1, part
+            elif isinstance(part, BaseException):
+                failed += 1
+                logger.error(f"AI batch classification failed ({len(chunk)} items): {part}")
+            else:
+                result.update({str(k): v for k, v in part.items()})
+        if over_budget is not None and failed == len(chunks):
+            raise over_budget
+        if failed:
+            logger.warning(f"AI batch classification: {failed}/{len(chunks)} chunks unanswered")
+        return result
+
+    @staticmethod
+    def parse_json_object(text: str) -> dict:
+        json_str = text or ""
+        # Extract JSON from code blocks if present
+        if "```" in json_str:
+            match = re.search(r"```(?:json)?(.*?)```", json_str, re.DOTALL)
+            if match:
+                json_str = match.group(1).strip()
+        if "{" not in json_str:
+            raise ValueError("AI Valid JSON qaytarmadi")
+        json_str = json_str[json_str.index("{"):json_str.rindex("}") + 1]
+        return json.loads(json_str)
+
+    @classmethod
+    def metrics(cls) -> dict:
+        m = dict(cls._metrics)
+        calls = m["upstream_calls"] or 1
+        m["latency_avg_ms"] = round(m["latency_sum_ms"] / calls, 1)
+        hits = m["cache_hits_exact"] + m["cache_hits_normalized"]
+        m["cache_hit_rate"] = round(hits / m["requests"], 3) if m["requests"] else 0.0
+        return m
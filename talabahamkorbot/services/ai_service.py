@@ -1,8 +1,9 @@
 import logging
 import os
 from openai import AsyncOpenAI
-from config import OPENAI_API_KEY, OPENAI_MODEL_TASKS, OPENAI_MODEL_CHAT, OPENAI_API_KEY_OWNER
+from config import OPENAI_API_KEY, OPENAI_MODEL_TASKS, OPENAI_MODEL_CHAT, OPENAI_API_KEY_OWNER, OPENAI_BASE_URL
 from data.ai_prompts import AI_PROMPTS
+from services.ai_gateway import AIGateway, AIBudgetExceeded
 
 logger = logging.getLogger(__name__)
 
@@ -10,20 +11,20 @@ logger = logging.getLogger(__name__)
 # Configure APIs
 client = None
 if OPENAI_API_KEY:
-    client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+    client = AsyncOpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL)
 else:
     logger.warning("OPENAI_API_KEY topilmadi! Student AI ishlamaydi.")
 
 client_owner = None
 if OPENAI_API_KEY_OWNER:
-    client_owner = AsyncOpenAI(api_key=OPENAI_API_KEY_OWNER)
+    client_owner = AsyncOpenAI(api_key=OPENAI_API_KEY_OWNER, base_url=OPENAI_BASE_URL)
 elif OPENAI_API_KEY:
     # Fallback to main key if owner key is not dedicated
-    client_owner = AsyncOpenAI(api_key=OPENAI_API_KEY)
+    client_owner = AsyncOpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL)
 else:
     logger.warning("OPENAI_API_KEY topilmadi! AI xizmatlari ishlamaydi.")
 
-async def generate_response(prompt_text: str, model: str = OPENAI_MODEL_CHAT, stream: bool = False, system_context: str = None, role: str = 'student', user_name: str = None) -> str:
+async def generate_response(prompt_text: str, model: str = OPENAI_MODEL_CHAT, stream: bool = False, system_context: str = None, role: str = 'student', user_name: str = None, user_id: int = None, cache_ttl: int = None) -> str:
     """
     Oddiy matnli so'rov yuborish va javob olish.
     Chat uchun default model: gpt-3.5-turbo (Nano)
@@ -33,6 +34,8 @@ async def generate_response(prompt_text: str, model: str = OPENAI_MODEL_CHAT, st
     system_context -> Additional system prompt context (e.g. analytics)
     role -> 'student', 'staff', 'owner', 'admin'
     user_name -> Personalized greeting
+    user_id -> token budget hisobi uchun (AIGateway)
+    cache_ttl -> javob keshi muddati (0 = keshlamaslik, None = default)
     """
     # Select Client based on Role
     active_client = client
@@ -102,32 +105,29 @@ async def generate_response(prompt_text: str, model: str = OPENAI_MODEL_CHAT, st
                 raise e
         else:
             try:
-                completion = await active_client.chat.completions.create(
-                    model=model,
-                    messages=[
-                        {"role": "system", "content": base_system},
-                        {"role": "user", "content": prompt_text}
-                    ]
+                return await AIGateway.complete(
+                    active_client, model, base_system, prompt_text,
+                    role=role, user_id=user_id, cache_ttl=cache_ttl
                 )
-                return completion.choices[0].message.content
+            except AIBudgetExceeded:
+                raise
             except Exception as e:
                 logger.error(f"AI Error with model {model}: {e}")
                 if model == "gpt-5.2" or "model" in str(e).lower():
                      logger.warning("Falling back to gpt-4o...")
-                     completion = await active_client.chat.completions.create(
-                        model="gpt-4o",
-                        messages=[
-                            {"role": "system", "content": base_system},
-                            {"role": "user", "content": prompt_text}
-                        ]
+                     return await AIGateway.complete(
+                        active_client, "gpt-4o", base_system, prompt_text,
+                        role=role, user_id=user_id, cache_ttl=cache_ttl
                     )
-                     return completion.choices[0].message.content
                 raise e
+    except AIBudgetExceeded as e:
+        logger.warning(f"AI token budget exceeded: {e}")
+        return "⚠️ Bugungi AI limitingiz tugadi. Iltimos, ertaga qayta urinib ko'ring."
     except Exception as e:
         logger.error(f"OpenAI API Error ({model}): {e}")
         return "⚠️ Kechirasiz, AI xizmatida xatolik yuz berdi."
 
-async def generate_answer_by_key(topic_key: str, custom_prompt: str = None) -> str:
+async def generate_answer_by_key(topic_key: str, custom_prompt: str = None, user_id: int = None, role: str = 'student') -> str:
     """
     Kalit so'z (topic_key) bo'yicha tayyor promptni yuborish.
     Agar custom_prompt berilsa, o'shandan foydalanadi (dictionary o'rniga).
@@ -141,9 +141,9 @@ async def generate_answer_by_key(topic_key: str, custom_prompt: str = None) -> s
     if not prompt:
         return "⚠️ Mavzu bo'yicha ma'lumot topilmadi."
     
-    return await generate_response(prompt, model=OPENAI_MODEL_TASKS)
+    return await generate_response(prompt, model=OPENAI_MODEL_TASKS, user_id=user_id, role=role)
 
-async def summarize_konspekt(text_content: str) -> str:
+async def summarize_konspekt(text_content: str, user_id: int = None) -> str:
     """
     Berilgan matnni 'Konspekt' prompti asosida tahlil qilish.
     Konspekt (murakkab) -> Mini (4o-mini)
@@ -151,7 +151,8 @@ async def summarize_konspekt(text_content: str) -> str:
     base_prompt = AI_PROMPTS.get("konspekt_prompt", "")
     full_prompt = f"{base_prompt}\n\nMATN:\n{text_content}"
     
-    return await generate_response(full_prompt, model=OPENAI_MODEL_TASKS)
+    # Bir xil hujjat qayta yuborilsa javob keshdan qaytadi (AIGateway)
+    return await generate_response(full_prompt, model=OPENAI_MODEL_TASKS, user_id=user_id)
 
 async def analyze_appeal(text_content: str) -> str:
     """
@@ -183,3 +184,19 @@ async def generate_reply_suggestion(appeal_text: str) -> str:
     )
     full_prompt = f"{base_prompt}{appeal_text}"
     return await generate_response(full_prompt, model=OPENAI_MODEL_TASKS)
+
+async def classify_texts(items: dict, instruction: str, batch_size: int = 100, user_id: int = None, role: str = 'staff') -> dict:
+    """
+    Ko'p matnni bir nechta katta so'rovda tasniflash (masalan murojaat mavzulari).
+    items: {id: text} -> {"id": "label"}
+    """
+    if not client:
+        return {}
+    base_system = (
+        "Sen Universitet xodimlari yordamchisisan. Matnlarni berilgan mavzular bo'yicha tasniflaysan. "
+        "Faqat so'ralgan JSON formatida javob ber."
+    )
+    return await AIGateway.classify_batch(
+        client, OPENAI_MODEL_TASKS, base_system, items, instruction,
+        batch_size=batch_size, role=role, user_id=user_id
+    )
@@ -66,3 +66,14 @@ class BannerAnalyticsService:
             except Exception as e:
                 logger.error(f"Error flushing banner analytics: {e}")
                 # We could try to restore buffer here, but for analytics, data loss is acceptable vs complex retry logic
+
+
+async def run_banner_analytics_flusher(interval: int = 60):
+    """Background loop (started in lifespan): writes buffered views/clicks every `interval` seconds."""
+    service = BannerAnalyticsService()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await service.flush()
+        except Exception as e:
+            logger.error(f"Banner analytics flusher error: {e}")
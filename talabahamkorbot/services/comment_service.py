@@ -0,0 +1,261 @@
+import base64
+import json
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from database.models import ChoyxonaComment, ChoyxonaCommentLike, ChoyxonaPost, Staff, Student
+
+logger = logging.getLogger(__name__)
+
+AuthorStudent = aliased(Student, name="author_student")
+AuthorStaff = aliased(Staff, name="author_staff")
+
+
+class CommentService:
+    """
+    Choyxona comment threads without ORM graphs:
+      - ranked top-level pages (likes_count DESC, created_at, id) via keyset cursor
+      - reply pages per parent (created_at, id)
+      - lean column projection (comment + author columns only)
+      - denormalized replies_count / liked_by_author maintained on write
+    """
+
+    DEFAULT_LIMIT = 20
+    MAX_LIMIT = 100
+
+    # ------------------------------------------------------------
+    # Cursors
+    # ------------------------------------------------------------
+
+    @staticmethod
+    def encode_cursor(values: list) -> str:
+        raw = json.dumps(values, default=lambda v: v.isoformat(), separators=(",", ":"))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor: Optional[str]) -> Optional[list]:
+        if not cursor:
+            return None
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            return json.loads(base64.urlsafe_b64decode(padded.encode()))
+        except Exception:
+            raise ValueError("Noto'g'ri cursor")
+
+    @classmethod
+    def _after(cls, cursor: Optional[str], size: int) -> Optional[list]:
+        """
+        Decoded keyset position: [*ints, created_at, id] with created_at parsed.
+        Any malformed value is a ValueError (API -> 400), never a TypeError/500.
+        """
+        after = cls.decode_cursor(cursor)
+        if after is None:
+            return None
+        try:
+            if len(after) != size:
+                raise ValueError
+            *counts, created_at, last_id = after
+            return [int(v) for v in counts] + [datetime.fromisoformat(created_at), int(last_id)]
+        except (TypeError, ValueError, KeyError):
+            raise ValueError("Noto'g'ri cursor")
+
+    # ------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------
+
+    @staticmethod
+    def _projection():
+        c = ChoyxonaComment
+        return (
+            select(
+                c.id, c.post_id, c.content, c.created_at, c.likes_count, c.replies_count, c.liked_by_author,
+                c.student_id, c.staff_id, c.reply_to_comment_id, c.reply_to_user_id, c.reply_to_staff_id,
+                AuthorStudent.full_name.label("s_full_name"),
+                AuthorStudent.short_name.label("s_short_name"),
+                AuthorStudent.username.label("s_username"),
+                AuthorStudent.image_url.label("s_image_url"),
+                AuthorStudent.hemis_role.label("s_role"),
+                AuthorStudent.is_premium.label("s_is_premium"),
+                AuthorStudent.custom_badge.label("s_custom_badge"),
+                AuthorStaff.full_name.label("f_full_name"),
+                AuthorStaff.short_name.label("f_short_name"),
+                AuthorStaff.username.label("f_username"),
+                AuthorStaff.image_url.label("f_image_url"),
+                AuthorStaff.role.label("f_role"),
+                AuthorStaff.is_premium.label("f_is_premium"),
+                AuthorStaff.custom_badge.label("f_custom_badge"),
+            )
+            .select_from(c)
+            .outerjoin(AuthorStudent, AuthorStudent.id == c.student_id)
+            .outerjoin(AuthorStaff, AuthorStaff.id == c.staff_id)
+        )
+
+    @classmethod
+    async def top_level_page(
+        cls, db: AsyncSession, post_id: int, cursor: Optional[str] = None, limit: int = DEFAULT_LIMIT
+    ) -> Tuple[list, Optional[str]]:
+        """Top-level comments ranked by likes. Returns (rows, next_cursor)."""
+        c = ChoyxonaComment
+        limit = max(1, min(limit, cls.MAX_LIMIT))
+        query = cls._projection().where(c.post_id == post_id, c.reply_to_comment_id.is_(None))
+
+        after = cls._after(cursor, 3)
+        if after:
+            likes, created_at, last_id = after
+            query = query.where(or_(
+                c.likes_count < likes,
+                and_(c.likes_count == likes, or_(
+                    c.created_at > created_at,
+                    and_(c.created_at == created_at, c.id > last_id),
+                )),
+            ))
+
+        query = query.order_by(c.likes_count.desc(), c.created_at, c.id).limit(limit + 1)
+        rows = (await db.execute(query)).all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = cls.encode_cursor([last.likes_count or 0, last.created_at, last.id])
+        return rows, next_cursor
+
+    @classmethod
+    async def replies_page(
+        cls, db: AsyncSession, parent_id: int, cursor: Optional[str] = None, limit: int = DEFAULT_LIMIT
+    ) -> Tuple[list, Optional[str]]:
+        """Direct replies of one comment, oldest first. Returns (rows, next_cursor)."""
+        c = ChoyxonaComment
+        limit = max(1, min(limit, cls.MAX_LIMIT))
+        query = cls._projection().where(c.reply_to_comment_id == parent_id)
+
+        after = cls._after(cursor, 2)
+        if after:
+            created_at, last_id = after
+            query = query.where(or_(
+                c.created_at > created_at,
+                and_(c.created_at == created_at, c.id > last_id),
+            ))
+
+        query = query.order_by(c.created_at, c.id).limit(limit + 1)
+        rows = (await db.execute(query)).all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = cls.encode_cursor([last.created_at, last.id])
+        return rows, next_cursor
+
+    @classmethod
+    async def all_comments(cls, db: AsyncSession, post_id: int) -> list:
+        """Flat, ranked list of every comment of a post (legacy clients)."""
+        c = ChoyxonaComment
+        query = cls._projection().where(c.post_id == post_id).order_by(c.likes_count.desc(), c.created_at, c.id)
+        return (await db.execute(query)).all()
+
+    @classmethod
+    async def get_row(cls, db: AsyncSession, comment_id: int):
+        return (await db.execute(cls._projection().where(ChoyxonaComment.id == comment_id))).first()
+
+    @staticmethod
+    async def liked_ids(db: AsyncSession, user, comment_ids: Iterable[int]) -> set:
+        """Which of these comments the current user liked (one query)."""
+        comment_ids = list(comment_ids)
+        if not comment_ids:
+            return set()
+        query = select(ChoyxonaCommentLike.comment_id).where(ChoyxonaCommentLike.comment_id.in_(comment_ids))
+        if isinstance(user, Staff):
+            query = query.where(ChoyxonaCommentLike.staff_id == user.id)
+        else:
+            query = query.where(ChoyxonaCommentLike.student_id == user.id)
+        return set((await db.execute(query)).scalars().all())
+
+    @staticmethod
+    async def reply_targets(db: AsyncSession, rows: list) -> Dict[int, dict]:
+        """
+        "Reply to" info for rows that are replies: {comment_id: {"username", "full_name", "short_name", "content"}}.
+        Parent comments are loaded in one query; the reply_to_user fallback (parent deleted) in at most two more.
+        """
+        parent_ids = {r.reply_to_comment_id for r in rows if r.reply_to_comment_id}
+        parents = {}
+        if parent_ids:
+            c = ChoyxonaComment
+            result = await db.execute(
+                select(
+                    c.id, c.content,
+                    AuthorStudent.username, AuthorStudent.full_name, AuthorStudent.short_name,
+                    AuthorStaff.username, AuthorStaff.full_name, AuthorStaff.short_name,
+                )
+                .select_from(c)
+                .outerjoin(AuthorStudent, AuthorStudent.id == c.student_id)
+                .outerjoin(AuthorStaff, AuthorStaff.id == c.staff_id)
+                .where(c.id.in_(parent_ids))
+            )
+            for pid, content, s_user, s_full, s_short, f_user, f_full, f_short in result.all():
+                is_student = s_full is not None or s_user is not None
+                parents[pid] = {
+                    "content": content,
+                    "username": s_user if is_student else f_user,
+                    "full_name": s_full if is_student else f_full,
+                    "short_name": s_short if is_student else f_short,
+                    "found": is_student or f_full is not None or f_user is not None,
+                }
+
+        orphan_students = {r.reply_to_user_id for r in rows
+                           if r.reply_to_user_id and r.reply_to_comment_id not in parents}
+        orphan_staff = {r.reply_to_staff_id for r in rows
+                        if r.reply_to_staff_id and not r.reply_to_user_id and r.reply_to_comment_id not in parents}
+        users: Dict[tuple, dict] = {}
+        for model, ids, kind in ((Student, orphan_students, "s"), (Staff, orphan_staff, "f")):
+            if not ids:
+                continue
+            result = await db.execute(
+                select(model.id, model.username, model.full_name, model.short_name).where(model.id.in_(ids))
+            )
+            for uid, username, full_name, short_name in result.all():
+                users[(kind, uid)] = {"username": username, "full_name": full_name, "short_name": short_name}
+
+        targets = {}
+        for r in rows:
+            if r.reply_to_comment_id in parents:
+                targets[r.id] = parents[r.reply_to_comment_id]
+            elif r.reply_to_user_id and ("s", r.reply_to_user_id) in users:
+                targets[r.id] = dict(users[("s", r.reply_to_user_id)], content=None, found=True)
+            elif r.reply_to_staff_id and ("f", r.reply_to_staff_id) in users:
+                targets[r.id] = dict(users[("f", r.reply_to_staff_id)], content=None, found=True)
+        return targets
+
+    # ------------------------------------------------------------
+    # Writes (denormalized flags)
+    # ------------------------------------------------------------
+
+    @staticmethod
+    def is_post_author(post_author: tuple, user) -> bool:
+        """post_author = (student_id, staff_id) of the post."""
+        student_id, staff_id = post_author
+        if staff_id:
+            return isinstance(user, Staff) and user.id == staff_id
+        return bool(student_id) and not isinstance(user, Staff) and user.id == student_id
+
+    @staticmethod
+    async def get_post_author(db: AsyncSession, post_id: int) -> tuple:
+        row = (await db.execute(
+            select(ChoyxonaPost.student_id, ChoyxonaPost.staff_id).where(ChoyxonaPost.id == post_id)
+        )).first()
+        return tuple(row) if row else (None, None)
+
+    @staticmethod
+    async def adjust_replies_count(db: AsyncSession, parent_id: Optional[int], delta: int):
+        if not parent_id:
+            return
+        await db.execute(
+            update(ChoyxonaComment)
+            .where(ChoyxonaComment.id == parent_id)
+            .values(replies_count=ChoyxonaComment.replies_count + delta)
+        )
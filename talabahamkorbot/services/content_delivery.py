@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import redis.asyncio as redis
+from sqlalchemy import desc, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import REDIS_URL
+from database.models import Announcement, AnnouncementRead, Banner
+
+logger = logging.getLogger(__name__)
+
+
+class ContentDeliveryService:
+    """
+    Active announcements / banners for app launch:
+      - per-university snapshots cached in process memory
+      - versioned invalidation: invalidate() bumps a Redis counter, every worker
+        notices it within VERSION_CHECK_INTERVAL and drops its snapshots
+      - unread = cached candidates minus the user's reads among those candidates
+        (one indexed lookup on announcement_read_status, skipped if nothing is active)
+      - banner impressions go to the BannerAnalyticsService buffer, not the DB
+    """
+
+    VERSION_KEY = "content_delivery:version"
+    VERSION_CHECK_INTERVAL = 5       # sekund
+    CACHE_TTL = 300                  # Redis ishlamasa ham snapshot shu muddatda yangilanadi
+
+    _redis = None
+    _version: Optional[str] = None
+    _version_checked_at = 0.0
+    _cache: Dict[str, tuple] = {}    # key -> (expires_at, data)
+    _locks: Dict[str, asyncio.Lock] = {}
+
+    @classmethod
+    async def get_redis(cls):
+        if cls._redis is None:
+            cls._redis = redis.from_url(REDIS_URL, decode_responses=True)
+        return cls._redis
+
+    # ------------------------------------------------------------
+    # Versioning
+    # ------------------------------------------------------------
+
+    @classmethod
+    async def _sync_version(cls):
+        now = time.monotonic()
+        if now - cls._version_checked_at < cls.VERSION_CHECK_INTERVAL:
+            return
+        cls._version_checked_at = now
+        try:
+            r = await cls.get_redis()
+            version = await r.get(cls.VERSION_KEY)
+        except Exception as e:
+            logger.warning(f"Content version check failed (TTL fallback): {e}")
+            return
+        if version != cls._version:
+            cls._version = version
+            cls._cache.clear()
+
+    @classmethod
+    async def invalidate(cls):
+        """Announcement / banner yaratilganda, yoqilganda yoki o'chirilganda chaqiriladi."""
+        cls._cache.clear()
+        try:
+            r = await cls.get_redis()
+            cls._version = str(await r.incr(cls.VERSION_KEY))
+        except Exception as e:
+            logger.warning(f"Content version bump failed (local only): {e}")
+
+    @classmethod
+    async def _cached(cls, key: str, loader):
+        await cls._sync_version()
+        item = cls._cache.get(key)
+        if item and item[0] > time.monotonic():
+            return item[1]
+
+        lock = cls._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            item = cls._cache.get(key)
+            if item and item[0] > time.monotonic():
+                return item[1]
+            data = await loader()
+            cls._cache[key] = (time.monotonic() + cls.CACHE_TTL, data)
+            return data
+
+    # ------------------------------------------------------------
+    # Announcements
+    # ------------------------------------------------------------
+
+    @classmethod
+    async def active_announcements(cls, db: AsyncSession, university_id: Optional[int]) -> List[dict]:
+        """Global + university announcements, priority order. Expiry is applied on read."""
+        async def load():
+            result = await db.execute(
+                select(
+                    Announcement.id, Announcement.title, Announcement.content, Announcement.image_url,
+                    Announcement.link, Announcement.priority, Announcement.created_at, Announcement.expires_at,
+                )
+                .where(
+                    Announcement.is_active == True,
+                    or_(Announcement.expires_at == None, Announcement.expires_at > datetime.utcnow()),
+                    or_(Announcement.university_id == None, Announcement.university_id == university_id)
+                )
+                .order_by(desc(Announcement.priority), desc(Announcement.created_at))
+            )
+            return [dict(row._mapping) for row in result.all()]
+
+        items = await cls._cached(f"ann:{university_id}", load)
+        now = datetime.utcnow()
+        return [a for a in items if a["expires_at"] is None or a["expires_at"] > now]
+
+    @classmethod
+    async def unread_announcements(cls, db: AsyncSession, user_id: int, university_id: Optional[int]) -> List[dict]:
+        candidates = await cls.active_announcements(db, university_id)
+        if not candidates:
+            return []
+        result = await db.execute(
+            select(AnnouncementRead.announcement_id).where(
+                AnnouncementRead.user_id == user_id,
+                AnnouncementRead.announcement_id.in_([a["id"] for a in candidates])
+            )
+        )
+        read = set(result.scalars().all())
+        return [a for a in candidates if a["id"] not in read]
+
+    # ------------------------------------------------------------
+    # Banners
+    # ------------------------------------------------------------
+
+    @classmethod
+    async def active_banners(cls, db: AsyncSession) -> List[dict]:
+        """All active banners, newest first."""
+        async def load():
+            result = await db.execute(
+                select(Banner.id, Banner.image_file_id, Banner.link, Banner.created_at)
+                .where(Banner.is_active == True)
+                .order_by(desc(Banner.id))
+            )
+            return [dict(row._mapping) for row in result.all()]
+
+        return await cls._cached("banners", load)
+
+    @staticmethod
+    async def record_banner_view(banner_id: int):
+        from services.banner_analytics import BannerAnalyticsService
+        await BannerAnalyticsService().increment_view(banner_id)
+
+    @staticmethod
+    async def record_banner_click(banner_id: int):
+        from services.banner_analytics import BannerAnalyticsService
+        await BannerAnalyticsService().increment_click(banner_id)
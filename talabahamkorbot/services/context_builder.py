@@ -1,42 +1,208 @@
 
 import logging
+import hashlib
+import json
+import time
+from dataclasses import dataclass, asdict
 from datetime import datetime
+from typing import Dict, List, Optional
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from database.models import Student, UserActivity
-# from services.hemis_service import get_student_schedule
-# from services.hemis_service import get_grades # Need to implement or check existance
+from database.models import Student, UserActivity, StudentCache
+from services import student_cache_codec
 
 import asyncio
 from celery_app import app as celery_app
-from database.db_connect import AsyncSessionLocal
+from database.db_connect import BatchSessionLocal
 
 logger = logging.getLogger(__name__)
 
+# Profile fields that end up in the context text (and therefore in the fingerprint)
+PROFILE_FIELDS = (
+    "full_name", "university_name", "faculty_name", "specialty_name", "level_name",
+    "semester_name", "group_number", "education_type", "education_form", "payment_form",
+    "missed_hours", "missed_hours_excused", "missed_hours_unexcused",
+)
+
+
+@dataclass
+class ContextUpdateStats:
+    total: int = 0
+    changed: int = 0
+    unchanged: int = 0
+    errors: int = 0
+    batches: int = 0
+    duration_sec: float = 0.0
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
 @celery_app.task(name="daily_context_update")
 def run_daily_context_update():
     """Celery task wrapper for global context update"""
     return asyncio.run(bulk_update_contexts())
 
-async def bulk_update_contexts():
-    """Tashkent vaqti bilan 03:00-04:00 orasi (UTC 22:00-23:00)"""
-    logger.info("🕛 Starting Global Daily AI Context Update...")
-    async with AsyncSessionLocal() as session:
-        # Get active students
-        stmt = select(Student).where(Student.is_active == True)
-        result = await session.execute(stmt)
-        students = result.scalars().all()
-        
-        count = 0
+
+def context_fingerprint(student: Student, grades: Optional[list], activities: List[tuple]) -> str:
+    """Hash of everything the context text is built from."""
+    payload = {
+        "p": [getattr(student, f, None) for f in PROFILE_FIELDS],
+        "g": _grade_lines(grades or []),
+        # None (masalan, status yo'q) bilan str ni solishtirib bo'lmaydi
+        "a": sorted(activities, key=lambda a: tuple("" if v is None else str(v) for v in a)),
+    }
+    raw = json.dumps(payload, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def _grade_lines(grades_data: list) -> List[str]:
+    g_lines = []
+    for g in grades_data:
+        if not isinstance(g, dict):
+            continue
+        sub_name = "Fan"
+        score = "0"
+
+        if isinstance(g.get("subject"), dict):
+            sub_name = g.get("subject", {}).get("name", "Fan")
+
+        # Check for 5-grade system flag or explicit grade key
+        if g.get("is_5_grade"):
+            val = g.get("total_score", 0)
+            score = f"{val} baho"
+        elif "total_score" in g:
+            score = f"{g['total_score']} ball"
+        elif "grade" in g:
+             score = f"{g['grade']} baho"
+
+        g_lines.append(f"- {sub_name}: {score}")
+    return g_lines
+
+
+def render_student_context(student: Student, grades: Optional[list], activities: List[tuple]) -> str:
+    """
+    Talaba haqidagi ma'lumotlardan AI uchun matn yig'adi (DB/HEMIS ga murojaat qilmaydi).
+    activities: [(name, category, status), ...]
+    """
+    # 1. Shaxsiy Ma'lumotlar
+    context_lines = [
+        f"TALABA MA'LUMOTLARI:",
+        f"Ism: {student.full_name}",
+        f"Universitet: {student.university_name or 'Namalum'}",
+        f"Fakultet: {student.faculty_name or 'Namalum'}",
+        f"Yo'nalish: {student.specialty_name or 'Namalum'}",
+        f"Bosqich: {student.level_name or 'Namalum'}, {student.semester_name or 'Namalum'}",
+        f"Guruh: {student.group_number or 'Namalum'}",
+        f"Ta'lim turi: {student.education_type}, {student.education_form}",
+        f"To'lov shakli: {student.payment_form}",
+        f"Qoldirilgan soatlar: {student.missed_hours}",
+    ]
+
+    # 2. O'zlashtirish (Baholar) - CURRENT SEMESTER
+    g_lines = _grade_lines(grades or [])
+    grades_text = "\n".join(g_lines) if g_lines else "Ma'lumot yo'q"
+    context_lines.append(f"\nBAHOLAR (Joriy):\n{grades_text}")
+
+    # 3. Faolliklar
+    if activities:
+        context_lines.append("\nFAOLLIKLARI:")
+        for name, category, status in activities:
+            context_lines.append(f"- {name} ({category}): {status}")
+
+    # 4. Yakuniy matn
+    return "\n".join(context_lines)
+
+
+async def _load_cached_grades(session: AsyncSession, student_ids: List[int]) -> Dict[int, list]:
+    """Latest-semester cached subject list per student (one query for the whole batch)."""
+    rows = (await session.execute(
+        select(StudentCache.student_id, StudentCache.key, StudentCache.data,
+               StudentCache.payload, StudentCache.schema_version)
+        .where(StudentCache.student_id.in_(student_ids), StudentCache.key.like("subjects_%"))
+    )).all()
+
+    best: Dict[int, tuple] = {}
+    for sid, key, data, payload, version in rows:
+        code = key[len("subjects_"):]
+        rank = int(code) if code.isdigit() else -1  # "subjects_all" only as fallback
+        if sid not in best or rank > best[sid][0]:
+            best[sid] = (rank, data, payload, version)
+    # Faqat tanlangan qatorlar decode qilinadi
+    return {sid: student_cache_codec.raw_of(data, payload, version) for sid, (_, data, payload, version) in best.items()}
+
+
+async def _load_activities(session: AsyncSession, student_ids: List[int]) -> Dict[int, List[tuple]]:
+    rows = (await session.execute(
+        select(UserActivity.student_id, UserActivity.name, UserActivity.category, UserActivity.status)
+        .where(UserActivity.student_id.in_(student_ids))
+        .order_by(UserActivity.id)
+    )).all()
+    result: Dict[int, List[tuple]] = {}
+    for sid, name, category, status in rows:
+        result.setdefault(sid, []).append((name, category, status))
+    return result
+
+
+async def _update_batch(student_ids: List[int], stats: ContextUpdateStats):
+    """Rebuilds contexts for one batch in its own session and commits once."""
+    async with BatchSessionLocal() as session:
+        students = (await session.scalars(select(Student).where(Student.id.in_(student_ids)))).all()
+        grades = await _load_cached_grades(session, student_ids)
+        activities = await _load_activities(session, student_ids)
+
+        now = datetime.utcnow()
         for student in students:
             try:
-                await build_student_context(session, student.id)
-                count += 1
+                acts = activities.get(student.id, [])
+                fp = context_fingerprint(student, grades.get(student.id), acts)
+                if fp == student.ai_context_hash and student.ai_context:
+                    stats.unchanged += 1
+                    continue
+                student.ai_context = render_student_context(student, grades.get(student.id), acts)
+                student.ai_context_hash = fp
+                student.last_context_update = now
+                stats.changed += 1
             except Exception as e:
+                stats.errors += 1
                 logger.error(f"Context update failed for student {student.id}: {e}")
-        
+
         await session.commit()
-    logger.info(f"✅ Daily Context Update Finished. Updated {count} students.")
+        stats.batches += 1
+
+
+async def bulk_update_contexts(batch_size: int = 500, concurrency: int = 4) -> dict:
+    """
+    Tashkent vaqti bilan 03:00-04:00 orasi (UTC 22:00-23:00)
+    Incremental: only students whose context inputs (profile, cached grades, activities)
+    changed since the last build are rewritten. Batches run concurrently, each commits itself.
+    """
+    logger.info("🕛 Starting Global Daily AI Context Update...")
+    started = time.monotonic()
+    stats = ContextUpdateStats()
+
+    async with BatchSessionLocal() as session:
+        ids = (await session.scalars(
+            select(Student.id).where(Student.is_active == True).order_by(Student.id)
+        )).all()
+    stats.total = len(ids)
+
+    sem = asyncio.Semaphore(concurrency)
+
+    async def run(chunk):
+        async with sem:
+            try:
+                await _update_batch(chunk, stats)
+            except Exception as e:
+                stats.errors += len(chunk)
+                logger.error(f"Context batch failed ({chunk[0]}..{chunk[-1]}): {e}")
+
+    await asyncio.gather(*(run(list(ids[i:i + batch_size])) for i in range(0, len(ids), batch_size)))
+
+    stats.duration_sec = round(time.monotonic() - started, 2)
+    logger.info(f"✅ Daily Context Update Finished: {stats.as_dict()}")
+    return stats.as_dict()
+
 
 async def build_student_context(session: AsyncSession, student_id: int) -> str:
     """
@@ -50,127 +216,47 @@ async def build_student_context(session: AsyncSession, student_id: int) -> str:
     if not student:
         return ""
 
-    
-    # 0. Avto-Login va Token Tekshiruvi
     from services.hemis_service import HemisService
-    from aiogram import Bot
-    from config import BOT_TOKEN
-    import os
-    
-    # Initialize bot for notifications (hacky but works for service layer)
-    # Better to pass bot instance, but for now strict implementation
-    bot = Bot(token=BOT_TOKEN)
 
+    # 0. Token Tekshiruvi va Ism yangilash
+    # [STATELESS] If token is invalid/expired, we CANNOT refresh it without password.
+    current_token = getattr(student, 'hemis_token', None)
     try:
-        # Check if token is valid by fetching ME
-        me_data = None
-        current_token = getattr(student, 'hemis_token', None)
-        
         if current_token:
-            # Try to get data with existing token
             me_data = await HemisService.get_me(current_token)
-        
-        # [STATELESS] If token is invalid/expired, we CANNOT refresh it without password.
-        # We just skip the update and log it. The user must login again in the app.
-        if not me_data:
-            logger.warning(f"Context Update: Token invalid or missing for student {student.id}. Skipping auto-login (Stateless Mode).")
-            # Optional: Send notification to user to re-login?
-            # For now, just skip to avoid spamming.
-
-        # Update Name from latest data
-        if me_data:
-             f_name_parts = [
-                 me_data.get('firstname', ''), 
-                 me_data.get('lastname', ''), 
-                 me_data.get('fathername', '')
-             ]
-             f_name = " ".join(filter(None, f_name_parts)).strip()
-             if f_name:
-                 student.full_name = f_name
-
+            if me_data:
+                f_name_parts = [
+                    me_data.get('firstname', ''),
+                    me_data.get('lastname', ''),
+                    me_data.get('fathername', '')
+                ]
+                f_name = " ".join(filter(None, f_name_parts)).strip()
+                if f_name:
+                    student.full_name = f_name
+            else:
+                logger.warning(f"Context Update: Token invalid for student {student.id}. Skipping live data (Stateless Mode).")
     except Exception as e:
         logger.error(f"Error in Context Update (Stateless): {e}")
-    finally:
-        await bot.session.close() # Important to close bot session
 
-    # 1. Shaxsiy Ma'lumotlar
-    context_lines = [
-        f"TALABA MA'LUMOTLARI:",
-        f"Ism: {student.full_name}",
-        f"Universitet: {student.university_name or 'Namalum'}",
-        f"Fakultet: {student.faculty_name or 'Namalum'}",
-        f"Yo'nalish: {student.specialty_name or 'Namalum'}",
-        f"Bosqich: {student.level_name or 'Namalum'}, {student.semester_name or 'Namalum'}",
-        f"Guruh: {student.group_number or 'Namalum'}",
-        f"Ta'lim turi: {student.education_type}, {student.education_form}",
-        f"To'lov shakli: {student.payment_form}",
-        f"Qoldirilgan soatlar: {student.missed_hours}",
-    ]
-
-    # 2. O'zlashtirish (Baholar) - CURRENT SEMESTER & GPA
-    # Try fetching via API first
-    grades_text = "Ma'lumot yo'q"
+    # 1. Baholar: live (token bo'lsa), aks holda keshdan
+    grades_data = None
     try:
-        if student.hemis_token:
-            # A. API Method
-            grades_data = await HemisService.get_student_subject_list(student.hemis_token)
-            
-            # [STATELESS] No scraping fallback because we don't have password.
-            
-            if grades_data:
-                g_lines = []
-                for g in grades_data:
-                    sub_name = "Fan"
-                    score = "0"
-                    
-                    if isinstance(g.get("subject"), dict):
-                        sub_name = g.get("subject", {}).get("name", "Fan")
-                    
-                    # Check for 5-grade system flag or explicit grade key
-                    if g.get("is_5_grade"):
-                        val = g.get("total_score", 0)
-                        score = f"{val} baho"
-                    elif "total_score" in g:
-                        score = f"{g['total_score']} ball"
-                    elif "grade" in g:
-                         score = f"{g['grade']} baho"
-                    
-                    g_lines.append(f"- {sub_name}: {score}")
-                
-                if g_lines:
-                    grades_text = "\n".join(g_lines)
+        if current_token:
+            grades_data = await HemisService.get_student_subject_list(current_token)
     except Exception as e:
         logger.error(f"Context Grade Fetch Error: {e}")
+    if not grades_data:
+        grades_data = (await _load_cached_grades(session, [student.id])).get(student.id)
 
-    context_lines.append(f"\nBAHOLAR (Joriy):\n{grades_text}")
-
-    # 3. Dars Jadvali (Bugun va Ertaga)
-    # Jadvalni olish uchun login/parol kerak emas, jmcu api ochiq
-    # Lekin bizda student uchun token kerak bo'lishi mumkin.
-    # Hozircha statik yoki oxirgi saqlangan ma'lumotni olishga harakat qilamiz.
-    # Agar jadval servisi bo'lsa:
-    # try:
-    #     schedule = await get_schedule(student.hemis_token)
-    #     context_lines.append(f"\nDARS JADVALI: {schedule}")
-    # except:
-    #     pass
+    # 2. Faolliklar
+    activities = (await _load_activities(session, [student.id])).get(student.id, [])
 
-    # 3. Faolliklar
-    stmt_act = select(UserActivity).where(UserActivity.student_id == student_id)
-    res_act = await session.execute(stmt_act)
-    activities = res_act.scalars().all()
-    
-    if activities:
-        context_lines.append("\nFAOLLIKLARI:")
-        for act in activities:
-            context_lines.append(f"- {act.name} ({act.category}): {act.status}")
+    full_text = render_student_context(student, grades_data, activities)
 
-    # 4. Yakuniy matn
-    full_text = "\n".join(context_lines)
-    
     # Bazaga saqlash
     student.ai_context = full_text
+    student.ai_context_hash = context_fingerprint(student, grades_data, activities)
     student.last_context_update = datetime.utcnow()
     # session.add(student) # Caller commits
-    
+
     return full_text
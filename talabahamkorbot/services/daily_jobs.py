@@ -0,0 +1,112 @@
+import asyncio
+import importlib
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+import redis.asyncio as redis
+
+from config import REDIS_URL
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class DailyJob:
+    name: str
+    target: str             # "module:function" (async, no arguments)
+    hour: int               # server local time, as the APScheduler cron jobs used
+    minute: int
+    at_startup: bool = False
+
+
+class DailyJobScheduler:
+    """
+    Daily maintenance jobs as lifespan background loops (like the activity/banner flushers).
+    The APScheduler instance in main.py is never started, so jobs must not rely on it.
+    With several uvicorn workers a Redis lock (SET NX per job and day) lets only one of
+    them run a job; if Redis is down every worker runs it (all jobs are idempotent).
+    """
+
+    JOBS: List[DailyJob] = [
+        # Log tables: next monthly partitions, archive + drop expired months
+        DailyJob("log_partitions", "services.partition_manager:run_log_partition_maintenance", 3, 0,
+                 at_startup=True),
+        # Expired action tokens + legacy security_tokens rows
+        DailyJob("security_token_cleanup", "services.token_service:run_security_token_cleanup", 3, 30),
+        # Follower/following counters drifted from the follow rows
+        DailyJob("follow_counter_reconciliation",
+                 "services.social_graph_service:run_follow_counter_reconciliation", 4, 0),
+        # Tyutor KPI leaderboard (joriy chorak, barcha universitetlar)
+        DailyJob("tutor_kpi_recompute", "services.kpi_calculator:run_tutor_kpi_recompute", 4, 30),
+        # Username Bloom filter: drops bits of released usernames. The startup build stays
+        # in the lifespan - every worker has to attach to the shared filter.
+        DailyJob("username_index_rebuild", "services.username_index:run_username_index_rebuild", 5, 0),
+    ]
+
+    LOCK_PREFIX = "daily_job:"
+    DAY_LOCK_TTL = 23 * 3600
+    STARTUP_LOCK_TTL = 600
+
+    _redis = None
+    _tasks: List[asyncio.Task] = []
+
+    @classmethod
+    async def get_redis(cls):
+        if cls._redis is None:
+            cls._redis = redis.from_url(REDIS_URL, decode_responses=False)
+        return cls._redis
+
+    @staticmethod
+    def seconds_until(hour: int, minute: int, now: Optional[datetime] = None) -> float:
+        now = now or datetime.now()
+        target = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if target <= now:
+            target += timedelta(days=1)
+        return (target - now).total_seconds()
+
+    @classmethod
+    async def _acquire(cls, key: str, ttl: int) -> bool:
+        try:
+            r = await cls.get_redis()
+            return bool(await r.set(cls.LOCK_PREFIX + key, b"1", nx=True, ex=ttl))
+        except Exception:
+            return True  # Redis yo'q: har bir worker o'zi bajaradi
+
+    @classmethod
+    async def run_once(cls, job: DailyJob, lock_key: str, ttl: int):
+        """Runs the job unless another worker already holds `lock_key`. Errors are logged, not raised."""
+        if not await cls._acquire(lock_key, ttl):
+            return None
+        module, func = job.target.split(":")
+        started = datetime.now()
+        try:
+            result = await getattr(importlib.import_module(module), func)()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Daily job {job.name} failed: {e}")
+            return None
+        logger.info(f"⏰ Daily job {job.name} done in {(datetime.now() - started).total_seconds():.1f}s: {result}")
+        return result
+
+    @classmethod
+    async def _loop(cls, job: DailyJob):
+        if job.at_startup:
+            await cls.run_once(job, f"{job.name}:startup", cls.STARTUP_LOCK_TTL)
+        while True:
+            await asyncio.sleep(cls.seconds_until(job.hour, job.minute))
+            await cls.run_once(job, f"{job.name}:{datetime.now():%Y-%m-%d}", cls.DAY_LOCK_TTL)
+
+    @classmethod
+    def start(cls) -> List[asyncio.Task]:
+        """Called from the FastAPI lifespan: one background task per job."""
+        cls._tasks = [asyncio.create_task(cls._loop(job), name=f"daily:{job.name}") for job in cls.JOBS]
+        return cls._tasks
+
+    @classmethod
+    def stop(cls):
+        for task in cls._tasks:
+            task.cancel()
+        cls._tasks = []
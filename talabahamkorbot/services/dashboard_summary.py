@@ -0,0 +1,228 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from itertools import chain
+from typing import Dict, Optional, Set
+
+import redis.asyncio as redis
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from config import REDIS_URL
+from database.db_connect import AsyncSessionLocal
+from database.models import (
+    ClubMembership, Election, RatingActivation, RatingRecord, StudentDashboardSummary, UserActivity,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class DashboardSummaryService:
+    """
+    Student dashboard without per-open aggregation:
+      - counters live in student_dashboard_summary (one PK lookup per load) and are
+        recomputed after commits touching activities, club memberships or rating votes
+        (ORM events below, so API and bot writes are both covered)
+      - election / rating state is per university, kept as a short-lived process
+        snapshot and dropped on Election / RatingActivation commits
+      - GPA and attendance come from the Student row the auth dependency already loaded
+      - refresh=true queues the HEMIS sync (one at a time per student, Redis lock)
+        and the current snapshot is returned right away
+    """
+
+    FLAGS_TTL = 30                   # sekund (boshqa workerlar uchun ham shu muddat)
+    SUMMARY_MAX_AGE = 86400          # event o'tkazib yuborilgan bo'lsa ham kuniga bir marta qayta hisoblanadi
+    REFRESH_KEY = "dashboard_refresh:{}"
+    REFRESH_TTL = 120
+
+    _redis = None
+    _flags: Dict[int, tuple] = {}    # university_id -> (expires_at, flags)
+    _refreshing: Set[int] = set()    # Redis ishlamasa
+    _tasks: Set[asyncio.Task] = set()
+
+    @classmethod
+    async def get_redis(cls):
+        if cls._redis is None:
+            cls._redis = redis.from_url(REDIS_URL, decode_responses=True)
+        return cls._redis
+
+    # ------------------------------------------------------------
+    # Per-student counters
+    # ------------------------------------------------------------
+
+    @staticmethod
+    async def recompute(student_id: int) -> StudentDashboardSummary:
+        """
+        Own session (a GET must not commit the caller's request session) and an upsert,
+        so concurrent first loads of the same student do not collide on the PK.
+        """
+        async with AsyncSessionLocal() as session:
+            return await DashboardSummaryService._recompute(session, student_id)
+
+    @staticmethod
+    async def _recompute(session: AsyncSession, student_id: int) -> StudentDashboardSummary:
+        counts = (await session.execute(select(
+            select(func.count(UserActivity.id))
+            .where(UserActivity.student_id == student_id).scalar_subquery(),
+            select(func.count(UserActivity.id))
+            .where(UserActivity.student_id == student_id, UserActivity.status == "approved").scalar_subquery(),
+            select(func.count(ClubMembership.id))
+            .where(ClubMembership.student_id == student_id).scalar_subquery(),
+        ))).one()
+        voted = (await session.execute(
+            select(RatingRecord.activation_id).distinct()
+            .where(RatingRecord.user_id == student_id, RatingRecord.activation_id != None)
+        )).scalars().all()
+
+        values = dict(zip(("activities_count", "activities_approved_count", "clubs_count"), (c or 0 for c in counts)))
+        values.update(voted_activation_ids=sorted(voted), updated_at=datetime.utcnow())
+
+        dialect = session.bind.dialect.name if session.bind is not None else "postgresql"
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        await session.execute(
+            dialect_insert(StudentDashboardSummary)
+            .values(student_id=student_id, **values)
+            .on_conflict_do_update(index_elements=["student_id"], set_=values)
+        )
+        row = await session.get(StudentDashboardSummary, student_id, populate_existing=True)
+        await session.commit()
+        return row
+
+    @classmethod
+    async def recompute_many(cls, student_ids):
+        for sid in student_ids:
+            try:
+                await cls.recompute(sid)
+            except Exception as e:
+                logger.error(f"Dashboard summary recompute failed for {sid}: {e}")
+
+    @classmethod
+    async def get_summary(cls, db: AsyncSession, student_id: int) -> StudentDashboardSummary:
+        row = await db.get(StudentDashboardSummary, student_id)
+        if row is None or (datetime.utcnow() - row.updated_at).total_seconds() > cls.SUMMARY_MAX_AGE:
+            # Birinchi ochilish: bir marta hisoblanadi, keyin eventlar yangilaydi
+            row = await cls.recompute(student_id)
+        return row
+
+    # ------------------------------------------------------------
+    # Per-university election / rating snapshot
+    # ------------------------------------------------------------
+
+    @classmethod
+    async def university_flags(cls, db: AsyncSession, university_id: Optional[int]) -> dict:
+        empty = {"election_id": None, "activations": []}
+        if not university_id:
+            return empty
+        item = cls._flags.get(university_id)
+        if item and item[0] > time.monotonic():
+            return item[1]
+
+        # Latest active election counts only while its deadline has not passed (get_election_info)
+        election = (await db.execute(
+            select(Election.id, Election.deadline)
+            .where(Election.university_id == university_id, Election.status == "active")
+            .order_by(Election.created_at.desc()).limit(1)
+        )).first()
+        election_id = None
+        if election and (not election.deadline or election.deadline > datetime.utcnow()):
+            election_id = election.id
+        activations = (await db.execute(
+            select(RatingActivation.id, RatingActivation.role_type, RatingActivation.title,
+                   RatingActivation.questions, RatingActivation.expires_at)
+            .where(RatingActivation.university_id == university_id, RatingActivation.is_active == True)
+            .order_by(RatingActivation.created_at.desc())
+        )).all()
+
+        flags = {"election_id": election_id, "activations": [a._asdict() for a in activations]}
+        cls._flags[university_id] = (time.monotonic() + cls.FLAGS_TTL, flags)
+        return flags
+
+    # ------------------------------------------------------------
+    # HEMIS refresh (non-blocking)
+    # ------------------------------------------------------------
+
+    @classmethod
+    async def request_refresh(cls, student_id: int) -> bool:
+        """Starts a background HEMIS sync unless one is running; True while refreshing."""
+        if student_id in cls._refreshing:
+            return True
+        try:
+            r = await cls.get_redis()
+            if not await r.set(cls.REFRESH_KEY.format(student_id), "1", nx=True, ex=cls.REFRESH_TTL):
+                return True  # boshqa worker allaqachon yangilayapti
+        except Exception as e:
+            logger.warning(f"Dashboard refresh lock failed (local): {e}")
+
+        cls._refreshing.add(student_id)
+        task = asyncio.create_task(cls._run_sync(student_id))
+        cls._tasks.add(task)
+        task.add_done_callback(cls._tasks.discard)
+        return True
+
+    @classmethod
+    async def _run_sync(cls, student_id: int):
+        try:
+            from services.sync_service import sync_student_data
+            async with AsyncSessionLocal() as session:
+                await sync_student_data(session, student_id)
+                await session.commit()
+        except Exception as e:
+            logger.error(f"Dashboard HEMIS sync failed for {student_id}: {e}")
+        finally:
+            cls._refreshing.discard(student_id)
+            try:
+                r = await cls.get_redis()
+                await r.delete(cls.REFRESH_KEY.format(student_id))
+            except Exception:
+                pass
+
+
+# ------------------------------------------------------------
+# Domain events: committed writes schedule a recompute of the touched
+# students' counters and drop changed university snapshots.
+# ------------------------------------------------------------
+
+_DIRTY_KEY = "dashboard_dirty"
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_dirty(session, flush_context):
+    students, universities = set(), set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, (UserActivity, ClubMembership)):
+            students.add(obj.student_id)
+        elif isinstance(obj, RatingRecord):
+            students.add(obj.user_id)
+        elif isinstance(obj, (Election, RatingActivation)):
+            universities.add(obj.university_id)
+    if students or universities:
+        dirty = session.info.setdefault(_DIRTY_KEY, (set(), set()))
+        dirty[0].update(s for s in students if s)
+        dirty[1].update(u for u in universities if u)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_dirty(session):
+    dirty = session.info.pop(_DIRTY_KEY, None)
+    if not dirty:
+        return
+    students, universities = dirty
+    for uid in universities:
+        DashboardSummaryService._flags.pop(uid, None)
+    if students:
+        try:
+            task = asyncio.get_running_loop().create_task(DashboardSummaryService.recompute_many(sorted(students)))
+            DashboardSummaryService._tasks.add(task)
+            task.add_done_callback(DashboardSummaryService._tasks.discard)
+        except RuntimeError:
+            pass  # sinxron kontekst: keyingi o'qishda eskirgan bo'lishi mumkin
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_dirty(session):
+    session.info.pop(_DIRTY_KEY, None)
@@ -0,0 +1,347 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import zlib
+from typing import Dict, List, Optional
+
+import redis.asyncio as redis
+
+from config import REDIS_URL
+
+logger = logging.getLogger(__name__)
+
+EMPLOYEE_LIST_URL = "https://student.jmcu.uz/rest/v1/data/employee-list"
+
+# Fields of an employee-list item used after lookup (verify_staff_role_from_hemis)
+KEEP_FIELDS = (
+    "id", "employee_id_number", "pinfl", "jshshir", "passport_pin", "full_name",
+    "staffPosition", "department", "tutorGroups", "phone", "phone_number", "birth_date", "birthDate",
+)
+
+
+class DirectoryUnavailable(Exception):
+    """HEMIS employee-list request failed (network error / non-200): not the same as "not found"."""
+
+
+def _norm(value) -> str:
+    return str(value or "").strip().lower()
+
+
+def normalize_name(name: str) -> str:
+    """Same loose form as HemisService._normalize_name (o'/g', x/h, no spaces/punctuation)."""
+    n = _norm(name).replace("‘", "'").replace("’", "'").replace("`", "'").replace("'", "")
+    n = n.replace("o'", "o").replace("g'", "g").replace("h", "x")
+    return n.replace(" ", "").replace("-", "").replace(".", "")
+
+
+def pinfl_of(employee: dict) -> str:
+    return _norm(employee.get("pinfl") or employee.get("jshshir") or employee.get("passport_pin"))
+
+
+class DirectoryIndex:
+    """Hash indexes over one employee snapshot (built once per refresh)."""
+
+    def __init__(self, items: List[dict], version: str = "", fetched_at: float = 0.0):
+        self.items = items
+        self.version = version
+        self.fetched_at = fetched_at
+        self.by_id: Dict[str, dict] = {}
+        self.by_pinfl: Dict[str, dict] = {}
+        self.by_name: Dict[str, List[dict]] = {}
+        for e in items:
+            # First occurrence wins - same as the old linear scan
+            emp_id = _norm(e.get("employee_id_number"))
+            if emp_id:
+                self.by_id.setdefault(emp_id, e)
+            pinfl = pinfl_of(e)
+            if pinfl:
+                self.by_pinfl.setdefault(pinfl, e)
+            name = normalize_name(e.get("full_name"))
+            if name:
+                self.by_name.setdefault(name, []).append(e)
+
+    def find(self, identifier: str) -> Optional[dict]:
+        ident = _norm(identifier)
+        if not ident:
+            return None
+        if len(ident) == 14 and ident.isdigit():
+            return self.by_pinfl.get(ident)
+        return self.by_id.get(ident) or self.by_pinfl.get(ident)
+
+    def find_by_name(self, full_name: str) -> List[dict]:
+        return self.by_name.get(normalize_name(full_name), [])
+
+
+class EmployeeDirectory:
+    """
+    HEMIS employee directory for staff login / role verification:
+      - one background refresher (leader lock) pages the admin employee-list every
+        REFRESH_INTERVAL and publishes a compressed snapshot to Redis; its version is
+        a content hash, so an unchanged list does not make workers reload/reindex
+      - every worker keeps hash indexes (employee ID, PINFL, normalized name) of the
+        current snapshot and checks the Redis version at most every VERSION_CHECK seconds
+      - the request path never pages HEMIS (only a cold start without any snapshot does)
+      - unknown identifiers are negative-cached (Redis, local fallback) after one
+        targeted admin search, so repeated failed logins do not hit the admin API;
+        a failed search (HEMIS down) is never cached as a miss
+      - a failed or partial paging never replaces (or publishes over) the current snapshot
+    """
+
+    SNAPSHOT_KEY = "employee_directory:snapshot"
+    VERSION_KEY = "employee_directory:version"
+    LOCK_KEY = "employee_directory:refresh_lock"
+    MISS_KEY = "employee_directory:miss:{}"
+    REFRESH_INTERVAL = 300
+    VERSION_CHECK = 15
+    MISS_TTL = 1800
+    PAGE_LIMIT = 200
+
+    _redis = None
+    _index: Optional[DirectoryIndex] = None
+    _version_checked_at = 0.0
+    _misses: Dict[str, float] = {}     # identifier -> expires_at (Redis ishlamasa)
+    _load_lock: Optional[asyncio.Lock] = None
+    _stats = {"lookups": 0, "hits": 0, "negative_hits": 0, "admin_searches": 0, "admin_search_errors": 0,
+              "refreshes": 0, "refresh_errors": 0, "reloads": 0}
+
+    @classmethod
+    async def get_redis(cls):
+        if cls._redis is None:
+            cls._redis = redis.from_url(REDIS_URL, decode_responses=False)
+        return cls._redis
+
+    # ------------------------------------------------------------
+    # HEMIS
+    # ------------------------------------------------------------
+
+    @classmethod
+    async def fetch_all(cls) -> List[dict]:
+        """Whole employee list; raises DirectoryUnavailable if any page fails (no partial lists)."""
+        from config import HEMIS_ADMIN_TOKEN
+        from services.hemis_service import HemisService
+
+        client = await HemisService.get_client()
+        headers = HemisService.get_headers(HEMIS_ADMIN_TOKEN)
+        items, page = [], 1
+        while True:
+            response = await client.get(
+                EMPLOYEE_LIST_URL, headers=headers, params={"type": "all", "limit": cls.PAGE_LIMIT, "page": page}
+            )
+            if response.status_code != 200:
+                raise DirectoryUnavailable(f"employee list page {page}: HTTP {response.status_code}")
+            data = response.json().get("data", {})
+            batch = data.get("items", [])
+            if not batch:
+                break
+            items.extend({k: e[k] for k in KEEP_FIELDS if k in e} for e in batch)
+            if len(items) >= data.get("pagination", {}).get("totalCount", 0) or len(batch) < cls.PAGE_LIMIT:
+                break
+            page += 1
+        return items
+
+    @classmethod
+    async def admin_search(cls, identifier: str) -> Optional[dict]:
+        """
+        Targeted admin-API search for an identifier missing from the snapshot.
+        None = HEMIS answered and has no such employee; DirectoryUnavailable = no answer.
+        """
+        from config import HEMIS_ADMIN_TOKEN
+        from services.hemis_service import HemisService
+
+        cls._stats["admin_searches"] += 1
+        try:
+            client = await HemisService.get_client()
+            response = await client.get(
+                EMPLOYEE_LIST_URL, headers=HemisService.get_headers(HEMIS_ADMIN_TOKEN),
+                params={"type": "all", "limit": 10, "search": str(identifier)}
+            )
+            if response.status_code != 200:
+                raise DirectoryUnavailable(f"employee search: HTTP {response.status_code}")
+            items = response.json().get("data", {}).get("items", [])
+        except DirectoryUnavailable:
+            raise
+        except Exception as e:
+            raise DirectoryUnavailable(f"employee search: {e}") from e
+        found = DirectoryIndex(items)
+        ident = _norm(identifier)
+        return found.by_id.get(ident) or found.by_pinfl.get(ident)
+
+    # ------------------------------------------------------------
+    # Snapshot
+    # ------------------------------------------------------------
+
+    @staticmethod
+    def _version_of(items: List[dict]) -> str:
+        return hashlib.sha1(json.dumps(items, sort_keys=True, ensure_ascii=False).encode()).hexdigest()[:16]
+
+    @classmethod
+    def _install(cls, items: List[dict], version: str, fetched_at: float):
+        cls._index = DirectoryIndex(items, version, fetched_at)
+        cls._misses.clear()
+
+    @classmethod
+    async def refresh(cls, publish: bool = True) -> int:
+        """
+        Pages HEMIS, reindexes if the content changed and publishes to Redis. Returns count.
+        On a failed paging the current index (if any) is kept and nothing is published.
+        """
+        try:
+            items = await cls.fetch_all()
+        except Exception as e:
+            cls._stats["refresh_errors"] += 1
+            logger.error(f"Employee directory refresh failed (keeping current snapshot): {e}")
+            return 0
+        if not items:
+            return 0
+        cls._stats["refreshes"] += 1
+        version = cls._version_of(items)
+        if not cls._index or cls._index.version != version:
+            cls._install(items, version, time.time())
+            logger.info(f"👥 Employee directory: {len(items)} employees indexed (v{version})")
+        elif cls._index:
+            cls._index.fetched_at = time.time()
+        if publish:
+            try:
+                r = await cls.get_redis()
+                current = await r.get(cls.VERSION_KEY)
+                if (current or b"").decode() != version:
+                    blob = zlib.compress(json.dumps(items, ensure_ascii=False).encode(), 6)
+                    async with r.pipeline(transaction=True) as pipe:
+                        pipe.set(cls.SNAPSHOT_KEY, blob)
+                        pipe.set(cls.VERSION_KEY, version)
+                        await pipe.execute()
+            except Exception as e:
+                logger.warning(f"Employee directory publish failed (local only): {e}")
+        return len(items)
+
+    @classmethod
+    async def _sync_from_redis(cls, force: bool = False) -> bool:
+        """Loads the shared snapshot if its version differs from ours. True if we have an index."""
+        now = time.monotonic()
+        if not force and cls._index and now - cls._version_checked_at < cls.VERSION_CHECK:
+            return True
+        cls._version_checked_at = now
+        try:
+            r = await cls.get_redis()
+            version = await r.get(cls.VERSION_KEY)
+            if version and (not cls._index or cls._index.version != version.decode()):
+                blob = await r.get(cls.SNAPSHOT_KEY)
+                if blob:
+                    cls._install(json.loads(zlib.decompress(blob)), version.decode(), time.time())
+                    cls._stats["reloads"] += 1
+        except Exception as e:
+            logger.warning(f"Employee directory sync failed: {e}")
+        return cls._index is not None
+
+    @classmethod
+    async def ensure_loaded(cls):
+        if await cls._sync_from_redis():
+            return
+        if cls._load_lock is None:
+            cls._load_lock = asyncio.Lock()
+        async with cls._load_lock:
+            if not cls._index:
+                # Cold start with no shared snapshot: the only fetch on a request path
+                await cls.refresh()
+
+    # ------------------------------------------------------------
+    # Negative cache
+    # ------------------------------------------------------------
+
+    @classmethod
+    async def _is_known_miss(cls, ident: str) -> bool:
+        expires = cls._misses.get(ident)
+        if expires and expires > time.monotonic():
+            return True
+        try:
+            r = await cls.get_redis()
+            return bool(await r.exists(cls.MISS_KEY.format(ident)))
+        except Exception:
+            return False
+
+    @classmethod
+    async def _remember_miss(cls, ident: str):
+        cls._misses[ident] = time.monotonic() + cls.MISS_TTL
+        try:
+            r = await cls.get_redis()
+            await r.set(cls.MISS_KEY.format(ident), b"1", ex=cls.MISS_TTL)
+        except Exception as e:
+            logger.warning(f"Employee miss cache write failed (local only): {e}")
+
+    # ------------------------------------------------------------
+    # Lookup
+    # ------------------------------------------------------------
+
+    @classmethod
+    async def lookup(cls, identifier: str, force_refresh: bool = False) -> Optional[dict]:
+        """Employee by employee_id_number or PINFL (14 digits => PINFL only)."""
+        ident = _norm(identifier)
+        if not ident:
+            return None
+        cls._stats["lookups"] += 1
+        if force_refresh:
+            await cls.refresh()
+        else:
+            await cls.ensure_loaded()
+
+        employee = cls._index.find(ident) if cls._index else None
+        if employee:
+            cls._stats["hits"] += 1
+            return employee
+        if force_refresh:
+            return None
+        if await cls._is_known_miss(ident):
+            cls._stats["negative_hits"] += 1
+            return None
+
+        try:
+            employee = await cls.admin_search(ident)
+        except DirectoryUnavailable as e:
+            # HEMIS did not answer: this attempt fails, the next one searches again
+            cls._stats["admin_search_errors"] += 1
+            logger.warning(f"Employee admin search failed: {e}")
+            return None
+        if employee is None:
+            await cls._remember_miss(ident)
+        return employee
+
+    @classmethod
+    async def find_by_name(cls, full_name: str) -> List[dict]:
+        await cls.ensure_loaded()
+        return cls._index.find_by_name(full_name) if cls._index else []
+
+    @classmethod
+    async def all_items(cls) -> List[dict]:
+        await cls.ensure_loaded()
+        return cls._index.items if cls._index else []
+
+    @classmethod
+    def stats(cls) -> dict:
+        s = dict(cls._stats)
+        s["employees"] = len(cls._index.items) if cls._index else 0
+        s["version"] = cls._index.version if cls._index else None
+        return s
+
+
+async def run_employee_directory_refresher():
+    """Background loop: one worker (Redis lock) refreshes, all workers follow the version."""
+    while True:
+        try:
+            leader = True
+            try:
+                r = await EmployeeDirectory.get_redis()
+                leader = bool(await r.set(EmployeeDirectory.LOCK_KEY, b"1", nx=True,
+                                          ex=EmployeeDirectory.REFRESH_INTERVAL - 5))
+            except Exception:
+                pass  # Redis yo'q: har bir worker o'zi yangilaydi
+            if leader:
+                await EmployeeDirectory.refresh()
+            else:
+                await EmployeeDirectory._sync_from_redis(force=True)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Employee directory refresh error: {e}")
+        await asyncio.sleep(EmployeeDirectory.REFRESH_INTERVAL)
@@ -0,0 +1,361 @@
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import Student, StudentCache, StudentGpaRank
+from services import student_cache_codec
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CohortFrame:
+    """
+    Columnar (NumPy) representation of cached HEMIS subject rows for a whole cohort.
+    One row per (student, subject attempt).
+    """
+    student_ids: np.ndarray   # unique student ids, position = student index
+    student_idx: np.ndarray   # int32, row -> student index
+    subject_idx: np.ndarray   # int32, row -> interned subject id (-1 if unknown)
+    semester: np.ndarray      # int32, semester code (11, 12, ...), 0 if unknown
+    credit: np.ndarray        # float64
+    score: np.ndarray         # float64, overallScore.grade
+    is_retake: np.ndarray     # bool, (student, subject) seen more than once
+
+    @property
+    def size(self) -> int:
+        return int(self.student_idx.shape[0])
+
+
+@dataclass
+class CohortGPA:
+    student_ids: np.ndarray
+    gpa: np.ndarray
+    total_credits: np.ndarray
+    total_points: np.ndarray
+
+
+class CohortGPAEngine:
+    """
+    Batch counterpart of GPACalculator: computes semester and cumulative GPA for
+    an entire faculty/course at once and produces ranked leaderboards.
+    Grade mapping and inclusion rules mirror GPACalculator exactly.
+    """
+
+    @staticmethod
+    def map_points(score: np.ndarray) -> np.ndarray:
+        """Vectorized GPACalculator._map_grade (point part only)."""
+        conditions = [
+            (score > 0) & (score <= 5),          # already on the 5-point scale
+            (score >= 86) & (score <= 100),
+            (score >= 71) & (score <= 85),
+            (score >= 56) & (score <= 70),
+            (score >= 0) & (score <= 55),
+        ]
+        choices = [score, 5.0, 4.0, 3.0, 2.0]
+        return np.select(conditions, choices, default=0.0)
+
+    @staticmethod
+    def _extract_row(item: Dict):
+        subject_info = item.get("curriculumSubject", {}) or item.get("subject", {}) or {}
+        subj_id = str(subject_info.get("id") or (item.get("subject") or {}).get("id") or "")
+
+        try:
+            credit = float(item.get("credit") or subject_info.get("credit") or 0)
+        except (TypeError, ValueError):
+            credit = 0.0
+
+        overall = item.get("overallScore")
+        score = 0.0
+        try:
+            if isinstance(overall, dict):
+                score = float(overall.get("grade") or 0)
+            elif isinstance(overall, (int, float)):
+                score = float(overall)
+        except (TypeError, ValueError):
+            score = 0.0
+
+        sem = (item.get("semester") or {}).get("code")
+        return subj_id, credit, score, sem
+
+    @staticmethod
+    def build_frame(subjects_by_student: Dict[int, List[Dict]], semester_hint: Optional[Dict[int, List[str]]] = None) -> CohortFrame:
+        """
+        Normalizes raw HEMIS subject dicts into columnar arrays.
+        semester_hint: optional per-student list (parallel to subjects) of semester codes
+        taken from the cache key, used when the item itself has no semester.
+        """
+        student_ids = np.array(sorted(subjects_by_student.keys()), dtype=np.int64)
+        position = {int(sid): i for i, sid in enumerate(student_ids)}
+        subject_codes: Dict[str, int] = {}
+
+        s_idx, subj_idx, sems, credits, scores = [], [], [], [], []
+        for sid, items in subjects_by_student.items():
+            hints = (semester_hint or {}).get(sid)
+            pos = position[int(sid)]
+            for n, item in enumerate(items or []):
+                subj_id, credit, score, sem = CohortGPAEngine._extract_row(item)
+                if sem is None and hints:
+                    sem = hints[n]
+                try:
+                    sem_code = int(sem or 0)
+                except (TypeError, ValueError):
+                    sem_code = 0
+
+                s_idx.append(pos)
+                subj_idx.append(subject_codes.setdefault(subj_id, len(subject_codes)) if subj_id else -1)
+                sems.append(sem_code)
+                credits.append(credit)
+                scores.append(score)
+
+        student_idx = np.array(s_idx, dtype=np.int32)
+        subject_idx = np.array(subj_idx, dtype=np.int32)
+
+        # Retake flag: same (student, subject) pair appears more than once
+        is_retake = np.zeros(student_idx.shape[0], dtype=bool)
+        if student_idx.size:
+            pair = student_idx.astype(np.int64) * (len(subject_codes) + 1) + (subject_idx + 1)
+            _, inverse, counts = np.unique(pair, return_inverse=True, return_counts=True)
+            is_retake = (counts[inverse] > 1) & (subject_idx >= 0)
+
+        return CohortFrame(
+            student_ids=student_ids,
+            student_idx=student_idx,
+            subject_idx=subject_idx,
+            semester=np.array(sems, dtype=np.int32),
+            credit=np.array(credits, dtype=np.float64),
+            score=np.array(scores, dtype=np.float64),
+            is_retake=is_retake,
+        )
+
+    @staticmethod
+    def _included(frame: CohortFrame, exclude_in_progress: bool = True) -> np.ndarray:
+        mask = frame.credit > 0
+        if exclude_in_progress:
+            mask &= frame.score != 0
+        return mask
+
+    @staticmethod
+    def semester_gpa(frame: CohortFrame, exclude_in_progress: bool = True) -> Dict[int, Dict[str, float]]:
+        """Weighted GPA per (student, semester). Returns {student_id: {"11": 4.5, ...}}."""
+        if frame.size == 0:
+            return {int(sid): {} for sid in frame.student_ids}
+
+        inc = CohortGPAEngine._included(frame, exclude_in_progress)
+        points = CohortGPAEngine.map_points(frame.score) * frame.credit
+
+        sem_values, sem_pos = np.unique(frame.semester, return_inverse=True)
+        group = frame.student_idx.astype(np.int64) * len(sem_values) + sem_pos
+        n_groups = len(frame.student_ids) * len(sem_values)
+
+        credit_sum = np.bincount(group, weights=np.where(inc, frame.credit, 0.0), minlength=n_groups)
+        point_sum = np.bincount(group, weights=np.where(inc, points, 0.0), minlength=n_groups)
+        present = np.bincount(group, minlength=n_groups) > 0
+
+        gpa = np.divide(point_sum, credit_sum, out=np.zeros(point_sum.shape, dtype=np.float64), where=credit_sum > 0)
+
+        result: Dict[int, Dict[str, float]] = {int(sid): {} for sid in frame.student_ids}
+        for g in np.flatnonzero(present):
+            s, k = divmod(int(g), len(sem_values))
+            result[int(frame.student_ids[s])][str(int(sem_values[k]))] = round(float(gpa[g]), 2)
+        return result
+
+    @staticmethod
+    def resolve_retakes(frame: CohortFrame, retake_policy: str = "latest") -> np.ndarray:
+        """
+        Returns row indices of the attempt kept for each (student, subject),
+        matching GPACalculator.calculate_cumulative (stable sort, first wins).
+        Rows without a subject id are dropped, as in the per-student loop.
+        """
+        rows = np.flatnonzero(frame.subject_idx >= 0)
+        if rows.size == 0:
+            return rows
+
+        order_key = -frame.score[rows] if retake_policy == "best" else -frame.semester[rows].astype(np.float64)
+        # np.lexsort: last key is primary
+        order = np.lexsort((rows, order_key, frame.subject_idx[rows], frame.student_idx[rows]))
+        sorted_rows = rows[order]
+
+        s = frame.student_idx[sorted_rows]
+        j = frame.subject_idx[sorted_rows]
+        first = np.ones(sorted_rows.shape[0], dtype=bool)
+        first[1:] = (s[1:] != s[:-1]) | (j[1:] != j[:-1])
+        return sorted_rows[first]
+
+    @staticmethod
+    def cumulative_gpa(frame: CohortFrame, retake_policy: str = "latest") -> CohortGPA:
+        n = len(frame.student_ids)
+        keep = CohortGPAEngine.resolve_retakes(frame, retake_policy)
+
+        credit = frame.credit[keep]
+        score = frame.score[keep]
+        inc = (credit > 0) & (score != 0)
+        points = CohortGPAEngine.map_points(score) * credit
+        owner = frame.student_idx[keep]
+
+        credit_sum = np.bincount(owner, weights=np.where(inc, credit, 0.0), minlength=n).astype(np.float64)
+        point_sum = np.bincount(owner, weights=np.where(inc, points, 0.0), minlength=n).astype(np.float64)
+        gpa = np.divide(point_sum, credit_sum, out=np.zeros(point_sum.shape, dtype=np.float64), where=credit_sum > 0)
+
+        # Python round() (not np.round) so ties like 3.825 match GPACalculator exactly
+        gpa = np.array([round(float(g), 2) for g in gpa], dtype=np.float64)
+
+        return CohortGPA(
+            student_ids=frame.student_ids,
+            gpa=gpa,
+            total_credits=credit_sum,
+            total_points=point_sum,
+        )
+
+    @staticmethod
+    def rank(result: CohortGPA) -> np.ndarray:
+        """
+        Leaderboard order (indices into result arrays).
+        Tie-break: GPA desc -> total credits desc -> student id asc.
+        """
+        return np.lexsort((result.student_ids, -result.total_credits, -result.gpa))
+
+    # ------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------
+
+    @staticmethod
+    def cohort_scope(faculty_id: Optional[int], level_name: Optional[str]) -> str:
+        return f"faculty:{faculty_id or 0}:{(level_name or '').strip().lower()}"
+
+    @staticmethod
+    async def load_cohort_subjects(session: AsyncSession, student_ids: List[int]):
+        """
+        Reads cached subject lists (StudentCache "subjects_<code>") for all students
+        in one query. Per-semester keys win over "subjects_all".
+        Students without any cached subjects are left out (not synced yet, not a 0.0 GPA).
+        """
+        if not student_ids:
+            return {}, {}
+
+        rows = (await session.execute(
+            select(StudentCache.student_id, StudentCache.key, StudentCache.data,
+                   StudentCache.payload, StudentCache.schema_version)
+            .where(StudentCache.student_id.in_(student_ids), StudentCache.key.like("subjects_%"))
+        )).all()
+
+        per_semester: Dict[int, Dict[str, list]] = {}
+        fallback: Dict[int, list] = {}
+        for sid, key, data, payload, version in rows:
+            data = student_cache_codec.raw_of(data, payload, version)
+            if not isinstance(data, list):
+                continue
+            code = key[len("subjects_"):]
+            if code.isdigit():
+                per_semester.setdefault(sid, {})[code] = data
+            elif code == "all":
+                fallback[sid] = data
+
+        subjects: Dict[int, List[Dict]] = {}
+        hints: Dict[int, List[str]] = {}
+        for sid in student_ids:
+            if sid in per_semester:
+                items, codes = [], []
+                for code in sorted(per_semester[sid], key=int):
+                    items.extend(per_semester[sid][code])
+                    codes.extend([code] * len(per_semester[sid][code]))
+                subjects[sid], hints[sid] = items, codes
+            elif fallback.get(sid):
+                subjects[sid] = fallback[sid]
+        return subjects, hints
+
+    @staticmethod
+    async def rebuild_cohort(session: AsyncSession, faculty_id: int, level_name: str, retake_policy: str = "latest") -> int:
+        """
+        Recomputes and persists the leaderboard for one faculty/course.
+        Only students with cached subjects are ranked; the rest are reported as
+        pending by /gpa/rank and join the next rebuild once their data is synced.
+        Returns the cohort size (ranked students). Caller commits.
+        """
+        student_ids = (await session.scalars(
+            select(Student.id).where(
+                Student.faculty_id == faculty_id,
+                Student.level_name == level_name,
+                Student.is_active == True,
+            )
+        )).all()
+
+        scope = CohortGPAEngine.cohort_scope(faculty_id, level_name)
+        await session.execute(delete(StudentGpaRank).where(StudentGpaRank.scope == scope))
+        if not student_ids:
+            return 0
+
+        subjects, hints = await CohortGPAEngine.load_cohort_subjects(session, list(student_ids))
+        pending = len(student_ids) - len(subjects)
+        if not subjects:
+            logger.info(f"GPA leaderboard skipped: {scope} ({pending} students pending, no cached subjects)")
+            return 0
+
+        frame = CohortGPAEngine.build_frame(subjects, hints)
+        cumulative = CohortGPAEngine.cumulative_gpa(frame, retake_policy)
+        per_semester = CohortGPAEngine.semester_gpa(frame)
+        order = CohortGPAEngine.rank(cumulative)
+
+        now = datetime.utcnow()
+        cohort_size = len(order)
+        session.add_all([
+            StudentGpaRank(
+                student_id=int(cumulative.student_ids[i]),
+                scope=scope,
+                gpa=float(cumulative.gpa[i]),
+                total_credits=float(cumulative.total_credits[i]),
+                semester_gpa=per_semester.get(int(cumulative.student_ids[i])),
+                rank=position + 1,
+                cohort_size=cohort_size,
+                retake_policy=retake_policy,
+                computed_at=now,
+            )
+            for position, i in enumerate(order)
+        ])
+        logger.info(f"GPA leaderboard rebuilt: {scope} ({cohort_size} students, {pending} pending, "
+                    f"{frame.size} subject rows)")
+        return cohort_size
+
+    @staticmethod
+    async def rebuild_all(session: AsyncSession, university_id: Optional[int] = None, retake_policy: str = "latest") -> int:
+        """Rebuilds every (faculty, course) cohort, committing per cohort."""
+        stmt = select(Student.faculty_id, Student.level_name).where(
+            Student.is_active == True, Student.faculty_id.isnot(None)
+        ).distinct()
+        if university_id:
+            stmt = stmt.where(Student.university_id == university_id)
+
+        total = 0
+        for faculty_id, level_name in (await session.execute(stmt)).all():
+            total += await CohortGPAEngine.rebuild_cohort(session, faculty_id, level_name, retake_policy)
+            await session.commit()
+        return total
+
+    @staticmethod
+    async def get_student_rank(session: AsyncSession, student: Student) -> Optional[StudentGpaRank]:
+        scope = CohortGPAEngine.cohort_scope(student.faculty_id, student.level_name)
+        return await session.scalar(
+            select(StudentGpaRank).where(
+                StudentGpaRank.student_id == student.id,
+                StudentGpaRank.scope == scope,
+            )
+        )
+
+    @staticmethod
+    async def get_leaderboard(session: AsyncSession, scope: str, limit: int = 10):
+        result = await session.execute(
+            select(StudentGpaRank.rank, StudentGpaRank.gpa, StudentGpaRank.student_id, Student.full_name)
+            .join(Student, Student.id == StudentGpaRank.student_id)
+            .where(StudentGpaRank.scope == scope)
+            .order_by(StudentGpaRank.rank)
+            .limit(limit)
+        )
+        return [
+            {"rank": r.rank, "gpa": r.gpa, "student_id": r.student_id, "full_name": r.full_name}
+            for r in result.all()
+        ]
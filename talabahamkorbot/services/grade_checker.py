@@ -13,157 +13,48 @@ from celery_app import app as celery_app
 
 logger = logging.getLogger(__name__)
 
-# @celery_app.task(name="check_new_grades")
-# def run_check_new_grades():
-#     """Celery task wrapper for grade checks"""
-#     return asyncio.run(check_new_grades())
+# HEMIS token source for background grade checks: async (student) -> token | None.
+# Tokens are not stored in DB (stateless mode); register one that returns stored/refreshed credentials.
+_token_provider = None
+
+
+def register_token_provider(provider):
+    global _token_provider
+    _token_provider = provider
+
+
+@celery_app.task(name="check_new_grades")
+def run_check_new_grades(run_id: str = None):
+    """Celery task wrapper for grade checks (resume an interrupted run by passing its run_id)"""
+    return asyncio.run(check_new_grades(run_id))
 
 @celery_app.task(name="send_student_welcome_report")
 def run_send_welcome_report(student_id: int):
     """Celery task wrapper for welcome report"""
     return asyncio.run(send_welcome_report(student_id))
 
-async def check_new_grades():
+async def check_new_grades(run_id: str = None) -> dict:
+    """
+    Sharded grade-change detection (see services/grade_pipeline.py).
+    Unchanged semesters are skipped after a single fingerprint comparison;
+    changed (subject, component) events go to the Redis queue and are sent by GradeNotifier.
+    """
+    from services.grade_pipeline import GradeChangePipeline, GradeNotifier
+
+    if _token_provider is None:
+        raise RuntimeError("Grade check needs a HEMIS token provider (grade_checker.register_token_provider)")
+
     logger.info("🔍 Checking for new grades...")
-    async with AsyncSessionLocal() as session:
-        # Get active students with tokens
-        stmt = select(Student).where(Student.is_active == True, Student.hemis_token.is_not(None)).options(selectinload(Student.tg_accounts))
-        result = await session.execute(stmt)
-        students = result.scalars().all()
-        
-        for student in students:
-            try:
-                # 1. Fetch Fresh Data (Network Call)
-                # We don't pass student_id to force fresh fetch
-                # We use student's current stored semester name/code logic if possible, or just default (current)
-                # Usually default is best for "Current Semester" grades.
-                fresh_subjects = await HemisService.get_student_subject_list(student.hemis_token)
-                
-                if not fresh_subjects:
-                    continue
-
-                # 2. Get Cached Data
-                # We need to guess the "key". HemisService uses "subjects_{semester_code}" or "subjects_all".
-                # If fresh_subjects returns data, it's for specific semester (usually current).
-                # We can extract semester code from the first item in fresh_subjects if available.
-                sem_code = None
-                if fresh_subjects and isinstance(fresh_subjects[0], dict):
-                     semester = fresh_subjects[0].get("semester", {})
-                     sem_code = str(semester.get("code") or semester.get("id") or "")
-                
-                key = f"subjects_{sem_code}" if sem_code else "subjects_all"
-                
-                cache_entry = await session.scalar(select(StudentCache).where(StudentCache.student_id == student.id, StudentCache.key == key))
-                cached_data = cache_entry.data if cache_entry else []
-                
-                # 3. Compare
-                changes = [] # List of strings to notify
-                
-                # Convert cached list to dict by subject ID for O(1) lookup
-                # ID extraction: curriculumSubject -> subject -> id/name
-                cached_map = {}
-                for s in cached_data:
-                    curr_subj = s.get("curriculumSubject", {})
-                    subj_data = curr_subj.get("subject", {}) or s.get("subject", {})
-                    sid = str(subj_data.get("id") or subj_data.get("name"))
-                    cached_map[sid] = s
-                
-                for fresh_subj in fresh_subjects:
-                    curr_subj = fresh_subj.get("curriculumSubject", {})
-                    subj_data = curr_subj.get("subject", {}) or fresh_subj.get("subject", {})
-                    
-                    subj_id = str(subj_data.get("id") or subj_data.get("name"))
-                    subj_name = subj_data.get("name") or "Noma'lum fan"
-                    
-                    old_subj = cached_map.get(subj_id)
-                    
-                    if not old_subj:
-                        # New subject? Unlikely mid-semester, but possible.
-                        # Check if it has grades > 0
-                        is_jmcu = (student.hemis_login[:3] == "395") if student.hemis_login else False
-                        parsed_fresh = HemisService.parse_grades_detailed(fresh_subj, skip_conversion=not is_jmcu)
-                        if parsed_fresh["raw_total"] > 0:
-                            changes.append(f"🆕 <b>{subj_name}</b> fanidan baholar chiqdi!")
-                        continue
-                        
-                    # Compare Grades
-                    is_jmcu = (student.hemis_login[:3] == "395") if student.hemis_login else False
-                    parsed_fresh = HemisService.parse_grades_detailed(fresh_subj, skip_conversion=not is_jmcu)
-                    parsed_old = HemisService.parse_grades_detailed(old_subj, skip_conversion=not is_jmcu)
-                    
-                    # ON Check
-                    if parsed_fresh["ON"]["raw"] > parsed_old["ON"]["raw"]:
-                         changes.append(f"📈 <b>{subj_name}</b>: Oraliq Nazorat (ON) dan <b>{parsed_fresh['ON']['raw']}</b> ball qo'yildi!")
-                    
-                    # YN Check
-                    if parsed_fresh["YN"]["raw"] > parsed_old["YN"]["raw"]:
-                         changes.append(f"🎓 <b>{subj_name}</b>: Yakuniy Nazorat (YN) dan <b>{parsed_fresh['YN']['raw']}</b> ball qo'yildi!")
-
-                # 4. Notify & Update
-                if changes:
-                    # Notify via Telegram
-                    tg_id = None
-                    if student.tg_accounts:
-                        tg_id = student.tg_accounts[0].telegram_id
-                    
-                    if tg_id:
-                        msg = "⚡️ <b>Yangi Baholar!</b>\n\n" + "\n".join(changes)
-                        try:
-                            await bot.send_message(tg_id, msg, parse_mode="HTML")
-                            logger.info(f"Notified {student.full_name} about grades.")
-                        except Exception as e:
-                            logger.error(f"Failed to notify {student.full_name}: {e}")
-                    
-                    # Create Notification in DB for Mobile App
-                    try:
-                        notif_body = "\n".join(changes).replace("<b>", "").replace("</b>", "")
-                        new_notif = StudentNotification(
-                            student_id=student.id,
-                            title="⚡️ Yangi Baholar!",
-                            body=notif_body,
-                            type="grade",
-                            is_read=False
-                        )
-                        session.add(new_notif)
-                    except Exception as e:
-                        logger.error(f"Failed to create app notification: {e}")
-                    
-                    # [NEW] Push Notification
-                    if student.fcm_token:
-                        await NotificationService.send_push(
-                            token=student.fcm_token,
-                            title="⚡️ Yangi Baholar!",
-                            body=notif_body,
-                            data={"type": "grade"}
-                        )
-                    
-                    # Update Cache in DB
-                    if cache_entry:
-                        cache_entry.data = fresh_subjects
-                    else:
-                        new_cache = StudentCache(student_id=student.id, key=key, data=fresh_subjects)
-                        session.add(new_cache)
-                    
-                    await session.commit()
-                else:
-                    # Update cache anyway to keep it fresh? 
-                    # Yes, logic dictates cache should reflect latest state to avoid false positives later if structure changes.
-                    # But if no grade change, JSON diff might be trivial.
-                    # Let's simple check if we should update.
-                    # Actually, for "First Run", if cache doesn't exist, we should save it but NOT notify (or maybe notify "Monitoring started").
-                    # User asked for "yangi baho".
-                    # If cache_entry is None, it's the first run.
-                    if not cache_entry:
-                         new_cache = StudentCache(student_id=student.id, key=key, data=fresh_subjects)
-                         session.add(new_cache)
-                         await session.commit()
-                    elif fresh_subjects != cached_data:
-                         # Update invisible changes
-                         cache_entry.data = fresh_subjects
-                         await session.commit()
-
-            except Exception as e:
-                logger.error(f"Grade check error for student {student.id}: {e}")
+    stats = await GradeChangePipeline(_token_provider, run_id=run_id).run()
+    sent = await GradeNotifier.drain()
+
+    result = stats.as_dict()
+    result["notified_students"] = sent
+    logger.info(
+        f"📊 Grade check {stats.run_id}: {stats.processed} students, "
+        f"{stats.students_per_minute} students/min, {stats.change_events} change events"
+    )
+    return result
 
 async def send_welcome_report(student_id: int):
     """
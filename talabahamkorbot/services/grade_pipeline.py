@@ -0,0 +1,342 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+from uuid import uuid4
+
+import redis.asyncio as redis
+from sqlalchemy import select
+
+from config import REDIS_URL
+from database.db_connect import AsyncSessionLocal
+from database.models import Student, StudentCache
+from services import student_cache_codec
+from services.hemis_service import HemisService
+from services.university_service import UniversityService
+
+logger = logging.getLogger(__name__)
+
+# Components tracked in the fingerprint; only these produce notification events
+TRACKED_COMPONENTS = ("JN", "ON", "YN")
+NOTIFY_COMPONENTS = ("ON", "YN")
+
+FINGERPRINT_KEY = "grade_fp_{}"          # StudentCache.key, per semester
+EVENT_QUEUE_KEY = "grade_events"         # Redis list consumed by GradeNotifier
+CHECKPOINT_KEY = "grade_check:{}:done"   # Redis set of finished shard numbers
+CHECKPOINT_TTL = 2 * 86400
+
+
+def _subject_id(subj: dict) -> str:
+    curr = subj.get("curriculumSubject", {}) or {}
+    data = curr.get("subject", {}) or subj.get("subject", {}) or {}
+    return str(data.get("id") or data.get("name"))
+
+
+def _subject_name(subj: dict) -> str:
+    curr = subj.get("curriculumSubject", {}) or {}
+    data = curr.get("subject", {}) or subj.get("subject", {}) or {}
+    return data.get("name") or "Noma'lum fan"
+
+
+def _digest(payload) -> str:
+    raw = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(raw.encode(), digest_size=8).hexdigest()
+
+
+def build_fingerprint(subjects: List[dict], skip_conversion: bool = False) -> dict:
+    """
+    Compact per-semester fingerprint:
+      {"h": <semester hash>, "s": {subject_id: [<subject hash>, {"JN": raw, "ON": raw, "YN": raw}, raw_total]}}
+    Only score-bearing fields are hashed, so cosmetic changes in the HEMIS payload are ignored.
+    """
+    per_subject = {}
+    for subj in subjects:
+        sid = _subject_id(subj)
+        parsed = HemisService.parse_grades_detailed(subj, skip_conversion=skip_conversion)
+        scores = {c: parsed[c]["raw"] for c in TRACKED_COMPONENTS}
+        overall = subj.get("overallScore")
+        overall = overall.get("grade") if isinstance(overall, dict) else overall
+        per_subject[sid] = [_digest([scores, overall]), scores, parsed["raw_total"]]
+
+    return {
+        "h": _digest({sid: v[0] for sid, v in per_subject.items()}),
+        "s": per_subject,
+    }
+
+
+def diff_fingerprints(old: Optional[dict], new: dict, names: Dict[str, str]) -> List[dict]:
+    """
+    Returns changed (subject, component) events. The semester hash is compared first,
+    so an unchanged semester costs one string comparison.
+    """
+    if old and old.get("h") == new["h"]:
+        return []
+
+    old_subjects = (old or {}).get("s", {})
+    events = []
+    for sid, (h, scores, raw_total) in new["s"].items():
+        prev = old_subjects.get(sid)
+        if prev is None:
+            if raw_total > 0:
+                events.append({"subject_id": sid, "subject": names.get(sid), "component": "NEW", "value": raw_total})
+            continue
+        if prev[0] == h:
+            continue
+        for comp in NOTIFY_COMPONENTS:
+            if scores.get(comp, 0) > prev[1].get(comp, 0):
+                events.append({"subject_id": sid, "subject": names.get(sid), "component": comp, "value": scores[comp]})
+    return events
+
+
+@dataclass
+class GradeCheckStats:
+    run_id: str
+    students_total: int = 0
+    processed: int = 0
+    unchanged: int = 0
+    first_seen: int = 0
+    skipped_no_token: int = 0
+    skipped_checkpoint: int = 0
+    errors: int = 0
+    change_events: int = 0
+    students_with_changes: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+    duration_sec: float = 0.0
+
+    @property
+    def students_per_minute(self) -> float:
+        if self.duration_sec <= 0:
+            return 0.0
+        return round(self.processed / (self.duration_sec / 60), 1)
+
+    def as_dict(self) -> dict:
+        data = asdict(self)
+        data.pop("started_at", None)
+        data["students_per_minute"] = self.students_per_minute
+        return data
+
+
+# [STATELESS] Student.hemis_token is not stored in DB (only injected per request), so the
+# pipeline must be given a real token source (stored/refreshed HEMIS credentials)
+TokenProvider = Callable[[Student], Awaitable[Optional[str]]]
+
+
+def new_run_id() -> str:
+    """Unique per invocation; pass an existing run_id only to resume an interrupted run."""
+    return f"{datetime.utcnow():%Y%m%d%H%M}-{uuid4().hex[:8]}"
+
+
+class GradeChangePipeline:
+    """
+    Sharded, resumable grade-change detection.
+    Students are split into id-ordered shards, processed by a bounded worker pool with a
+    per-HEMIS-host semaphore; finished shards are checkpointed in Redis so an interrupted
+    run can be resumed by passing the same run_id explicitly (every new run gets a unique one).
+    """
+
+    def __init__(
+        self,
+        token_provider: TokenProvider,
+        run_id: Optional[str] = None,
+        workers: int = 16,
+        per_host_limit: int = 4,
+        shard_size: int = 200,
+    ):
+        if token_provider is None:
+            raise ValueError("GradeChangePipeline needs a HEMIS token provider")
+        self.run_id = run_id or new_run_id()
+        self.workers = workers
+        self.per_host_limit = per_host_limit
+        self.shard_size = shard_size
+        self.token_provider = token_provider
+        self.stats = GradeCheckStats(run_id=self.run_id)
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+        self._redis = None
+
+    async def _get_redis(self):
+        if self._redis is None:
+            self._redis = redis.from_url(REDIS_URL, decode_responses=True)
+        return self._redis
+
+    def _host_semaphore(self, base_url: Optional[str]) -> asyncio.Semaphore:
+        host = base_url or HemisService.BASE_URL
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.per_host_limit)
+        return self._host_limits[host]
+
+    async def _load_shards(self) -> List[List[int]]:
+        async with AsyncSessionLocal() as session:
+            ids = (await session.scalars(
+                select(Student.id).where(Student.is_active == True).order_by(Student.id)
+            )).all()
+        self.stats.students_total = len(ids)
+        return [list(ids[i:i + self.shard_size]) for i in range(0, len(ids), self.shard_size)]
+
+    async def _check_student(self, student: Student) -> List[dict]:
+        token = await self.token_provider(student)
+        if not token:
+            self.stats.skipped_no_token += 1
+            return []
+
+        base_url = UniversityService.get_api_url(student.hemis_login)
+        async with self._host_semaphore(base_url):
+            fresh = await HemisService.get_student_subject_list(token, base_url=base_url)
+        if not fresh:
+            return []
+
+        sem = fresh[0].get("semester", {}) if isinstance(fresh[0], dict) else {}
+        sem_code = str(sem.get("code") or sem.get("id") or "") or "all"
+        is_jmcu = (student.hemis_login[:3] == "395") if student.hemis_login else False
+
+        new_fp = build_fingerprint(fresh, skip_conversion=not is_jmcu)
+        fp_key = FINGERPRINT_KEY.format(sem_code)
+
+        async with AsyncSessionLocal() as session:
+            fp_row = await session.scalar(
+                select(StudentCache).where(StudentCache.student_id == student.id, StudentCache.key == fp_key)
+            )
+            old_fp = fp_row.data if fp_row else None
+
+            if old_fp and old_fp.get("h") == new_fp["h"]:
+                self.stats.unchanged += 1
+                return []
+
+            # First run only records the baseline (no notification), as before
+            events = diff_fingerprints(old_fp, new_fp, {_subject_id(s): _subject_name(s) for s in fresh}) if old_fp else []
+            if not old_fp:
+                self.stats.first_seen += 1
+
+            if fp_row:
+                fp_row.data = new_fp
+                fp_row.updated_at = datetime.utcnow()
+            else:
+                session.add(StudentCache(student_id=student.id, key=fp_key, data=new_fp))
+
+            subj_key = f"subjects_{sem_code}"
+            subj_row = await session.scalar(
+                select(StudentCache).where(StudentCache.student_id == student.id, StudentCache.key == subj_key)
+            )
+            if not subj_row:
+                subj_row = StudentCache(student_id=student.id, key=subj_key)
+                session.add(subj_row)
+            student_cache_codec.apply(subj_row, subj_key, fresh)
+            subj_row.updated_at = datetime.utcnow()
+            await session.commit()
+
+        return events
+
+    async def _emit(self, student_id: int, events: List[dict]):
+        if not events:
+            return
+        self.stats.change_events += len(events)
+        self.stats.students_with_changes += 1
+        r = await self._get_redis()
+        await r.rpush(EVENT_QUEUE_KEY, json.dumps({"student_id": student_id, "events": events}))
+
+    async def _process_shard(self, shard_no: int, ids: List[int]):
+        async with AsyncSessionLocal() as session:
+            students = (await session.scalars(select(Student).where(Student.id.in_(ids)))).all()
+
+        for student in students:
+            try:
+                events = await self._check_student(student)
+                await self._emit(student.id, events)
+            except Exception as e:
+                self.stats.errors += 1
+                logger.error(f"Grade check error for student {student.id}: {e}")
+            self.stats.processed += 1
+
+        r = await self._get_redis()
+        await r.sadd(CHECKPOINT_KEY.format(self.run_id), shard_no)
+        await r.expire(CHECKPOINT_KEY.format(self.run_id), CHECKPOINT_TTL)
+
+    async def run(self) -> GradeCheckStats:
+        shards = await self._load_shards()
+        r = await self._get_redis()
+        done = {int(x) for x in await r.smembers(CHECKPOINT_KEY.format(self.run_id))}
+
+        queue: asyncio.Queue = asyncio.Queue()
+        for no, ids in enumerate(shards):
+            if no in done:
+                self.stats.skipped_checkpoint += len(ids)
+                continue
+            queue.put_nowait((no, ids))
+
+        async def worker():
+            while True:
+                try:
+                    no, ids = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                await self._process_shard(no, ids)
+
+        logger.info(f"🔍 Grade check {self.run_id}: {self.stats.students_total} students, {queue.qsize()} shards pending")
+        await asyncio.gather(*(worker() for _ in range(min(self.workers, max(queue.qsize(), 1)))))
+
+        self.stats.duration_sec = round(time.monotonic() - self.stats.started_at, 2)
+        logger.info(f"✅ Grade check finished: {self.stats.as_dict()}")
+        return self.stats
+
+
+class GradeNotifier:
+    """Consumes grade change events from Redis and notifies students (Telegram, app, push)."""
+
+    MESSAGES = {
+        "NEW": "🆕 <b>{subject}</b> fanidan baholar chiqdi!",
+        "ON": "📈 <b>{subject}</b>: Oraliq Nazorat (ON) dan <b>{value}</b> ball qo'yildi!",
+        "YN": "🎓 <b>{subject}</b>: Yakuniy Nazorat (YN) dan <b>{value}</b> ball qo'yildi!",
+    }
+
+    @classmethod
+    def format_events(cls, events: List[dict]) -> List[str]:
+        return [
+            cls.MESSAGES[e["component"]].format(subject=e.get("subject") or "Noma'lum fan", value=e.get("value"))
+            for e in events if e["component"] in cls.MESSAGES
+        ]
+
+    @classmethod
+    async def drain(cls, batch_size: int = 100) -> int:
+        from sqlalchemy.orm import selectinload
+        from bot import bot
+        from database.models import StudentNotification
+        from services.notification_service import NotificationService
+
+        r = redis.from_url(REDIS_URL, decode_responses=True)
+        sent = 0
+        while True:
+            raw = await r.lpop(EVENT_QUEUE_KEY, batch_size)
+            if not raw:
+                break
+            payloads = [json.loads(x) for x in raw]
+
+            async with AsyncSessionLocal() as session:
+                ids = [p["student_id"] for p in payloads]
+                students = {
+                    s.id: s for s in (await session.scalars(
+                        select(Student).where(Student.id.in_(ids)).options(selectinload(Student.tg_accounts))
+                    )).all()
+                }
+                for p in payloads:
+                    student = students.get(p["student_id"])
+                    lines = cls.format_events(p["events"])
+                    if not student or not lines:
+                        continue
+
+                    body = "\n".join(lines).replace("<b>", "").replace("</b>", "")
+                    session.add(StudentNotification(
+                        student_id=student.id, title="⚡️ Yangi Baholar!", body=body, type="grade", is_read=False
+                    ))
+                    if student.tg_accounts:
+                        try:
+                            await bot.send_message(student.tg_accounts[0].telegram_id, "⚡️ <b>Yangi Baholar!</b>\n\n" + "\n".join(lines), parse_mode="HTML")
+                        except Exception as e:
+                            logger.error(f"Failed to notify {student.id}: {e}")
+                    if student.fcm_token:
+                        await NotificationService.send_push(token=student.fcm_token, title="⚡️ Yangi Baholar!", body=body, data={"type": "grade"})
+                    sent += 1
+                await session.commit()
+        return sent
@@ -6,6 +6,8 @@ from datetime import datetime, timedelta
 from sqlalchemy import select
 from database.db_connect import AsyncSessionLocal
 from database.models import StudentCache
+from services import student_cache_codec
+from services.student_cache_codec import CacheEntry
 from config import HEMIS_ADMIN_TOKEN
 
 
@@ -21,8 +23,12 @@ class HemisService:
     }
     
     
+    # StudentCache validity (sekund) for the prefetched modules
+    CACHE_TTL = {"subjects": 3600, "attendance": 30 * 60, "schedule": 86400}
+
     # Shared Client Singletons
     _client: httpx.AsyncClient = None
+    _priority_client: httpx.AsyncClient = None
     _auth_cache: Dict[str, Dict[str, Any]] = {} # {token: {"status": str, "expiry": datetime}}
 
     @staticmethod
@@ -72,11 +78,29 @@ class HemisService:
             )
         return cls._client
 
+    @classmethod
+    async def get_priority_client(cls):
+        """
+        Separate pool for time-critical submissions (QR attendance): never queues behind
+        the shared 10-connection client, short timeouts, no built-in retries.
+        """
+        if cls._priority_client is None or cls._priority_client.is_closed:
+            cls._priority_client = httpx.AsyncClient(
+                verify=False,
+                limits=httpx.Limits(max_keepalive_connections=10, max_connections=20),
+                timeout=httpx.Timeout(5.0, connect=3.0),
+                headers=cls.HEADERS
+            )
+        return cls._priority_client
+
     @classmethod
     async def close_client(cls):
         if cls._client and not cls._client.is_closed:
             await cls._client.aclose()
             cls._client = None
+        if cls._priority_client and not cls._priority_client.is_closed:
+            await cls._priority_client.aclose()
+            cls._priority_client = None
 
     @staticmethod
     def get_headers(token: str = None):
@@ -406,127 +430,24 @@ class HemisService:
             
         return None
 
-    _cached_employee_list = None
-    _cached_employee_list_time = 0
-    
     @staticmethod
     async def get_all_employees_cached() -> list:
-        """Fetches all employees from JMCU Admin API with a 5-minute cache TTL."""
-        import time
-        from config import HEMIS_ADMIN_TOKEN
-        
-        current_time = time.time()
-        # 5 minutes cache TTL
-        if HemisService._cached_employee_list is not None and (current_time - HemisService._cached_employee_list_time) < 300:
-            return HemisService._cached_employee_list
-            
-        client = await HemisService.get_client()
-        url = "https://student.jmcu.uz/rest/v1/data/employee-list"
-        headers = HemisService.get_headers(HEMIS_ADMIN_TOKEN)
-        
-        all_items = []
-        page = 1
-        limit = 200
-        
-        try:
-            logger.info("Fetching full employee list from JMCU HEMIS Admin API to update cache...")
-            while True:
-                params = {"type": "all", "limit": limit, "page": page}
-                response = await client.get(url, headers=headers, params=params)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    items = data.get("data", {}).get("items", [])
-                    if not items:
-                        break
-                        
-                    all_items.extend(items)
-                    
-                    pagination = data.get("data", {}).get("pagination", {})
-                    if len(all_items) >= pagination.get("totalCount", 0) or len(items) < limit:
-                        break
-                        
-                    page += 1
-                else:
-                    logger.error(f"Failed to fetch employee list page {page}. Status: {response.status_code}")
-                    break
-                    
-            if all_items:
-                HemisService._cached_employee_list_time = time.time()
-                HemisService._cached_employee_list = all_items
-                logger.info(f"Successfully cached {len(all_items)} employees. Next refresh in 5 minutes.")
-                
-            return all_items
-        except Exception as e:
-            logger.error(f"Exception fetching full employee list: {e}")
-            # Fallback to expired cache if available during transient error
-            return HemisService._cached_employee_list or []
+        """All employees (slim items) from the shared EmployeeDirectory snapshot."""
+        from services.employee_directory import EmployeeDirectory
+        return await EmployeeDirectory.all_items()
 
     @staticmethod
     async def verify_staff_role_from_hemis(identifier: str, force_refresh: bool = False) -> Optional[dict]:
         """
-        Dynamically verifies a staff member's role against the JMCU HEMIS employee database via in-memory cache.
+        Verifies a staff member's role against the JMCU HEMIS employee database
+        (EmployeeDirectory: indexed snapshot, refreshed in background, negative cache).
         """
-        import time
         if not identifier:
             return None
-            
-        # 1. First, check the cached list
-        if force_refresh:
-            HemisService._cached_employee_list_time = 0 # Force refresh
-            
-        items = await HemisService.get_all_employees_cached()
-        
-        if not items:
-            logger.warning("Employee list cache is empty and cannot be fetched.")
-            return None
-            
-        logger.info(f"Searching for staff identifier {identifier} in {len(items)} cached employees...")
-        
-        matched_employee = None
-        is_pinfl_search = len(str(identifier)) == 14 and str(identifier).isdigit()
-        ident_str = str(identifier).strip().lower()
-        
-        for employee in items:
-            emp_id = str(employee.get("employee_id_number") or "").strip().lower()
-            emp_pinfl = str(employee.get("pinfl") or employee.get("jshshir") or employee.get("passport_pin") or "").strip().lower()
-            
-            if is_pinfl_search:
-                if emp_pinfl and emp_pinfl == ident_str:
-                    matched_employee = employee
-                    break
-            else:
-                if emp_id and emp_id == ident_str:
-                    matched_employee = employee
-                    break
-                # Fallback checking PINFL just in case
-                if emp_pinfl and emp_pinfl == ident_str:
-                    matched_employee = employee
-                    break
-                    
-        if not matched_employee:
-            # 2. Refresh-on-miss fallback
-            if not force_refresh:
-                logger.info(f"Identifier {identifier} not found in cache. Forcing a targeted fallback request on Admin API...")
-                client = await HemisService.get_client()
-                from config import HEMIS_ADMIN_TOKEN
-                url = f"https://student.jmcu.uz/rest/v1/data/employee-list"
-                headers = HemisService.get_headers(HEMIS_ADMIN_TOKEN)
-                params = {"type": "all", "limit": 10, "search": str(identifier)}
-                
-                try:
-                    response = await client.get(url, headers=headers, params=params)
-                    if response.status_code == 200:
-                        fallback_items = response.json().get("data", {}).get("items", [])
-                        for employee in fallback_items:
-                            emp_id = str(employee.get("employee_id_number") or "").strip().lower()
-                            emp_pinfl = str(employee.get("pinfl") or employee.get("jshshir") or employee.get("passport_pin") or "").strip().lower()
-                            if (emp_id and emp_id == ident_str) or (emp_pinfl and emp_pinfl == ident_str):
-                                matched_employee = employee
-                                break
-                except Exception as e:
-                    logger.warning(f"Fallback request failed: {e}")
-                    
+
+        from services.employee_directory import EmployeeDirectory
+        matched_employee = await EmployeeDirectory.lookup(identifier, force_refresh=force_refresh)
+
         if not matched_employee:
              logger.warning(f"Staff identifier {identifier} completely rejected (Not found in API Database).")
              return None
@@ -586,42 +507,56 @@ class HemisService:
 
 
     @staticmethod
-    async def get_student_absence(token: str, semester_code: str = None, student_id: int = None, force_refresh: bool = False, base_url: Optional[str] = None):
+    async def _cache_read(student_id: int, key: str) -> Optional[CacheEntry]:
+        async with AsyncSessionLocal() as session:
+            row = (await session.execute(
+                select(StudentCache.key, StudentCache.data, StudentCache.payload,
+                       StudentCache.schema_version, StudentCache.updated_at)
+                .where(StudentCache.student_id == student_id, StudentCache.key == key)
+            )).first()
+        return CacheEntry(*row) if row else None
+
+    @staticmethod
+    async def _cache_write(student_id: int, key: str, data):
+        """Upsert; subjects/attendance/schedule/performance are stored compact (student_cache_codec)."""
+        async with AsyncSessionLocal() as session:
+            c = await session.scalar(select(StudentCache).where(StudentCache.student_id == student_id, StudentCache.key == key))
+            if not c:
+                c = StudentCache(student_id=student_id, key=key)
+                session.add(c)
+            student_cache_codec.apply(c, key, data)
+            c.updated_at = datetime.utcnow()
+            await session.commit()
+
+    @staticmethod
+    def _cache_age(entry: CacheEntry) -> float:
+        return (datetime.utcnow() - entry.updated_at).total_seconds()
+
+    @staticmethod
+    async def _note_read(student_id: Optional[int], from_cache: bool):
+        """Prefetch hit-rate metric (first read after a prefetch enqueue)."""
+        if student_id:
+            from services.prefetch_scheduler import PrefetchScheduler
+            await PrefetchScheduler.note_first_read(student_id, from_cache)
+
+    @staticmethod
+    async def get_absence_entry(token: str, semester_code: str = None, student_id: int = None, force_refresh: bool = False, base_url: Optional[str] = None) -> Optional[CacheEntry]:
+        """Attendance as a CacheEntry: get_summary() has the totals, records the compact items."""
         key = f"attendance_{semester_code}" if semester_code else "attendance_all"
         
         final_base = base_url or HemisService.BASE_URL
-        
-        def calculate_totals(data):
-            total, excused, unexcused = 0, 0, 0
-            for item in data:
-                hour = item.get("hour", 2)
-                total += hour
-                is_explicable = item.get("explicable", False)
-                if is_explicable:
-                    excused += hour
-                else:
-                    status = item.get("absent_status", {})
-                    code = str(status.get("code", "12"))
-                    name = status.get("name", "").lower()
-                    if code in ["11", "13"] or any(x in name for x in ["sababli", "kasallik", "ruxsat", "xizmat"]): 
-                         excused += hour
-                    else:
-                         unexcused += hour
-            return total, excused, unexcused
 
-        stale_data = None
+        stale = None
         # Check Cache if not forcing refresh
         if student_id and not force_refresh:
             try:
-                async with AsyncSessionLocal() as session:
-                    cache = await session.scalar(select(StudentCache).where(StudentCache.student_id == student_id, StudentCache.key == key))
-                    if cache: 
-                        # Cache validity: 30 minutes for attendance (it changes often)
-                        age = (datetime.utcnow() - cache.updated_at).total_seconds()
-                        if age < 30 * 60:
-                            t, e, u = calculate_totals(cache.data)
-                            return t, e, u, cache.data
-                        stale_data = cache.data
+                cache = await HemisService._cache_read(student_id, key)
+                if cache: 
+                    # Cache validity: 30 minutes for attendance (it changes often)
+                    if HemisService._cache_age(cache) < HemisService.CACHE_TTL["attendance"]:
+                        await HemisService._note_read(student_id, True)
+                        return cache
+                    stale = cache
             except Exception as e: 
                 logger.error(f"Cache Read Error: {e}")
 
@@ -640,33 +575,29 @@ class HemisService:
                 # Update Cache ONLY if data is present
                 if student_id and data:
                      try:
-                         async with AsyncSessionLocal() as session:
-                             c = await session.scalar(select(StudentCache).where(StudentCache.student_id == student_id, StudentCache.key == key))
-                             if c: 
-                                 c.data = data
-                                 c.updated_at = datetime.utcnow()
-                             else:
-                                 session.add(StudentCache(student_id=student_id, key=key, data=data))
-                             await session.commit()
+                         await HemisService._cache_write(student_id, key, data)
                      except Exception as e:
                          logger.error(f"Cache Write Error: {e}")
                          
-                t, e, u = calculate_totals(data)
-                return t, e, u, data
-            
-            if stale_data:
-                t, e, u = calculate_totals(stale_data)
-                return t, e, u, stale_data
+                await HemisService._note_read(student_id, False)
+                return CacheEntry(key, data)
             
-            return 0, 0, 0, []
+            return stale
         except Exception as e:
-            if stale_data:
-                t, e, u = calculate_totals(stale_data)
-                return t, e, u, stale_data
+            if stale:
+                return stale
             # Raise error if no cache and network failed
             logger.error(f"Absence Error: {e}")
             raise e
 
+    @staticmethod
+    async def get_student_absence(token: str, semester_code: str = None, student_id: int = None, force_refresh: bool = False, base_url: Optional[str] = None):
+        entry = await HemisService.get_absence_entry(token, semester_code, student_id, force_refresh, base_url)
+        if not entry or not entry.raw:
+            return 0, 0, 0, []
+        s = entry.get_summary()
+        return s["total"], s["excused"], s["unexcused"], entry.raw
+
     @staticmethod
     async def get_semester_list(token: str, student_id: int = None, force_refresh: bool = False, base_url: Optional[str] = None):
         key = "semesters_list"
@@ -675,11 +606,10 @@ class HemisService:
         # Check Cache
         if student_id and not force_refresh:
             try:
-                async with AsyncSessionLocal() as session:
-                    cache = await session.scalar(select(StudentCache).where(StudentCache.student_id == student_id, StudentCache.key == key))
-                    # Cache validity: 24 hours for semesters (they rarely change)
-                    if cache and (datetime.utcnow() - cache.updated_at).total_seconds() < 86400:
-                        return cache.data
+                cache = await HemisService._cache_read(student_id, key)
+                # Cache validity: 24 hours for semesters (they rarely change)
+                if cache and HemisService._cache_age(cache) < 86400:
+                    return cache.raw
             except Exception as e: 
                 logger.error(f"Semester Cache Read Error: {e}")
 
@@ -694,14 +624,7 @@ class HemisService:
                 # Update Cache
                 if student_id and data:
                     try:
-                        async with AsyncSessionLocal() as session:
-                            c = await session.scalar(select(StudentCache).where(StudentCache.student_id == student_id, StudentCache.key == key))
-                            if c: 
-                                c.data = data
-                                c.updated_at = datetime.utcnow()
-                            else:
-                                session.add(StudentCache(student_id=student_id, key=key, data=data))
-                            await session.commit()
+                        await HemisService._cache_write(student_id, key, data)
                     except Exception as e:
                         logger.error(f"Semester Cache Write Error: {e}")
 
@@ -716,18 +639,19 @@ class HemisService:
             return []
 
     @staticmethod
-    async def get_student_subject_list(token: str, semester_code: str = None, student_id: int = None, force_refresh: bool = False, base_url: Optional[str] = None):
+    async def get_subject_list_entry(token: str, semester_code: str = None, student_id: int = None, force_refresh: bool = False, base_url: Optional[str] = None) -> Optional[CacheEntry]:
+        """Subject list as a CacheEntry: records are normalized subjects (JN/ON/YN, hours)."""
         key = f"subjects_{semester_code}" if semester_code else "subjects_all"
         final_base = base_url or HemisService.BASE_URL
         
         # Check Cache
         if student_id and not force_refresh:
             try:
-                async with AsyncSessionLocal() as session:
-                    cache = await session.scalar(select(StudentCache).where(StudentCache.student_id == student_id, StudentCache.key == key))
-                    # Cache validity: 1 hour for subjects/grades
-                    if cache and (datetime.utcnow() - cache.updated_at).total_seconds() < 3600:
-                        return cache.data
+                cache = await HemisService._cache_read(student_id, key)
+                # Cache validity: 1 hour for subjects/grades
+                if cache and HemisService._cache_age(cache) < HemisService.CACHE_TTL["subjects"]:
+                    await HemisService._note_read(student_id, True)
+                    return cache
             except Exception as e: 
                 pass
 
@@ -744,21 +668,20 @@ class HemisService:
                 # Update Cache ONLY if data is present
                 if student_id and data:
                      try:
-                         async with AsyncSessionLocal() as session:
-                             c = await session.scalar(select(StudentCache).where(StudentCache.student_id == student_id, StudentCache.key == key))
-                             if c: 
-                                 c.data = data
-                                 c.updated_at = datetime.utcnow()
-                             else:
-                                 session.add(StudentCache(student_id=student_id, key=key, data=data))
-                             await session.commit()
+                         await HemisService._cache_write(student_id, key, data)
                      except Exception as e:
                          logger.error(f"Cache Write Error: {e}")
-                return data
-            return []
+                await HemisService._note_read(student_id, False)
+                return CacheEntry(key, data)
+            return None
         except Exception as e:
             logger.error(f"Subject List Error: {e}")
-            return []
+            return None
+
+    @staticmethod
+    async def get_student_subject_list(token: str, semester_code: str = None, student_id: int = None, force_refresh: bool = False, base_url: Optional[str] = None):
+        entry = await HemisService.get_subject_list_entry(token, semester_code, student_id, force_refresh, base_url)
+        return (entry.raw or []) if entry else []
 
     @staticmethod
     async def get_student_performance(token: str, semester_code: str = None, student_id: int = None, force_refresh: bool = False, base_url: Optional[str] = None):
@@ -768,11 +691,10 @@ class HemisService:
         # Check Cache
         if student_id and not force_refresh:
             try:
-                async with AsyncSessionLocal() as session:
-                    cache = await session.scalar(select(StudentCache).where(StudentCache.student_id == student_id, StudentCache.key == key))
-                    # Cache validity: 1 hour for performance
-                    if cache and (datetime.utcnow() - cache.updated_at).total_seconds() < 3600:
-                        return cache.data
+                cache = await HemisService._cache_read(student_id, key)
+                # Cache validity: 1 hour for performance
+                if cache and HemisService._cache_age(cache) < 3600:
+                    return cache.raw
             except Exception as e: 
                 pass
 
@@ -790,14 +712,7 @@ class HemisService:
                 # Update Cache ONLY if data is present
                 if student_id and data:
                      try:
-                         async with AsyncSessionLocal() as session:
-                             c = await session.scalar(select(StudentCache).where(StudentCache.student_id == student_id, StudentCache.key == key))
-                             if c: 
-                                 c.data = data
-                                 c.updated_at = datetime.utcnow()
-                             else:
-                                 session.add(StudentCache(student_id=student_id, key=key, data=data))
-                             await session.commit()
+                         await HemisService._cache_write(student_id, key, data)
                      except Exception as e:
                          logger.error(f"Cache Write Error: {e}")
                 return data
@@ -807,18 +722,19 @@ class HemisService:
             return []
 
     @staticmethod
-    async def get_student_schedule_cached(token: str, semester_code: str = None, student_id: int = None, force_refresh: bool = False, base_url: Optional[str] = None):
+    async def get_schedule_entry(token: str, semester_code: str = None, student_id: int = None, force_refresh: bool = False, base_url: Optional[str] = None) -> Optional[CacheEntry]:
+        """Semester schedule as a CacheEntry: records are compact lesson slots."""
         key = f"schedule_{semester_code}" if semester_code else "schedule_all"
         final_base = base_url or HemisService.BASE_URL
         
         # Check Cache
         if student_id and not force_refresh:
             try:
-                async with AsyncSessionLocal() as session:
-                    cache = await session.scalar(select(StudentCache).where(StudentCache.student_id == student_id, StudentCache.key == key))
-                    # Cache validity: 1 day for schedule (it basically never changes mid-semester)
-                    if cache and (datetime.utcnow() - cache.updated_at).total_seconds() < 86400:
-                            return cache.data
+                cache = await HemisService._cache_read(student_id, key)
+                # Cache validity: 1 day for schedule (it basically never changes mid-semester)
+                if cache and HemisService._cache_age(cache) < HemisService.CACHE_TTL["schedule"]:
+                        await HemisService._note_read(student_id, True)
+                        return cache
             except Exception as e: 
                 pass # Removed logger.error(f"Cache Read Error: {e}")
 
@@ -837,21 +753,20 @@ class HemisService:
                 # Update Cache ONLY if data is present
                 if student_id and data:
                      try:
-                         async with AsyncSessionLocal() as session:
-                             c = await session.scalar(select(StudentCache).where(StudentCache.student_id == student_id, StudentCache.key == key))
-                             if c: 
-                                 c.data = data
-                                 c.updated_at = datetime.utcnow()
-                             else:
-                                 session.add(StudentCache(student_id=student_id, key=key, data=data))
-                             await session.commit()
+                         await HemisService._cache_write(student_id, key, data)
                      except Exception as e:
                          logger.error(f"Cache Write Error: {e}")
-                return data
-            return []
+                await HemisService._note_read(student_id, False)
+                return CacheEntry(key, data)
+            return None
         except Exception as e:
             logger.error(f"Schedule Error: {e}")
-            return []
+            return None
+
+    @staticmethod
+    async def get_student_schedule_cached(token: str, semester_code: str = None, student_id: int = None, force_refresh: bool = False, base_url: Optional[str] = None):
+        entry = await HemisService.get_schedule_entry(token, semester_code, student_id, force_refresh, base_url)
+        return (entry.raw or []) if entry else []
 
     @staticmethod
     async def get_student_contract(token: str, student_id: int = None, force_refresh: bool = False, base_url: Optional[str] = None):
@@ -927,11 +842,10 @@ class HemisService:
         final_base = base_url or HemisService.BASE_URL
         if student_id:
             try:
-                async with AsyncSessionLocal() as session:
-                    cache = await session.scalar(select(StudentCache).where(StudentCache.student_id == student_id, StudentCache.key == key))
-                    # Cache validity: 3 days for curriculum
-                    if cache and (datetime.utcnow() - cache.updated_at).total_seconds() < 3 * 86400:
-                            return cache.data
+                cache = await HemisService._cache_read(student_id, key)
+                # Cache validity: 3 days for curriculum
+                if cache and HemisService._cache_age(cache) < 3 * 86400:
+                        return cache.raw
             except: pass
 
         client = await HemisService.get_client()
@@ -951,14 +865,7 @@ class HemisService:
                 data = response.json().get("data", {}).get("items", [])
                 # Only cache if data exists
                 if student_id and data:
-                    async with AsyncSessionLocal() as session:
-                        c = await session.scalar(select(StudentCache).where(StudentCache.student_id == student_id, StudentCache.key == key))
-                        if c:
-                            c.data = data
-                            c.updated_at = datetime.utcnow()
-                        else:
-                            session.add(StudentCache(student_id=student_id, key=key, data=data))
-                        await session.commit()
+                    await HemisService._cache_write(student_id, key, data)
                 return data
             return []
         except: return []
@@ -1047,105 +954,45 @@ class HemisService:
 
     @staticmethod
     async def resolve_specialty_id(specialty_name: str, education_type: str = None, faculty_id: int = None, education_form: str = None) -> Optional[int]:
-        """Find the best matching specialty ID, checking counts for duplicates."""
+        """Find the best matching specialty ID (ReferenceIndex), checking counts for duplicates."""
         if not HEMIS_ADMIN_TOKEN or not specialty_name: return None
-        
-        if not HEMIS_ADMIN_TOKEN or not specialty_name: return None
-        
-        # 1. Check persistent cache (memory only for now)
-        # keys now include context
-        cache_key = f"{specialty_name}:{education_type}:{faculty_id}:{education_form}"
-        if not hasattr(HemisService, "_resolved_specialty_ids"):
-             HemisService._resolved_specialty_ids = {}
-        if cache_key in HemisService._resolved_specialty_ids:
-             return HemisService._resolved_specialty_ids[cache_key]
 
-        all_specs = await HemisService.get_specialty_list()
-        req_norm = HemisService._normalize_name(specialty_name)
-        
-        # 2. Collect candidates
-        candidates = []
-        for s in all_specs:
-            s_name = s.get("name", "")
-            s_norm = HemisService._normalize_name(s_name)
-            if req_norm == s_norm or req_norm in s_norm or s_norm in req_norm:
-                candidates.append(s)
-        
+        from services.reference_index import ReferenceIndex
+        candidates = await ReferenceIndex.specialty_candidates(specialty_name, education_type, faculty_id, education_form)
         if not candidates: return None
+        if len(candidates) == 1:
+            return candidates[0].get("id")
 
-        # 3. Narrow by Education Type (60... Bakalavr, 70... Magistr)
-        if education_type:
-            is_bach = "Bakalavr" in education_type or str(education_type) == "11"
-            is_mag = "Magistr" in education_type or str(education_type) == "12"
-            type_prefix = "6" if is_bach else "7" if is_mag else None
-            if type_prefix:
-                typed = [c for c in candidates if str(c.get("code", "")).startswith(type_prefix)]
-                if typed:
-                    candidates = typed
-        
-        # 4. Narrow by Exact Normalized Name if multiple exist
-        exact = [c for c in candidates if req_norm == HemisService._normalize_name(c.get("name", ""))]
-        if exact:
-            candidates = exact
-
-        # 5. Narrow by Context (Specialized departments or Faculty)
-        context_candidates = []
-        
-        # A. Sirtqi/Magistr Context (Specialized departments)
-        is_sirtqi = education_form and ("Sirtqi" in education_form or str(education_form) == "13")
-        is_mag = education_type and ("Magistr" in education_type or str(education_type) == "12")
-        
-        if is_sirtqi:
-            sirtqi_matches = [c for c in candidates if c.get("department", {}).get("id") == 35]
-            if sirtqi_matches:
-                context_candidates = sirtqi_matches
-        elif is_mag:
-            mag_matches = [c for c in candidates if c.get("department", {}).get("id") == 16]
-            if mag_matches:
-                context_candidates = mag_matches
-        
-        # B. Faculty Context (Prioritize Selected Faculty)
-        if not context_candidates and faculty_id:
-            faculty_matches = [c for c in candidates if c.get("department", {}).get("id") == faculty_id]
-            if faculty_matches:
-                context_candidates = faculty_matches
-                
-        if context_candidates:
-            candidates = context_candidates
-
-        # 6. Resolve among remaining clones by checking real student counts
-        resolved_id = None
-        if len(candidates) > 1:
-            try:
-                client = await HemisService.get_client()
-                tasks = []
-                # Limit to first 5 candidates to avoid overwhelming
-                for c in candidates[:5]:
-                    sid = c.get("id")
-                    url = f"{HemisService.BASE_URL}/data/student-list"
-                    tasks.append(client.get(url, 
-                        headers={"Authorization": f"Bearer {HEMIS_ADMIN_TOKEN}"},
-                        params={"limit": 1, "_specialty": sid}
-                    ))
-                
-                responses = await asyncio.gather(*tasks)
-                max_count = -1
-                for i, r in enumerate(responses):
-                    if r.status_code == 200:
-                        count = r.json().get("data", {}).get("pagination", {}).get("totalCount", 0)
-                        if count > max_count:
-                            max_count = count
-                            resolved_id = candidates[i].get("id")
-            except Exception as e:
-                logger.error(f"Error resolving specialty count: {e}")
-                # Fallback to highest ID if count check fails
-                candidates.sort(key=lambda x: x.get("id"), reverse=True)
-                resolved_id = candidates[0].get("id")
-        elif candidates:
-            resolved_id = candidates[0].get("id")
+        # Resolve among remaining clones by checking real student counts (cached for the index TTL)
+        cache_key = f"{specialty_name}:{education_type}:{faculty_id}:{education_form}"
+        resolved_id = await ReferenceIndex.get_resolved_specialty(cache_key)
+        if resolved_id:
+            return resolved_id
+        try:
+            client = await HemisService.get_client()
+            tasks = []
+            # Limit to first 5 candidates to avoid overwhelming
+            for c in candidates[:5]:
+                tasks.append(client.get(f"{HemisService.BASE_URL}/data/student-list",
+                    headers={"Authorization": f"Bearer {HEMIS_ADMIN_TOKEN}"},
+                    params={"limit": 1, "_specialty": c.get("id")}
+                ))
+
+            responses = await asyncio.gather(*tasks)
+            max_count = -1
+            for i, r in enumerate(responses):
+                if r.status_code == 200:
+                    count = r.json().get("data", {}).get("pagination", {}).get("totalCount", 0)
+                    if count > max_count:
+                        max_count = count
+                        resolved_id = candidates[i].get("id")
+        except Exception as e:
+            logger.error(f"Error resolving specialty count: {e}")
+            # Fallback to highest ID if count check fails (candidates are sorted by id desc)
+            return candidates[0].get("id")
 
         if resolved_id:
-            HemisService._resolved_specialty_ids[cache_key] = resolved_id
+            await ReferenceIndex.set_resolved_specialty(cache_key, resolved_id)
         return resolved_id
 
     # [NEW] Admin API Methods for accurate search
@@ -1257,73 +1104,12 @@ class HemisService:
 
     @staticmethod
     async def resolve_group_id(group_name: str, token: str = None, faculty_id: int = None) -> Optional[int]:
-        """Find the matching group ID from the group list."""
+        """Find the matching group ID (ReferenceIndex: precomputed name / prefix lookups)."""
         auth_token = token or HEMIS_ADMIN_TOKEN
         if not auth_token or not group_name: return None
-        
-        # Cache resolution
-        if not hasattr(HemisService, "_resolved_group_ids"):
-             HemisService._resolved_group_ids = {}
-        if group_name in HemisService._resolved_group_ids:
-             return HemisService._resolved_group_ids[group_name]
-        
-        # Pass faculty_id if provided
-        all_groups = await HemisService.get_group_list(token=auth_token, faculty_id=faculty_id)
-        req_norm = HemisService._normalize_name(group_name)
-        
-        # 1. Try exact or substantial substring match
-        for g in all_groups:
-            g_original = g.get("name", "")
-            g_norm = HemisService._normalize_name(g_original)
-            if req_norm == g_norm or req_norm in g_norm or g_norm in req_norm:
-                gid = g.get("id")
-                HemisService._resolved_group_ids[group_name] = gid
-                return gid
-        
-        # 2. Try matching by group prefix code (e.g. "25-23")
-        import re
-        # Match standard pattern: 2 digits - 2 digits (e.g. 25-23)
-        match = re.search(r'(\d{2}-\d{2})', group_name)
-        if match:
-            group_prefix = match.group(1)
-            # Filter candidates by prefix first
-            candidates = [g for g in all_groups if group_prefix in g.get("name", "")]
-            
-            # If we have candidates, try to match the rest of the name
-            # Normalize and remove the prefix and common words
-            def clean_name(n):
-                n = HemisService._normalize_name(n)
-                return n.replace(group_prefix.replace("-", ""), "").replace("kunduzgi", "").replace("kechki", "").replace("sirtqi", "")
 
-            req_clean = clean_name(group_name)
-            
-            for g in candidates:
-                g_name = g.get("name", "")
-                g_clean = clean_name(g_name)
-                
-                # Loose match: if one contains the other
-                if req_clean in g_clean or g_clean in req_clean:
-                     gid = g.get("id")
-                     HemisService._resolved_group_ids[group_name] = gid
-                     return gid
-            
-            # Fallback: if only 1 candidate with that prefix, use it? 
-            # Risk: 25-23 Gr1 vs 25-23 Gr2. Better to be safe.
-            # But usually prefix + Specialty name is enough.
-            
-        # 3. Try matching by ignoring parenthesis content
-        # "25-23 AXBOROT ... (KUNDUZGI)" -> "25-23 AXBOROT ..."
-        base_name = re.sub(r'\(.*?\)', '', group_name).strip()
-        if base_name != group_name:
-             base_norm = HemisService._normalize_name(base_name)
-             for g in all_groups:
-                g_norm = HemisService._normalize_name(g.get("name", ""))
-                if base_norm in g_norm:
-                    gid = g.get("id")
-                    HemisService._resolved_group_ids[group_name] = gid
-                    return gid
-                    
-        return None
+        from services.reference_index import ReferenceIndex
+        return await ReferenceIndex.resolve_group(group_name, faculty_id=faculty_id, token=token)
 
     @staticmethod
     async def get_specialty_list(faculty_id: int = None, education_type: str = None):
@@ -1610,44 +1396,12 @@ class HemisService:
     async def prefetch_data(token: str, student_id: int, base_url: Optional[str] = None):
         """
         Eagerly loads critical data into cache to prevent 'First Load' delay.
-        Should be called as a background task upon login.
+        Runs the job inline; API handlers enqueue via PrefetchScheduler instead.
         """
+        from services.prefetch_scheduler import PrefetchScheduler
         logger.info(f"Prefetching data for student {student_id} (URL: {base_url})...")
-        try:
-            # 0. Warm Me Cache
-            await HemisService.get_me(token, base_url=base_url)
-
-            # 1. Semesters (Fast)
-            semesters = await HemisService.get_semester_list(token, student_id=student_id, base_url=base_url)
-            
-            # Resolve ID
-            sem_code = None
-            # Try to get from Me first if possible, but get_me isn't cached here. 
-            # Let's assume most recent semester from list is current or close enough for cache warming.
-            if semesters:
-                 # Find 'current' flag
-                 for s in semesters:
-                     if s.get("current") is True:
-                         sem_code = str(s.get("code") or s.get("id"))
-                         break
-                 if not sem_code and semesters:
-                     sem_code = str(semesters[0].get("code") or semesters[0].get("id"))
-
-            if not sem_code: sem_code = "11" # Fallback
-
-            # 2. Parallel Fetch of Critical Modules
-            import asyncio
-            await asyncio.gather(
-                # Grades / Subjects
-                HemisService.get_student_subject_list(token, semester_code=sem_code, student_id=student_id, base_url=base_url),
-                # Attendance
-                HemisService.get_student_absence(token, semester_code=sem_code, student_id=student_id, base_url=base_url),
-                # Schedule
-                HemisService.get_student_schedule_cached(token, semester_code=sem_code, student_id=student_id, base_url=base_url)
-            )
-            logger.info(f"Prefetch complete for student {student_id}")
-        except Exception as e:
-            logger.error(f"Prefetch error: {e}")
+        result = await PrefetchScheduler.run_job(student_id, {"token": token, "base_url": base_url})
+        logger.info(f"Prefetch {result} for student {student_id}")
 
     @staticmethod
     async def get_public_stats() -> Dict[str, Any]:
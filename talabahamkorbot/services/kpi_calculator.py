@@ -3,16 +3,21 @@ KPI Calculator Service for Tyutor Module
 Calculates tyutor performance based on 5 metrics
 """
 
-from datetime import datetime, timedelta
-from sqlalchemy import select, func
+import logging
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import select, func, union
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from database.models import (
     Staff, Student, TutorGroup,
     UserActivity, StudentFeedback,
-    ParentContactLog, TyutorKPI
+    ParentContactLog, TyutorKPI, StaffRole
 )
 
+logger = logging.getLogger(__name__)
+
 
 async def calculate_tyutor_kpi(
     tyutor_id: int,
@@ -30,48 +35,11 @@ async def calculate_tyutor_kpi(
     5. Intizom (10%)
     """
     
-    # Chorak sanalarini aniqlash
-    start_date, end_date = get_quarter_dates(quarter, year)
-    
-    # 1. Talabalar qamrovi (30%)
-    coverage_score = await calculate_coverage_score(tyutor_id, session)
-    
-    # 2. Muammo aniqlash (25%)
-    risk_score = await calculate_risk_detection_score(
-        tyutor_id, start_date, end_date, session
-    )
-    
-    # 3. Tadbir faolligi (20%)
-    activity_score = await calculate_activity_score(
-        tyutor_id, start_date, end_date, session
-    )
-    
-    # 4. Ota-ona aloqasi (15%)
-    parent_score = await calculate_parent_contact_score(
-        tyutor_id, start_date, end_date, session
+    # Batch engine bilan bir xil formulalar (bitta tyutor uchun)
+    rows = await calculate_university_kpi(
+        None, quarter, year, session, tutor_ids=[tyutor_id]
     )
-    
-    # 5. Intizom (10%)
-    discipline_score = await calculate_discipline_score(tyutor_id, session)
-    
-    # Umumiy KPI
-    total_kpi = (
-        coverage_score * 0.30 +
-        risk_score * 0.25 +
-        activity_score * 0.20 +
-        parent_score * 0.15 +
-        discipline_score * 0.10
-    )
-    
-    # KPI ni saqlash
-    await save_kpi(
-        tyutor_id, quarter, year,
-        coverage_score, risk_score, activity_score,
-        parent_score, discipline_score, total_kpi,
-        session
-    )
-    
-    return total_kpi
+    return rows[0]["total_kpi"] if rows else 0.0
 
 
 async def calculate_coverage_score(tyutor_id: int, session: AsyncSession) -> float:
@@ -243,3 +211,243 @@ def get_quarter_dates(quarter: int, year: int) -> tuple[datetime, datetime]:
         4: (datetime(year, 10, 1), datetime(year, 12, 31, 23, 59, 59)),
     }
     return quarters.get(quarter, quarters[1])
+
+
+# ============================================================
+# BATCH: universitetdagi barcha tyutorlar bir o'tishda
+# ============================================================
+
+def score_components(
+    total_students: int,
+    active_students: int,
+    feedback_count: int,
+    activity_count: int,
+    contact_count: int,
+) -> Dict[str, float]:
+    """Yuqoridagi calculate_*_score funksiyalari bilan bir xil formulalar (sof hisob)."""
+    coverage = 30.0 if total_students else 0.0
+    risk = min((feedback_count / 2) * 5, 25.0)
+    activity = min((activity_count / 5) * 4, 20.0)
+    parent = min((contact_count / 3) * 5, 15.0)
+    discipline = (active_students / total_students) * 10 if total_students else 10.0
+    total = (
+        coverage * 0.30 +
+        risk * 0.25 +
+        activity * 0.20 +
+        parent * 0.15 +
+        discipline * 0.10
+    )
+    return {
+        "coverage_score": coverage,
+        "risk_detection_score": risk,
+        "activity_score": activity,
+        "parent_contact_score": parent,
+        "discipline_score": discipline,
+        "total_kpi": total,
+    }
+
+
+def _tutor_scope(university_id: Optional[int], tutor_ids: Optional[Iterable[int]]):
+    """Tyutorlar ro'yxati: guruh biriktirilganlar + rol bo'yicha tyutorlar."""
+    by_group = select(TutorGroup.tutor_id.label("tutor_id")).where(TutorGroup.tutor_id.isnot(None))
+    by_role = select(Staff.id.label("tutor_id")).where(Staff.role == StaffRole.TYUTOR)
+    if university_id is not None:
+        by_group = by_group.where(TutorGroup.university_id == university_id)
+        by_role = by_role.where(Staff.university_id == university_id)
+    if tutor_ids is not None:
+        # Aniq ro'yxat berilsa, rolidan qat'i nazar hisoblanadi
+        ids = list(tutor_ids)
+        by_group = by_group.where(TutorGroup.tutor_id.in_(ids))
+        by_role = select(Staff.id.label("tutor_id")).where(Staff.id.in_(ids))
+    return union(by_group, by_role).cte("kpi_tutors")
+
+
+async def compute_kpi_batch(
+    session: AsyncSession,
+    start_date: datetime,
+    end_date: datetime,
+    university_id: Optional[int] = None,
+    tutor_ids: Optional[Iterable[int]] = None,
+) -> List[dict]:
+    """
+    Barcha tyutorlar uchun 5 ta komponent bitta SQL so'rovda (tutor_id bo'yicha guruhlangan CTE lar).
+    Returns [{"tyutor_id", "coverage_score", ..., "total_kpi", "counts": {...}}].
+    """
+    tutors = _tutor_scope(university_id, tutor_ids)
+
+    # Tyutor -> talaba (calculate_coverage_score dagi join bilan bir xil)
+    roster = (
+        select(
+            TutorGroup.tutor_id.label("tutor_id"),
+            Student.id.label("student_id"),
+            Student.status.label("status"),
+        )
+        .join(Student, Student.group_number == TutorGroup.group_number)
+        .where(TutorGroup.tutor_id.in_(select(tutors.c.tutor_id)))
+        .cte("kpi_roster")
+    )
+
+    students = (
+        select(
+            roster.c.tutor_id,
+            func.count(roster.c.student_id).label("total_students"),
+            func.count(roster.c.student_id).filter(roster.c.status == "active").label("active_students"),
+        )
+        .group_by(roster.c.tutor_id)
+        .cte("kpi_students")
+    )
+    feedback = (
+        select(roster.c.tutor_id, func.count(StudentFeedback.id).label("feedback_count"))
+        .join(StudentFeedback, StudentFeedback.student_id == roster.c.student_id)
+        .where(StudentFeedback.created_at.between(start_date, end_date))
+        .group_by(roster.c.tutor_id)
+        .cte("kpi_feedback")
+    )
+    activity = (
+        select(roster.c.tutor_id, func.count(UserActivity.id).label("activity_count"))
+        .join(UserActivity, UserActivity.student_id == roster.c.student_id)
+        .where(
+            UserActivity.status == "approved",
+            UserActivity.created_at.between(start_date, end_date),
+        )
+        .group_by(roster.c.tutor_id)
+        .cte("kpi_activity")
+    )
+    contacts = (
+        select(
+            ParentContactLog.tyutor_id.label("tutor_id"),
+            func.count(ParentContactLog.id).label("contact_count"),
+        )
+        .where(
+            ParentContactLog.tyutor_id.in_(select(tutors.c.tutor_id)),
+            ParentContactLog.contact_date.between(start_date, end_date),
+        )
+        .group_by(ParentContactLog.tyutor_id)
+        .cte("kpi_contacts")
+    )
+
+    query = (
+        select(
+            tutors.c.tutor_id,
+            func.coalesce(students.c.total_students, 0),
+            func.coalesce(students.c.active_students, 0),
+            func.coalesce(feedback.c.feedback_count, 0),
+            func.coalesce(activity.c.activity_count, 0),
+            func.coalesce(contacts.c.contact_count, 0),
+        )
+        .select_from(tutors)
+        .outerjoin(students, students.c.tutor_id == tutors.c.tutor_id)
+        .outerjoin(feedback, feedback.c.tutor_id == tutors.c.tutor_id)
+        .outerjoin(activity, activity.c.tutor_id == tutors.c.tutor_id)
+        .outerjoin(contacts, contacts.c.tutor_id == tutors.c.tutor_id)
+        .order_by(tutors.c.tutor_id)
+    )
+
+    results = []
+    for tutor_id, total, active, fb, act, contact in (await session.execute(query)).all():
+        scores = score_components(total, active, fb, act, contact)
+        scores["tyutor_id"] = tutor_id
+        scores["counts"] = {
+            "students": total, "active_students": active,
+            "feedback": fb, "activities": act, "parent_contacts": contact,
+        }
+        results.append(scores)
+    return results
+
+
+async def upsert_kpi_rows(session: AsyncSession, quarter: int, year: int, rows: List[dict]) -> int:
+    """
+    TyutorKPI ga bitta INSERT ... ON CONFLICT (tyutor_id, quarter, year) DO UPDATE.
+    Ustunlar Integer, shuning uchun ballar yaxlitlanadi.
+    """
+    if not rows:
+        return 0
+
+    dialect = session.bind.dialect.name if session.bind is not None else "postgresql"
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+
+    now = datetime.utcnow()
+    score_fields = (
+        "coverage_score", "risk_detection_score", "activity_score",
+        "parent_contact_score", "discipline_score", "total_kpi",
+    )
+    values = [
+        dict(
+            {field: round(row[field]) for field in score_fields},
+            tyutor_id=row["tyutor_id"], quarter=quarter, year=year, updated_at=now,
+        )
+        for row in rows
+    ]
+
+    stmt = dialect_insert(TyutorKPI)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["tyutor_id", "quarter", "year"],
+        set_={field: getattr(stmt.excluded, field) for field in score_fields + ("updated_at",)},
+    )
+    await session.execute(stmt, values)
+    return len(values)
+
+
+async def calculate_university_kpi(
+    university_id: Optional[int],
+    quarter: int,
+    year: int,
+    session: AsyncSession,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    tutor_ids: Optional[Iterable[int]] = None,
+    commit: bool = True,
+) -> List[dict]:
+    """
+    Universitetdagi barcha tyutorlar KPI si: 1 ta hisob so'rovi + 1 ta bulk upsert.
+    start_date/end_date berilmasa chorak sanalari ishlatiladi.
+    """
+    q_start, q_end = get_quarter_dates(quarter, year)
+    rows = await compute_kpi_batch(
+        session, start_date or q_start, end_date or q_end,
+        university_id=university_id, tutor_ids=tutor_ids,
+    )
+    await upsert_kpi_rows(session, quarter, year, rows)
+    if commit:
+        await session.commit()
+    logger.info(f"📊 Tyutor KPI: university={university_id} {year}-Q{quarter}: {len(rows)} tutors")
+    return rows
+
+
+def quarters_in_range(start: date, end: date) -> List[tuple]:
+    """[(quarter, year), ...] - oraliq bilan kesishgan choraklar (xronologik tartibda)."""
+    if end < start:
+        start, end = end, start
+    result = []
+    year, quarter = start.year, (start.month - 1) // 3 + 1
+    while (year, quarter) <= (end.year, (end.month - 1) // 3 + 1):
+        result.append((quarter, year))
+        quarter += 1
+        if quarter > 4:
+            quarter, year = 1, year + 1
+    return result
+
+
+async def recompute_kpi_range(
+    session: AsyncSession,
+    start: date,
+    end: date,
+    university_id: Optional[int] = None,
+) -> Dict[str, int]:
+    """Oraliqqa tushgan har bir chorakni to'liq qayta hisoblaydi. Returns {"2026-Q1": tutors, ...}."""
+    summary = {}
+    for quarter, year in quarters_in_range(start, end):
+        rows = await calculate_university_kpi(university_id, quarter, year, session)
+        summary[f"{year}-Q{quarter}"] = len(rows)
+    return summary
+
+
+async def run_tutor_kpi_recompute():
+    """Daily job (services.daily_jobs): joriy chorak, barcha universitetlar."""
+    from database.db_connect import BatchSessionLocal
+    today = datetime.utcnow()
+    async with BatchSessionLocal() as session:
+        return await calculate_university_kpi(None, (today.month - 1) // 3 + 1, today.year, session)
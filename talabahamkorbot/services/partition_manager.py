@@ -0,0 +1,267 @@
+import asyncio
+import gzip
+import json
+import logging
+import os
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import column, delete, func, select, table as sa_table, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from config import LOG_ARCHIVE_DIR, LOG_RETENTION_MONTHS
+from database.db_connect import Base, batch_engine as default_engine
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class LogTablePolicy:
+    table: str
+    column: str                        # time column (partition key)
+    retention_months: Optional[int]    # None: never deleted automatically
+    archive: bool = True               # write rows to gzip JSONL before dropping/deleting
+    partitioned: bool = True           # False: heap table, retention by batched DELETE
+
+
+# security_tokens is not here: TokenService.cleanup_old_tokens (daily job) already
+# removes used tokens and the whole legacy table after LEGACY_ACTION_TOKENS_UNTIL.
+POLICIES: List[LogTablePolicy] = [
+    LogTablePolicy("activity_logs", "created_at", 13),
+    LogTablePolicy("student_notifications", "created_at", 6),
+    LogTablePolicy("student_ai_logs", "created_at", 12),
+    # UNIQUE (post_id, student_id) cannot include viewed_at, so no partitions; views
+    # older than the window may be counted again if the post is reopened.
+    LogTablePolicy("choyxona_post_views", "viewed_at", 12, partitioned=False),
+    # Self-referencing FK (reply_to_message_id) and user content: kept unless configured
+    LogTablePolicy("private_messages", "created_at", None, partitioned=False),
+]
+
+
+def get_policies() -> List[LogTablePolicy]:
+    """POLICIES with LOG_RETENTION_MONTHS overrides ("activity_logs=24,private_messages=36")."""
+    overrides = {}
+    for item in filter(None, (LOG_RETENTION_MONTHS or "").split(",")):
+        name, _, months = item.partition("=")
+        overrides[name.strip()] = int(months) if months.strip().isdigit() else None
+    return [
+        LogTablePolicy(p.table, p.column, overrides.get(p.table, p.retention_months), p.archive, p.partitioned)
+        if p.table in overrides else p
+        for p in POLICIES
+    ]
+
+
+def month_start(ts: datetime) -> datetime:
+    return ts.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(ts: datetime, months: int) -> datetime:
+    index = ts.year * 12 + ts.month - 1 + months
+    return ts.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(table: str, month: datetime) -> str:
+    return f"{table}_p{month:%Y%m}"
+
+
+PARTITION_RE = re.compile(r"_p(\d{4})(\d{2})$")
+
+
+class PartitionManager:
+    """
+    Monthly RANGE partitions and retention for high-volume log tables:
+      - Postgres, partitioned table: keeps PREMAKE_MONTHS future partitions created; partitions
+        wholly older than the retention window are archived (gzip JSONL) then DETACHed and
+        DROPped - no DELETE, no index bloat
+      - heap tables (not partitioned yet, incompatible constraints, SQLite dev): old rows are
+        archived month by month and deleted in id batches
+    Conversion of an existing heap table: scripts/migrations/partition_log_tables.py
+    """
+
+    PREMAKE_MONTHS = 3
+    BATCH_SIZE = 5000
+    FETCH_SIZE = 2000
+
+    @staticmethod
+    def _table(name: str, policy: LogTablePolicy):
+        """Lightweight table clause with the model's column types (works for partitions too)."""
+        model = Base.metadata.tables[policy.table]
+        return sa_table(name, *[column(c.name, c.type) for c in model.columns])
+
+    # ------------------------------------------------------------
+    # Postgres partitions
+    # ------------------------------------------------------------
+
+    @staticmethod
+    async def is_partitioned(conn, table: str) -> bool:
+        if conn.dialect.name != "postgresql":
+            return False
+        row = await conn.execute(text(
+            "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+            "WHERE c.relname = :t"
+        ), {"t": table})
+        return row.first() is not None
+
+    @staticmethod
+    async def list_partitions(conn, table: str) -> List[Tuple[str, datetime]]:
+        """Monthly partitions as (name, month), oldest first (DEFAULT partition excluded)."""
+        rows = await conn.execute(text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = :t"
+        ), {"t": table})
+        found = []
+        for (name,) in rows:
+            m = PARTITION_RE.search(name)
+            if m and name == f"{table}{m.group(0)}":
+                found.append((name, datetime(int(m.group(1)), int(m.group(2)), 1)))
+        return sorted(found, key=lambda p: p[1])
+
+    @staticmethod
+    def partition_ddl(table: str, month: datetime) -> str:
+        return (
+            f"CREATE TABLE IF NOT EXISTS {partition_name(table, month)} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{add_months(month, 1):%Y-%m-%d}')"
+        )
+
+    @classmethod
+    async def ensure_partitions(cls, conn, policy: LogTablePolicy, now: datetime) -> List[str]:
+        existing = {name for name, _ in await cls.list_partitions(conn, policy.table)}
+        created = []
+        current = month_start(now)
+        for i in range(cls.PREMAKE_MONTHS + 1):
+            month = add_months(current, i)
+            name = partition_name(policy.table, month)
+            if name not in existing:
+                await conn.execute(text(cls.partition_ddl(policy.table, month)))
+                created.append(name)
+        return created
+
+    # ------------------------------------------------------------
+    # Archive / delete
+    # ------------------------------------------------------------
+
+    @classmethod
+    async def archive_range(cls, engine: AsyncEngine, policy: LogTablePolicy, source: str,
+                            start: Optional[datetime], end: datetime, label: str) -> int:
+        """Streams rows of `source` with start <= column < end into a gzip JSONL file."""
+        t = cls._table(source, policy)
+        col = t.c[policy.column]
+        stmt = select(t).where(col < end)
+        if start is not None:
+            stmt = stmt.where(col >= start)
+        stmt = stmt.order_by(col)
+
+        folder = os.path.join(LOG_ARCHIVE_DIR, policy.table)
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"{label}.jsonl.gz")
+        tmp = path + ".tmp"
+        rows = 0
+        fh = gzip.open(tmp, "wt", encoding="utf-8")
+        try:
+            async with engine.connect() as conn:
+                result = await conn.stream(stmt.execution_options(yield_per=cls.FETCH_SIZE))
+                async for chunk in result.mappings().partitions(cls.FETCH_SIZE):
+                    data = "".join(json.dumps(dict(r), default=str, ensure_ascii=False) + "\n" for r in chunk)
+                    await asyncio.to_thread(fh.write, data)
+                    rows += len(chunk)
+        finally:
+            await asyncio.to_thread(fh.close)
+        if rows:
+            os.replace(tmp, path)
+        else:
+            os.remove(tmp)
+        return rows
+
+    @classmethod
+    async def drop_partition(cls, engine: AsyncEngine, table: str, name: str):
+        async with engine.begin() as conn:
+            await conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+            await conn.execute(text(f"DROP TABLE {name}"))
+
+    @classmethod
+    async def delete_before(cls, engine: AsyncEngine, policy: LogTablePolicy, end: datetime) -> int:
+        """Deletes rows older than `end` in id batches (short transactions)."""
+        t = cls._table(policy.table, policy)
+        deleted = 0
+        while True:
+            async with engine.begin() as conn:
+                ids = (await conn.execute(
+                    select(t.c.id).where(t.c[policy.column] < end).limit(cls.BATCH_SIZE)
+                )).scalars().all()
+                if not ids:
+                    break
+                await conn.execute(delete(t).where(t.c.id.in_(ids)))
+            deleted += len(ids)
+            if len(ids) < cls.BATCH_SIZE:
+                break
+        return deleted
+
+    # ------------------------------------------------------------
+    # Policy
+    # ------------------------------------------------------------
+
+    @classmethod
+    async def apply_policy(cls, engine: AsyncEngine, policy: LogTablePolicy, now: datetime) -> Dict[str, int]:
+        stats = {"created": 0, "dropped": 0, "archived": 0, "deleted": 0}
+        async with engine.begin() as conn:
+            partitioned = policy.partitioned and await cls.is_partitioned(conn, policy.table)
+            if partitioned:
+                stats["created"] = len(await cls.ensure_partitions(conn, policy, now))
+        if policy.retention_months is None:
+            return stats
+
+        cutoff = add_months(month_start(now), -policy.retention_months)
+        if partitioned:
+            async with engine.connect() as conn:
+                partitions = await cls.list_partitions(conn, policy.table)
+            for name, month in partitions:
+                if add_months(month, 1) > cutoff:
+                    break
+                if policy.archive:
+                    stats["archived"] += await cls.archive_range(
+                        engine, policy, name, None, add_months(month, 1), name)
+                await cls.drop_partition(engine, policy.table, name)
+                stats["dropped"] += 1
+                logger.info(f"🗄 {policy.table}: partition {name} archived and dropped")
+
+        # Heap tables, and rows left in a DEFAULT partition: month by month
+        t = cls._table(policy.table, policy)
+        async with engine.connect() as conn:
+            oldest = (await conn.execute(
+                select(func.min(t.c[policy.column])).where(t.c[policy.column] < cutoff)
+            )).scalar()
+        if oldest is None:
+            return stats
+        month = month_start(oldest)
+        while month < cutoff:
+            end = min(add_months(month, 1), cutoff)
+            if policy.archive:
+                label = f"{policy.table}_{month:%Y%m}_{now:%Y%m%d%H%M%S}"
+                stats["archived"] += await cls.archive_range(engine, policy, policy.table, month, end, label)
+            stats["deleted"] += await cls.delete_before(engine, policy, end)
+            month = end
+        return stats
+
+    @classmethod
+    async def run(cls, engine: AsyncEngine = None, now: datetime = None,
+                  policies: List[LogTablePolicy] = None) -> Dict[str, Dict[str, int]]:
+        engine = engine or default_engine
+        now = now or datetime.utcnow()
+        report = {}
+        for policy in policies or get_policies():
+            try:
+                report[policy.table] = await cls.apply_policy(engine, policy, now)
+            except Exception as e:
+                logger.error(f"Partition maintenance failed for {policy.table}: {e}")
+                report[policy.table] = {"error": str(e)}
+        return report
+
+
+async def run_log_partition_maintenance():
+    """Daily job (services.daily_jobs, also at startup): future partitions, archival and retention of log tables."""
+    report = await PartitionManager.run()
+    logger.info(f"🗄 Log partition maintenance: {report}")
+    return report
@@ -0,0 +1,106 @@
+import logging
+
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+
+from database.models import ChoyxonaPost, Staff, Student
+from utils.text_utils import format_uzbek_name
+
+logger = logging.getLogger(__name__)
+
+PostAuthorStudent = aliased(Student, name="post_author_student")
+PostAuthorStaff = aliased(Staff, name="post_author_staff")
+
+
+class PostFeedService:
+    """
+    Choyxona post lists without ORM graphs: one projection (post + author columns)
+    mapped straight to PostResponseSchema-shaped dicts.
+    """
+
+    @staticmethod
+    def projection():
+        p = ChoyxonaPost
+        return (
+            select(
+                p.id, p.content, p.category_type, p.student_id, p.staff_id, p.created_at,
+                p.target_university_id, p.target_faculty_id, p.target_specialty_name,
+                p.likes_count, p.comments_count, p.reposts_count, p.views_count,
+                PostAuthorStudent.id.label("s_id"),
+                PostAuthorStudent.full_name.label("s_full_name"),
+                PostAuthorStudent.short_name.label("s_short_name"),
+                PostAuthorStudent.username.label("s_username"),
+                PostAuthorStudent.image_url.label("s_image_url"),
+                PostAuthorStudent.hemis_role.label("s_role"),
+                PostAuthorStudent.is_premium.label("s_is_premium"),
+                PostAuthorStudent.custom_badge.label("s_custom_badge"),
+                PostAuthorStaff.id.label("f_id"),
+                PostAuthorStaff.full_name.label("f_full_name"),
+                PostAuthorStaff.short_name.label("f_short_name"),
+                PostAuthorStaff.username.label("f_username"),
+                PostAuthorStaff.image_url.label("f_image_url"),
+                PostAuthorStaff.role.label("f_role"),
+                PostAuthorStaff.is_premium.label("f_is_premium"),
+                PostAuthorStaff.custom_badge.label("f_custom_badge"),
+            )
+            .select_from(p)
+            .outerjoin(PostAuthorStudent, PostAuthorStudent.id == p.student_id)
+            .outerjoin(PostAuthorStaff, PostAuthorStaff.id == p.staff_id)
+        )
+
+    @staticmethod
+    def author_name(full_name, short_name) -> str:
+        """Same rules as api.community.format_name: "First Last" from "Last First [Patronymic]"."""
+        f_name = (full_name or "").strip()
+        if f_name and len(f_name.split()) >= 2:
+            parts = f_name.split()
+            return format_uzbek_name(f"{parts[1]} {parts[0]}")
+        s_name = (short_name or "").strip()
+        if f_name:
+            return format_uzbek_name(f_name)
+        if s_name:
+            return format_uzbek_name(s_name)
+        return "Talaba"
+
+    @classmethod
+    def map_row(cls, row, viewer_id: int, viewer_is_staff: bool, is_liked: bool, is_reposted: bool) -> dict:
+        if row.s_id is not None:
+            prefix, role = "s", row.s_role or "student"
+        elif row.f_id is not None:
+            prefix, role = "f", row.f_role or "student"
+        else:
+            prefix, role = None, "student"
+
+        author = (lambda name: getattr(row, f"{prefix}_{name}")) if prefix else (lambda name: None)
+        image = author("image_url")
+
+        if row.staff_id and viewer_is_staff:
+            is_mine = row.staff_id == viewer_id
+        else:
+            is_mine = bool(row.student_id) and not viewer_is_staff and row.student_id == viewer_id
+
+        return {
+            "id": row.id,
+            "content": row.content,
+            "category_type": row.category_type,
+            "author_id": author("id") or 0,
+            "author_name": cls.author_name(author("full_name"), author("short_name")) if prefix else "Unknown",
+            "author_username": author("username"),
+            "author_avatar": image,
+            "author_image": image,
+            "image": image,
+            "author_role": role,
+            "author_is_premium": bool(author("is_premium")),
+            "author_custom_badge": author("custom_badge"),
+            "created_at": row.created_at,
+            "target_university_id": row.target_university_id,
+            "target_faculty_id": row.target_faculty_id,
+            "target_specialty_name": row.target_specialty_name,
+            "likes_count": row.likes_count or 0,
+            "comments_count": row.comments_count or 0,
+            "reposts_count": row.reposts_count or 0,
+            "views_count": row.views_count or 0,
+            "is_liked_by_me": is_liked,
+            "is_reposted_by_me": is_reposted,
+            "is_mine": is_mine,
+        }
@@ -0,0 +1,408 @@
+import asyncio
+import contextvars
+import heapq
+import json
+import logging
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import redis.asyncio as redis
+from sqlalchemy import select
+
+from config import REDIS_URL
+from database.db_connect import AsyncSessionLocal
+from database.models import StudentCache
+
+logger = logging.getLogger(__name__)
+
+# Priority lanes (kichik raqam = yuqori ustuvorlik)
+LANE_INTERACTIVE = 0    # pull-to-refresh, /student/sync
+LANE_PREFETCH = 1       # login
+LANE_SYNC = 2           # app start / background sync
+
+LANE_SPAN = 10 ** 13    # score = lane * LANE_SPAN + enqueue time (ms)
+
+# Set while a prefetch job runs, so HemisService reads made by the job are not
+# counted as "first screen" reads
+PREFETCHING = contextvars.ContextVar("prefetching", default=False)
+
+Job = Tuple[int, dict, float]   # (student_id, {"token", "base_url", "semester"}, score)
+
+
+def lane_of(score: float) -> int:
+    return int(score // LANE_SPAN)
+
+
+class LocalQueue:
+    """In-process backend (Redis down / single worker / tests)."""
+
+    def __init__(self):
+        self.scores: Dict[int, float] = {}
+        self.jobs: Dict[int, dict] = {}
+        self.heap: List[Tuple[float, int]] = []
+        self.budget: Dict[str, Tuple[int, int]] = {}
+        self.counters: Dict[str, int] = {}
+        self.pending: Dict[int, float] = {}
+
+    async def push(self, student_id: int, job: dict, score: float) -> str:
+        old = self.scores.get(student_id)
+        self.jobs[student_id] = job
+        if old is not None and old <= score:
+            return "dup"
+        self.scores[student_id] = score
+        heapq.heappush(self.heap, (score, student_id))
+        return "promoted" if old is not None else "new"
+
+    async def pop(self, count: int) -> List[Job]:
+        out = []
+        while self.heap and len(out) < count:
+            score, sid = heapq.heappop(self.heap)
+            if self.scores.get(sid) != score:
+                continue  # promoted entry left behind
+            del self.scores[sid]
+            out.append((sid, self.jobs.pop(sid, None), score))
+        return out
+
+    async def take_budget(self, host: str, units: int, limit: int) -> bool:
+        second = int(time.time())
+        sec, used = self.budget.get(host, (second, 0))
+        if sec != second:
+            used = 0
+        if used + units > limit:
+            return False
+        self.budget[host] = (second, used + units)
+        return True
+
+    async def incr(self, counts: Dict[str, int]):
+        for k, v in counts.items():
+            self.counters[k] = self.counters.get(k, 0) + v
+
+    async def get_counters(self) -> Dict[str, int]:
+        return dict(self.counters)
+
+    async def mark_pending(self, student_id: int, ttl: int):
+        self.pending[student_id] = time.monotonic() + ttl
+
+    async def take_pending(self, student_id: int) -> bool:
+        expires = self.pending.pop(student_id, None)
+        return bool(expires and expires > time.monotonic())
+
+    async def size(self) -> int:
+        return len(self.scores)
+
+
+class RedisQueue:
+    """
+    Shared backend: every worker enqueues into and pops from the same sorted set.
+      - ZADD LT: re-enqueueing a queued student is a no-op unless it raises priority
+      - job bodies (they carry HEMIS tokens) in one key per student with JOB_TTL, latest token wins
+      - pop = one Lua script (ZPOPMIN + GET + DEL), so a concurrent push cannot lose or
+        overwrite a body between popping the id and reading it
+      - per-host budget: INCRBY on a per-second counter
+    """
+
+    QUEUE_KEY = "prefetch:queue"
+    JOB_KEY = "prefetch:job:{}"
+    JOB_TTL = 3600
+    METRICS_KEY = "prefetch:metrics"
+    BUDGET_KEY = "prefetch:budget:{}:{}"
+    PENDING_KEY = "prefetch:pending:{}"
+
+    # KEYS: queue; ARGV: count, job key prefix -> flat [id, score, body|nil, ...]
+    POP_SCRIPT = """
+    local popped = redis.call('ZPOPMIN', KEYS[1], ARGV[1])
+    local out = {}
+    for i = 1, #popped, 2 do
+        local key = ARGV[2] .. popped[i]
+        table.insert(out, popped[i])
+        table.insert(out, popped[i + 1])
+        table.insert(out, redis.call('GET', key))
+        redis.call('DEL', key)
+    end
+    return out
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    async def push(self, student_id: int, job: dict, score: float) -> str:
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.zscore(self.QUEUE_KEY, student_id)
+            pipe.zadd(self.QUEUE_KEY, {student_id: score}, lt=True)
+            pipe.set(self.JOB_KEY.format(student_id), json.dumps(job), ex=self.JOB_TTL)
+            old, _, _ = await pipe.execute()
+        if old is None:
+            return "new"
+        return "promoted" if score < float(old) else "dup"
+
+    async def pop(self, count: int) -> List[Job]:
+        flat = await self.client.eval(self.POP_SCRIPT, 1, self.QUEUE_KEY, count, self.JOB_KEY.format(""))
+        # Body missing (JOB_TTL passed) => None, dropped by drain_once
+        return [
+            (int(flat[i]), json.loads(flat[i + 2]) if flat[i + 2] else None, float(flat[i + 1]))
+            for i in range(0, len(flat or []), 3)
+        ]
+
+    async def take_budget(self, host: str, units: int, limit: int) -> bool:
+        key = self.BUDGET_KEY.format(host, int(time.time()))
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.incrby(key, units)
+            pipe.expire(key, 2)
+            used, _ = await pipe.execute()
+        if used > limit:
+            await self.client.decrby(key, units)  # rad etilgan ulush qaytariladi
+            return False
+        return True
+
+    async def incr(self, counts: Dict[str, int]):
+        async with self.client.pipeline(transaction=False) as pipe:
+            for k, v in counts.items():
+                pipe.hincrby(self.METRICS_KEY, k, v)
+            await pipe.execute()
+
+    async def get_counters(self) -> Dict[str, int]:
+        raw = await self.client.hgetall(self.METRICS_KEY)
+        return {k: int(v) for k, v in raw.items()}
+
+    async def mark_pending(self, student_id: int, ttl: int):
+        await self.client.set(self.PENDING_KEY.format(student_id), "1", ex=ttl)
+
+    async def take_pending(self, student_id: int) -> bool:
+        return bool(await self.client.delete(self.PENDING_KEY.format(student_id)))
+
+    async def size(self) -> int:
+        return await self.client.zcard(self.QUEUE_KEY)
+
+
+class PrefetchScheduler:
+    """
+    Login / app-start cache warming through one shared queue instead of ad-hoc tasks:
+      - dedupe by student; a higher-priority enqueue promotes a queued student
+      - lanes: interactive > prefetch > background sync
+      - per-HEMIS-host budget (calls/second across workers); lower lanes get a smaller share,
+        so a login wave cannot starve interactive requests
+      - skip-if-fresh: modules whose StudentCache row is still valid are not refetched
+      - metrics: first-screen hit rate = first read after enqueue served from cache
+    Without Redis the queue is per-process (LocalQueue).
+    """
+
+    HOST_BUDGET = 20                                    # HEMIS calls / second / host
+    LANE_SHARE = {LANE_INTERACTIVE: 1.0, LANE_PREFETCH: 0.6, LANE_SYNC: 0.3}
+    PER_HOST_CONCURRENCY = 4                            # per worker
+    BATCH = 16
+    PENDING_TTL = 1800                                  # first-screen marker
+    REDIS_RETRY = 30                                    # sekund
+
+    _redis = None
+    _redis_down_until = 0.0
+    _local = LocalQueue()
+    _host_limits: Dict[str, asyncio.Semaphore] = {}
+
+    @classmethod
+    async def get_redis(cls):
+        if cls._redis is None:
+            cls._redis = redis.from_url(REDIS_URL, decode_responses=True)
+        return cls._redis
+
+    @classmethod
+    async def _backend(cls):
+        if time.monotonic() < cls._redis_down_until:
+            return cls._local
+        return RedisQueue(await cls.get_redis())
+
+    @classmethod
+    def _redis_failed(cls, e: Exception):
+        logger.warning(f"Prefetch queue: Redis unavailable, using local queue ({e})")
+        cls._redis_down_until = time.monotonic() + cls.REDIS_RETRY
+
+    @classmethod
+    async def _call(cls, method: str, *args):
+        """Runs a backend call; falls back to the local queue if Redis fails."""
+        backend = await cls._backend()
+        try:
+            return await getattr(backend, method)(*args)
+        except Exception as e:
+            if backend is cls._local:
+                raise
+            cls._redis_failed(e)
+            return await getattr(cls._local, method)(*args)
+
+    # ------------------------------------------------------------
+    # Enqueue
+    # ------------------------------------------------------------
+
+    @classmethod
+    async def enqueue(
+        cls,
+        student_id: int,
+        token: Optional[str],
+        base_url: Optional[str] = None,
+        lane: int = LANE_PREFETCH,
+        semester: Optional[str] = None,
+    ) -> str:
+        """Returns "new", "promoted" or "dup"."""
+        if not student_id or not token:
+            return "skipped"
+        job = {"token": token, "base_url": base_url, "semester": semester}
+        score = lane * LANE_SPAN + int(time.time() * 1000)
+        try:
+            result = await cls._call("push", student_id, job, score)
+            await cls._call("mark_pending", student_id, cls.PENDING_TTL)
+            await cls._call("incr", {"enqueued": 1, result: 1})
+        except Exception as e:
+            logger.error(f"Prefetch enqueue error: {e}")
+            return "error"
+        return result
+
+    # ------------------------------------------------------------
+    # Metrics
+    # ------------------------------------------------------------
+
+    @classmethod
+    async def note_first_read(cls, student_id: Optional[int], from_cache: bool):
+        """
+        Called by HemisService on student reads. Only the first read after an enqueue
+        counts: a hit means the screen was served from cache (prefetch won the race).
+        """
+        if not student_id or PREFETCHING.get():
+            return
+        try:
+            if await cls._call("take_pending", student_id):
+                await cls._call("incr", {"first_read_hits" if from_cache else "first_read_misses": 1})
+        except Exception as e:
+            logger.debug(f"Prefetch metric error: {e}")
+
+    @classmethod
+    async def metrics(cls) -> dict:
+        try:
+            counters = await cls._call("get_counters")
+            counters["queued"] = await cls._call("size")
+        except Exception as e:
+            logger.error(f"Prefetch metrics error: {e}")
+            counters = {}
+        hits, misses = counters.get("first_read_hits", 0), counters.get("first_read_misses", 0)
+        counters["first_screen_hit_rate"] = round(hits / (hits + misses), 3) if hits + misses else 0.0
+        return counters
+
+    # ------------------------------------------------------------
+    # Processing
+    # ------------------------------------------------------------
+
+    @classmethod
+    def _host_semaphore(cls, base_url: Optional[str]) -> asyncio.Semaphore:
+        from services.hemis_service import HemisService
+        host = base_url or HemisService.BASE_URL
+        if host not in cls._host_limits:
+            cls._host_limits[host] = asyncio.Semaphore(cls.PER_HOST_CONCURRENCY)
+        return cls._host_limits[host]
+
+    @staticmethod
+    async def stale_modules(student_id: int, semester: str) -> List[str]:
+        """Modules (subjects / attendance / schedule) whose cache row is missing or expired."""
+        from services.hemis_service import HemisService
+        keys = {f"{m}_{semester}": m for m in HemisService.CACHE_TTL}
+        async with AsyncSessionLocal() as session:
+            rows = (await session.execute(
+                select(StudentCache.key, StudentCache.updated_at)
+                .where(StudentCache.student_id == student_id, StudentCache.key.in_(keys))
+            )).all()
+        now = datetime.utcnow()
+        fresh = {
+            keys[key] for key, updated_at in rows
+            if updated_at and (now - updated_at).total_seconds() < HemisService.CACHE_TTL[keys[key]]
+        }
+        return [m for m in HemisService.CACHE_TTL if m not in fresh]
+
+    @staticmethod
+    async def resolve_semester(token: str, student_id: int, base_url: Optional[str]) -> str:
+        from services.hemis_service import HemisService
+        semesters = await HemisService.get_semester_list(token, student_id=student_id, base_url=base_url)
+        for s in semesters or []:
+            if s.get("current") is True:
+                return str(s.get("code") or s.get("id"))
+        if semesters:
+            return str(semesters[0].get("code") or semesters[0].get("id"))
+        return "11"  # Fallback
+
+    @classmethod
+    async def run_job(cls, student_id: int, job: dict, lane: int = LANE_PREFETCH) -> str:
+        """
+        Warms one student's cache. Returns "fresh", "fetched", "deferred" (host budget
+        exhausted - caller requeues) or "error".
+        """
+        from services.hemis_service import HemisService
+        token, base_url = job["token"], job.get("base_url")
+        marker = PREFETCHING.set(True)
+        try:
+            semester = job.get("semester") or await cls.resolve_semester(token, student_id, base_url)
+            job["semester"] = semester
+            if lane == LANE_INTERACTIVE:
+                # Foydalanuvchi o'zi yangilashni so'radi: fresh tekshiruvisiz
+                stale = list(HemisService.CACHE_TTL)
+            else:
+                stale = await cls.stale_modules(student_id, semester)
+            if not stale:
+                return "fresh"
+
+            host = base_url or HemisService.BASE_URL
+            limit = max(1, int(cls.HOST_BUDGET * cls.LANE_SHARE.get(lane, 0.3)))
+            if not await cls._call("take_budget", host, len(stale), limit):
+                return "deferred"
+
+            loaders = {
+                "subjects": HemisService.get_subject_list_entry,
+                "attendance": HemisService.get_absence_entry,
+                "schedule": HemisService.get_schedule_entry,
+            }
+            async with cls._host_semaphore(base_url):
+                results = await asyncio.gather(*[
+                    loaders[m](token, semester_code=semester, student_id=student_id,
+                               force_refresh=True, base_url=base_url)
+                    for m in stale
+                ], return_exceptions=True)
+            errors = [r for r in results if isinstance(r, Exception)]
+            if errors:
+                logger.warning(f"Prefetch partial failure for student {student_id}: {errors[0]}")
+            return "fetched"
+        except Exception as e:
+            logger.error(f"Prefetch error for student {student_id}: {e}")
+            return "error"
+        finally:
+            PREFETCHING.reset(marker)
+
+    @classmethod
+    async def drain_once(cls, batch: int = BATCH) -> Dict[str, int]:
+        """Pops up to `batch` jobs (highest priority first) and runs them concurrently."""
+        jobs = await cls._call("pop", batch)
+        if cls._local is not await cls._backend():
+            # Redis qaytdi: Redis o'chiq paytida yig'ilgan lokal navbat ham bo'shatiladi
+            jobs += await cls._local.pop(batch)
+        jobs = [j for j in jobs if j[1]]
+        if not jobs:
+            return {}
+
+        results = await asyncio.gather(*[cls.run_job(sid, job, lane_of(score)) for sid, job, score in jobs])
+        counts: Dict[str, int] = {"processed": len(jobs)}
+        for (sid, job, score), result in zip(jobs, results):
+            counts[result] = counts.get(result, 0) + 1
+            if result == "deferred":
+                # Same score: keeps its place in the lane
+                await cls._call("push", sid, job, score)
+        await cls._call("incr", counts)
+        return counts
+
+
+async def run_prefetch_worker(idle_sleep: float = 0.5):
+    """Background loop (started in lifespan): drains the prefetch queue."""
+    while True:
+        try:
+            counts = await PrefetchScheduler.drain_once()
+        except Exception as e:
+            logger.error(f"Prefetch worker error: {e}")
+            counts = {}
+        if not counts:
+            await asyncio.sleep(idle_sleep)
+        elif counts.get("deferred") == counts.get("processed"):
+            # Hamma xost budjeti tugagan - keyingi soniyani kutamiz
+            await asyncio.sleep(1)
@@ -1,90 +1,185 @@
+import asyncio
 import logging
 from datetime import datetime, timedelta
-from sqlalchemy import select
-from database.db_connect import AsyncSessionLocal
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, func, insert, or_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.db_connect import BatchSessionLocal
 from database.models import Student, TakenUsername, StudentNotification
-from services.notification_service import NotificationService
 
 logger = logging.getLogger(__name__)
 
+
 class PremiumService:
+    """
+    Premium grace-period lifecycle, set-based:
+      Day 0: Expiry notification.
+      Day 3: Feature closure notification.
+      Day 7: Username removal & Premium status update.
+
+    Each cohort is claimed with one UPDATE ... RETURNING that also stamps
+    premium_notice_stage/premium_notice_expiry, so a re-run on the same day
+    matches no rows and sends nothing twice. Notifications are bulk-inserted,
+    pushes go out after commit via multicast batches.
+    """
+
+    NOTIFICATION_TYPE = "premium_alert"
+    PUSH_BATCH_SIZE = 500        # FCM multicast limit
+    PUSH_CONCURRENCY = 4
+
+    # (stage, title, body)
+    STAGE_EXPIRED = (
+        1, "⚠️ Obuna muddati tugadi",
+        "Sizning Premium obunangiz bugun tugadi. 3 kundan keyin AI va ijtimoiy funksiyalar yopiladi.",
+    )
+    STAGE_CLOSED = (
+        3, "🚫 Premium funksiyalar yopildi",
+        "AI va ijtimoiy faollik funksiyalari to'xtatildi. 4 kundan so'ng @username ham o'chiriladi.",
+    )
+    STAGE_REMOVED = (
+        7, "❌ Premium va Username o'chirildi",
+        "Imtiyozli 7 kunlik muddat tugadi. Sizning @username barcha uchun ochiq holga keldi.",
+    )
+
+    @staticmethod
+    def _not_notified(stage: int):
+        """Stage hali yuborilmagan (yoki obuna yangilangan - boshqa expiry uchun yuborilgan)."""
+        return or_(
+            Student.premium_notice_expiry.is_(None),
+            Student.premium_notice_expiry != Student.premium_expiry,
+            func.coalesce(Student.premium_notice_stage, 0) < stage,
+        )
+
     @classmethod
-    async def check_premium_expiries(cls):
+    async def _claim_cohort(cls, session: AsyncSession, stage: int, *conditions, **values) -> List[tuple]:
+        """Marks the cohort as notified for `stage` and returns [(id, fcm_token), ...]."""
+        result = await session.execute(
+            update(Student)
+            .where(Student.is_premium == True, *conditions)
+            .values(
+                premium_notice_stage=stage,
+                premium_notice_expiry=Student.premium_expiry,
+                **values
+            )
+            .returning(Student.id, Student.fcm_token)
+            .execution_options(synchronize_session=False)
+        )
+        return [tuple(row) for row in result.all()]
+
+    @classmethod
+    async def _insert_notifications(cls, session: AsyncSession, student_ids: List[int], title: str, body: str):
+        if not student_ids:
+            return
+        now = datetime.utcnow()
+        await session.execute(insert(StudentNotification), [
+            {
+                "student_id": sid, "title": title, "body": body,
+                "type": cls.NOTIFICATION_TYPE, "is_read": False, "created_at": now,
+            }
+            for sid in student_ids
+        ])
+
+    @classmethod
+    async def process_lifecycle(cls, session: AsyncSession, now: Optional[datetime] = None) -> Dict[str, object]:
         """
-        Background task to handle premium grace periods:
-        Day 0: Expiry notification.
-        Day 3: Feature closure notification.
-        Day 7: Username removal & Premium status update.
+        Runs all three cohorts in one transaction (caller's session). Returns
+        {"expired": n, "closed": n, "removed": n, "released_usernames": [...],
+         "pushes": [(tokens, title, body), ...]}
+        - pushes are not sent here, see send_pushes().
         """
-        async with AsyncSessionLocal() as session:
-            now = datetime.utcnow()
-            
-            # 1. Day 0: Just expired today
-            # (premium_expiry between yesterday 23:59 and today 23:59)
-            # Simplified: expired in last 24h
-            day0_stmt = select(Student).where(
-                Student.is_premium == True,
-                Student.premium_expiry <= now,
-                Student.premium_expiry > now - timedelta(days=1)
-            )
-            day0_res = await session.execute(day0_stmt)
-            day0_students = day0_res.scalars().all()
-            
-            for s in day0_students:
-                await cls.notify_expiry(s, session, "⚠️ Obuna muddati tugadi", 
-                    "Sizning Premium obunangiz bugun tugadi. 3 kundan keyin AI va ijtimoiy funksiyalar yopiladi.")
-
-            # 2. Day 3: Features closed
-            day3_stmt = select(Student).where(
-                Student.is_premium == True,
-                Student.premium_expiry <= now - timedelta(days=3),
-                Student.premium_expiry > now - timedelta(days=4)
-            )
-            day3_res = await session.execute(day3_stmt)
-            day3_students = day3_res.scalars().all()
-            
-            for s in day3_students:
-                await cls.notify_expiry(s, session, "🚫 Premium funksiyalar yopildi", 
-                    "AI va ijtimoiy faollik funksiyalari to'xtatildi. 4 kundan so'ng @username ham o'chiriladi.")
-
-            # 3. Day 7: Username removal
-            day7_stmt = select(Student).where(
-                Student.is_premium == True,
-                Student.premium_expiry <= now - timedelta(days=7)
+        now = now or datetime.utcnow()
+        day3, day7 = now - timedelta(days=3), now - timedelta(days=7)
+        stats: Dict[str, object] = {"pushes": []}
+
+        # Day 7: premium, badge, username o'chiriladi (is_premium=False => qayta tanlanmaydi)
+        stage, title, body = cls.STAGE_REMOVED
+        removed = await cls._claim_cohort(
+            session, stage,
+            Student.premium_expiry <= day7,
+            is_premium=False, custom_badge=None, ai_limit=25, username=None,
+        )
+        removed_ids = [sid for sid, _ in removed]
+        stats["released_usernames"] = []
+        if removed_ids:
+            result = await session.execute(
+                delete(TakenUsername)
+                .where(TakenUsername.student_id.in_(removed_ids))
+                .returning(TakenUsername.username)
             )
-            day7_res = await session.execute(day7_stmt)
-            day7_students = day7_res.scalars().all()
-            
-            for s in day7_students:
-                logger.info(f"Removing premium, username, and badge for student {s.id}")
-                s.is_premium = False
-                s.custom_badge = None
-                s.ai_limit = 25
-                
-                if s.username:
-                    username_entry = await session.scalar(select(TakenUsername).where(TakenUsername.student_id == s.id))
-                    if username_entry:
-                        await session.delete(username_entry)
-                    s.username = None
-                
-                await cls.notify_expiry(s, session, "❌ Premium va Username o'chirildi", 
-                    "Imtiyozli 7 kunlik muddat tugadi. Sizning @username barcha uchun ochiq holga keldi.")
+            stats["released_usernames"] = list(result.scalars().all())
+        await cls._insert_notifications(session, removed_ids, title, body)
+        stats["removed"] = len(removed_ids)
+        stats["pushes"].append(([t for _, t in removed if t], title, body))
 
-            await session.commit()
+        # Day 3..7: funksiyalar yopildi
+        stage, title, body = cls.STAGE_CLOSED
+        closed = await cls._claim_cohort(
+            session, stage,
+            Student.premium_expiry <= day3,
+            Student.premium_expiry > day7,
+            cls._not_notified(stage),
+        )
+        await cls._insert_notifications(session, [sid for sid, _ in closed], title, body)
+        stats["closed"] = len(closed)
+        stats["pushes"].append(([t for _, t in closed if t], title, body))
 
-    @classmethod
-    async def notify_expiry(cls, student: Student, session, title: str, body: str):
-        """Helper to create DB notification and send push"""
-        notif = StudentNotification(
-            student_id=student.id,
-            title=title,
-            body=body,
-            type="premium_alert"
+        # Day 0..3: muddati tugadi (o'tkazib yuborilgan kun ham ushlanadi)
+        stage, title, body = cls.STAGE_EXPIRED
+        expired = await cls._claim_cohort(
+            session, stage,
+            Student.premium_expiry <= now,
+            Student.premium_expiry > day3,
+            cls._not_notified(stage),
         )
-        session.add(notif)
-        
-        if student.fcm_token:
-            await NotificationService.send_push(student.fcm_token, title, body)
+        await cls._insert_notifications(session, [sid for sid, _ in expired], title, body)
+        stats["expired"] = len(expired)
+        stats["pushes"].append(([t for _, t in expired if t], title, body))
+
+        return stats
+
+    @classmethod
+    async def send_pushes(cls, pushes: List[tuple]) -> int:
+        """Batched FCM fan-out: chunks of PUSH_BATCH_SIZE tokens, PUSH_CONCURRENCY in flight."""
+        jobs = [
+            (tokens[i:i + cls.PUSH_BATCH_SIZE], title, body)
+            for tokens, title, body in pushes
+            for i in range(0, len(tokens), cls.PUSH_BATCH_SIZE)
+        ]
+        if not jobs:
+            return 0
+
+        from services.notification_service import NotificationService
+        semaphore = asyncio.Semaphore(cls.PUSH_CONCURRENCY)
+
+        async def send(chunk, title, body):
+            async with semaphore:
+                try:
+                    await NotificationService.send_multicast(chunk, title, body, {"type": cls.NOTIFICATION_TYPE})
+                except Exception as e:
+                    logger.error(f"Premium push batch failed ({len(chunk)} tokens): {e}")
+
+        await asyncio.gather(*(send(*job) for job in jobs))
+        return sum(len(job[0]) for job in jobs)
+
+    @classmethod
+    async def check_premium_expiries(cls):
+        """
+        Background task to handle premium grace periods (safe to re-run).
+        """
+        async with BatchSessionLocal() as session:
+            stats = await cls.process_lifecycle(session)
+            await session.commit()
+
+        from services.username_index import UsernameIndex
+        UsernameIndex.release(stats.pop("released_usernames"))
+
+        # Push faqat commitdan keyin (rollback bo'lsa foydalanuvchi ogohlantirilmaydi)
+        pushed = await cls.send_pushes(stats.pop("pushes"))
+        logger.info(f"💎 Premium lifecycle: {stats}, pushes={pushed}")
+        return stats
+
 
 async def run_premium_checker():
     """Entry point for scheduler/celery"""
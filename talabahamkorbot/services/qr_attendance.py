@@ -0,0 +1,312 @@
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import time
+from collections import deque
+from typing import Dict, Optional
+
+import httpx
+import redis.asyncio as redis
+
+from config import REDIS_URL
+from services.hemis_service import HemisService
+
+logger = logging.getLogger(__name__)
+
+PENDING, SUCCESS, FAILED, EXPIRED = "pending", "success", "failed", "expired"
+
+
+class QRAttendanceQueue:
+    """
+    QR attendance submissions during a lecture burst:
+      - accepted immediately (202) and sent by an in-process worker pool,
+        earliest deadline first, on HemisService's priority client (own connection pool)
+      - idempotent per (student, qr_token): repeats return the same pending/successful
+        submission; after a failed/expired one a rescan is sent again
+      - retries only transient errors, with short jittered backoff, and stop before
+        the QR code expires (no attempt starts without MIN_ATTEMPT seconds left)
+      - result via status poll (shared through Redis) and an optional push
+      - per-process metrics: end-to-end latency percentiles, attempts, outcomes
+    """
+
+    QR_VALIDITY = 45            # sekund: QR kod amal qilish muddati (qabul qilingandan)
+    SAFETY_MARGIN = 1.0
+    MIN_ATTEMPT = 0.5
+    ATTEMPT_TIMEOUT = 4.0
+    BACKOFF = 0.25              # 0.25, 0.5, 1.0 ... + jitter
+    WORKERS = 32
+    STATE_TTL = 600
+    STATE_KEY = "qr_attendance:{}"
+
+    _redis = None
+    _local: Dict[str, tuple] = {}           # sub_id -> (expires_at, state) (Redis ishlamasa)
+    _events: Dict[str, asyncio.Event] = {}
+    _queue: Optional[asyncio.PriorityQueue] = None
+    _workers: list = []
+    _latencies: deque = deque(maxlen=4096)  # accept -> final, sekund
+    _stats = {
+        "accepted": 0, "duplicates": 0, "attempts": 0, "retries": 0,
+        SUCCESS: 0, FAILED: 0, EXPIRED: 0,
+    }
+
+    @classmethod
+    async def get_redis(cls):
+        if cls._redis is None:
+            cls._redis = redis.from_url(REDIS_URL, decode_responses=True)
+        return cls._redis
+
+    @staticmethod
+    def submission_id(student_id: int, qr_token: str) -> str:
+        return hashlib.sha1(f"{student_id}:{qr_token}".encode()).hexdigest()[:20]
+
+    # ------------------------------------------------------------
+    # State (Redis, local fallback)
+    # ------------------------------------------------------------
+
+    # Atomic claim: keeps a success or live pending state, overwrites a missing, failed/expired
+    # or stale pending one (accepted more than QR_VALIDITY ago - its worker died)
+    # ARGV: state, ttl, now, QR_VALIDITY
+    CLAIM_SCRIPT = """
+    local v = redis.call('GET', KEYS[1])
+    if v then
+        local old = cjson.decode(v)
+        if old['status'] == 'success' then return v end
+        if old['status'] == 'pending'
+            and tonumber(ARGV[3]) - (tonumber(old['accepted_at']) or 0) < tonumber(ARGV[4]) then
+            return v
+        end
+    end
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+    return false
+    """
+
+    @classmethod
+    def _blocks_claim(cls, state: dict, now: float) -> bool:
+        """Same rule as CLAIM_SCRIPT (local fallback)."""
+        if state["status"] == SUCCESS:
+            return True
+        return state["status"] == PENDING and now - (state.get("accepted_at") or 0) < cls.QR_VALIDITY
+
+    @classmethod
+    async def _claim(cls, sub_id: str, state: dict) -> Optional[dict]:
+        """
+        Stores state if the submission is new or its previous attempt ended in failure
+        (failed/expired - a rescan must be able to succeed) or is a pending one older than
+        the QR code itself (the accepting worker died); otherwise returns the existing
+        pending/success state.
+        """
+        key = cls.STATE_KEY.format(sub_id)
+        try:
+            r = await cls.get_redis()
+            existing = await r.eval(cls.CLAIM_SCRIPT, 1, key, json.dumps(state), cls.STATE_TTL,
+                                    state["accepted_at"], cls.QR_VALIDITY)
+            return json.loads(existing) if existing else None
+        except Exception as e:
+            logger.warning(f"QR state claim via Redis failed (local): {e}")
+        item = cls._local.get(sub_id)
+        if item and item[0] > time.monotonic() and cls._blocks_claim(item[1], state["accepted_at"]):
+            return item[1]
+        cls._local[sub_id] = (time.monotonic() + cls.STATE_TTL, state)
+        return None
+
+    @classmethod
+    async def _save(cls, sub_id: str, state: dict):
+        cls._local[sub_id] = (time.monotonic() + cls.STATE_TTL, state)
+        try:
+            r = await cls.get_redis()
+            await r.set(cls.STATE_KEY.format(sub_id), json.dumps(state), ex=cls.STATE_TTL)
+        except Exception as e:
+            logger.warning(f"QR state save via Redis failed (local only): {e}")
+
+    @classmethod
+    async def get_status(cls, sub_id: str) -> Optional[dict]:
+        item = cls._local.get(sub_id)
+        if item and item[0] > time.monotonic() and item[1]["status"] != PENDING:
+            return item[1]
+        try:
+            r = await cls.get_redis()
+            value = await r.get(cls.STATE_KEY.format(sub_id))
+            if value:
+                return json.loads(value)
+        except Exception as e:
+            logger.warning(f"QR state read via Redis failed: {e}")
+        return item[1] if item and item[0] > time.monotonic() else None
+
+    # ------------------------------------------------------------
+    # Submit
+    # ------------------------------------------------------------
+
+    @classmethod
+    def _ensure_workers(cls):
+        if cls._queue is None:
+            cls._queue = asyncio.PriorityQueue()
+        cls._workers = [w for w in cls._workers if not w.done()]
+        while len(cls._workers) < cls.WORKERS:
+            cls._workers.append(asyncio.create_task(cls._worker()))
+
+    @classmethod
+    async def submit(
+        cls,
+        student_id: int,
+        token: str,
+        qr_token: str,
+        qr_code: str,
+        base_url: Optional[str] = None,
+        fcm_token: Optional[str] = None,
+    ) -> dict:
+        """Accepts a submission (or returns the pending/successful one for the same student/QR)."""
+        sub_id = cls.submission_id(student_id, qr_token)
+        now = time.time()
+        state = {
+            "id": sub_id, "student_id": student_id, "status": PENDING,
+            "message": "Davomat yuborilmoqda...", "accepted_at": now,
+            "finished_at": None, "attempts": 0, "http_status": None,
+        }
+        existing = await cls._claim(sub_id, state)
+        if existing:
+            cls._stats["duplicates"] += 1
+            return existing
+
+        cls._stats["accepted"] += 1
+        cls._events[sub_id] = asyncio.Event()
+        cls._ensure_workers()
+        deadline = time.monotonic() + cls.QR_VALIDITY - cls.SAFETY_MARGIN
+        job = {
+            "state": state, "token": token, "qr_token": qr_token, "qr_code": qr_code,
+            "base_url": base_url, "fcm_token": fcm_token, "started": time.monotonic(),
+        }
+        # Earliest deadline first; id breaks ties (dicts are not comparable)
+        await cls._queue.put((deadline, sub_id, job))
+        return state
+
+    @classmethod
+    async def wait(cls, sub_id: str, timeout: float) -> Optional[dict]:
+        """Waits up to `timeout` for a final state (in-process event, else Redis polling)."""
+        event = cls._events.get(sub_id)
+        if event:
+            try:
+                await asyncio.wait_for(event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            return await cls.get_status(sub_id)
+
+        end = time.monotonic() + timeout
+        while True:
+            state = await cls.get_status(sub_id)
+            if not state or state["status"] != PENDING or time.monotonic() >= end:
+                return state
+            await asyncio.sleep(0.2)
+
+    # ------------------------------------------------------------
+    # Worker
+    # ------------------------------------------------------------
+
+    @classmethod
+    async def _worker(cls):
+        while True:
+            deadline, sub_id, job = await cls._queue.get()
+            try:
+                await cls._process(deadline, sub_id, job)
+            except Exception as e:
+                logger.error(f"QR attendance worker error: {e}")
+            finally:
+                cls._queue.task_done()
+
+    @staticmethod
+    def _parse(response: httpx.Response) -> tuple:
+        """(final, success, message) - same mapping as HemisService.send_qr_attendance."""
+        try:
+            data = response.json()
+        except ValueError:
+            data = {}
+        if response.status_code == 200:
+            return True, data.get("success", True), data.get("message", "Davomat muvaffaqiyatli belgilandi")
+        if response.status_code >= 500 or response.status_code == 429:
+            return False, False, data.get("message", "HEMIS javob bermadi")
+        return True, False, data.get("message", "Xatolik yuz berdi")
+
+    @classmethod
+    async def send_with_deadline(cls, token: str, qr_token: str, qr_code: str,
+                                 base_url: Optional[str], deadline: float) -> tuple:
+        """(status, message, attempts, http_status). Retries transient failures while time is left."""
+        client = await HemisService.get_priority_client()
+        url = f"{base_url or HemisService.BASE_URL}/student/qr-attendance"
+        payload = {"token": qr_token, "code": qr_code}
+        headers = HemisService.get_headers(token)
+
+        attempt, message, http_status = 0, "Tizimga ulanishda xatolik", None
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining < cls.MIN_ATTEMPT:
+                return EXPIRED, "QR kod muddati tugadi, qayta skanerlang", attempt, http_status
+            attempt += 1
+            cls._stats["attempts"] += 1
+            limit = min(cls.ATTEMPT_TIMEOUT, remaining)
+            try:
+                response = await client.post(
+                    url, json=payload, headers=headers,
+                    timeout=httpx.Timeout(limit, connect=min(limit, 2.0))
+                )
+                http_status = response.status_code
+                final, success, message = cls._parse(response)
+                if final:
+                    return (SUCCESS if success else FAILED), message, attempt, http_status
+            except httpx.TransportError as e:
+                logger.warning(f"QR attendance attempt {attempt} failed: {e!r}")
+            except Exception as e:
+                logger.error(f"QR attendance unrecoverable error: {e}")
+                return FAILED, message, attempt, http_status
+
+            cls._stats["retries"] += 1
+            pause = cls.BACKOFF * (2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+            if deadline - time.monotonic() - pause < cls.MIN_ATTEMPT:
+                return EXPIRED, "QR kod muddati tugadi, qayta skanerlang", attempt, http_status
+            await asyncio.sleep(pause)
+
+    @classmethod
+    async def _process(cls, deadline: float, sub_id: str, job: dict):
+        status, message, attempts, http_status = await cls.send_with_deadline(
+            job["token"], job["qr_token"], job["qr_code"], job["base_url"], deadline
+        )
+        state = dict(job["state"], status=status, message=message, attempts=attempts,
+                     http_status=http_status, finished_at=time.time())
+        await cls._save(sub_id, state)
+
+        cls._stats[status] += 1
+        cls._latencies.append(time.monotonic() - job["started"])
+        event = cls._events.pop(sub_id, None)
+        if event:
+            event.set()
+
+        if job.get("fcm_token"):
+            asyncio.create_task(cls._push(job["fcm_token"], state))
+
+    @staticmethod
+    async def _push(fcm_token: str, state: dict):
+        try:
+            from services.notification_service import NotificationService
+            title = "Davomat belgilandi ✅" if state["status"] == SUCCESS else "Davomat belgilanmadi"
+            await NotificationService.send_push(
+                fcm_token, title, state["message"],
+                {"type": "qr_attendance", "submission_id": state["id"], "status": state["status"]}
+            )
+        except Exception as e:
+            logger.warning(f"QR attendance push failed: {e}")
+
+    # ------------------------------------------------------------
+    # Metrics
+    # ------------------------------------------------------------
+
+    @classmethod
+    def stats(cls) -> dict:
+        s = dict(cls._stats)
+        lat = sorted(cls._latencies)
+        if lat:
+            pick = lambda q: round(lat[min(len(lat) - 1, int(q * len(lat)))] * 1000, 1)
+            s.update(latency_ms_p50=pick(0.50), latency_ms_p95=pick(0.95), latency_ms_p99=pick(0.99),
+                     latency_ms_max=round(lat[-1] * 1000, 1))
+        s["queued"] = cls._queue.qsize() if cls._queue else 0
+        s["in_flight"] = len(cls._events)
+        return s
@@ -0,0 +1,388 @@
+import asyncio
+import json
+import logging
+import re
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import redis.asyncio as redis
+
+from config import REDIS_URL
+
+logger = logging.getLogger(__name__)
+
+PREFIX_RE = re.compile(r"(\d{2}-\d{2})")
+PAREN_RE = re.compile(r"\(.*?\)")
+FORM_WORDS = {"kunduzgi": "11", "kechki": "12", "sirtqi": "13", "masofaviy": "16"}
+
+
+def normalize_name(name: str) -> str:
+    """Same loose form as HemisService._normalize_name (o'/g', x/h, no spaces/punctuation)."""
+    if not name:
+        return ""
+    n = name.lower().strip()
+    n = n.replace("‘", "'").replace("’", "'").replace("`", "'").replace("'", "")
+    n = n.replace("o'", "o").replace("g'", "g").replace("h", "x")
+    return n.replace(" ", "").replace("-", "").replace(".", "")
+
+
+def prefix_of(name: str) -> Optional[str]:
+    m = PREFIX_RE.search(name or "")
+    return m.group(1) if m else None
+
+
+def clean_name(norm: str, prefix: Optional[str]) -> str:
+    """Normalized name without the group prefix digits and education-form words."""
+    if prefix:
+        norm = norm.replace(prefix.replace("-", ""), "")
+    for word in FORM_WORDS:
+        norm = norm.replace(word, "")
+    return norm
+
+
+def form_of(name: str) -> Optional[str]:
+    low = (name or "").lower()
+    for word, code in FORM_WORDS.items():
+        if word in low:
+            return code
+    return None
+
+
+def _dept_id(item: dict) -> Optional[int]:
+    dept = item.get("department")
+    return dept.get("id") if isinstance(dept, dict) else None
+
+
+def _form_code(item: dict) -> Optional[str]:
+    form = item.get("educationForm")
+    if isinstance(form, dict) and form.get("code"):
+        return str(form["code"])
+    return form_of(item.get("name"))
+
+
+# ------------------------------------------------------------
+# Groups
+# ------------------------------------------------------------
+
+class GroupIndex:
+    """
+    Precomputed group lookups (built once per refresh):
+      by_norm   normalized name -> entries
+      by_prefix "25-23" -> entries
+    Each entry: (id, norm, clean, department_id, form_code).
+    Ties are broken deterministically: education form named in the request,
+    then closest name length, then the highest (newest) id.
+    """
+
+    def __init__(self, groups: List[dict], version: str = "", built_at: float = 0.0):
+        self.version = version
+        self.built_at = built_at
+        self.items = groups
+        self.entries: List[tuple] = []
+        self.by_norm: Dict[str, List[tuple]] = {}
+        self.by_prefix: Dict[str, List[tuple]] = {}
+        for g in groups:
+            name = g.get("name") or ""
+            norm = normalize_name(name)
+            if not norm or g.get("id") is None:
+                continue
+            prefix = prefix_of(name)
+            entry = (g["id"], norm, clean_name(norm, prefix), _dept_id(g), _form_code(g))
+            self.entries.append(entry)
+            self.by_norm.setdefault(norm, []).append(entry)
+            if prefix:
+                self.by_prefix.setdefault(prefix, []).append(entry)
+        self._memo: Dict[tuple, Optional[int]] = {}
+
+    @staticmethod
+    def _best(matches: List[tuple], req_norm: str, form: Optional[str]) -> Optional[int]:
+        if not matches:
+            return None
+        return min(matches, key=lambda e: (form is not None and e[4] != form,
+                                           abs(len(e[1]) - len(req_norm)), -e[0]))[0]
+
+    def resolve(self, group_name: str, faculty_id: Optional[int] = None) -> Optional[int]:
+        key = (group_name, faculty_id)
+        if key in self._memo:
+            return self._memo[key]
+
+        def scoped(entries):
+            return [e for e in entries if e[3] == faculty_id] if faculty_id else entries
+
+        req_norm = normalize_name(group_name)
+        form = form_of(group_name)
+        prefix = prefix_of(group_name)
+        pool = scoped(self.by_prefix.get(prefix) or []) if prefix else []
+        pool = pool or scoped(self.entries)
+        gid = None
+        if req_norm:
+            # 1. Exact normalized name, then containment either way
+            gid = self._best(scoped(self.by_norm.get(req_norm, [])), req_norm, form)
+            if gid is None:
+                gid = self._best([e for e in pool if req_norm in e[1] or e[1] in req_norm], req_norm, form)
+            # 2. Same prefix code, rest of the name (without form words) contained either way
+            if gid is None and prefix:
+                req_clean = clean_name(req_norm, prefix)
+                gid = self._best([e for e in scoped(self.by_prefix.get(prefix, []))
+                                  if req_clean in e[2] or e[2] in req_clean], req_norm, form)
+            # 3. Request without "(...)" contained in the group name
+            if gid is None:
+                base = PAREN_RE.sub("", group_name).strip()
+                if base != group_name.strip():
+                    base_norm = normalize_name(base)
+                    gid = self._best([e for e in pool if base_norm in e[1]], req_norm, form)
+        self._memo[key] = gid
+        return gid
+
+
+# ------------------------------------------------------------
+# Specialties
+# ------------------------------------------------------------
+
+class SpecialtyIndex:
+    """Specialties with normalized names; narrowing rules of HemisService.resolve_specialty_id."""
+
+    SIRTQI_DEPT = 35
+    MAGISTR_DEPT = 16
+
+    def __init__(self, specialties: List[dict], version: str = "", built_at: float = 0.0):
+        self.version = version
+        self.built_at = built_at
+        self.items = specialties
+        self.entries: List[tuple] = []          # (norm, item)
+        self.by_norm: Dict[str, List[dict]] = {}
+        for s in specialties:
+            norm = normalize_name(s.get("name") or "")
+            if norm and s.get("id") is not None:
+                self.entries.append((norm, s))
+                self.by_norm.setdefault(norm, []).append(s)
+        self._memo: Dict[tuple, List[dict]] = {}
+
+    def candidates(self, specialty_name: str, education_type: str = None, faculty_id: int = None,
+                   education_form: str = None) -> List[dict]:
+        """Narrowed candidates, ordered by descending id (deterministic)."""
+        key = (specialty_name, education_type, faculty_id, education_form)
+        if key in self._memo:
+            return self._memo[key]
+
+        req_norm = normalize_name(specialty_name)
+        exact = self.by_norm.get(req_norm, [])
+        candidates = [s for norm, s in self.entries if req_norm in norm or norm in req_norm] if req_norm else []
+
+        if candidates and education_type:
+            is_bach = "Bakalavr" in education_type or str(education_type) == "11"
+            is_mag = "Magistr" in education_type or str(education_type) == "12"
+            type_prefix = "6" if is_bach else "7" if is_mag else None
+            if type_prefix:
+                typed = [c for c in candidates if str(c.get("code", "")).startswith(type_prefix)]
+                candidates = typed or candidates
+
+        exact_ids = {id(s) for s in exact}
+        exact = [c for c in candidates if id(c) in exact_ids]
+        candidates = exact or candidates
+
+        context = []
+        is_sirtqi = education_form and ("Sirtqi" in education_form or str(education_form) == "13")
+        is_mag = education_type and ("Magistr" in education_type or str(education_type) == "12")
+        if is_sirtqi:
+            context = [c for c in candidates if _dept_id(c) == self.SIRTQI_DEPT]
+        elif is_mag:
+            context = [c for c in candidates if _dept_id(c) == self.MAGISTR_DEPT]
+        if not context and faculty_id:
+            context = [c for c in candidates if _dept_id(c) == faculty_id]
+        candidates = sorted(context or candidates, key=lambda c: c.get("id") or 0, reverse=True)
+
+        self._memo[key] = candidates
+        return candidates
+
+
+# ------------------------------------------------------------
+# Shared, TTL-refreshed indexes
+# ------------------------------------------------------------
+
+GROUP_FIELDS = ("id", "name", "department", "educationForm")
+SPECIALTY_FIELDS = ("id", "name", "code", "department")
+
+
+class ReferenceIndex:
+    """
+    Group / specialty reference data for name -> HEMIS id resolution:
+      - lists are fetched with the admin token at most once per TTL (one worker,
+        Redis lock) and stored in Redis as compressed JSON, so every worker and
+        Celery job builds its index from the same snapshot
+      - an expired index keeps answering while one refresh runs in the background
+      - resolved specialty clones (student-count tie-break) are kept in Redis for TTL
+    """
+
+    TTL = 6 * 3600
+    KEY = "reference_index:{}"
+    LOCK_KEY = "reference_index:{}:lock"
+    RESOLVED_KEY = "reference_index:resolved_specialty"
+    KINDS = {"groups": (GroupIndex, GROUP_FIELDS), "specialties": (SpecialtyIndex, SPECIALTY_FIELDS)}
+
+    _redis = None
+    _indexes: Dict[str, object] = {}
+    _locks: Dict[str, asyncio.Lock] = {}
+    _refreshing: Dict[str, asyncio.Task] = {}
+    _resolved_local: Dict[str, Tuple[float, int]] = {}
+
+    @classmethod
+    async def get_redis(cls):
+        if cls._redis is None:
+            cls._redis = redis.from_url(REDIS_URL, decode_responses=False)
+        return cls._redis
+
+    # ------------------------------------------------------------
+    # Fetch
+    # ------------------------------------------------------------
+
+    @staticmethod
+    async def _fetch(kind: str, token: str) -> List[dict]:
+        from services.hemis_service import HemisService
+        client = await HemisService.get_client()
+        path = "group-list" if kind == "groups" else "specialty-list"
+        items, page = [], 1
+        while True:
+            response = await client.get(
+                f"{HemisService.BASE_URL}/data/{path}", headers={"Authorization": f"Bearer {token}"},
+                params={"limit": 200, "page": page}, timeout=20
+            )
+            if response.status_code != 200:
+                logger.warning(f"Reference {kind} page {page} failed: {response.status_code}")
+                break
+            data = response.json().get("data", {})
+            batch = data if isinstance(data, list) else data.get("items", [])
+            items.extend(batch)
+            pagination = data.get("pagination", {}) if isinstance(data, dict) else {}
+            if not batch or pagination.get("page", 1) >= pagination.get("pageCount", 1):
+                break
+            page += 1
+        return items
+
+    @classmethod
+    def _build(cls, kind: str, items: List[dict], built_at: float):
+        index_cls, fields = cls.KINDS[kind]
+        slim = [{k: i[k] for k in fields if k in i} for i in items]
+        index = index_cls(slim, version=str(int(built_at)), built_at=built_at)
+        cls._indexes[kind] = index
+        return index
+
+    @classmethod
+    async def refresh(cls, kind: str, token: Optional[str] = None):
+        """Fetches the list and rebuilds; publishes to Redis only for the admin token."""
+        from config import HEMIS_ADMIN_TOKEN
+        shared = not token or token == HEMIS_ADMIN_TOKEN
+        if not (token or HEMIS_ADMIN_TOKEN):
+            return cls._indexes.get(kind)
+        items = await cls._fetch(kind, token or HEMIS_ADMIN_TOKEN)
+        if not items:
+            return cls._indexes.get(kind)
+        now = time.time()
+        index = cls._build(kind, items, now)
+        logger.info(f"📚 Reference index {kind}: {len(index.items)} items")
+        if shared:
+            try:
+                r = await cls.get_redis()
+                blob = zlib.compress(json.dumps({"built_at": now, "items": index.items}, ensure_ascii=False).encode(), 6)
+                await r.set(cls.KEY.format(kind), blob, ex=cls.TTL * 2)
+            except Exception as e:
+                logger.warning(f"Reference index publish failed (local only): {e}")
+        return index
+
+    @classmethod
+    async def _load_shared(cls, kind: str):
+        try:
+            r = await cls.get_redis()
+            blob = await r.get(cls.KEY.format(kind))
+        except Exception as e:
+            logger.warning(f"Reference index read failed: {e}")
+            return None
+        if not blob:
+            return None
+        data = json.loads(zlib.decompress(blob))
+        current = cls._indexes.get(kind)
+        if current and current.built_at >= data["built_at"]:
+            return current
+        return cls._build(kind, data["items"], data["built_at"])
+
+    @classmethod
+    async def _refresh_shared(cls, kind: str, token: Optional[str] = None):
+        """One worker refreshes (Redis lock); the others pick up its snapshot."""
+        try:
+            r = await cls.get_redis()
+            if not await r.set(cls.LOCK_KEY.format(kind), b"1", nx=True, ex=120):
+                await asyncio.sleep(1)
+                return await cls._load_shared(kind)
+        except Exception:
+            pass  # Redis yo'q: o'zimiz yangilaymiz
+        return await cls.refresh(kind, token)
+
+    @classmethod
+    async def get(cls, kind: str, token: Optional[str] = None):
+        index = cls._indexes.get(kind)
+        if index and time.time() - index.built_at < cls.TTL:
+            return index
+        if index:
+            # Stale-while-revalidate: one background refresh per kind
+            task = cls._refreshing.get(kind)
+            if not task or task.done():
+                cls._refreshing[kind] = asyncio.create_task(cls._background(kind, token))
+            return index
+
+        lock = cls._locks.setdefault(kind, asyncio.Lock())
+        async with lock:
+            index = cls._indexes.get(kind)
+            if index:
+                return index
+            index = await cls._load_shared(kind)
+            if index and time.time() - index.built_at < cls.TTL:
+                return index
+            return await cls._refresh_shared(kind, token) or index
+
+    @classmethod
+    async def _background(cls, kind: str, token: Optional[str]):
+        try:
+            index = await cls._load_shared(kind)
+            if not index or time.time() - index.built_at >= cls.TTL:
+                await cls._refresh_shared(kind, token)
+        except Exception as e:
+            logger.error(f"Reference index refresh failed ({kind}): {e}")
+
+    # ------------------------------------------------------------
+    # Resolution
+    # ------------------------------------------------------------
+
+    @classmethod
+    async def resolve_group(cls, group_name: str, faculty_id: Optional[int] = None,
+                            token: Optional[str] = None) -> Optional[int]:
+        index = await cls.get("groups", token)
+        return index.resolve(group_name, faculty_id) if index else None
+
+    @classmethod
+    async def specialty_candidates(cls, specialty_name: str, education_type: str = None,
+                                   faculty_id: int = None, education_form: str = None) -> List[dict]:
+        index = await cls.get("specialties")
+        return index.candidates(specialty_name, education_type, faculty_id, education_form) if index else []
+
+    @classmethod
+    async def get_resolved_specialty(cls, key: str) -> Optional[int]:
+        item = cls._resolved_local.get(key)
+        if item and item[0] > time.monotonic():
+            return item[1]
+        try:
+            r = await cls.get_redis()
+            value = await r.hget(cls.RESOLVED_KEY, key)
+            return int(value) if value else None
+        except Exception:
+            return None
+
+    @classmethod
+    async def set_resolved_specialty(cls, key: str, specialty_id: int):
+        cls._resolved_local[key] = (time.monotonic() + cls.TTL, specialty_id)
+        try:
+            r = await cls.get_redis()
+            await r.hset(cls.RESOLVED_KEY, key, specialty_id)
+            await r.expire(cls.RESOLVED_KEY, cls.TTL)
+        except Exception as e:
+            logger.warning(f"Resolved specialty cache write failed (local only): {e}")
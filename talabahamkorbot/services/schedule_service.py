@@ -0,0 +1,277 @@
+import asyncio
+import json
+import logging
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import redis.asyncio as redis
+
+from config import REDIS_URL
+from services.hemis_service import HemisService
+from services.student_cache_codec import TASHKENT, lesson_day, week_key
+
+logger = logging.getLogger(__name__)
+
+NO_TOPIC = "Mavzu kiritilmagan"
+
+
+class ScheduleService:
+    """
+    Week views and offline export on top of the week-indexed schedule cache
+    (student_cache_codec: records["weeks"] maps ISO week -> lesson indexes):
+      - a week view is one StudentCache read + index lookup, no scan of the semester
+      - missing topics are filled from curriculum topic lists fetched concurrently
+        (bounded) and cached per (group, subject, semester, training type) in Redis,
+        so one student's fetch serves the whole group
+      - full-semester export as compact JSON or ICS for offline use
+    """
+
+    TOPICS_KEY = "schedule_topics:{}:{}:{}:{}"
+    TOPICS_TTL = 3 * 86400          # curriculum bilan bir xil (3 kun)
+    EMPTY_TOPICS_TTL = 3600
+    TOPIC_CONCURRENCY = 4
+
+    _redis = None
+    _local: Dict[str, Tuple[float, list]] = {}     # Redis ishlamasa
+    _locks: Dict[str, asyncio.Lock] = {}
+
+    @classmethod
+    async def get_redis(cls):
+        if cls._redis is None:
+            cls._redis = redis.from_url(REDIS_URL, decode_responses=True)
+        return cls._redis
+
+    # ------------------------------------------------------------
+    # Topics (shared per group)
+    # ------------------------------------------------------------
+
+    @classmethod
+    async def _get_shared(cls, key: str) -> Optional[list]:
+        item = cls._local.get(key)
+        if item and item[0] > time.monotonic():
+            return item[1]
+        try:
+            r = await cls.get_redis()
+            value = await r.get(key)
+        except Exception as e:
+            logger.warning(f"Topic cache read failed: {e}")
+            return None
+        return json.loads(value) if value is not None else None
+
+    @classmethod
+    async def _set_shared(cls, key: str, names: list):
+        ttl = cls.TOPICS_TTL if names else cls.EMPTY_TOPICS_TTL
+        cls._local[key] = (time.monotonic() + min(ttl, 300), names)
+        try:
+            r = await cls.get_redis()
+            await r.set(key, json.dumps(names, ensure_ascii=False), ex=ttl)
+        except Exception as e:
+            logger.warning(f"Topic cache write failed: {e}")
+
+    @classmethod
+    async def topic_names(cls, token: str, group_key, subject_id, semester: str, training_type,
+                          base_url: Optional[str] = None) -> List[Optional[str]]:
+        """Curriculum topic names in lesson order; one HEMIS call per group/subject/type."""
+        key = cls.TOPICS_KEY.format(group_key, subject_id, semester, training_type)
+        names = await cls._get_shared(key)
+        if names is not None:
+            return names
+
+        lock = cls._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            names = await cls._get_shared(key)
+            if names is not None:
+                return names
+            topics = await HemisService.get_curriculum_topics(
+                token, subject_id=subject_id, semester_code=semester,
+                training_type_code=training_type, base_url=base_url
+            )
+            names = [t.get("name") for t in topics or []]
+            await cls._set_shared(key, names)
+            return names
+
+    @classmethod
+    async def enrich_topics(cls, token: str, lessons: List[dict], slots: List[dict], semester: str,
+                            group_number: Optional[str] = None, base_url: Optional[str] = None) -> int:
+        """
+        Fills lesson_topic in place for lessons without one; slots[i] is the compact record
+        of lessons[i] ("seq" = ordinal of the lesson within its subject/type). Returns fills.
+        """
+        missing = [
+            i for i, lesson in enumerate(lessons)
+            if (lesson.get("lesson_topic") or lesson.get("theme") or NO_TOPIC) == NO_TOPIC
+            and slots[i]["subject_id"]
+        ]
+        if not missing:
+            return 0
+
+        def pair_of(slot):
+            return (slot["group_id"] or group_number or "-", slot["subject_id"], slot["training_type_code"] or "")
+
+        pairs = list(dict.fromkeys(pair_of(slots[i]) for i in missing))
+        semaphore = asyncio.Semaphore(cls.TOPIC_CONCURRENCY)
+
+        async def load(pair):
+            async with semaphore:
+                try:
+                    return await cls.topic_names(token, pair[0], pair[1], semester, pair[2] or None, base_url)
+                except Exception as e:
+                    logger.warning(f"Topic fetch failed {pair}: {e}")
+                    return []
+
+        topics = dict(zip(pairs, await asyncio.gather(*[load(p) for p in pairs])))
+        filled = 0
+        for i in missing:
+            names = topics.get(pair_of(slots[i])) or []
+            seq = slots[i].get("seq", 0)
+            if seq < len(names) and names[seq]:
+                lessons[i]["lesson_topic"] = names[seq]
+                filled += 1
+        return filled
+
+    # ------------------------------------------------------------
+    # Views
+    # ------------------------------------------------------------
+
+    @staticmethod
+    def target_week(target_date: Optional[str] = None) -> str:
+        day = datetime.now(TASHKENT).date()
+        if target_date:
+            try:
+                day = datetime.strptime(target_date, "%Y-%m-%d").date()
+            except ValueError:
+                logger.warning(f"Bad target_date {target_date!r}, using current week")
+        return week_key(day)
+
+    @classmethod
+    async def week_view(cls, token: str, student, semester: str, target_date: Optional[str] = None,
+                        refresh: bool = False, base_url: Optional[str] = None) -> List[dict]:
+        """Lessons of one ISO week (raw HEMIS shape, topics filled)."""
+        entry = await HemisService.get_schedule_entry(
+            token, semester_code=semester, student_id=student.id, force_refresh=refresh, base_url=base_url
+        )
+        if not entry:
+            return []
+        records = entry.records
+        idxs = records["weeks"].get(cls.target_week(target_date), [])
+        if not idxs:
+            return []
+
+        raw = entry.raw
+        lessons = [dict(raw[i]) for i in idxs]
+        slots = [records["slots"][i] for i in idxs]
+        await cls.enrich_topics(token, lessons, slots, semester, getattr(student, "group_number", None), base_url)
+        return lessons
+
+    @classmethod
+    async def semester_slots(cls, token: str, student, semester: str, base_url: Optional[str] = None) -> List[dict]:
+        """All compact lesson slots of the semester, topics filled, ordered by time."""
+        entry = await HemisService.get_schedule_entry(token, semester_code=semester, student_id=student.id, base_url=base_url)
+        if not entry:
+            return []
+        slots = [dict(s) for s in entry.records["slots"]]
+        lessons = [{"lesson_topic": s["lesson_topic"]} for s in slots]
+        await cls.enrich_topics(token, lessons, slots, semester, getattr(student, "group_number", None), base_url)
+        for slot, lesson in zip(slots, lessons):
+            slot["lesson_topic"] = lesson["lesson_topic"]
+        slots.sort(key=lambda s: (int(s["lesson_date"] or 0), s["start_time"] or ""))
+        return slots
+
+    # ------------------------------------------------------------
+    # Export
+    # ------------------------------------------------------------
+
+    @staticmethod
+    def export_json(slots: List[dict], semester: str) -> dict:
+        """Compact offline timetable: repeated strings (subjects, teachers, rooms) as lookup tables."""
+        tables: Dict[str, Dict[str, int]] = {"subjects": {}, "types": {}, "employees": {}, "rooms": {}}
+
+        def ref(table: str, value):
+            if not value:
+                return None
+            ids = tables[table]
+            return ids.setdefault(value, len(ids))
+
+        weeks: Dict[str, list] = {}
+        for s in slots:
+            day = lesson_day(s["lesson_date"])
+            if not day:
+                continue
+            weeks.setdefault(week_key(day), []).append([
+                day.isoformat(), s["start_time"], s["end_time"],
+                ref("subjects", s["subject"]), ref("types", s["training_type"]),
+                ref("employees", s["employee"]),
+                ref("rooms", f"{s['auditorium']} ({s['building']})" if s["building"] else s["auditorium"]),
+                s["lesson_topic"],
+            ])
+        return {
+            "semester": semester,
+            "generated_at": datetime.utcnow().isoformat(),
+            "columns": ["date", "start", "end", "subject", "type", "employee", "room", "topic"],
+            **{name: list(ids) for name, ids in tables.items()},
+            "weeks": weeks,
+        }
+
+    @staticmethod
+    def _ics_escape(value) -> str:
+        return (str(value or "").replace("\\", "\\\\").replace(";", "\\;")
+                .replace(",", "\\,").replace("\n", "\\n"))
+
+    @staticmethod
+    def _ics_fold(line: str) -> str:
+        """RFC 5545: lines longer than 75 octets continue with a leading space."""
+        data = line.encode("utf-8")
+        if len(data) <= 75:
+            return line
+        parts, start = [], 0
+        while start < len(data):
+            end = min(start + (75 if not parts else 74), len(data))
+            while end < len(data) and (data[end] & 0xC0) == 0x80:
+                end -= 1  # UTF-8 belgini bo'lmaymiz
+            parts.append(data[start:end].decode("utf-8"))
+            start = end
+        return "\r\n ".join(parts)
+
+    @staticmethod
+    def _utc(day: date, hhmm: str) -> Optional[str]:
+        try:
+            hour, minute = (int(x) for x in hhmm.split(":")[:2])
+        except (AttributeError, ValueError):
+            return None
+        local = datetime(day.year, day.month, day.day, hour, minute, tzinfo=TASHKENT)
+        return (local - local.utcoffset()).strftime("%Y%m%dT%H%M%SZ")
+
+    @classmethod
+    def export_ics(cls, slots: List[dict], semester: str) -> str:
+        stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+        lines = [
+            "BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//Talabahamkor//Dars jadvali//UZ",
+            "CALSCALE:GREGORIAN", f"X-WR-CALNAME:{semester}-semestr dars jadvali", "X-WR-TIMEZONE:Asia/Tashkent",
+        ]
+        for n, s in enumerate(slots):
+            day = lesson_day(s["lesson_date"])
+            if not day:
+                continue
+            start, end = cls._utc(day, s["start_time"]), cls._utc(day, s["end_time"])
+            if start:
+                when = [f"DTSTART:{start}", f"DTEND:{end or start}"]
+            else:
+                when = [f"DTSTART;VALUE=DATE:{day.strftime('%Y%m%d')}",
+                        f"DTEND;VALUE=DATE:{(day + timedelta(days=1)).strftime('%Y%m%d')}"]
+            title = s["subject"] or "Dars"
+            if s["training_type"]:
+                title += f" ({s['training_type']})"
+            room = f"{s['auditorium']} ({s['building']})" if s["building"] else s["auditorium"]
+            description = "\n".join(x for x in (s["employee"], s["lesson_topic"]) if x)
+            lines += [
+                "BEGIN:VEVENT", f"UID:{s['id'] or n}-{semester}@talabahamkor", f"DTSTAMP:{stamp}", *when,
+                f"SUMMARY:{cls._ics_escape(title)}",
+            ]
+            if room:
+                lines.append(f"LOCATION:{cls._ics_escape(room)}")
+            if description:
+                lines.append(f"DESCRIPTION:{cls._ics_escape(description)}")
+            lines.append("END:VEVENT")
+        lines.append("END:VCALENDAR")
+        return "\r\n".join(cls._ics_fold(line) for line in lines) + "\r\n"
@@ -0,0 +1,185 @@
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import and_, delete, func, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import Student, StudentSubscription
+
+logger = logging.getLogger(__name__)
+
+
+class SocialGraphService:
+    """
+    Follow graph (student_subscriptions) with counters denormalized on students:
+      - followers_count / following_count change in the same transaction as the edge
+      - follower/following lists: keyset pages (newest first) with a slim column projection
+      - batch relation check (following / followed_by / mutual) for feed rendering
+      - reconcile_counters() repairs drift (deleted accounts, manual SQL, old rows)
+    """
+
+    DEFAULT_LIMIT = 50
+    MAX_LIMIT = 200
+
+    # ------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------
+
+    @staticmethod
+    async def _bump(db: AsyncSession, follower_id: int, target_id: int, delta: int) -> int:
+        """Adjusts both counters; returns the target's new followers_count."""
+        await db.execute(
+            update(Student).where(Student.id == follower_id)
+            .values(following_count=Student.following_count + delta)
+            .execution_options(synchronize_session=False)
+        )
+        result = await db.execute(
+            update(Student).where(Student.id == target_id)
+            .values(followers_count=Student.followers_count + delta)
+            .returning(Student.followers_count)
+            .execution_options(synchronize_session=False)
+        )
+        return max(0, result.scalar() or 0)
+
+    @classmethod
+    async def follow(cls, db: AsyncSession, follower_id: int, target_id: int) -> Tuple[bool, int]:
+        """
+        Creates the edge and bumps counters atomically. Caller commits.
+        Returns (created, followers_count); created=False if the edge already existed.
+        """
+        try:
+            async with db.begin_nested():
+                await db.execute(insert(StudentSubscription).values(
+                    follower_id=follower_id, target_id=target_id, created_at=datetime.utcnow()
+                ))
+        except IntegrityError:
+            count = await db.scalar(select(Student.followers_count).where(Student.id == target_id))
+            return False, count or 0
+        return True, await cls._bump(db, follower_id, target_id, 1)
+
+    @classmethod
+    async def unfollow(cls, db: AsyncSession, follower_id: int, target_id: int) -> Tuple[bool, int]:
+        """Deletes the edge (if any) and decrements counters. Caller commits."""
+        removed = (await db.execute(
+            delete(StudentSubscription)
+            .where(StudentSubscription.follower_id == follower_id, StudentSubscription.target_id == target_id)
+            .returning(StudentSubscription.id)
+        )).first()
+        if not removed:
+            count = await db.scalar(select(Student.followers_count).where(Student.id == target_id))
+            return False, count or 0
+        return True, await cls._bump(db, follower_id, target_id, -1)
+
+    # ------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------
+
+    @staticmethod
+    async def get_counts(db: AsyncSession, student_id: int) -> Optional[Tuple[int, int]]:
+        row = (await db.execute(
+            select(Student.followers_count, Student.following_count).where(Student.id == student_id)
+        )).first()
+        return (max(0, row[0] or 0), max(0, row[1] or 0)) if row else None
+
+    @classmethod
+    async def list_page(
+        cls,
+        db: AsyncSession,
+        student_id: int,
+        direction: str = "followers",
+        cursor: Optional[int] = None,
+        limit: int = DEFAULT_LIMIT,
+    ) -> Tuple[list, Optional[int]]:
+        """
+        direction="followers": who follows student_id; "following": whom student_id follows.
+        Newest edges first; cursor is the last subscription id of the previous page.
+        """
+        s = StudentSubscription
+        limit = max(1, min(limit, cls.MAX_LIMIT))
+        if direction == "followers":
+            owner_col, other_col = s.target_id, s.follower_id
+        else:
+            owner_col, other_col = s.follower_id, s.target_id
+
+        query = (
+            select(
+                s.id.label("edge_id"), s.created_at.label("followed_at"),
+                Student.id, Student.full_name, Student.short_name, Student.username, Student.image_url,
+                Student.hemis_role, Student.faculty_name, Student.specialty_name, Student.level_name,
+                Student.is_premium, Student.custom_badge,
+            )
+            .join(Student, Student.id == other_col)
+            .where(owner_col == student_id)
+        )
+        if cursor:
+            query = query.where(s.id < cursor)
+        rows = (await db.execute(query.order_by(s.id.desc()).limit(limit + 1))).all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = rows[-1].edge_id
+        return rows, next_cursor
+
+    @staticmethod
+    async def relations(db: AsyncSession, student_id: int, other_ids: Iterable[int]) -> Dict[int, dict]:
+        """
+        One query for a whole feed page: {other_id: {"following", "followed_by", "mutual"}}.
+        """
+        other_ids = {i for i in other_ids if i and i != student_id}
+        result = {i: {"following": False, "followed_by": False, "mutual": False} for i in other_ids}
+        if not other_ids:
+            return result
+
+        s = StudentSubscription
+        rows = (await db.execute(
+            select(s.follower_id, s.target_id).where(or_(
+                and_(s.follower_id == student_id, s.target_id.in_(other_ids)),
+                and_(s.target_id == student_id, s.follower_id.in_(other_ids)),
+            ))
+        )).all()
+        for follower_id, target_id in rows:
+            if follower_id == student_id:
+                result[target_id]["following"] = True
+            else:
+                result[follower_id]["followed_by"] = True
+        for rel in result.values():
+            rel["mutual"] = rel["following"] and rel["followed_by"]
+        return result
+
+    # ------------------------------------------------------------
+    # Maintenance
+    # ------------------------------------------------------------
+
+    @staticmethod
+    async def reconcile_counters(db: AsyncSession) -> Dict[str, int]:
+        """Recomputes both counters from the edge table; only drifted rows are written."""
+        s = StudentSubscription
+        followers = select(func.count(s.id)).where(s.target_id == Student.id).scalar_subquery()
+        following = select(func.count(s.id)).where(s.follower_id == Student.id).scalar_subquery()
+
+        r1 = await db.execute(
+            update(Student)
+            .where(func.coalesce(Student.followers_count, -1) != followers)
+            .values(followers_count=followers)
+            .execution_options(synchronize_session=False)
+        )
+        r2 = await db.execute(
+            update(Student)
+            .where(func.coalesce(Student.following_count, -1) != following)
+            .values(following_count=following)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        stats = {"followers_fixed": r1.rowcount or 0, "following_fixed": r2.rowcount or 0}
+        logger.info(f"🔁 Follow counters reconciled: {stats}")
+        return stats
+
+
+async def run_follow_counter_reconciliation():
+    """Daily job (services.daily_jobs)."""
+    from database.db_connect import BatchSessionLocal
+    async with BatchSessionLocal() as db:
+        return await SocialGraphService.reconcile_counters(db)
@@ -0,0 +1,294 @@
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime
+from itertools import chain
+from typing import Dict, Optional
+
+import redis.asyncio as redis
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session, selectinload
+
+from config import REDIS_URL
+from database.db_connect import AsyncSessionLocal
+from database.models import (
+    StudentCache, StudentDocument, StudentFeedback, User, UserActivity, UserActivityImage,
+)
+from services.student_cache_codec import CacheEntry
+
+logger = logging.getLogger(__name__)
+
+SECTIONS = ("account", "appeals", "activities", "documents", "certificates", "academic")
+
+
+def _iso(dt) -> Optional[str]:
+    if not dt:
+        return None
+    if isinstance(dt, str):
+        return dt
+    try:
+        return dt.isoformat()
+    except Exception:
+        return str(dt)
+
+
+class Student360Service:
+    """
+    Management "full details" view of one student:
+      - independent sections (account, appeals, activities, documents, certificates,
+        academic) are read concurrently, each on its own session/connection
+      - academic data comes only from the StudentCache (no live HEMIS call); a stale
+        or missing cache queues a background refresh through PrefetchScheduler
+      - every section carries "as_of" and "status"; a section slower than
+        SECTION_TIMEOUT is returned empty with status "timeout" (partial result)
+      - the composed view is cached per student for CACHE_TTL (Redis, local fallback)
+        and dropped on commit of any appeal / activity / document change (ORM events)
+    """
+
+    CACHE_KEY = "student360:{}"
+    CACHE_TTL = 60
+    SECTION_TIMEOUT = 3.0
+    ACADEMIC_STALE = 6 * 3600
+
+    _redis = None
+    _local: Dict[int, tuple] = {}   # student_id -> (expires_at, view) (Redis ishlamasa)
+
+    @classmethod
+    async def get_redis(cls):
+        if cls._redis is None:
+            cls._redis = redis.from_url(REDIS_URL, decode_responses=True)
+        return cls._redis
+
+    # ------------------------------------------------------------
+    # Cache
+    # ------------------------------------------------------------
+
+    @classmethod
+    async def _cached(cls, student_id: int) -> Optional[dict]:
+        try:
+            r = await cls.get_redis()
+            value = await r.get(cls.CACHE_KEY.format(student_id))
+            return json.loads(value) if value else None
+        except Exception as e:
+            logger.warning(f"Student360 cache read failed (local): {e}")
+        item = cls._local.get(student_id)
+        return item[1] if item and item[0] > time.monotonic() else None
+
+    @classmethod
+    async def _store(cls, student_id: int, view: dict):
+        cls._local[student_id] = (time.monotonic() + cls.CACHE_TTL, view)
+        try:
+            r = await cls.get_redis()
+            await r.set(cls.CACHE_KEY.format(student_id), json.dumps(view, ensure_ascii=False), ex=cls.CACHE_TTL)
+        except Exception as e:
+            logger.warning(f"Student360 cache write failed (local only): {e}")
+
+    @classmethod
+    async def invalidate(cls, *student_ids: int):
+        for sid in student_ids:
+            cls._local.pop(sid, None)
+        if not student_ids:
+            return
+        try:
+            r = await cls.get_redis()
+            await r.delete(*[cls.CACHE_KEY.format(sid) for sid in student_ids])
+        except Exception as e:
+            logger.warning(f"Student360 invalidation failed (local only): {e}")
+
+    # ------------------------------------------------------------
+    # Sections (each on its own session)
+    # ------------------------------------------------------------
+
+    @staticmethod
+    async def _account(student) -> dict:
+        async with AsyncSessionLocal() as session:
+            token = await session.scalar(select(User.hemis_token).where(User.hemis_login == student.hemis_login))
+        return {"is_app_user": bool(token), "_token": token}
+
+    @staticmethod
+    async def _appeals(student_id: int) -> list:
+        async with AsyncSessionLocal() as session:
+            rows = (await session.execute(
+                select(StudentFeedback.id, StudentFeedback.text, StudentFeedback.status,
+                       StudentFeedback.created_at, StudentFeedback.file_id, StudentFeedback.file_type)
+                .where(StudentFeedback.student_id == student_id, StudentFeedback.parent_id == None)
+                .order_by(StudentFeedback.created_at.desc())
+            )).all()
+        return [
+            {"id": a.id, "text": a.text, "status": a.status or "pending", "date": _iso(a.created_at),
+             "file_id": a.file_id, "file_type": a.file_type or "photo"}
+            for a in rows
+        ]
+
+    @staticmethod
+    async def _activities(student_id: int) -> list:
+        async with AsyncSessionLocal() as session:
+            rows = (await session.execute(
+                select(UserActivity)
+                .where(UserActivity.student_id == student_id)
+                .options(selectinload(UserActivity.images))
+                .order_by(UserActivity.created_at.desc())
+            )).scalars().all()
+        return [
+            {"id": act.id, "title": act.name, "status": act.status or "pending", "date": _iso(act.created_at),
+             "images": [{"file_id": img.file_id, "file_type": img.file_type} for img in act.images]}
+            for act in rows
+        ]
+
+    @staticmethod
+    async def _documents(student_id: int, file_type: str) -> list:
+        async with AsyncSessionLocal() as session:
+            rows = (await session.execute(
+                select(StudentDocument.id, StudentDocument.file_name, StudentDocument.uploaded_at,
+                       StudentDocument.telegram_file_id, StudentDocument.file_type)
+                .where(StudentDocument.student_id == student_id, StudentDocument.file_type == file_type)
+                .order_by(StudentDocument.uploaded_at.desc())
+            )).all()
+        return [
+            {"id": d.id, "title": d.file_name, "created_at": _iso(d.uploaded_at), "file_id": d.telegram_file_id,
+             "file_url": f"/api/v1/management/documents/{d.id}/download",
+             "file_type": d.file_type or file_type, "status": "approved"}
+            for d in rows
+        ]
+
+    @staticmethod
+    async def _academic(student_id: int) -> tuple:
+        """Newest cached attendance / subject list of any semester; (data, as_of)."""
+        async with AsyncSessionLocal() as session:
+            rows = (await session.execute(
+                select(StudentCache.key, StudentCache.data, StudentCache.payload,
+                       StudentCache.schema_version, StudentCache.updated_at)
+                .where(StudentCache.student_id == student_id,
+                       StudentCache.key.like("attendance_%") | StudentCache.key.like("subjects_%"))
+                .order_by(StudentCache.updated_at.desc())
+            )).all()
+
+        newest: Dict[str, CacheEntry] = {}
+        for row in rows:
+            newest.setdefault(row.key.split("_", 1)[0], CacheEntry(*row))
+
+        data = {"attendance": None, "subjects": None, "gpa": None}
+        att = newest.get("attendance")
+        if att:
+            s = att.get_summary()
+            data["attendance"] = {"semester": att.key.split("_", 1)[1], "total": s.get("total", 0),
+                                  "excused": s.get("excused", 0), "unexcused": s.get("unexcused", 0)}
+        subj = newest.get("subjects")
+        if subj:
+            s = subj.get_summary()
+            data["subjects"] = {"semester": subj.key.split("_", 1)[1], "count": s.get("count", 0),
+                                "graded": s.get("graded", 0), "overall_avg": s.get("overall_avg", 0)}
+            try:
+                from services.gpa_calculator import GPACalculator
+                data["gpa"] = GPACalculator.calculate_gpa(subj.raw or []).gpa
+            except Exception as e:
+                logger.warning(f"Student360 GPA from cache failed: {e}")
+
+        dates = [e.updated_at for e in newest.values() if e.updated_at]
+        return data, (min(dates) if dates else None)
+
+    # ------------------------------------------------------------
+    # View
+    # ------------------------------------------------------------
+
+    @classmethod
+    async def _section(cls, name: str, coro) -> dict:
+        started = time.monotonic()
+        as_of = datetime.utcnow()
+        try:
+            data = await asyncio.wait_for(coro, cls.SECTION_TIMEOUT)
+            status = "ok"
+            if name == "academic":
+                data, as_of = data
+                status = "ok" if as_of else "missing"
+        except asyncio.TimeoutError:
+            data, status, as_of = None, "timeout", None
+        except Exception as e:
+            logger.error(f"Student360 section {name} failed: {e}")
+            data, status, as_of = None, "error", None
+        return {"data": data, "status": status, "as_of": _iso(as_of),
+                "ms": round((time.monotonic() - started) * 1000, 1)}
+
+    @classmethod
+    async def build(cls, student) -> dict:
+        loaders = {
+            "account": cls._account(student),
+            "appeals": cls._appeals(student.id),
+            "activities": cls._activities(student.id),
+            "documents": cls._documents(student.id, "document"),
+            "certificates": cls._documents(student.id, "certificate"),
+            "academic": cls._academic(student.id),
+        }
+        results = await asyncio.gather(*[cls._section(name, coro) for name, coro in loaders.items()])
+        sections = dict(zip(loaders, results))
+
+        token = (sections["account"]["data"] or {}).pop("_token", None)
+        academic = sections["academic"]
+        if token and (academic["status"] == "missing" or (
+                academic["as_of"] and
+                (datetime.utcnow() - datetime.fromisoformat(academic["as_of"])).total_seconds() > cls.ACADEMIC_STALE)):
+            try:
+                from services.prefetch_scheduler import LANE_SYNC, PrefetchScheduler
+                from services.university_service import UniversityService
+                await PrefetchScheduler.enqueue(
+                    student.id, token, UniversityService.get_api_url(student.hemis_login), lane=LANE_SYNC
+                )
+            except Exception as e:
+                logger.warning(f"Student360 academic refresh enqueue failed: {e}")
+        return sections
+
+    @classmethod
+    async def get_view(cls, student, refresh: bool = False) -> dict:
+        """{"sections": {...}, "built_at", "cached"}; partial views are not cached."""
+        if not refresh:
+            view = await cls._cached(student.id)
+            if view:
+                return dict(view, cached=True)
+
+        view = {"sections": await cls.build(student), "built_at": datetime.utcnow().isoformat()}
+        if all(s["status"] in ("ok", "missing") for s in view["sections"].values()):
+            await cls._store(student.id, view)
+        return dict(view, cached=False)
+
+
+# ------------------------------------------------------------
+# Invalidation: any committed change to a student's appeals / activities /
+# documents drops that student's cached view (covers API and bot writes).
+# ------------------------------------------------------------
+
+_DIRTY_KEY = "student360_dirty"
+
+
+def _owner_id(obj) -> Optional[int]:
+    if isinstance(obj, (StudentFeedback, UserActivity, StudentDocument)):
+        return obj.student_id
+    if isinstance(obj, UserActivityImage):
+        activity = inspect(obj).attrs.activity.loaded_value
+        return getattr(activity, "student_id", None)
+    return None
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_dirty(session, flush_context):
+    ids = {sid for sid in map(_owner_id, chain(session.new, session.dirty, session.deleted)) if sid}
+    if ids:
+        session.info.setdefault(_DIRTY_KEY, set()).update(ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_dirty(session):
+    ids = session.info.pop(_DIRTY_KEY, None)
+    if not ids:
+        return
+    for sid in ids:
+        Student360Service._local.pop(sid, None)
+    try:
+        asyncio.get_running_loop().create_task(Student360Service.invalidate(*ids))
+    except RuntimeError:
+        pass  # sinxron kontekst (skriptlar): faqat lokal kesh tozalandi
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_dirty(session):
+    session.info.pop(_DIRTY_KEY, None)
@@ -0,0 +1,371 @@
+"""
+Compact StudentCache storage for HEMIS responses.
+
+At write time a HEMIS list (subjects / attendance / schedule / performance) is
+normalized into small records + a summary, and stored compressed:
+
+    StudentCache.data            -> summary (small JSON: totals, counts, schema "v")
+    StudentCache.schema_version  -> SCHEMA_VERSION
+    StudentCache.payload         -> codec(1) | len(records)(4) | records | raw
+
+records and raw are compressed separately, so API reads decode only the records
+section; legacy callers that need the verbatim HEMIS JSON use raw_of().
+Rows written before the migration (schema_version NULL) keep raw JSON in `data`.
+"""
+
+import json
+import struct
+import zlib
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - zstandard is optional
+    zstandard = None
+
+SCHEMA_VERSION = 2     # 2: schedule records indexed by ISO week
+COMPACT_PREFIXES = ("subjects_", "attendance_", "schedule_", "performance_")
+
+# 11/15: JN, 12: ON, 13: YN (HemisService.parse_grades_detailed bilan bir xil)
+EXAM_TYPES = {"11": "JN", "15": "JN", "12": "ON", "13": "YN"}
+EXCUSED_CODES = ("11", "13")
+EXCUSED_WORDS = ("sababli", "kasallik", "ruxsat", "xizmat")
+
+# HEMIS lesson_date - Toshkent yarim tuni (UTC+5, DST yo'q)
+TASHKENT = timezone(timedelta(hours=5))
+
+CODEC_ZLIB = b"z"
+CODEC_ZSTD = b"s"
+_HEADER = struct.Struct(">cI")
+
+
+# ------------------------------------------------------------
+# Bytes
+# ------------------------------------------------------------
+
+def _to_json(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _from_json(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _compress(codec: bytes, data: bytes) -> bytes:
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdCompressor(level=6).compress(data)
+    return zlib.compress(data, 6)
+
+
+def _decompress(codec: bytes, data: bytes) -> bytes:
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise ValueError("zstd payload but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+def encode_payload(records: Any, raw: Any) -> bytes:
+    codec = CODEC_ZSTD if zstandard is not None else CODEC_ZLIB
+    rec = _compress(codec, _to_json(records))
+    return _HEADER.pack(codec, len(rec)) + rec + _compress(codec, _to_json(raw))
+
+
+def decode_records(payload: bytes) -> Any:
+    codec, size = _HEADER.unpack_from(payload)
+    start = _HEADER.size
+    return _from_json(_decompress(codec, bytes(payload[start:start + size])))
+
+
+def decode_raw(payload: bytes) -> Any:
+    codec, size = _HEADER.unpack_from(payload)
+    return _from_json(_decompress(codec, bytes(payload[_HEADER.size + size:])))
+
+
+# ------------------------------------------------------------
+# Normalizers
+# ------------------------------------------------------------
+
+def _to_5_scale(val, max_val) -> int:
+    if val is None: val = 0
+    if max_val == 0: return 0
+    if max_val <= 5: return round(val)
+    return round((val / max_val) * 5)
+
+
+def normalize_subject(item: dict) -> dict:
+    cs = item.get("curriculumSubject") or {}
+    sub = cs.get("subject") or {}
+    plain = item.get("subject") or {}
+
+    grades, raw_total = {}, 0
+    for ex in item.get("gradesByExam") or []:
+        exam_type = ex.get("examType") or {}
+        val = ex.get("grade", 0)
+        max_b = ex.get("max_ball", 0)
+        raw_total += val or 0
+        t = EXAM_TYPES.get(str(exam_type.get("code")))
+        if t:
+            grades[t] = {
+                "type": t, "name": exam_type.get("name", "Noma'lum"),
+                "val_5": _to_5_scale(val, max_b), "raw": val, "max": max_b,
+            }
+
+    training_hours = {}
+    training_info = cs.get("training_hours")
+    for th in training_info if isinstance(training_info, list) else []:
+        t_name = (th.get("trainingType") or {}).get("name")
+        hrs = th.get("hour", 0) or 0
+        if t_name and hrs > 0:
+            training_hours[t_name] = hrs
+
+    return {
+        "id": sub.get("id") or plain.get("id"),
+        "name": sub.get("name") or plain.get("name") or "Nomsiz fan",
+        "overall_grade": (item.get("overallScore") or {}).get("grade", 0),
+        "grades": grades,
+        "raw_total": raw_total,
+        "credit": cs.get("credit") or item.get("credit"),
+        "training_hours": training_hours,
+        "total_acload": int(cs.get("total_acload") or 0),
+    }
+
+
+def grades_view(record: dict, skip_conversion: bool = False) -> dict:
+    """Same dict as HemisService.parse_grades_detailed(raw_item, skip_conversion)."""
+    results = {
+        "JN": {"val_5": 0, "raw": 0, "max": 0},
+        "ON": {"val_5": 0, "raw": 0, "max": 0},
+        "YN": {"val_5": 0, "raw": 0, "max": 0},
+        "total": {"val_5": 0, "raw": 0, "max": 0},
+        "raw_total": record.get("raw_total", 0),
+    }
+    for t, g in (record.get("grades") or {}).items():
+        g = dict(g)
+        # Non-JMCU: ball o'z shkalasida qoladi
+        if skip_conversion and (g["max"] or 0) > 5:
+            g["val_5"] = g["raw"] if g["raw"] is not None else 0
+        results[t] = g
+    return results
+
+
+def attendance_status_excused(item: dict) -> bool:
+    if item.get("explicable", False):
+        return True
+    status = item.get("absent_status") or {}
+    code = str(status.get("code", "12"))
+    name = (status.get("name") or "").lower()
+    return code in EXCUSED_CODES or any(x in name for x in EXCUSED_WORDS)
+
+
+def attendance_totals(items: List[dict]) -> Tuple[int, int, int]:
+    """(total, excused, unexcused) hours of a raw HEMIS attendance list."""
+    total, excused, unexcused = 0, 0, 0
+    for item in items or []:
+        hour = item.get("hour", 2)
+        total += hour
+        if attendance_status_excused(item):
+            excused += hour
+        else:
+            unexcused += hour
+    return total, excused, unexcused
+
+
+def normalize_absence(item: dict) -> dict:
+    subject = item.get("subject") or {}
+    hours = (item.get("absent_on", 0) or 0) + (item.get("absent_off", 0) or 0)
+    return {
+        "subject_id": subject.get("id"),
+        "subject": subject.get("name", "Fan"),
+        "lesson_date": item.get("lesson_date"),
+        "training_type": (item.get("trainingType") or {}).get("name", ""),
+        "hours": hours or item.get("hour", 2),
+        "hour": item.get("hour", 2),
+        "explicable": bool(item.get("explicable", False)),
+        "excused": attendance_status_excused(item),
+    }
+
+
+def normalize_lesson(item: dict) -> dict:
+    subject = item.get("subject") or {}
+    training = item.get("trainingType") or {}
+    pair = item.get("lessonPair") or {}
+    auditorium = item.get("auditorium") or {}
+    return {
+        "id": item.get("id"),
+        "subject_id": subject.get("id"),
+        "subject": subject.get("name"),
+        "group_id": (item.get("group") or {}).get("id"),
+        "training_type_code": training.get("code"),
+        "training_type": training.get("name"),
+        "employee": (item.get("employee") or {}).get("name"),
+        "lesson_date": item.get("lesson_date"),
+        "pair": pair.get("name"),
+        "start_time": pair.get("start_time") or item.get("start_time"),
+        "end_time": pair.get("end_time") or item.get("end_time"),
+        "auditorium": auditorium.get("name"),
+        "building": (auditorium.get("building") or {}).get("name"),
+        "lesson_topic": item.get("lesson_topic") or item.get("theme"),
+    }
+
+
+def week_key(day: date) -> str:
+    """ISO week, e.g. "2025-W37"."""
+    year, week, _ = day.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def lesson_day(lesson_date) -> Optional[date]:
+    if not lesson_date:
+        return None
+    return datetime.fromtimestamp(int(lesson_date), TASHKENT).date()
+
+
+def index_schedule(slots: List[dict]) -> dict:
+    """
+    {"slots": [...], "weeks": {"2025-W37": [slot index, ...]}}. Each slot also gets
+    "seq": its ordinal among lessons of the same (subject, training type) in the semester,
+    i.e. which curriculum topic it covers.
+    """
+    weeks: Dict[str, List[int]] = {}
+    pairs: Dict[tuple, List[int]] = {}
+    for i, slot in enumerate(slots):
+        day = lesson_day(slot["lesson_date"])
+        if day:
+            weeks.setdefault(week_key(day), []).append(i)
+        pairs.setdefault((str(slot["subject_id"] or ""), str(slot["training_type_code"] or "")), []).append(i)
+    for idxs in pairs.values():
+        idxs.sort(key=lambda i: (int(slots[i]["lesson_date"] or 0), slots[i]["start_time"] or ""))
+        for seq, i in enumerate(idxs):
+            slots[i]["seq"] = seq
+    return {"slots": slots, "weeks": weeks}
+
+
+def _kind(key: str) -> Optional[str]:
+    for prefix in COMPACT_PREFIXES:
+        if key.startswith(prefix):
+            return prefix[:-1]
+    return None
+
+
+def normalize(key: str, raw: list) -> Tuple[Any, dict]:
+    """(records, summary) for a compact key."""
+    kind = _kind(key)
+    summary = {"v": SCHEMA_VERSION, "count": len(raw)}
+
+    if kind == "subjects":
+        records = [normalize_subject(i) for i in raw]
+        graded = [r["overall_grade"] for r in records if r["overall_grade"]]
+        summary["graded"] = len(graded)
+        summary["overall_avg"] = round(sum(graded) / len(graded), 2) if graded else 0
+    elif kind == "attendance":
+        items = [normalize_absence(i) for i in raw]
+        total, excused, unexcused = attendance_totals(raw)
+        by_subject: Dict[str, int] = {}
+        for a in items:
+            name = (a["subject"] or "").lower().strip()
+            if name:
+                by_subject[name] = by_subject.get(name, 0) + a["hour"]
+        summary.update(total=total, excused=excused, unexcused=unexcused)
+        records = {"items": items, "by_subject": by_subject}
+    elif kind == "schedule":
+        records = index_schedule([normalize_lesson(i) for i in raw])
+        dates = [r["lesson_date"] for r in records["slots"] if r["lesson_date"]]
+        summary["first"] = min(dates) if dates else None
+        summary["last"] = max(dates) if dates else None
+    else:
+        # performance: kundalik baholar shakli turlicha, faqat siqilgan raw saqlanadi
+        records = None
+    return records, summary
+
+
+# ------------------------------------------------------------
+# Row helpers
+# ------------------------------------------------------------
+
+def is_compact_key(key: str) -> bool:
+    return _kind(key) is not None
+
+
+def encode(key: str, raw: Any) -> Tuple[dict, Optional[bytes], Optional[int]]:
+    """(data, payload, schema_version) to store for `key`. Non-compact keys stay plain JSON."""
+    if not is_compact_key(key) or not isinstance(raw, list):
+        return raw, None, None
+    records, summary = normalize(key, raw)
+    return summary, encode_payload(records, raw), SCHEMA_VERSION
+
+
+def apply(row, key: str, raw: Any):
+    """Writes `raw` into an existing StudentCache row (or a new one)."""
+    row.data, row.payload, row.schema_version = encode(key, raw)
+    return row
+
+
+def raw_of(data: Any, payload: Optional[bytes], schema_version: Optional[int]) -> Any:
+    """Verbatim HEMIS JSON for both legacy and compact rows."""
+    if payload is not None and schema_version:
+        return decode_raw(payload)
+    return data
+
+
+class CacheEntry:
+    """Lazily decoded StudentCache row (or a fresh HEMIS response)."""
+
+    __slots__ = ("key", "summary", "updated_at", "_payload", "_version", "_raw", "_records")
+
+    def __init__(self, key: str, data: Any, payload: Optional[bytes] = None,
+                 schema_version: Optional[int] = None, updated_at=None):
+        self.key = key
+        self.updated_at = updated_at
+        self._payload = payload
+        self._version = schema_version
+        self._raw = self._records = None
+        if payload is not None and schema_version:
+            self.summary = data
+        else:
+            # Legacy row / fresh response: data is raw HEMIS JSON
+            self._raw = data
+            self.summary = None
+
+    @classmethod
+    def from_row(cls, row) -> "CacheEntry":
+        return cls(row.key, row.data, row.payload, row.schema_version, row.updated_at)
+
+    @property
+    def current(self) -> bool:
+        return self._version == SCHEMA_VERSION
+
+    @property
+    def raw(self) -> Any:
+        if self._raw is None and self._payload is not None:
+            self._raw = decode_raw(self._payload)
+        return self._raw
+
+    def _normalized(self):
+        records, summary = normalize(self.key, self.raw if isinstance(self.raw, list) else [])
+        self._records, self.summary = records, summary
+
+    @property
+    def records(self) -> Any:
+        if self._records is None:
+            if self.current and self._payload is not None:
+                self._records = decode_records(self._payload)
+            else:
+                # Legacy / old schema row: normalize once for this request
+                self._normalized()
+        return self._records
+
+    def get_summary(self) -> dict:
+        if self.summary is None or self.summary.get("v") != SCHEMA_VERSION:
+            self._normalized()
+        return self.summary
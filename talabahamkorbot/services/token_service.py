@@ -1,16 +1,63 @@
-import uuid
+import hmac
+import time
+import base64
 import hashlib
+import secrets
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from sqlalchemy import select, insert, update
+from typing import List, Optional, Tuple
+from sqlalchemy import select, delete, or_, and_
 from sqlalchemy.ext.asyncio import AsyncSession
-from database.models import SecurityToken, Student, Staff
-from fastapi import HTTPException
+from database.models import SecurityToken
+from config import ACTION_TOKEN_SECRET, ACTION_TOKEN_TTL_HOURS, LEGACY_ACTION_TOKENS_UNTIL, REDIS_URL
+import redis.asyncio as redis
 import logging
 
 logger = logging.getLogger(__name__)
 
+TOKEN_VERSION = "v2"
+NONCE_PREFIX = "action_nonce:"
+
+_SIGNING_KEY = hmac.new(ACTION_TOKEN_SECRET.encode(), b"action-token", hashlib.sha256).digest()
+
+
+def _b64e(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _b64d(value: str) -> bytes:
+    return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+
+
+def _legacy_cutoff() -> datetime:
+    try:
+        return datetime.fromisoformat(LEGACY_ACTION_TOKENS_UNTIL)
+    except (TypeError, ValueError):
+        return datetime.min
+
+
 class TokenService:
+    """
+    One-time Action Tokens (Shifr).
+
+    v2 tokens are stateless: "v2.<payload>.<hmac>" where payload = "<s|f>:<user_id>:<exp>:<scope>:<nonce>".
+    Signature/owner/expiry/scope are checked in CPU; the nonce is claimed once in Redis (SET NX + TTL),
+    so a replayed token is rejected without touching the database.
 
+    Legacy tokens (random hex stored hashed in security_tokens) are still accepted until
+    LEGACY_ACTION_TOKENS_UNTIL; cleanup_old_tokens() then removes the table rows.
+    """
+
+    _redis = None
+    # Redis ishlamasa: shu worker ichida replay himoyasi (nonce -> exp)
+    _local_nonces: "OrderedDict[str, int]" = OrderedDict()
+    LOCAL_NONCE_LIMIT = 100_000
+
+    @classmethod
+    async def get_redis(cls):
+        if cls._redis is None:
+            cls._redis = redis.from_url(REDIS_URL, decode_responses=True)
+        return cls._redis
 
     @staticmethod
     def _hash_token(token: str) -> str:
@@ -18,54 +65,131 @@ class TokenService:
         return hashlib.sha256(token.encode()).hexdigest()
 
     @staticmethod
-    async def generate_batch(db: AsyncSession, user_id: int, user_type: str = "student", count: int = 500):
+    def _sign(payload: str) -> str:
+        return _b64e(hmac.new(_SIGNING_KEY, payload.encode(), hashlib.sha256).digest()[:16])
+
+    # ------------------------------------------------------------
+    # Issue / verify (no DB)
+    # ------------------------------------------------------------
+
+    @staticmethod
+    def generate_batch(
+        user_id: int,
+        user_type: str = "student",
+        count: int = 500,
+        scope: str = "*",
+        ttl_hours: int = ACTION_TOKEN_TTL_HOURS,
+    ) -> List[str]:
         """
-        Generates a batch of unique tokens for the user.
-        Uses bulk insert for performance.
-        STORES HASHED TOKENS IN DB. RETURNS RAW TOKENS TO USER.
+        Generates a batch of signed one-time tokens for the user.
+        Nothing is stored - the signature is the proof, the nonce is claimed on use.
         """
-        tokens_db = []
-        tokens_raw = []
-        now = datetime.utcnow()
-        
-        # Determine user ID field
-        student_id = user_id if user_type == "student" else None
-        staff_id = user_id if user_type == "staff" else None
-        
+        kind = "f" if user_type == "staff" else "s"
+        exp = int(time.time()) + ttl_hours * 3600
+        scope = (scope or "*").replace(":", "|")  # ':' is the payload separator
+        tokens = []
         for _ in range(count):
-            token_raw = uuid.uuid4().hex
-            token_hash = TokenService._hash_token(token_raw)
-            
-            tokens_raw.append(token_raw)
-            tokens_db.append({
-                "token": token_hash, # STORE HASH
-                "student_id": student_id,
-                "staff_id": staff_id,
-                "status": "active",
-                "issued_at": now
-            })
-            
-        if tokens_db:
-            await db.execute(insert(SecurityToken), tokens_db)
-            await db.commit()
-            
-        return tokens_raw # Client gets raw keys
+            payload = f"{kind}:{user_id}:{exp}:{scope}:{secrets.token_urlsafe(9)}"
+            tokens.append(f"{TOKEN_VERSION}.{_b64e(payload.encode())}.{TokenService._sign(payload)}")
+        return tokens
+
+    @staticmethod
+    def verify_token(token: str, user_id: int, user_type: str = "student", action: str = None) -> Tuple[Optional[str], int, str]:
+        """
+        CPU-only check of a v2 token.
+        Returns (nonce, exp, "") if valid, otherwise (None, 0, reason).
+        """
+        try:
+            version, body, signature = token.split(".")
+            payload = _b64d(body).decode()
+        except Exception:
+            return None, 0, "malformed"
+        if version != TOKEN_VERSION:
+            return None, 0, "version"
+        if not hmac.compare_digest(signature, TokenService._sign(payload)):
+            return None, 0, "signature"
+
+        try:
+            kind, uid, exp, scope, nonce = payload.split(":", 4)
+            uid, exp = int(uid), int(exp)
+        except ValueError:
+            return None, 0, "malformed"
+
+        if uid != user_id or kind != ("f" if user_type == "staff" else "s"):
+            return None, 0, "owner"
+        if exp < time.time():
+            return None, 0, "expired"
+        if scope != "*" and not (action or "").startswith(scope.replace("|", ":")):
+            return None, 0, "scope"
+        return nonce, exp, ""
+
+    @classmethod
+    async def _claim_nonce(cls, nonce: str, exp: int) -> bool:
+        """True if this nonce was not used before (atomic SET NX)."""
+        ttl = max(1, exp - int(time.time())) + 60
+        try:
+            r = await cls.get_redis()
+            return bool(await r.set(f"{NONCE_PREFIX}{nonce}", 1, nx=True, ex=ttl))
+        except Exception as e:
+            logger.warning(f"Action token nonce store unavailable, using local fallback: {e}")
+
+        now = int(time.time())
+        while cls._local_nonces:
+            oldest, oldest_exp = next(iter(cls._local_nonces.items()))
+            if oldest_exp > now and len(cls._local_nonces) < cls.LOCAL_NONCE_LIMIT:
+                break
+            cls._local_nonces.popitem(last=False)
+        if nonce in cls._local_nonces:
+            return False
+        cls._local_nonces[nonce] = exp + 60
+        return True
+
+    @classmethod
+    async def consume_token(
+        cls,
+        db: AsyncSession,
+        token: str,
+        user_id: int,
+        action_meta: str = None,
+        user_type: str = "student",
+    ) -> bool:
+        """
+        Consumes a token (v2: signature + Redis nonce; legacy: DB row until the migration cutoff).
+        """
+        if not token.startswith(f"{TOKEN_VERSION}."):
+            return await cls.consume_legacy_token(db, token, user_id, action_meta)
+
+        nonce, exp, reason = cls.verify_token(token, user_id, user_type, action_meta)
+        if not nonce:
+            logger.warning(f"Security Alert: rejected action token for {user_type} {user_id} ({reason}) on {action_meta}")
+            return False
+        if not await cls._claim_nonce(nonce, exp):
+            logger.warning(f"Security Alert: Replay attack attempt with token ({user_type} {user_id}, {action_meta})")
+            return False
+        return True
+
+    # ------------------------------------------------------------
+    # Legacy (security_tokens table) - migration window only
+    # ------------------------------------------------------------
 
     @staticmethod
-    async def consume_token(db: AsyncSession, token: str, user_id: int, action_meta: str = None) -> bool:
+    async def consume_legacy_token(db: AsyncSession, token: str, user_id: int, action_meta: str = None) -> bool:
         """
-        Consumes a token.
+        Consumes an outstanding pre-v2 token.
         Token input is RAW. We hash it to find in DB.
         """
+        if db is None or datetime.utcnow() > _legacy_cutoff():
+            return False
+
         token_hash = TokenService._hash_token(token)
-        
+
         stmt = select(SecurityToken).where(SecurityToken.token == token_hash)
         result = await db.execute(stmt)
         security_token = result.scalar_one_or_none()
-        
+
         if not security_token:
             return False
-            
+
         # Check ownership
         # Staff vs Student logic
         is_owner = False
@@ -73,27 +197,55 @@ class TokenService:
             is_owner = True
         elif security_token.staff_id and security_token.staff_id == user_id:
             is_owner = True
-            
+
         if not is_owner:
             logger.warning(f"Security Alert: User {user_id} tried to use token belonging to another user.")
             return False
-            
+
         if security_token.status != "active":
             logger.warning(f"Security Alert: Replay attack attempt with token")
             return False
-            
+
         # Mark as used
         security_token.status = "used"
         security_token.used_at = datetime.utcnow()
         if action_meta:
             security_token.action_meta = action_meta
-            
+
         await db.commit()
         return True
 
     @staticmethod
-    async def cleanup_old_tokens(db: AsyncSession, days: int = 30):
-        """Removes used tokens older than N days."""
-        cutoff = datetime.utcnow() - timedelta(days=days)
-        # TODO: Implement cleanup logic if needed
-        pass
+    async def cleanup_old_tokens(db: AsyncSession, days: int = 30, batch_size: int = 5000) -> int:
+        """
+        Removes used legacy tokens older than N days, and every legacy row once the
+        migration window (LEGACY_ACTION_TOKENS_UNTIL) has passed. Deletes in batches.
+        """
+        now = datetime.utcnow()
+        cutoff = now - timedelta(days=days)
+        condition = and_(SecurityToken.status == "used", SecurityToken.used_at < cutoff)
+        if now > _legacy_cutoff():
+            condition = or_(condition, SecurityToken.id.isnot(None))  # window closed: drop everything
+
+        deleted = 0
+        while True:
+            ids = (await db.execute(
+                select(SecurityToken.id).where(condition).limit(batch_size)
+            )).scalars().all()
+            if not ids:
+                break
+            await db.execute(delete(SecurityToken).where(SecurityToken.id.in_(ids)))
+            await db.commit()
+            deleted += len(ids)
+            if len(ids) < batch_size:
+                break
+
+        logger.info(f"🧹 Security token cleanup: {deleted} legacy rows removed")
+        return deleted
+
+
+async def run_security_token_cleanup():
+    """Daily job (services.daily_jobs)."""
+    from database.db_connect import BatchSessionLocal
+    async with BatchSessionLocal() as db:
+        return await TokenService.cleanup_old_tokens(db)
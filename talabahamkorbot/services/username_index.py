@@ -0,0 +1,355 @@
+import hashlib
+import logging
+import random
+import re
+import time
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Tuple
+
+import redis.asyncio as redis
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import REDIS_URL
+from database.models import TakenUsername
+
+logger = logging.getLogger(__name__)
+
+USERNAME_RE = re.compile(r"^[a-z][a-z0-9_]{4,31}$")
+
+# (student_id, staff_id) of the owner
+Owner = Tuple[Optional[int], Optional[int]]
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter. Bit layout matches Redis SETBIT/GETBIT
+    (offset 0 = most significant bit of byte 0), so to_bytes() can be SET as a Redis string.
+    """
+
+    def __init__(self, bits: int, hashes: int):
+        self.bits = bits
+        self.hashes = hashes
+        self.data = bytearray((bits + 7) // 8)
+
+    def offsets(self, value: str) -> List[int]:
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def add(self, value: str):
+        for off in self.offsets(value):
+            self.data[off >> 3] |= 0x80 >> (off & 7)
+
+    def __contains__(self, value: str) -> bool:
+        return all(self.data[off >> 3] & (0x80 >> (off & 7)) for off in self.offsets(value))
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.data)
+
+
+class LocalBitmap:
+    """In-process bitmap backend (single worker / tests / benchmarks)."""
+
+    def __init__(self, bloom: BloomFilter):
+        self.bloom = bloom
+        self.journal: Optional[List[List[int]]] = None
+
+    async def get_bits(self, offsets: List[int]) -> List[int]:
+        data = self.bloom.data
+        return [1 if data[off >> 3] & (0x80 >> (off & 7)) else 0 for off in offsets]
+
+    async def set_bits(self, offsets: List[int]):
+        for off in offsets:
+            self.bloom.data[off >> 3] |= 0x80 >> (off & 7)
+        if self.journal is not None:
+            self.journal.append(list(offsets))
+
+    async def begin_load(self):
+        self.journal = []
+
+    async def load(self, bloom: BloomFilter):
+        journal, self.journal = self.journal or [], None
+        self.bloom = bloom
+        for offsets in journal:
+            await self.set_bits(offsets)
+
+
+class RedisBitmap:
+    """
+    Shared bitmap in Redis: every worker sees claims made by the others.
+    Claims are also journaled (set of offset lists), so the ones made while a rebuild
+    reads its DB snapshot are re-applied after the new bitmap replaces the old one.
+    """
+
+    JOURNAL_TTL = 24 * 3600
+
+    def __init__(self, client, key: str):
+        self.client = client
+        self.key = key
+        self.journal = f"{key}:claims"
+
+    async def get_bits(self, offsets: List[int]) -> List[int]:
+        async with self.client.pipeline(transaction=False) as pipe:
+            for off in offsets:
+                pipe.getbit(self.key, off)
+            return await pipe.execute()
+
+    async def set_bits(self, offsets: List[int]):
+        async with self.client.pipeline(transaction=False) as pipe:
+            for off in offsets:
+                pipe.setbit(self.key, off, 1)
+            pipe.sadd(self.journal, ",".join(map(str, offsets)))
+            pipe.expire(self.journal, self.JOURNAL_TTL)
+            await pipe.execute()
+
+    async def begin_load(self):
+        # Claims committed before this are in the DB snapshot the rebuild is about to read
+        await self.client.delete(self.journal)
+
+    async def load(self, bloom: BloomFilter):
+        tmp = f"{self.key}:building"
+        await self.client.set(tmp, bloom.to_bytes())
+        await self.client.rename(tmp, self.key)
+        # Claims since begin_load() may have set bits on the replaced bitmap only
+        claimed = await self.client.smembers(self.journal)
+        if claimed:
+            async with self.client.pipeline(transaction=False) as pipe:
+                for item in claimed:
+                    for off in (item.decode() if isinstance(item, bytes) else item).split(","):
+                        pipe.setbit(self.key, int(off), 1)
+                await pipe.execute()
+
+
+class UsernameIndex:
+    """
+    Username availability without hitting taken_usernames on every keystroke:
+      - Bloom filter over all taken usernames ("not in filter" => definitely free, no DB)
+      - small TTL LRU of recent positives (username -> owner)
+      - filter hit / LRU miss => one indexed DB lookup (false positive or real owner)
+    The filter lives in Redis (shared by workers); without Redis every check goes to the DB.
+    Releases cannot clear Bloom bits - they only cost a DB lookup until the next rebuild.
+    """
+
+    BITS = 1 << 24          # 2 MB, ~0.3% false positives at 1M usernames
+    HASHES = 7
+    REDIS_KEY = "username_index:bloom"
+    LOCK_KEY = "username_index:rebuild_lock"
+    LRU_SIZE = 2048
+    LRU_TTL = 60            # sekund
+
+    _redis = None
+    _backend = None
+    _hasher = BloomFilter(BITS, HASHES)   # only used for offsets()
+    _lru: "OrderedDict[str, tuple]" = OrderedDict()  # username -> (expires_at, owner)
+    _stats = {
+        "checks": 0, "lru_hits": 0, "bloom_negatives": 0,
+        "db_lookups": 0, "false_positives": 0, "backend_errors": 0,
+        "claims": 0, "releases": 0,
+    }
+
+    @classmethod
+    async def get_redis(cls):
+        if cls._redis is None:
+            cls._redis = redis.from_url(REDIS_URL, decode_responses=False)
+        return cls._redis
+
+    @staticmethod
+    def normalize(username: str) -> str:
+        username = (username or "").strip().lower()
+        return username[1:] if username.startswith("@") else username
+
+    # ------------------------------------------------------------
+    # Build
+    # ------------------------------------------------------------
+
+    @classmethod
+    async def build_filter(cls, db: AsyncSession) -> Tuple[BloomFilter, int]:
+        bloom = BloomFilter(cls.BITS, cls.HASHES)
+        count = 0
+        result = await db.stream_scalars(
+            select(TakenUsername.username).execution_options(yield_per=5000)
+        )
+        async for username in result:
+            if username:
+                bloom.add(username.lower())
+                count += 1
+        return bloom, count
+
+    @classmethod
+    async def rebuild(cls, db: AsyncSession, backend=None) -> int:
+        """
+        Rebuilds the filter from taken_usernames. Uses Redis unless a backend is given;
+        if Redis is unavailable the index stays disabled (checks fall back to the DB).
+        """
+        if backend is None:
+            try:
+                r = await cls.get_redis()
+                # Several workers start together - only one rebuilds
+                if not await r.set(cls.LOCK_KEY, b"1", nx=True, ex=120):
+                    if await r.exists(cls.REDIS_KEY):
+                        cls._backend = RedisBitmap(r, cls.REDIS_KEY)
+                        return 0
+                backend = RedisBitmap(r, cls.REDIS_KEY)
+            except Exception as e:
+                logger.warning(f"Username index disabled (Redis unavailable): {e}")
+                cls._backend = None
+                return 0
+
+        started = time.perf_counter()
+        try:
+            await backend.begin_load()
+        except Exception as e:
+            logger.warning(f"Username index load failed: {e}")
+            cls._backend = None
+            return 0
+        bloom, count = await cls.build_filter(db)
+        try:
+            await backend.load(bloom)
+        except Exception as e:
+            logger.warning(f"Username index load failed: {e}")
+            cls._backend = None
+            return 0
+        cls._backend = backend
+        cls._lru.clear()
+        logger.info(f"🔤 Username index rebuilt: {count} names in {(time.perf_counter() - started) * 1000:.0f} ms")
+        return count
+
+    # ------------------------------------------------------------
+    # LRU
+    # ------------------------------------------------------------
+
+    @classmethod
+    def _lru_get(cls, username: str) -> Optional[Owner]:
+        item = cls._lru.get(username)
+        if not item:
+            return None
+        if item[0] < time.monotonic():
+            cls._lru.pop(username, None)
+            return None
+        cls._lru.move_to_end(username)
+        return item[1]
+
+    @classmethod
+    def _lru_set(cls, username: str, owner: Owner):
+        cls._lru[username] = (time.monotonic() + cls.LRU_TTL, owner)
+        cls._lru.move_to_end(username)
+        while len(cls._lru) > cls.LRU_SIZE:
+            cls._lru.popitem(last=False)
+
+    # ------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------
+
+    @classmethod
+    async def _maybe_taken(cls, usernames: List[str]) -> List[bool]:
+        """Bloom answer per name; True when unsure (no backend / backend error)."""
+        if cls._backend is None or not usernames:
+            return [True] * len(usernames)
+        offsets = [cls._hasher.offsets(u) for u in usernames]
+        try:
+            bits = await cls._backend.get_bits([off for offs in offsets for off in offs])
+        except Exception as e:
+            cls._stats["backend_errors"] += 1
+            logger.warning(f"Username index read failed: {e}")
+            return [True] * len(usernames)
+        k = cls.HASHES
+        return [all(bits[i * k:(i + 1) * k]) for i in range(len(usernames))]
+
+    @classmethod
+    async def get_owner(cls, db: AsyncSession, username: str) -> Optional[Owner]:
+        """(student_id, staff_id) if the username is taken, otherwise None."""
+        username = cls.normalize(username)
+        cls._stats["checks"] += 1
+
+        owner = cls._lru_get(username)
+        if owner is not None:
+            cls._stats["lru_hits"] += 1
+            return owner
+
+        if not (await cls._maybe_taken([username]))[0]:
+            cls._stats["bloom_negatives"] += 1
+            return None
+
+        cls._stats["db_lookups"] += 1
+        row = (await db.execute(
+            select(TakenUsername.student_id, TakenUsername.staff_id).where(TakenUsername.username == username)
+        )).first()
+        if not row:
+            cls._stats["false_positives"] += 1
+            return None
+        owner = (row[0], row[1])
+        cls._lru_set(username, owner)
+        return owner
+
+    @classmethod
+    async def free_among(cls, db: AsyncSession, usernames: Iterable[str]) -> List[str]:
+        """Filters candidates to the free ones: one Bloom round trip + at most one DB query."""
+        names = list(dict.fromkeys(cls.normalize(u) for u in usernames))
+        maybe = await cls._maybe_taken(names)
+        unsure = [u for u, m in zip(names, maybe) if m]
+        taken = set()
+        if unsure:
+            cls._stats["db_lookups"] += 1
+            result = await db.execute(select(TakenUsername.username).where(TakenUsername.username.in_(unsure)))
+            taken = set(result.scalars().all())
+        return [u for u in names if u not in taken]
+
+    @classmethod
+    async def suggest(cls, db: AsyncSession, username: str, count: int = 5, seed: Optional[int] = None) -> List[str]:
+        """Free alternatives for a taken username (valid for POST /username)."""
+        base = re.sub(r"[^a-z0-9_]", "", cls.normalize(username))[:26]
+        if not base or not base[0].isalpha():
+            base = f"user{base}"[:26]
+        rnd = random.Random(seed)
+        year = time.gmtime().tm_year
+
+        candidates = [f"{base}{year % 100}", f"{base}_{year}", f"{base}_uz", f"the_{base}", f"{base}_official"]
+        candidates += [f"{base}{n}" for n in range(1, 10)]
+        candidates += [f"{base}{rnd.randint(10, 999)}" for _ in range(10)]
+        candidates += [f"{base}_{rnd.randint(10, 99)}" for _ in range(5)]
+        candidates = [c for c in candidates if USERNAME_RE.match(c)]
+
+        return (await cls.free_among(db, candidates))[:count]
+
+    # ------------------------------------------------------------
+    # Updates
+    # ------------------------------------------------------------
+
+    @classmethod
+    async def claim(cls, username: str, student_id: Optional[int] = None, staff_id: Optional[int] = None):
+        """Call after the taken_usernames row is committed."""
+        username = cls.normalize(username)
+        cls._stats["claims"] += 1
+        cls._lru_set(username, (student_id, staff_id))
+        if cls._backend is None:
+            return
+        try:
+            await cls._backend.set_bits(cls._hasher.offsets(username))
+        except Exception as e:
+            cls._stats["backend_errors"] += 1
+            logger.warning(f"Username index claim failed ({username}): {e}")
+
+    @classmethod
+    def release(cls, usernames: Iterable[str]):
+        """Usernames freed (changed / premium expired). Bloom bits stay until the next rebuild."""
+        for username in usernames:
+            if username:
+                cls._stats["releases"] += 1
+                cls._lru.pop(cls.normalize(username), None)
+
+    @classmethod
+    def stats(cls) -> dict:
+        s = dict(cls._stats)
+        s["enabled"] = cls._backend is not None
+        s["lru_size"] = len(cls._lru)
+        s["db_free_rate"] = round(1 - s["db_lookups"] / s["checks"], 3) if s["checks"] else 0.0
+        return s
+
+
+async def run_username_index_rebuild():
+    """Startup (every worker, lifespan) / daily job (services.daily_jobs)."""
+    from database.db_connect import BatchSessionLocal
+    async with BatchSessionLocal() as db:
+        return await UsernameIndex.rebuild(db)
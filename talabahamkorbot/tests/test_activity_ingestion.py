@@ -0,0 +1,161 @@
+import asyncio
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from services import activity_service
+from services.activity_service import ActivityService, ActivityType
+
+
+class TestActivityIngestion(unittest.TestCase):
+    """Queued events, batched writes, incremental daily stats."""
+
+    def setUp(self):
+        try:
+            import aiosqlite  # noqa: F401
+        except ImportError:
+            self.skipTest("aiosqlite not installed")
+        ActivityService._buffer.clear()
+        ActivityService._retry.clear()
+        ActivityService._flush_lock = None
+        for k in ActivityService._stats:
+            ActivityService._stats[k] = 0
+
+    def tearDown(self):
+        ActivityService._buffer.clear()
+
+    def run_db(self, scenario):
+        async def main():
+            from sqlalchemy import event, insert
+            from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+            from database.models import ActivityLog, DailyActivityStats, Student
+
+            engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+            async with engine.begin() as conn:
+                for model in (Student, ActivityLog, DailyActivityStats):
+                    await conn.run_sync(lambda c, t=model.__table__: t.create(c))
+            Session = async_sessionmaker(engine, expire_on_commit=False)
+            async with Session() as db:
+                await db.execute(insert(Student), [
+                    {"id": 1, "full_name": "A", "hemis_login": "a", "faculty_id": 7, "total_activity_count": 3},
+                    {"id": 2, "full_name": "B", "hemis_login": "b", "faculty_id": 7, "total_activity_count": 0},
+                ])
+                await db.commit()
+            statements = []
+            event.listen(engine.sync_engine, "before_cursor_execute",
+                         lambda conn, cursor, sql, *args: statements.append(sql))
+            try:
+                with patch.object(activity_service, "AsyncSessionLocal", Session):
+                    return await scenario(Session, statements)
+            finally:
+                await engine.dispose()
+        return asyncio.run(main())
+
+    def test_batch_flush(self):
+        from sqlalchemy import select
+        from database.models import ActivityLog, DailyActivityStats, Student
+
+        async def scenario(Session, statements):
+            for _ in range(3):
+                await ActivityService.log_activity(user_id=1, role="student", activity_type=ActivityType.LIKE, ref_id=5)
+            await ActivityService.log_activity(user_id=2, role="student", activity_type=ActivityType.POST, ref_id=9)
+            await ActivityService.log_activity(user_id=4, role="staff", activity_type=ActivityType.APPEAL)
+            await ActivityService.log_activity(user_id=99, role="student", activity_type=ActivityType.LIKE)
+            self.assertEqual(statements, [])            # nothing written on the request path
+            written = await ActivityService.flush()
+            inserts = [s for s in statements if s.startswith("INSERT INTO activity_logs")]
+            # Second batch on the same day: no new active students
+            await ActivityService.log_activity(user_id=1, role="student", activity_type=ActivityType.COMMENT)
+            await ActivityService.flush()
+            async with Session() as db:
+                logs = (await db.execute(select(ActivityLog))).scalars().all()
+                counts = dict((await db.execute(select(Student.id, Student.total_activity_count))).all())
+                day = (await db.execute(select(DailyActivityStats))).scalars().all()
+            return written, inserts, logs, counts, day
+
+        written, inserts, logs, counts, day = self.run_db(scenario)
+        self.assertEqual(written, 5)
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(len(logs), 6)
+        self.assertEqual({l.faculty_id for l in logs if l.student_id}, {7})
+        self.assertEqual(counts, {1: 7, 2: 1})
+        self.assertEqual(len(day), 1)
+        self.assertEqual((day[0].total_active_students, day[0].total_likes, day[0].total_posts,
+                          day[0].total_comments), (2, 3, 1, 1))
+        self.assertAlmostEqual(day[0].avg_activity_score, 2.5)
+        stats = ActivityService.stats()
+        self.assertEqual((stats["flushed"], stats["unknown_students"], stats["buffered"]), (6, 1, 0))
+
+    def test_aggregate_daily_stats_matches_incremental(self):
+        from sqlalchemy import select
+        from database.models import DailyActivityStats
+
+        async def scenario(Session, statements):
+            yesterday = datetime.utcnow() - timedelta(days=1)
+            for kind in (ActivityType.LOGIN, ActivityType.LIKE, ActivityType.LIKE):
+                ActivityService.enqueue(1, "student", kind, created_at=yesterday)
+            ActivityService.enqueue(2, "student", ActivityType.LOGIN, created_at=yesterday)
+            await ActivityService.flush()
+            async with Session() as db:
+                before = (await db.execute(select(DailyActivityStats))).scalar_one()
+                before = (before.total_active_students, before.total_logins, before.total_likes)
+                await db.execute(DailyActivityStats.__table__.update().values(total_likes=0, total_active_students=0))
+                await db.commit()
+                await ActivityService.aggregate_daily_stats(db, yesterday)
+                db.expire_all()
+                after = (await db.execute(select(DailyActivityStats))).scalar_one()
+            return before, (after.total_active_students, after.total_logins, after.total_likes)
+
+        before, after = self.run_db(scenario)
+        self.assertEqual(before, (2, 2, 2))
+        self.assertEqual(after, before)
+
+    def test_failed_batch_is_requeued(self):
+        async def scenario(Session, statements):
+            ActivityService.enqueue(1, "student", ActivityType.LIKE)
+            with patch.object(ActivityService, "_write_batch", side_effect=ConnectionError("db down")):
+                self.assertEqual(await ActivityService.flush(), 0)
+                self.assertEqual(await ActivityService.flush(), 0)
+            self.assertEqual(ActivityService.stats()["retrying"], 1)
+            return await ActivityService.flush()
+
+        self.assertEqual(self.run_db(scenario), 1)
+        self.assertEqual(ActivityService.stats()["failed_batches"], 2)
+        self.assertEqual(ActivityService.stats()["dead_lettered"], 0)
+
+    def test_poison_event_is_bisected_and_dead_lettered(self):
+        import json
+        import os
+        import tempfile
+
+        real_write = ActivityService._write_batch.__func__
+
+        async def write_batch(cls, session, batch):
+            if any(e[3] == 666 for e in batch):
+                raise ValueError("violates foreign key constraint")
+            return await real_write(cls, session, batch)
+
+        async def scenario(Session, statements):
+            for ref in (1, 2, 3, 666, 5, 6, 7):
+                ActivityService.enqueue(1, "student", ActivityType.LIKE, ref_id=ref)
+            with patch.object(ActivityService, "_write_batch", classmethod(write_batch)):
+                written = await ActivityService.flush()
+                ActivityService.enqueue(2, "student", ActivityType.POST, ref_id=8)
+                written += await ActivityService.flush()
+            return written
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "dead.jsonl")
+            with patch.object(ActivityService, "DEAD_LETTER_PATH", path):
+                written = self.run_db(scenario)
+            with open(path) as f:
+                dead = [json.loads(line) for line in f]
+        self.assertEqual(written, 7)
+        self.assertEqual([(d["reference_id"], d["error"]) for d in dead],
+                         [(666, "violates foreign key constraint")])
+        stats = ActivityService.stats()
+        self.assertEqual((stats["dead_lettered"], stats["buffered"], stats["retrying"]), (1, 0, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,204 @@
+import asyncio
+import importlib.util
+import os
+import unittest
+from unittest.mock import patch
+
+import httpx
+
+from services.ai_gateway import AIBudgetExceeded, AIGateway
+
+# scripts/fake_openai_server.py, served in-process through httpx's ASGI transport
+_spec = importlib.util.spec_from_file_location(
+    "fake_openai_server",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts", "fake_openai_server.py"),
+)
+fake_server = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(fake_server)
+
+SYSTEM = "Sen yordamchisan."
+
+
+class _FakeRedis:
+    """In-memory subset of redis.asyncio used by AIGateway (cache + budget counters)."""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def mget(self, keys):
+        return [self.data.get(k) for k in keys]
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    async def incrby(self, key, amount):
+        self.data[key] = int(self.data.get(key, 0)) + amount
+        return self.data[key]
+
+    async def decrby(self, key, amount):
+        return await self.incrby(key, -amount)
+
+    async def expire(self, key, ttl):
+        pass
+
+    def pipeline(self, transaction=False):
+        redis, calls = self, []
+
+        class _Pipe:
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *args):
+                return False
+
+            def set(self, *args, **kwargs):
+                calls.append(redis.set(*args, **kwargs))
+
+            async def execute(self):
+                return [await c for c in calls]
+
+        return _Pipe()
+
+
+class _RedisDown:
+    def pipeline(self, *args, **kwargs):
+        raise ConnectionError("redis down")
+
+    def __getattr__(self, name):
+        async def fail(*args, **kwargs):
+            raise ConnectionError("redis down")
+        return fail
+
+
+class TestAIGateway(unittest.TestCase):
+
+    def setUp(self):
+        try:
+            import openai  # noqa: F401
+        except ImportError:
+            self.skipTest("openai not installed")
+        self.redis = _FakeRedis()
+        AIGateway._redis = self.redis
+        AIGateway._semaphore = None
+        AIGateway._l1.clear()
+        for k in AIGateway._metrics:
+            AIGateway._metrics[k] = 0
+        fake_server.STATS["calls"] = 0
+        patcher = patch.object(fake_server, "LATENCY_SEC", 0.01)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        AIGateway._redis = None
+
+    def run_client(self, scenario):
+        async def main():
+            from openai import AsyncOpenAI
+            http = httpx.AsyncClient(transport=httpx.ASGITransport(app=fake_server.app))
+            client = AsyncOpenAI(api_key="test", base_url="http://fake/v1", http_client=http, max_retries=0)
+            try:
+                return await scenario(client)
+            finally:
+                await http.aclose()
+        return asyncio.run(main())
+
+    def used(self, role, user_id):
+        return int(self.redis.data.get(AIGateway._budget_key(role, user_id), 0))
+
+    def test_exact_and_normalized_cache(self):
+        async def scenario(client):
+            first = await AIGateway.complete(client, "m", SYSTEM, "Konspekt  haqida")
+            again = await AIGateway.complete(client, "m", SYSTEM, "Konspekt  haqida")
+            normalized = await AIGateway.complete(client, "m", SYSTEM, "konspekt haqida ")
+            return first, again, normalized
+
+        first, again, normalized = self.run_client(scenario)
+        self.assertTrue(first.startswith("[fake:m]"))
+        self.assertEqual(again, first)
+        self.assertEqual(normalized, first)
+        self.assertEqual(fake_server.STATS["calls"], 1)
+        m = AIGateway.metrics()
+        self.assertEqual((m["cache_hits_exact"], m["cache_hits_normalized"]), (1, 1))
+
+    def test_concurrent_requests_cannot_overspend(self):
+        prompts = [f"savol {i} " + "x" * 400 for i in range(5)]
+        estimate = AIGateway.estimate_tokens(SYSTEM) + AIGateway.estimate_tokens(prompts[0]) + \
+            AIGateway.COMPLETION_RESERVE
+
+        async def scenario(client):
+            return await asyncio.gather(*(
+                AIGateway.complete(client, "m", SYSTEM, p, role="student", user_id=7, cache_ttl=0)
+                for p in prompts
+            ), return_exceptions=True)
+
+        with patch.dict(AIGateway.TOKEN_BUDGETS, {"student": 2 * estimate + 10}):
+            results = self.run_client(scenario)
+        rejected = [r for r in results if isinstance(r, AIBudgetExceeded)]
+        self.assertEqual((len(results) - len(rejected), len(rejected)), (2, 3))
+        self.assertEqual(fake_server.STATS["calls"], 2)
+        m = AIGateway.metrics()
+        # Reservations were replaced by the actual usage
+        self.assertEqual(self.used("student", 7), m["prompt_tokens"] + m["completion_tokens"])
+
+    def test_batches_and_partial_results_on_budget(self):
+        items = {i: ("TTJ joy kerak" if i % 2 else "Kontrakt to'lovi") for i in range(1, 251)}
+
+        async def scenario(client):
+            full = await AIGateway.classify_batch(client, "m", SYSTEM, items, "Mavzuni aniqla", batch_size=100)
+            calls = fake_server.STATS["calls"]
+            AIGateway._l1.clear()
+            self.redis.data.clear()
+            with patch.dict(AIGateway.TOKEN_BUDGETS, {"staff": 1500}):
+                partial = await AIGateway.classify_batch(client, "m", SYSTEM, items, "Mavzuni aniqla",
+                                                         batch_size=100, user_id=3)
+            with patch.dict(AIGateway.TOKEN_BUDGETS, {"staff": 10}):
+                with self.assertRaises(AIBudgetExceeded):
+                    await AIGateway.classify_batch(client, "m", SYSTEM, items, "Boshqa ko'rsatma",
+                                                   batch_size=100, user_id=4)
+            return full, calls, partial
+
+        full, calls, partial = self.run_client(scenario)
+        self.assertEqual(calls, 3)
+        self.assertEqual(len(full), 250)
+        self.assertEqual((full["1"], full["2"]), ("Yotoqxona", "Kontrakt"))
+        # Budget fits some chunks only: their labels are kept, the rest are missing
+        self.assertTrue(0 < len(partial) < 250)
+        self.assertEqual(len(partial) % 50, 0)
+
+    def test_fallbacks(self):
+        from services import ai_service
+
+        class _Completions:
+            def __init__(self, real):
+                self.real = real
+
+            async def create(self, model, **kwargs):
+                if model == "broken":
+                    raise RuntimeError("upstream 500")
+                if model == "gpt-5.2":
+                    raise RuntimeError("The model `gpt-5.2` does not exist")
+                return await self.real.chat.completions.create(model=model, **kwargs)
+
+        async def scenario(client):
+            stub = type("Client", (), {})()
+            stub.chat = type("Chat", (), {"completions": _Completions(client)})()
+            with self.assertRaises(RuntimeError):
+                await AIGateway.complete(stub, "broken", SYSTEM, "salom", user_id=9, cache_ttl=0)
+            refunded = self.used("student", 9)
+            with patch.object(ai_service, "client", stub):
+                answer = await ai_service.generate_response("salom", model="gpt-5.2", user_id=9)
+            AIGateway._redis = _RedisDown()
+            no_redis = await AIGateway.complete(client, "m", SYSTEM, "redis yo'q", user_id=9)
+            return refunded, answer, no_redis
+
+        refunded, answer, no_redis = self.run_client(scenario)
+        self.assertEqual(refunded, 0)                      # failed call gives its reservation back
+        self.assertTrue(answer.startswith("[fake:gpt-4o]"))
+        self.assertTrue(no_redis.startswith("[fake:m]"))   # Redis down: no cache / budget, still served
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import asyncio
+import unittest
+from datetime import datetime, timedelta
+
+from services.comment_service import CommentService
+
+
+class TestCommentCursor(unittest.TestCase):
+
+    def test_roundtrip(self):
+        values = [3, datetime(2025, 1, 2, 3, 4, 5), 42]
+        decoded = CommentService.decode_cursor(CommentService.encode_cursor(values))
+        self.assertEqual(decoded, [3, "2025-01-02T03:04:05", 42])
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(ValueError):
+            CommentService.decode_cursor("not-a-cursor")
+        self.assertIsNone(CommentService.decode_cursor(None))
+
+    def test_malformed_cursor_values(self):
+        encode = CommentService.encode_cursor
+        self.assertEqual(CommentService._after(encode([3, datetime(2025, 1, 2), 42]), 3),
+                         [3, datetime(2025, 1, 2), 42])
+        # Valid base64/JSON, wrong contents: still ValueError (400), not TypeError (500)
+        for values, size in (([3, 12345, 42], 3), ([3, None, 42], 3), ([3, "kecha", 42], 3),
+                             (["2025-01-02T00:00:00"], 2), ({"a": 1, "b": 2}, 2),
+                             (["2025-01-02T00:00:00", [1]], 2), ("salom", 2)):
+            with self.assertRaises(ValueError, msg=values):
+                CommentService._after(encode(values), size)
+
+
+class TestCommentPages(unittest.TestCase):
+    """Keyset pages over SQLite must reproduce the full ranked order."""
+
+    def test_pages_match_ranked_order(self):
+        try:
+            import aiosqlite  # noqa: F401
+        except ImportError:
+            self.skipTest("aiosqlite not installed")
+        asyncio.run(self._run())
+
+    async def _run(self):
+        from sqlalchemy import insert
+        from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+        from database.db_connect import Base
+        from database.models import Student, ChoyxonaPost, ChoyxonaComment
+
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+
+        def create(conn):
+            for table in Base.metadata.sorted_tables:
+                try:
+                    table.create(conn, checkfirst=True)
+                except Exception:
+                    pass  # JSONB tables
+
+        async with engine.begin() as conn:
+            await conn.run_sync(create)
+        Session = async_sessionmaker(engine, expire_on_commit=False)
+
+        base = datetime(2025, 1, 1)
+        likes = [5, 0, 5, 2, 0, 5, 1, 2, 0, 0, 3]  # ties on likes and on created_at
+        async with Session() as db:
+            await db.execute(insert(Student), [{"id": 1, "full_name": "Aliyev Vali", "hemis_login": "v1"}])
+            await db.execute(insert(ChoyxonaPost), [{"id": 1, "student_id": 1, "content": "p", "category_type": "university"}])
+            rows = [{"id": i + 1, "post_id": 1, "student_id": 1, "content": f"c{i}", "likes_count": l,
+                     "created_at": base + timedelta(minutes=i // 2)} for i, l in enumerate(likes)]
+            rows += [{"id": 100 + i, "post_id": 1, "student_id": 1, "content": f"r{i}", "likes_count": 9,
+                      "reply_to_comment_id": 1, "created_at": base + timedelta(hours=1, minutes=i)} for i in range(5)]
+            await db.execute(insert(ChoyxonaComment), rows)
+            await db.commit()
+
+            expected = sorted((r for r in rows if "reply_to_comment_id" not in r),
+                              key=lambda r: (-r["likes_count"], r["created_at"], r["id"]))
+            walked, cursor = [], None
+            while True:
+                page, cursor = await CommentService.top_level_page(db, 1, cursor, 3)
+                walked.extend(r.id for r in page)
+                if not cursor:
+                    break
+            self.assertEqual(walked, [r["id"] for r in expected])
+
+            replies, cursor = await CommentService.replies_page(db, 1, None, 2)
+            self.assertEqual([r.id for r in replies], [100, 101])
+            replies, cursor = await CommentService.replies_page(db, 1, cursor, 10)
+            self.assertEqual([r.id for r in replies], [102, 103, 104])
+            self.assertIsNone(cursor)
+
+            targets = await CommentService.reply_targets(db, replies)
+            self.assertEqual(targets[102]["content"], "c0")
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import asyncio
+import unittest
+from datetime import datetime, timedelta
+
+from services.banner_analytics import BannerAnalyticsService
+from services.content_delivery import ContentDeliveryService
+
+
+class TestContentDelivery(unittest.TestCase):
+    """Cached announcements/banners: unread filter, invalidation, zero writes on launch."""
+
+    def setUp(self):
+        try:
+            import aiosqlite  # noqa: F401
+        except ImportError:
+            self.skipTest("aiosqlite not installed")
+        ContentDeliveryService._cache.clear()
+        ContentDeliveryService._version_checked_at = float("inf")  # no Redis in tests
+
+    async def _db(self):
+        from sqlalchemy import event, insert
+        from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+        from database.models import Announcement, AnnouncementRead, Banner
+
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with engine.begin() as conn:
+            for model in (Announcement, AnnouncementRead, Banner):
+                await conn.run_sync(lambda c, t=model.__table__: t.create(c))
+        Session = async_sessionmaker(engine, expire_on_commit=False)
+
+        now = datetime.utcnow()
+        async with Session() as db:
+            await db.execute(insert(Announcement), [
+                {"id": 1, "title": "Global", "priority": 100, "is_active": True, "created_at": now},
+                {"id": 2, "title": "OTM 1", "priority": 0, "is_active": True, "university_id": 1, "created_at": now},
+                {"id": 3, "title": "OTM 2", "priority": 0, "is_active": True, "university_id": 2, "created_at": now},
+                {"id": 4, "title": "Eski", "priority": 0, "is_active": True, "created_at": now,
+                 "expires_at": now - timedelta(days=1)},
+            ])
+            await db.execute(insert(AnnouncementRead), [{"user_id": 7, "announcement_id": 1}])
+            await db.execute(insert(Banner), [
+                {"id": 1, "image_file_id": "a", "is_active": True, "views": 0, "clicks": 0, "created_at": now},
+                {"id": 2, "image_file_id": "b", "is_active": True, "views": 0, "clicks": 0, "created_at": now},
+            ])
+            await db.commit()
+
+        statements = []
+        event.listen(engine.sync_engine, "before_cursor_execute",
+                     lambda conn, cursor, sql, *args: statements.append(sql))
+        return engine, Session, statements
+
+    def test_unread_cache_and_invalidation(self):
+        async def run():
+            from database.models import Announcement
+            engine, Session, statements = await self._db()
+            async with Session() as db:
+                unread = await ContentDeliveryService.unread_announcements(db, 7, 1)
+                self.assertEqual([a["id"] for a in unread], [2])
+                unread = await ContentDeliveryService.unread_announcements(db, 8, 1)
+                self.assertEqual([a["id"] for a in unread], [1, 2])
+
+                # Second launch: only the read-status lookup hits the DB
+                statements.clear()
+                await ContentDeliveryService.unread_announcements(db, 9, 1)
+                self.assertEqual(len(statements), 1)
+                self.assertIn("announcement_read_status", statements[0])
+
+                db.add(Announcement(id=5, title="Yangi", priority=50, is_active=True))
+                await db.commit()
+                self.assertNotIn(5, [a["id"] for a in await ContentDeliveryService.active_announcements(db, 1)])
+                await ContentDeliveryService.invalidate()
+                self.assertEqual([a["id"] for a in await ContentDeliveryService.active_announcements(db, 1)], [1, 5, 2])
+            await engine.dispose()
+
+        asyncio.run(run())
+
+    def test_banner_views_are_buffered(self):
+        async def run():
+            engine, Session, statements = await self._db()
+            service = BannerAnalyticsService()
+            service._views_buffer.clear()
+            async with Session() as db:
+                banners = await ContentDeliveryService.active_banners(db)
+                self.assertEqual([b["id"] for b in banners], [2, 1])
+
+                statements.clear()
+                for _ in range(3):
+                    banners = await ContentDeliveryService.active_banners(db)
+                    await ContentDeliveryService.record_banner_view(banners[0]["id"])
+                self.assertEqual(statements, [])
+                self.assertEqual(service._views_buffer, {2: 3})
+            service._views_buffer.clear()
+            await engine.dispose()
+
+        asyncio.run(run())
+
+
+if __name__ == "__main__":
+    unittest.main()
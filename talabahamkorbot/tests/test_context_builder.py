@@ -0,0 +1,131 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from services import context_builder
+from services.context_builder import ContextUpdateStats, context_fingerprint
+
+
+def _student(**overrides):
+    fields = {f: None for f in context_builder.PROFILE_FIELDS}
+    fields.update(full_name="Ali Valiyev", group_number="101-21", missed_hours=4)
+    fields.update(overrides)
+    return SimpleNamespace(**fields)
+
+
+class TestContextFingerprint(unittest.TestCase):
+
+    def test_activities_with_none_values(self):
+        student = _student()
+        acts = [("Sport", "sport", None), ("Olimpiada", None, "approved"), ("Sport", "sport", "pending")]
+        fp = context_fingerprint(student, None, acts)
+        # Tartib ahamiyatsiz, None bo'lsa ham TypeError bo'lmaydi
+        self.assertEqual(fp, context_fingerprint(student, [], list(reversed(acts))))
+        self.assertNotEqual(fp, context_fingerprint(student, None, acts[:2]))
+
+    def test_changes_with_profile_and_grades(self):
+        student = _student()
+        grades = [{"subject": {"name": "Fizika"}, "total_score": 80}]
+        fp = context_fingerprint(student, grades, [])
+        self.assertEqual(fp, context_fingerprint(_student(), grades, []))
+        self.assertNotEqual(fp, context_fingerprint(_student(missed_hours=6), grades, []))
+        self.assertNotEqual(fp, context_fingerprint(student, [{"subject": {"name": "Fizika"}, "total_score": 81}], []))
+
+
+class TestUpdateBatch(unittest.TestCase):
+
+    def setUp(self):
+        try:
+            import aiosqlite  # noqa: F401
+        except ImportError:
+            self.skipTest("aiosqlite not installed")
+
+    def run_db(self, scenario):
+        async def main():
+            from sqlalchemy import insert
+            from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+            from database.models import Club, Student, StudentCache, UserActivity
+
+            engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+            async with engine.begin() as conn:
+                for model in (Student, Club, StudentCache, UserActivity):
+                    await conn.run_sync(lambda c, t=model.__table__: t.create(c))
+            Session = async_sessionmaker(engine, expire_on_commit=False)
+            async with Session() as db:
+                await db.execute(insert(Student), [
+                    {"id": i, "full_name": f"Talaba {i}", "hemis_login": f"s{i}", "group_number": "101-21"}
+                    for i in (1, 2, 3)
+                ])
+                await db.execute(insert(UserActivity), [
+                    {"student_id": 1, "category": "sport", "name": "Futbol", "status": "pending"},
+                    {"student_id": 1, "category": "sport", "name": "Futbol", "status": "approved"},
+                ])
+                await db.commit()
+            try:
+                with patch.object(context_builder, "BatchSessionLocal", Session):
+                    return await scenario(Session)
+            finally:
+                await engine.dispose()
+        return asyncio.run(main())
+
+    def test_unchanged_students_are_skipped(self):
+        from sqlalchemy import select, update
+        from database.models import Student
+
+        async def scenario(Session):
+            first = ContextUpdateStats()
+            await context_builder._update_batch([1, 2, 3], first)
+            async with Session() as db:
+                stamps = dict((await db.execute(select(Student.id, Student.last_context_update))).all())
+
+            second = ContextUpdateStats()
+            await context_builder._update_batch([1, 2, 3], second)
+
+            async with Session() as db:
+                await db.execute(update(Student).where(Student.id == 2).values(missed_hours=9))
+                await db.commit()
+            third = ContextUpdateStats()
+            await context_builder._update_batch([1, 2, 3], third)
+            async with Session() as db:
+                rows = {s.id: s for s in (await db.scalars(select(Student))).all()}
+            return first, second, third, stamps, rows
+
+        first, second, third, stamps, rows = self.run_db(scenario)
+        self.assertEqual((first.changed, first.unchanged, first.errors, first.batches), (3, 0, 0, 1))
+        self.assertEqual((second.changed, second.unchanged), (0, 3))
+        self.assertEqual((third.changed, third.unchanged), (1, 2))
+        # Commit bo'lgan: matn va hash saqlangan, o'zgarmaganlar qayta yozilmagan
+        self.assertIn("- Futbol (sport): approved", rows[1].ai_context)
+        self.assertIn("Qoldirilgan soatlar: 9", rows[2].ai_context)
+        self.assertEqual(rows[1].last_context_update, stamps[1])
+        self.assertNotEqual(rows[2].last_context_update, stamps[2])
+        self.assertTrue(all(s.ai_context_hash for s in rows.values()))
+
+    def test_failing_student_does_not_block_batch(self):
+        from sqlalchemy import select
+        from database.models import Student
+
+        real = context_builder.render_student_context
+
+        def render(student, grades, acts):
+            if student.id == 2:
+                raise ValueError("bad profile")
+            return real(student, grades, acts)
+
+        async def scenario(Session):
+            stats = ContextUpdateStats()
+            with patch.object(context_builder, "render_student_context", render):
+                await context_builder._update_batch([1, 2, 3], stats)
+            async with Session() as db:
+                rows = {s.id: s.ai_context for s in (await db.scalars(select(Student))).all()}
+            return stats, rows
+
+        stats, rows = self.run_db(scenario)
+        self.assertEqual((stats.changed, stats.errors, stats.batches), (2, 1, 1))
+        self.assertIsNone(rows[2])
+        self.assertTrue(rows[1] and rows[3])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import ast
+import asyncio
+import inspect
+import os
+import unittest
+from datetime import datetime
+from unittest.mock import AsyncMock, patch
+
+from services import partition_manager
+from services.daily_jobs import DailyJobScheduler
+
+MAIN_PY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+
+class _RedisDown:
+    async def set(self, *args, **kwargs):
+        raise ConnectionError("redis down")
+
+
+class TestDailyJobs(unittest.TestCase):
+
+    def setUp(self):
+        DailyJobScheduler._redis = _FakeRedis()
+
+    def tearDown(self):
+        DailyJobScheduler._redis = None
+        DailyJobScheduler._tasks = []
+
+    def job(self, name):
+        return next(j for j in DailyJobScheduler.JOBS if j.name == name)
+
+    def test_jobs_resolve_to_coroutines(self):
+        import importlib
+        for job in DailyJobScheduler.JOBS:
+            module, func = job.target.split(":")
+            self.assertTrue(inspect.iscoroutinefunction(getattr(importlib.import_module(module), func)), job.name)
+        self.assertTrue(self.job("log_partitions").at_startup)
+        self.assertEqual({j.name: (j.hour, j.minute) for j in DailyJobScheduler.JOBS}, {
+            "log_partitions": (3, 0),
+            "security_token_cleanup": (3, 30),
+            "follow_counter_reconciliation": (4, 0),
+            "tutor_kpi_recompute": (4, 30),
+            "username_index_rebuild": (5, 0),
+        })
+
+    def test_lifespan_starts_scheduler(self):
+        """main.py's APScheduler is never started: the jobs must be started from the lifespan."""
+        with open(MAIN_PY, encoding="utf-8") as f:
+            tree = ast.parse(f.read())
+        lifespan = next(n for n in ast.walk(tree) if isinstance(n, ast.AsyncFunctionDef) and n.name == "lifespan")
+        calls = {ast.unparse(n.func) for n in ast.walk(lifespan) if isinstance(n, ast.Call)}
+        self.assertIn("DailyJobScheduler.start", calls)
+        self.assertIn("DailyJobScheduler.stop", calls)
+
+    def test_seconds_until(self):
+        now = datetime(2026, 10, 19, 2, 30)
+        self.assertEqual(DailyJobScheduler.seconds_until(3, 0, now), 1800)
+        self.assertEqual(DailyJobScheduler.seconds_until(2, 30, now), 24 * 3600)
+        self.assertEqual(DailyJobScheduler.seconds_until(1, 0, now), 22.5 * 3600)
+
+    def test_partition_maintenance_runs_at_startup_and_daily_once(self):
+        maintenance = AsyncMock(return_value={"created": []})
+        delays = iter([0, 3600])
+
+        async def scenario():
+            # Two workers start: the startup and the daily run happen once in total
+            tasks = DailyJobScheduler.start() + DailyJobScheduler.start()
+            await asyncio.sleep(0.05)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        with patch.object(partition_manager, "run_log_partition_maintenance", maintenance), \
+                patch.object(DailyJobScheduler, "JOBS", [self.job("log_partitions")]), \
+                patch.object(DailyJobScheduler, "seconds_until", side_effect=lambda h, m: next(delays, 3600)):
+            asyncio.run(scenario())
+        self.assertEqual(maintenance.await_count, 2)
+        keys = set(DailyJobScheduler._redis.data)
+        self.assertIn(f"daily_job:log_partitions:{datetime.now():%Y-%m-%d}", keys)
+        self.assertIn("daily_job:log_partitions:startup", keys)
+
+    def test_failure_is_logged_and_redis_down_still_runs(self):
+        DailyJobScheduler._redis = _RedisDown()
+        failing = AsyncMock(side_effect=RuntimeError("db down"))
+
+        async def scenario():
+            with self.assertLogs("services.daily_jobs", level="ERROR"):
+                result = await DailyJobScheduler.run_once(self.job("log_partitions"), "log_partitions:x", 60)
+            return result
+
+        with patch.object(partition_manager, "run_log_partition_maintenance", failing):
+            self.assertIsNone(asyncio.run(scenario()))
+        failing.assert_awaited_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,173 @@
+import asyncio
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, patch
+
+from services import dashboard_summary
+from services.dashboard_summary import DashboardSummaryService
+
+
+class _RedisDown:
+    async def set(self, *args, **kwargs):
+        raise ConnectionError("redis down")
+
+    async def delete(self, *args, **kwargs):
+        raise ConnectionError("redis down")
+
+
+class TestDashboardSummary(unittest.TestCase):
+    """Event-maintained counters, one-query loads, university snapshot, async refresh."""
+
+    def setUp(self):
+        try:
+            import aiosqlite  # noqa: F401
+        except ImportError:
+            self.skipTest("aiosqlite not installed")
+        DashboardSummaryService._redis = _RedisDown()
+        DashboardSummaryService._flags = {}
+        DashboardSummaryService._refreshing = set()
+
+    def tearDown(self):
+        DashboardSummaryService._redis = None
+
+    async def _db(self):
+        from sqlalchemy import event, insert
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+        from database.models import (
+            ClubMembership, Election, RatingActivation, RatingRecord, StudentDashboardSummary, UserActivity,
+        )
+
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with engine.begin() as conn:
+            for model in (StudentDashboardSummary, UserActivity, ClubMembership, RatingRecord,
+                          RatingActivation, Election):
+                await conn.run_sync(lambda c, t=model.__table__: t.create(c))
+        Session = async_sessionmaker(engine, expire_on_commit=False)
+
+        now = datetime.utcnow()
+        async with Session() as db:
+            await db.execute(insert(UserActivity), [
+                {"student_id": 1, "category": "sport", "name": "a", "status": "approved", "created_at": now},
+                {"student_id": 1, "category": "sport", "name": "b", "status": "pending", "created_at": now},
+                {"student_id": 2, "category": "sport", "name": "c", "status": "approved", "created_at": now},
+            ])
+            await db.execute(insert(ClubMembership), [{"student_id": 1, "club_id": 1}])
+            await db.execute(insert(RatingActivation), [
+                {"id": 1, "university_id": 1, "role_type": "tutor", "is_active": True, "created_at": now},
+                {"id": 2, "university_id": 1, "role_type": "water", "is_active": True,
+                 "created_at": now - timedelta(days=1)},
+            ])
+            await db.execute(insert(RatingRecord), [
+                {"user_id": 1, "activation_id": 2, "role_type": "water", "university_id": 1, "rating": 5},
+            ])
+            await db.execute(insert(Election), [
+                {"id": 1, "university_id": 1, "title": "Eski", "status": "active",
+                 "deadline": now - timedelta(days=1), "created_at": now - timedelta(days=2)},
+            ])
+            await db.commit()
+
+        statements = []
+        event.listen(engine.sync_engine, "before_cursor_execute",
+                     lambda conn, cursor, sql, *args: statements.append(sql))
+        return engine, Session, statements
+
+    def run_db(self, scenario):
+        async def main():
+            engine, Session, statements = await self._db()
+            try:
+                with patch.object(dashboard_summary, "AsyncSessionLocal", Session):
+                    return await scenario(Session, statements)
+            finally:
+                await engine.dispose()
+        return asyncio.run(main())
+
+    def test_counters_are_maintained_by_commits(self):
+        async def scenario(Session, statements):
+            from database.models import UserActivity
+            async with Session() as db:
+                first = await DashboardSummaryService.get_summary(db, 1)
+                first = (first.activities_count, first.activities_approved_count,
+                         first.clubs_count, first.voted_activation_ids)
+
+            async with Session() as db:
+                statements.clear()
+                await DashboardSummaryService.get_summary(db, 1)
+                reads = len(statements)
+
+                db.add(UserActivity(student_id=1, category="sport", name="d", status="approved"))
+                await db.commit()
+            await asyncio.gather(*DashboardSummaryService._tasks)
+
+            async with Session() as db:
+                after = await DashboardSummaryService.get_summary(db, 1)
+            return first, reads, (after.activities_count, after.activities_approved_count)
+
+        first, reads, after = self.run_db(scenario)
+        self.assertEqual(first, (2, 1, 1, [2]))
+        self.assertEqual(reads, 1)
+        self.assertEqual(after, (3, 2))
+
+    def test_concurrent_first_loads_do_not_touch_request_session(self):
+        async def scenario(Session, statements):
+            sessions = [Session(), Session()]
+            for db in sessions:
+                db.commit = AsyncMock(side_effect=AssertionError("GET committed the request session"))
+            try:
+                rows = await asyncio.gather(*(DashboardSummaryService.get_summary(db, 2) for db in sessions))
+            finally:
+                for db in sessions:
+                    await db.close()
+            return [(r.activities_count, r.activities_approved_count) for r in rows]
+
+        self.assertEqual(self.run_db(scenario), [(1, 1), (1, 1)])
+
+    def test_university_flags_snapshot_and_invalidation(self):
+        async def scenario(Session, statements):
+            from database.models import Election
+            async with Session() as db:
+                flags = await DashboardSummaryService.university_flags(db, 1)
+                statements.clear()
+                cached = await DashboardSummaryService.university_flags(db, 1)
+                reads = len(statements)
+
+                db.add(Election(id=2, university_id=1, title="Yangi", status="active"))
+                await db.commit()
+                fresh = await DashboardSummaryService.university_flags(db, 1)
+            return flags, cached, reads, fresh
+
+        flags, cached, reads, fresh = self.run_db(scenario)
+        # Expired election does not count; activations newest first
+        self.assertIsNone(flags["election_id"])
+        self.assertEqual([a["role_type"] for a in flags["activations"]], ["tutor", "water"])
+        self.assertIs(cached, flags)
+        self.assertEqual(reads, 0)
+        self.assertEqual(fresh["election_id"], 2)
+
+    def test_refresh_runs_in_background_once(self):
+        calls = []
+
+        async def scenario(Session, statements):
+            gate = asyncio.Event()
+
+            async def fake_run_sync(student_id):
+                # sync_service needs firebase_admin; the HEMIS sync itself is not under test
+                calls.append(student_id)
+                await gate.wait()
+                DashboardSummaryService._refreshing.discard(student_id)
+
+            with patch.object(DashboardSummaryService, "_run_sync", side_effect=fake_run_sync):
+                first = await DashboardSummaryService.request_refresh(1)
+                await asyncio.sleep(0)
+                second = await DashboardSummaryService.request_refresh(1)
+                gate.set()
+                await asyncio.gather(*DashboardSummaryService._tasks)
+            return first, second, set(DashboardSummaryService._refreshing)
+
+        first, second, left = self.run_db(scenario)
+        self.assertTrue(first and second)
+        self.assertEqual(calls, [1])
+        self.assertEqual(left, set())
+
+
+if __name__ == "__main__":
+    unittest.main()
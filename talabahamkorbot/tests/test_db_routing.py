@@ -0,0 +1,151 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+from database import db_connect
+from database.db_connect import ReplicaRouter, get_session, read_replica, read_session
+from database.pool_metrics import PoolMetrics, TimedQueuePool
+
+
+class TestDbRouting(unittest.TestCase):
+
+    def setUp(self):
+        ReplicaRouter._lag = None
+        ReplicaRouter._checked_at = 0.0
+        ReplicaRouter._lock = None
+        for k in ReplicaRouter._stats:
+            ReplicaRouter._stats[k] = 0
+
+    def test_read_replica_swaps_only_db_dependencies(self):
+        import inspect
+        from fastapi import Depends
+
+        async def current_user():
+            return 1
+
+        async def get_db():
+            yield None
+
+        db_connect.WRITE_DEPENDENCIES.add(get_db)
+        try:
+            @read_replica
+            async def endpoint(q: str = None, user=Depends(current_user), db=Depends(get_db), s=Depends(get_session)):
+                return q
+
+            params = inspect.signature(endpoint).parameters
+        finally:
+            db_connect.WRITE_DEPENDENCIES.discard(get_db)
+        self.assertIsNone(params["q"].default)
+        self.assertIs(params["user"].default.dependency, current_user)
+        self.assertIs(params["db"].default.dependency, db_connect.get_read_session)
+        self.assertIs(params["s"].default.dependency, db_connect.get_read_session)
+
+    def test_routing_follows_replica_lag(self):
+        lags = [0.4, 30.0]
+
+        async def fake_probe():
+            value = lags.pop(0)
+            if isinstance(value, Exception):
+                raise value
+            return value
+
+        async def scenario():
+            replica = object()
+            picked = []
+            with patch.object(db_connect, "ReplicaSessionLocal", replica), \
+                    patch.object(ReplicaRouter, "_probe", side_effect=fake_probe):
+                picked += [await ReplicaRouter.read_sessionmaker() for _ in range(3)]   # one probe: 0.4s
+                ReplicaRouter._checked_at = 0.0
+                picked.append(await ReplicaRouter.read_sessionmaker())                  # 30s behind
+                ReplicaRouter._checked_at = 0.0
+                lags.append(ConnectionError("replica down"))
+                picked.append(await ReplicaRouter.read_sessionmaker())
+            return [p is replica for p in picked]
+
+        picked = asyncio.run(scenario())
+        self.assertEqual(picked, [True, True, True, False, False])
+        self.assertEqual(ReplicaRouter.stats()["lag_checks"], 3)
+        self.assertEqual(ReplicaRouter.stats()["lag_errors"], 1)
+
+    def test_hung_replica_probe_does_not_block_reads(self):
+        started = asyncio.Event()
+
+        async def hung_probe():
+            started.set()
+            await asyncio.sleep(60)   # blackholed replica host
+
+        async def scenario():
+            replica = object()
+            with patch.object(db_connect, "ReplicaSessionLocal", replica), \
+                    patch.object(ReplicaRouter, "_probe", side_effect=hung_probe), \
+                    patch.object(ReplicaRouter, "PROBE_TIMEOUT", 0.2):
+                ReplicaRouter._lag = 0.1   # last known value
+                loop = asyncio.get_running_loop()
+                t0 = loop.time()
+                prober = asyncio.create_task(ReplicaRouter.read_sessionmaker())
+                await started.wait()
+                # While one request probes, the others do not wait for it
+                others = [await ReplicaRouter.read_sessionmaker() for _ in range(3)]
+                waited_others = loop.time() - t0
+                first = await prober
+                return [p is replica for p in others], first is replica, waited_others, loop.time() - t0
+
+        others, first, waited_others, total = asyncio.run(scenario())
+        self.assertEqual(others, [True] * 3)
+        self.assertLess(waited_others, 0.1)
+        self.assertFalse(first)              # probe timed out -> primary
+        self.assertLess(total, 1)
+        self.assertEqual(ReplicaRouter.stats()["lag_errors"], 1)
+        self.assertIsNone(ReplicaRouter._lag)
+
+    def test_without_replica_reads_use_primary(self):
+        async def scenario():
+            with patch.object(db_connect, "ReplicaSessionLocal", None), \
+                    patch.object(db_connect, "AsyncSessionLocal", lambda: _Session()):
+                async with read_session() as session:
+                    return session.info
+
+        class _Session(dict):
+            info = {}
+
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *args):
+                return False
+
+        self.assertEqual(asyncio.run(scenario()), {"read_only": True})
+        self.assertEqual(ReplicaRouter.stats()["primary_reads"], 1)
+
+    def test_pool_checkout_wait_metrics(self):
+        try:
+            import aiosqlite  # noqa: F401
+        except ImportError:
+            self.skipTest("aiosqlite not installed")
+        from sqlalchemy import exc, text
+        from sqlalchemy.ext.asyncio import create_async_engine
+
+        async def scenario():
+            engine = create_async_engine("sqlite+aiosqlite:///:memory:", poolclass=TimedQueuePool,
+                                         pool_logging_name="test_pool", pool_size=1, max_overflow=0,
+                                         pool_timeout=0.2)
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+                try:
+                    async with engine.connect() as other:
+                        await other.execute(text("SELECT 1"))
+                except exc.TimeoutError:
+                    pass
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+            await engine.dispose()
+
+        asyncio.run(scenario())
+        stats = PoolMetrics.snapshot()["test_pool"]
+        self.assertEqual((stats["checkouts"], stats["timeouts"]), (2, 1))
+        self.assertEqual(stats["size"], 1)
+        self.assertLess(stats["wait_max"], 0.2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import io
+import time
+import asyncio
+import unittest
+from unittest.mock import patch
+from utils import document_parser
+from utils.document_parser import (
+    DocumentExtractor, extract_text_from_bytes, extract_text_from_stream,
+    MSG_UNSUPPORTED, MSG_TOO_LARGE, MSG_TIMEOUT, MAX_BYTES,
+)
+
+def slow_extract(data, file_ext, max_pages, max_chars):
+    # Runs in the pool worker: b"hang" never finishes in time, others take a moment
+    time.sleep(30 if data == b"hang" else 0.5)
+    return data.decode(), None, 500.0
+
+def make_docx(paragraphs):
+    from docx import Document
+    doc = Document()
+    for p in paragraphs:
+        doc.add_paragraph(p)
+    buf = io.BytesIO()
+    doc.save(buf)
+    return buf.getvalue()
+
+class TestDocumentParser(unittest.TestCase):
+
+    def test_txt_and_char_limit(self):
+        text, error, _ = extract_text_from_bytes("salom dunyo".encode(), "TXT", max_chars=5)
+        self.assertIsNone(error)
+        self.assertEqual(text, "salom")
+
+    def test_unsupported_format(self):
+        self.assertEqual(extract_text_from_stream(io.BytesIO(b"x"), ".exe"), MSG_UNSUPPORTED)
+
+    def test_docx_paragraphs_joined(self):
+        try:
+            data = make_docx(["Birinchi", "", "Ikkinchi"])
+        except ImportError:
+            self.skipTest("python-docx not installed")
+        text, error, _ = extract_text_from_bytes(data, "docx")
+        self.assertIsNone(error)
+        self.assertEqual(text, "Birinchi\nIkkinchi")
+
+    def test_extract_in_pool_is_cached(self):
+        async def run():
+            data = "konspekt matni".encode()
+            first = await DocumentExtractor.extract(data, "txt")
+            second = await DocumentExtractor.extract(data, "txt")
+            too_big = await DocumentExtractor.extract(b"0" * (MAX_BYTES + 1), "txt")
+            return first, second, too_big
+        try:
+            first, second, too_big = asyncio.run(run())
+        finally:
+            DocumentExtractor.shutdown()
+        self.assertEqual(first, "konspekt matni")
+        self.assertEqual(second, first)
+        self.assertEqual(too_big, MSG_TOO_LARGE)
+        stats = DocumentExtractor.stats()["txt"]
+        self.assertEqual(stats["count"], 1)
+        self.assertGreaterEqual(stats["cache_hits"], 1)
+
+    def test_timeout_does_not_fail_other_extractions(self):
+        async def run():
+            hang = asyncio.create_task(DocumentExtractor.extract(b"hang", "txt", timeout=0.2))
+            other = asyncio.create_task(DocumentExtractor.extract(b"boshqa foydalanuvchi", "txt", timeout=10))
+            hung = await hang
+            # The old pool is retired, not killed: the other extraction is still running in it
+            retired = list(DocumentExtractor._retiring.items())
+            processes = [p for pool, _ in retired for p in pool._processes.values()]
+            self.assertFalse(other.done())
+            self.assertTrue(any(p.is_alive() for p in processes))
+            results = (hung, await other)
+            await asyncio.gather(*(task for _, task in retired))
+            await asyncio.sleep(0.2)
+            return results, retired, processes
+
+        with patch.object(document_parser, "extract_text_from_bytes", slow_extract), \
+                patch.object(document_parser, "POOL_WORKERS", 2):
+            try:
+                (hung, other), retired, processes = asyncio.run(run())
+            finally:
+                DocumentExtractor.shutdown()
+        self.assertEqual(hung, MSG_TIMEOUT)
+        self.assertEqual(other, "boshqa foydalanuvchi")
+        self.assertEqual(len(retired), 1)
+        self.assertEqual(DocumentExtractor._retiring, {})
+        self.assertFalse(any(p.is_alive() for p in processes))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,196 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+from services.employee_directory import DirectoryIndex, DirectoryUnavailable, EmployeeDirectory
+
+
+class _RedisDown:
+    async def get(self, *args, **kwargs):
+        raise ConnectionError("redis down")
+
+    async def set(self, *args, **kwargs):
+        raise ConnectionError("redis down")
+
+    async def exists(self, *args, **kwargs):
+        raise ConnectionError("redis down")
+
+
+class _RecordingRedis:
+    def __init__(self):
+        self.writes = []
+
+    async def get(self, key):
+        return None
+
+    def pipeline(self, transaction=False):
+        writes = self.writes
+
+        class _Pipe:
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *args):
+                return False
+
+            def set(self, key, value):
+                writes.append(key)
+
+            async def execute(self):
+                return []
+
+        return _Pipe()
+
+
+class _Response:
+    def __init__(self, status_code, items=(), total=0):
+        self.status_code = status_code
+        self._body = {"data": {"items": list(items), "pagination": {"totalCount": total}}}
+
+    def json(self):
+        return self._body
+
+
+EMPLOYEES = [
+    {"id": 1, "employee_id_number": "EMP-001", "pinfl": "12345678901234", "full_name": "Karimov Olim",
+     "staffPosition": {"name": "Tyutor"}},
+    {"id": 2, "employee_id_number": "emp-002 ", "jshshir": "99999999999999", "full_name": "G'aniyev Shoxrux"},
+    {"id": 3, "employee_id_number": "EMP-001", "full_name": "Takror"},
+]
+
+
+class TestEmployeeDirectory(unittest.TestCase):
+
+    def setUp(self):
+        EmployeeDirectory._redis = _RedisDown()
+        EmployeeDirectory._index = None
+        EmployeeDirectory._misses = {}
+        EmployeeDirectory._load_lock = None
+        for k in EmployeeDirectory._stats:
+            EmployeeDirectory._stats[k] = 0
+
+    def tearDown(self):
+        EmployeeDirectory._redis = None
+        EmployeeDirectory._index = None
+
+    def test_index_lookup_matches_linear_scan(self):
+        index = DirectoryIndex(EMPLOYEES)
+        self.assertEqual(index.find(" emp-001")["id"], 1)          # first occurrence wins
+        self.assertEqual(index.find("EMP-002")["id"], 2)
+        self.assertEqual(index.find("99999999999999")["id"], 2)    # PINFL from jshshir
+        self.assertIsNone(index.find("12345678901235"))
+        self.assertEqual([e["id"] for e in index.find_by_name("g`aniyev  shohrux")], [2])
+
+    def test_cold_start_then_negative_cache(self):
+        fetches, searches = [], []
+
+        async def fake_fetch_all():
+            fetches.append(1)
+            return [dict(e) for e in EMPLOYEES]
+
+        async def fake_search(identifier):
+            searches.append(identifier)
+            return None
+
+        async def scenario():
+            with patch.object(EmployeeDirectory, "fetch_all", side_effect=fake_fetch_all), \
+                    patch.object(EmployeeDirectory, "admin_search", side_effect=fake_search):
+                found = await asyncio.gather(*[EmployeeDirectory.lookup("EMP-001") for _ in range(5)])
+                missing = [await EmployeeDirectory.lookup("EMP-404") for _ in range(3)]
+                return found, missing
+
+        found, missing = asyncio.run(scenario())
+        self.assertEqual([e["id"] for e in found], [1] * 5)
+        self.assertEqual(len(fetches), 1)          # concurrent cold start: one HEMIS paging
+        self.assertEqual(missing, [None] * 3)
+        self.assertEqual(searches, ["emp-404"])    # later misses answered by the negative cache
+        self.assertEqual(EmployeeDirectory.stats()["negative_hits"], 2)
+
+    def test_failed_search_is_not_cached_as_miss(self):
+        """HEMIS timeout != "no such employee": only a successful empty search is negative-cached."""
+        answers = [DirectoryUnavailable("timeout"), None]
+        searches = []
+
+        async def fake_search(identifier):
+            searches.append(identifier)
+            answer = answers.pop(0)
+            if isinstance(answer, Exception):
+                raise answer
+            return answer
+
+        async def fake_fetch_all():
+            return [dict(e) for e in EMPLOYEES]
+
+        async def scenario():
+            with patch.object(EmployeeDirectory, "fetch_all", side_effect=fake_fetch_all), \
+                    patch.object(EmployeeDirectory, "admin_search", side_effect=fake_search):
+                return [await EmployeeDirectory.lookup("EMP-777") for _ in range(3)]
+
+        self.assertEqual(asyncio.run(scenario()), [None] * 3)
+        self.assertEqual(searches, ["emp-777", "emp-777"])   # timeout -> searched again, then cached
+        stats = EmployeeDirectory.stats()
+        self.assertEqual((stats["admin_search_errors"], stats["negative_hits"]), (1, 1))
+
+    def test_failed_paging_keeps_and_does_not_publish_snapshot(self):
+        from services.hemis_service import HemisService
+
+        page_one = [{"id": i, "employee_id_number": f"N-{i}"} for i in range(EmployeeDirectory.PAGE_LIMIT)]
+        responses = []
+
+        class _Client:
+            async def get(self, url, headers=None, params=None):
+                response = responses.pop(0)
+                if isinstance(response, Exception):
+                    raise response
+                return response
+
+        async def get_client():
+            return _Client()
+
+        async def scenario():
+            with patch.object(HemisService, "get_client", side_effect=get_client):
+                # page 2 fails: nothing installed, nothing published
+                responses[:] = [_Response(200, page_one, total=400), _Response(500)]
+                with self.assertRaises(DirectoryUnavailable):
+                    await EmployeeDirectory.fetch_all()
+                responses[:] = [_Response(200, page_one, total=400), _Response(500)]
+                cold = await EmployeeDirectory.refresh()
+                index_after_cold = EmployeeDirectory._index
+
+                responses[:] = [_Response(200, EMPLOYEES, total=3)]
+                await EmployeeDirectory.refresh()
+                good = EmployeeDirectory._index
+                writes = len(redis.writes)
+
+                # HEMIS unreachable: the good index stays, lookups keep working
+                responses[:] = [ConnectionError("hemis down"), _Response(502)]
+                await EmployeeDirectory.refresh()
+                found = await EmployeeDirectory.lookup("EMP-002", force_refresh=True)
+                return cold, index_after_cold, good, writes, found
+
+        redis = _RecordingRedis()
+        EmployeeDirectory._redis = redis
+        cold, index_after_cold, good, writes, found = asyncio.run(scenario())
+        self.assertEqual((cold, index_after_cold), (0, None))
+        self.assertEqual(writes, 2)                     # only the complete list was published
+        self.assertIs(EmployeeDirectory._index, good)
+        self.assertEqual(found["id"], 2)
+        self.assertEqual(EmployeeDirectory.stats()["refresh_errors"], 3)
+
+    def test_refresh_keeps_index_when_content_is_unchanged(self):
+        async def fake_fetch_all():
+            return [dict(e) for e in EMPLOYEES]
+
+        async def scenario():
+            with patch.object(EmployeeDirectory, "fetch_all", side_effect=fake_fetch_all):
+                await EmployeeDirectory.refresh()
+                first = EmployeeDirectory._index
+                await EmployeeDirectory.refresh()
+                return first, EmployeeDirectory._index
+
+        first, second = asyncio.run(scenario())
+        self.assertIs(first, second)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import asyncio
+import unittest
+from services.gpa_calculator import GPACalculator
+from services.gpa_engine import CohortGPAEngine
+
+def subj(sid, credit, grade, sem, name="Fan"):
+    return {
+        "subject": {"id": sid, "name": name, "credit": credit},
+        "overallScore": {"grade": grade},
+        "semester": {"code": sem}
+    }
+
+class TestCohortGPAEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.cohort = {
+            1: [subj("1", 6, 90, "11"), subj("2", 4, 75, "11"), subj("3", 2, 50, "11"), subj("3", 2, 80, "12")],
+            2: [subj("1", 6, 60, "11"), subj("4", 5, 80, "11"), subj("4", 5, 60, "12")],
+            3: [subj("5", 0, 100, "11"), subj("6", 4, 0, "11")],  # nothing counts
+            4: [subj("1", 6, 4, "11"), subj("2", 4, 5, "12")],    # already 5-point scale
+        }
+
+    def test_cumulative_matches_calculator(self):
+        """Engine must give the same cumulative GPA as the per-student loop for both retake policies."""
+        frame = CohortGPAEngine.build_frame(self.cohort)
+        for policy in ("latest", "best"):
+            res = CohortGPAEngine.cumulative_gpa(frame, retake_policy=policy)
+            for i, sid in enumerate(res.student_ids):
+                expected = GPACalculator.calculate_cumulative(self.cohort[int(sid)], retake_policy=policy)
+                self.assertEqual(float(res.gpa[i]), expected.gpa, f"student {sid} ({policy})")
+                self.assertEqual(float(res.total_credits[i]), expected.total_credits)
+
+    def test_semester_gpa_matches_calculator(self):
+        frame = CohortGPAEngine.build_frame(self.cohort)
+        per_sem = CohortGPAEngine.semester_gpa(frame)
+        expected = GPACalculator.calculate_gpa([s for s in self.cohort[1] if s["semester"]["code"] == "11"])
+        self.assertEqual(per_sem[1]["11"], expected.gpa)
+        self.assertEqual(per_sem[3]["11"], 0.0)
+
+    def test_retake_flags(self):
+        frame = CohortGPAEngine.build_frame(self.cohort)
+        self.assertEqual(int(frame.is_retake.sum()), 4)
+
+    def test_ranking_tie_break(self):
+        """Equal GPA -> more credits first -> lower student id first."""
+        cohort = {
+            10: [subj("1", 4, 90, "11")],
+            11: [subj("1", 6, 90, "11")],
+            12: [subj("1", 6, 90, "11")],
+            13: [subj("1", 6, 60, "11")],
+        }
+        res = CohortGPAEngine.cumulative_gpa(CohortGPAEngine.build_frame(cohort))
+        order = [int(res.student_ids[i]) for i in CohortGPAEngine.rank(res)]
+        self.assertEqual(order, [11, 12, 10, 13])
+
+    def test_empty_cohort(self):
+        frame = CohortGPAEngine.build_frame({7: []})
+        res = CohortGPAEngine.cumulative_gpa(frame)
+        self.assertEqual(float(res.gpa[0]), 0.0)
+        self.assertEqual(CohortGPAEngine.semester_gpa(frame), {7: {}})
+
+    def test_students_without_cache_are_not_ranked(self):
+        """No cached subjects -> pending: not ranked and not counted in cohort_size."""
+        try:
+            import aiosqlite  # noqa: F401
+        except ImportError:
+            self.skipTest("aiosqlite not installed")
+        from sqlalchemy import insert, select
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+        from database.models import Club, Student, StudentCache, StudentGpaRank
+
+        async def scenario():
+            engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+            async with engine.begin() as conn:
+                for model in (Student, Club, StudentCache, StudentGpaRank):
+                    await conn.run_sync(lambda c, t=model.__table__: t.create(c))
+            Session = async_sessionmaker(engine, expire_on_commit=False)
+            async with Session() as db:
+                await db.execute(insert(Student), [
+                    {"id": i, "full_name": f"Talaba {i}", "hemis_login": f"s{i}", "faculty_id": 1,
+                     "level_name": "2-kurs", "is_active": True}
+                    for i in (1, 2, 3, 4)
+                ])
+                await db.execute(insert(StudentCache), [
+                    {"student_id": 1, "key": "subjects_11", "data": self.cohort[1]},
+                    {"student_id": 2, "key": "subjects_all", "data": self.cohort[2]},
+                    {"student_id": 3, "key": "subjects_all", "data": []},
+                ])
+                size = await CohortGPAEngine.rebuild_cohort(db, 1, "2-kurs")
+                await db.commit()
+                ranks = (await db.execute(
+                    select(StudentGpaRank.student_id, StudentGpaRank.rank, StudentGpaRank.cohort_size)
+                    .order_by(StudentGpaRank.rank)
+                )).all()
+            await engine.dispose()
+            return size, ranks
+
+        size, ranks = asyncio.run(scenario())
+        self.assertEqual(size, 2)
+        self.assertEqual([tuple(r) for r in ranks], [(1, 1, 2), (2, 2, 2)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+from services.grade_pipeline import GradeChangePipeline, build_fingerprint, diff_fingerprints
+
+def subject(sid, name, on=0, yn=0, jn=0):
+    return {
+        "subject": {"id": sid, "name": name},
+        "gradesByExam": [
+            {"examType": {"code": "11"}, "grade": jn, "max_ball": 5},
+            {"examType": {"code": "12"}, "grade": on, "max_ball": 5},
+            {"examType": {"code": "13"}, "grade": yn, "max_ball": 5},
+        ]
+    }
+
+class TestGradeFingerprint(unittest.TestCase):
+
+    def test_unchanged_semester_short_circuits(self):
+        subjects = [subject("1", "Math", on=3), subject("2", "Physics", yn=4)]
+        old = build_fingerprint(subjects)
+        new = build_fingerprint([dict(s, extra="ignored") for s in subjects])
+        self.assertEqual(old["h"], new["h"])
+        self.assertEqual(diff_fingerprints(old, new, {}), [])
+
+    def test_changed_components_only(self):
+        old = build_fingerprint([subject("1", "Math", on=3), subject("2", "Physics")])
+        fresh = [subject("1", "Math", on=4, yn=5), subject("2", "Physics"), subject("3", "Chemistry", on=2)]
+        new = build_fingerprint(fresh)
+        events = diff_fingerprints(old, new, {"1": "Math", "3": "Chemistry"})
+        got = sorted((e["subject_id"], e["component"], e["value"]) for e in events)
+        self.assertEqual(got, [("1", "ON", 4), ("1", "YN", 5), ("3", "NEW", 2)])
+
+    def test_jn_change_updates_hash_without_event(self):
+        old = build_fingerprint([subject("1", "Math", jn=3)])
+        new = build_fingerprint([subject("1", "Math", jn=4)])
+        self.assertNotEqual(old["h"], new["h"])
+        self.assertEqual(diff_fingerprints(old, new, {}), [])
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.sets = {}
+
+    async def smembers(self, key):
+        return {str(x) for x in self.sets.get(key, set())}
+
+    async def sadd(self, key, value):
+        self.sets.setdefault(key, set()).add(value)
+
+    async def expire(self, key, ttl):
+        pass
+
+
+class TestGradePipelineRuns(unittest.TestCase):
+
+    async def _no_token(self, student):
+        return None
+
+    def test_token_provider_required(self):
+        with self.assertRaises(TypeError):
+            GradeChangePipeline()
+        with self.assertRaises(ValueError):
+            GradeChangePipeline(None)
+
+    def test_each_run_gets_unique_id_and_resume_reuses_checkpoints(self):
+        fake = _FakeRedis()
+        processed = []
+
+        async def run(run_id=None):
+            pipeline = GradeChangePipeline(self._no_token, run_id=run_id, shard_size=2)
+            pipeline._redis = fake
+
+            async def process(no, ids):
+                processed.append((pipeline.run_id, no))
+                await fake.sadd(f"grade_check:{pipeline.run_id}:done", no)
+
+            with patch.object(pipeline, "_load_shards", AsyncMock(return_value=[[1, 2], [3]])), \
+                    patch.object(pipeline, "_process_shard", side_effect=process):
+                return await pipeline.run()
+
+        first = asyncio.run(run())
+        second = asyncio.run(run())        # same hour / minute: still a fresh run
+        resumed = asyncio.run(run(first.run_id))
+        self.assertNotEqual(first.run_id, second.run_id)
+        self.assertEqual(len(processed), 4)
+        self.assertEqual(resumed.skipped_checkpoint, 3)
+
+    def test_students_without_token_are_skipped(self):
+        calls = []
+
+        async def provider(student):
+            calls.append(student.id)
+            return None if student.id == 1 else "tok"
+
+        pipeline = GradeChangePipeline(provider)
+        with patch("services.grade_pipeline.HemisService.get_student_subject_list",
+                   AsyncMock(return_value=[])) as hemis, \
+                patch("services.grade_pipeline.UniversityService.get_api_url", return_value=None):
+            for sid in (1, 2):
+                asyncio.run(pipeline._check_student(SimpleNamespace(id=sid, hemis_login="395001")))
+        self.assertEqual(calls, [1, 2])
+        self.assertEqual(pipeline.stats.skipped_no_token, 1)
+        hemis.assert_awaited_once_with("tok", base_url=None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import asyncio
+import unittest
+from datetime import date, datetime
+
+from services.kpi_calculator import (
+    calculate_activity_score, calculate_coverage_score, calculate_discipline_score,
+    calculate_parent_contact_score, calculate_risk_detection_score,
+    calculate_university_kpi, get_quarter_dates, quarters_in_range,
+)
+
+
+class TestKPIBatch(unittest.TestCase):
+    """Batch KPI engine must match the per-tutor formulas."""
+
+    def setUp(self):
+        try:
+            import aiosqlite  # noqa: F401
+        except ImportError:
+            self.skipTest("aiosqlite not installed")
+
+    async def _db(self):
+        from sqlalchemy import insert
+        from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+        from database.models import (
+            Staff, Student, TutorGroup, StudentFeedback, UserActivity, ParentContactLog, TyutorKPI
+        )
+
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with engine.begin() as conn:
+            for model in (Staff, Student, TutorGroup, StudentFeedback, UserActivity, ParentContactLog, TyutorKPI):
+                await conn.run_sync(lambda c, t=model.__table__: t.create(c))
+        Session = async_sessionmaker(engine, expire_on_commit=False)
+
+        inside = datetime(2026, 2, 10)
+        outside = datetime(2025, 12, 20)
+        async with Session() as db:
+            await db.execute(insert(Staff), [
+                {"id": 1, "full_name": "Tyutor A", "role": "tyutor", "university_id": 1},
+                {"id": 2, "full_name": "Tyutor B", "role": "tyutor", "university_id": 1},
+                {"id": 3, "full_name": "Tyutor C", "role": "tyutor", "university_id": 1},  # guruhsiz
+                {"id": 4, "full_name": "Boshqa OTM", "role": "tyutor", "university_id": 2},
+            ])
+            await db.execute(insert(TutorGroup), [
+                {"tutor_id": 1, "university_id": 1, "group_number": "101-22"},
+                {"tutor_id": 1, "university_id": 1, "group_number": "102-22"},
+                {"tutor_id": 2, "university_id": 1, "group_number": "201-22"},
+                {"tutor_id": 4, "university_id": 2, "group_number": "901-22"},
+            ])
+            students = []
+            for i in range(1, 13):
+                group = "101-22" if i <= 5 else "102-22" if i <= 8 else "201-22" if i <= 11 else "901-22"
+                students.append({
+                    "id": i, "full_name": f"Talaba {i}", "hemis_login": f"s{i}",
+                    "group_number": group, "status": "active" if i % 3 else "expelled",
+                })
+            await db.execute(insert(Student), students)
+            await db.execute(insert(StudentFeedback), [
+                {"student_id": s, "text": "x", "created_at": inside} for s in (1, 2, 6, 9, 9, 12)
+            ] + [{"student_id": 1, "text": "old", "created_at": outside}])
+            await db.execute(insert(UserActivity), [
+                {"student_id": s, "category": "c", "name": "n", "status": st, "created_at": inside}
+                for s, st in ((1, "approved"), (3, "approved"), (7, "approved"), (9, "pending"), (10, "approved"))
+            ])
+            await db.execute(insert(ParentContactLog), [
+                {"student_id": 1, "tyutor_id": 1, "contact_date": inside, "contact_type": "phone"},
+                {"student_id": 2, "tyutor_id": 1, "contact_date": inside, "contact_type": "visit"},
+                {"student_id": 9, "tyutor_id": 2, "contact_date": outside, "contact_type": "phone"},
+            ])
+            await db.commit()
+        return engine, Session
+
+    def test_batch_matches_per_tutor_formulas(self):
+        async def run():
+            from sqlalchemy import select
+            from database.models import TyutorKPI
+
+            engine, Session = await self._db()
+            async with Session() as db:
+                rows = await calculate_university_kpi(1, 1, 2026, db)
+                self.assertEqual([r["tyutor_id"] for r in rows], [1, 2, 3])
+
+                start, end = get_quarter_dates(1, 2026)
+                for r in rows:
+                    tid = r["tyutor_id"]
+                    self.assertAlmostEqual(r["coverage_score"], await calculate_coverage_score(tid, db))
+                    self.assertAlmostEqual(r["risk_detection_score"], await calculate_risk_detection_score(tid, start, end, db))
+                    self.assertAlmostEqual(r["activity_score"], await calculate_activity_score(tid, start, end, db))
+                    self.assertAlmostEqual(r["parent_contact_score"], await calculate_parent_contact_score(tid, start, end, db))
+                    self.assertAlmostEqual(r["discipline_score"], await calculate_discipline_score(tid, db))
+
+                self.assertEqual(rows[0]["counts"]["students"], 8)
+                self.assertEqual(rows[2]["total_kpi"], 1.0)  # talabasiz: faqat intizom (10 * 0.10)
+
+                # Re-run = upsert, not duplicate rows
+                await calculate_university_kpi(1, 1, 2026, db)
+                stored = (await db.execute(select(TyutorKPI).order_by(TyutorKPI.tyutor_id))).scalars().all()
+                self.assertEqual([k.tyutor_id for k in stored], [1, 2, 3])
+                self.assertEqual(stored[0].total_kpi, round(rows[0]["total_kpi"]))
+            await engine.dispose()
+
+        asyncio.run(run())
+
+    def test_quarters_in_range(self):
+        self.assertEqual(quarters_in_range(date(2025, 11, 5), date(2026, 4, 1)), [(4, 2025), (1, 2026), (2, 2026)])
+        self.assertEqual(quarters_in_range(date(2026, 2, 1), date(2026, 2, 2)), [(1, 2026)])
+
+
+if __name__ == "__main__":
+    unittest.main()
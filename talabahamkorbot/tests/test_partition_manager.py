@@ -0,0 +1,84 @@
+import asyncio
+import gzip
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+from services import partition_manager
+from services.partition_manager import LogTablePolicy, PartitionManager, add_months, get_policies
+
+
+class TestPartitionManager(unittest.TestCase):
+
+    def test_month_math_and_ddl(self):
+        self.assertEqual(add_months(datetime(2026, 11, 1), 3), datetime(2027, 2, 1))
+        self.assertEqual(add_months(datetime(2026, 1, 1), -13), datetime(2024, 12, 1))
+        self.assertEqual(
+            PartitionManager.partition_ddl("activity_logs", datetime(2026, 12, 1)),
+            "CREATE TABLE IF NOT EXISTS activity_logs_p202612 PARTITION OF activity_logs "
+            "FOR VALUES FROM ('2026-12-01') TO ('2027-01-01')",
+        )
+
+    def test_retention_overrides(self):
+        with patch.object(partition_manager, "LOG_RETENTION_MONTHS", "activity_logs=24, private_messages=36"):
+            policies = {p.table: p for p in get_policies()}
+        self.assertEqual(policies["activity_logs"].retention_months, 24)
+        self.assertEqual(policies["private_messages"].retention_months, 36)
+        self.assertTrue(policies["activity_logs"].partitioned)
+        self.assertEqual(policies["student_notifications"].retention_months, 6)
+
+    def test_heap_retention_archives_then_deletes(self):
+        try:
+            import aiosqlite  # noqa: F401
+        except ImportError:
+            self.skipTest("aiosqlite not installed")
+
+        async def scenario(folder):
+            from sqlalchemy import func, insert, select
+            from sqlalchemy.ext.asyncio import create_async_engine
+            from database.models import ActivityLog, PrivateMessage
+
+            engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+            async with engine.begin() as conn:
+                for model in (ActivityLog, PrivateMessage):
+                    await conn.run_sync(lambda c, t=model.__table__: t.create(c))
+                await conn.execute(insert(ActivityLog.__table__), [
+                    {"activity_type": "like", "student_id": i, "meta_data": {"n": i},
+                     "created_at": datetime(2025, 1 + i % 12, 10)}
+                    for i in range(120)
+                ])
+                await conn.execute(insert(PrivateMessage.__table__), [
+                    {"chat_id": 1, "sender_id": 1, "content": "salom", "created_at": datetime(2020, 1, 1)}
+                ])
+            policies = [LogTablePolicy("activity_logs", "created_at", 6),
+                        LogTablePolicy("private_messages", "created_at", None, partitioned=False)]
+            with patch.object(partition_manager, "LOG_ARCHIVE_DIR", folder), \
+                    patch.object(PartitionManager, "BATCH_SIZE", 7):
+                report = await PartitionManager.run(engine, now=datetime(2025, 12, 15), policies=policies)
+            async with engine.connect() as conn:
+                left = (await conn.execute(select(func.min(ActivityLog.created_at), func.count()))).one()
+                messages = (await conn.execute(select(func.count()).select_from(PrivateMessage))).scalar()
+            await engine.dispose()
+            return report, left, messages
+
+        with tempfile.TemporaryDirectory() as folder:
+            report, left, messages = asyncio.run(scenario(folder))
+            files = sorted(os.listdir(os.path.join(folder, "activity_logs")))
+            with gzip.open(os.path.join(folder, "activity_logs", files[0]), "rt") as fh:
+                first = [json.loads(line) for line in fh]
+
+        # Cutoff 2025-06-01: January..May (5 months x 10 rows) archived and deleted
+        self.assertEqual(report["activity_logs"], {"created": 0, "dropped": 0, "archived": 50, "deleted": 50})
+        self.assertEqual(len(files), 5)
+        self.assertTrue(files[0].startswith("activity_logs_202501_"))
+        self.assertEqual(len(first), 10)
+        self.assertEqual(first[0]["meta_data"], {"n": first[0]["student_id"]})
+        self.assertEqual((left[0], left[1]), (datetime(2025, 6, 10), 70))
+        self.assertEqual(messages, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+import asyncio
+import time
+import unittest
+from unittest.mock import patch
+
+from services.prefetch_scheduler import (
+    LANE_INTERACTIVE, LANE_PREFETCH, LANE_SYNC, LocalQueue, PrefetchScheduler, RedisQueue, lane_of,
+)
+
+
+class _FakeRedis:
+    """Sorted set + string keys; eval() mirrors RedisQueue.POP_SCRIPT (checked separately in Lua)."""
+
+    def __init__(self):
+        self.zset, self.kv, self.ttl = {}, {}, {}
+
+    def pipeline(self, transaction=False):
+        redis, ops = self, []
+
+        class _Pipe:
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *args):
+                return False
+
+            def zscore(self, key, member):
+                ops.append(lambda: redis.zset.get(str(member)))
+
+            def zadd(self, key, mapping, lt=False):
+                def run():
+                    for member, score in mapping.items():
+                        old = redis.zset.get(str(member))
+                        if old is None or not lt or score < old:
+                            redis.zset[str(member)] = score
+                ops.append(run)
+
+            def set(self, key, value, ex=None):
+                ops.append(lambda: (redis.kv.__setitem__(key, value), redis.ttl.__setitem__(key, ex)))
+
+            async def execute(self):
+                return [op() for op in ops]
+
+        return _Pipe()
+
+    async def eval(self, script, numkeys, queue_key, count, prefix):
+        assert script is RedisQueue.POP_SCRIPT
+        out = []
+        for member, score in sorted(self.zset.items(), key=lambda kv: kv[1])[:count]:
+            del self.zset[member]
+            out += [member, "%.17g" % score, self.kv.pop(prefix + member, None)]
+        return out
+
+
+class TestPrefetchScheduler(unittest.TestCase):
+    """Queue semantics on the local backend (same contract as RedisQueue)."""
+
+    def setUp(self):
+        PrefetchScheduler._local = LocalQueue()
+        PrefetchScheduler._redis_down_until = time.monotonic() + 3600
+
+    def tearDown(self):
+        PrefetchScheduler._redis_down_until = 0.0
+
+    def test_dedupe_and_promotion(self):
+        async def scenario():
+            assert await PrefetchScheduler.enqueue(1, "t1", lane=LANE_SYNC) == "new"
+            assert await PrefetchScheduler.enqueue(2, "t2", lane=LANE_PREFETCH) == "new"
+            assert await PrefetchScheduler.enqueue(2, "t2b", lane=LANE_SYNC) == "dup"
+            assert await PrefetchScheduler.enqueue(1, "t1b", lane=LANE_INTERACTIVE) == "promoted"
+            return await PrefetchScheduler._local.pop(10)
+
+        jobs = asyncio.run(scenario())
+        self.assertEqual([sid for sid, _, _ in jobs], [1, 2])
+        self.assertEqual([lane_of(score) for _, _, score in jobs], [LANE_INTERACTIVE, LANE_PREFETCH])
+        # Latest token wins even for a duplicate
+        self.assertEqual([job["token"] for _, job, _ in jobs], ["t1b", "t2b"])
+
+    def test_redis_queue_pop_and_job_ttl(self):
+        r = _FakeRedis()
+        q = RedisQueue(r)
+        base = LANE_SYNC * 10 ** 13 + 1729354000123
+
+        async def scenario():
+            results = [await q.push(1, {"token": "t1"}, base),
+                       await q.push(2, {"token": "t2"}, base + 1),
+                       await q.push(1, {"token": "t1b"}, base - 2 * 10 ** 13)]   # promoted, new token
+            del r.kv[RedisQueue.JOB_KEY.format(2)]                              # body expired
+            return results, await q.pop(10), await q.pop(10)
+
+        results, jobs, empty = asyncio.run(scenario())
+        self.assertEqual(results, ["new", "new", "promoted"])
+        self.assertEqual(jobs, [(1, {"token": "t1b"}, float(base - 2 * 10 ** 13)), (2, None, float(base + 1))])
+        self.assertEqual(empty, [])
+        self.assertEqual(set(r.ttl.values()), {RedisQueue.JOB_TTL})   # tokens never stored without expiry
+        self.assertEqual(r.kv, {})
+
+    def test_host_budget(self):
+        q = LocalQueue()
+        async def scenario():
+            return [await q.take_budget("h", 3, 7) for _ in range(3)] + [await q.take_budget("other", 3, 7)]
+        self.assertEqual(asyncio.run(scenario()), [True, True, False, True])
+
+    def test_deferred_jobs_are_requeued_and_metrics(self):
+        results = {1: "fetched", 2: "deferred", 3: "fresh"}
+
+        async def fake_run_job(student_id, job, lane=LANE_PREFETCH):
+            return results[student_id]
+
+        async def scenario():
+            for sid in (1, 2, 3):
+                await PrefetchScheduler.enqueue(sid, f"t{sid}")
+            with patch.object(PrefetchScheduler, "run_job", side_effect=fake_run_job):
+                counts = await PrefetchScheduler.drain_once()
+            left = await PrefetchScheduler._local.pop(10)
+
+            await PrefetchScheduler.note_first_read(1, True)
+            await PrefetchScheduler.note_first_read(1, False)   # only the first read counts
+            await PrefetchScheduler.note_first_read(3, False)
+            return counts, left, await PrefetchScheduler.metrics()
+
+        counts, left, metrics = asyncio.run(scenario())
+        self.assertEqual(counts, {"processed": 3, "fetched": 1, "deferred": 1, "fresh": 1})
+        self.assertEqual([sid for sid, _, _ in left], [2])
+        self.assertEqual((metrics["first_read_hits"], metrics["first_read_misses"]), (1, 1))
+        self.assertEqual(metrics["first_screen_hit_rate"], 0.5)
+        self.assertEqual(metrics["enqueued"], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
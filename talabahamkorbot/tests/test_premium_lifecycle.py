@@ -0,0 +1,92 @@
+import asyncio
+import unittest
+from datetime import datetime, timedelta
+
+from services.premium_service import PremiumService
+
+
+class TestPremiumLifecycle(unittest.TestCase):
+    """Cohort updates, bulk notifications and same-day idempotency over SQLite."""
+
+    def setUp(self):
+        try:
+            import aiosqlite  # noqa: F401
+        except ImportError:
+            self.skipTest("aiosqlite not installed")
+
+    async def _db(self, now):
+        from sqlalchemy import insert
+        from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+        from database.models import Student, TakenUsername, StudentNotification
+
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with engine.begin() as conn:
+            for model in (Student, TakenUsername, StudentNotification):
+                await conn.run_sync(lambda c, t=model.__table__: t.create(c))
+        Session = async_sessionmaker(engine, expire_on_commit=False)
+
+        expiries = {
+            1: now - timedelta(hours=5),     # day 0
+            2: now - timedelta(days=3, hours=2),  # day 3
+            3: now - timedelta(days=8),      # day 7+
+            4: now + timedelta(days=10),     # active
+            5: now - timedelta(days=2),      # day 0 (missed run)
+        }
+        async with Session() as db:
+            await db.execute(insert(Student), [
+                {
+                    "id": i, "full_name": f"Talaba {i}", "hemis_login": f"s{i}",
+                    "is_premium": True, "premium_expiry": exp, "username": f"user{i}",
+                    "custom_badge": "⭐", "ai_limit": 100, "fcm_token": None,
+                }
+                for i, exp in expiries.items()
+            ])
+            await db.execute(insert(TakenUsername), [
+                {"username": f"user{i}", "student_id": i} for i in expiries
+            ])
+            await db.commit()
+        return engine, Session
+
+    def test_cohorts_and_rerun(self):
+        async def run():
+            from sqlalchemy import select, func
+            from database.models import Student, TakenUsername, StudentNotification
+
+            now = datetime(2026, 10, 19, 0, 10)
+            engine, Session = await self._db(now)
+            async with Session() as db:
+                stats = await PremiumService.process_lifecycle(db, now)
+                await db.commit()
+                self.assertEqual((stats["expired"], stats["closed"], stats["removed"]), (2, 1, 1))
+                self.assertEqual(stats["released_usernames"], ["user3"])
+
+                s3 = (await db.execute(
+                    select(Student.is_premium, Student.username, Student.custom_badge, Student.ai_limit)
+                    .where(Student.id == 3)
+                )).one()
+                self.assertEqual(tuple(s3), (False, None, None, 25))
+                usernames = (await db.execute(select(TakenUsername.student_id))).scalars().all()
+                self.assertEqual(sorted(usernames), [1, 2, 4, 5])
+
+                # Same-day re-run: nothing new
+                stats = await PremiumService.process_lifecycle(db, now + timedelta(hours=3))
+                await db.commit()
+                self.assertEqual((stats["expired"], stats["closed"], stats["removed"]), (0, 0, 0))
+                self.assertEqual(await db.scalar(select(func.count(StudentNotification.id))), 4)
+
+                # Three days later student 1 moves to the next stage
+                stats = await PremiumService.process_lifecycle(db, now + timedelta(days=3))
+                await db.commit()
+                self.assertEqual(stats["closed"], 2)  # students 1 and 5
+
+                # Renewal (new expiry) resets the markers for the next cycle
+                await db.execute(Student.__table__.update().where(Student.id == 4).values(premium_expiry=now))
+                stats = await PremiumService.process_lifecycle(db, now + timedelta(hours=1))
+                self.assertEqual(stats["expired"], 1)
+            await engine.dispose()
+
+        asyncio.run(run())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,165 @@
+import asyncio
+import time
+import unittest
+from unittest.mock import patch
+
+import httpx
+
+from services.hemis_service import HemisService
+from services.qr_attendance import QRAttendanceQueue
+
+
+class _RedisDown:
+    """Every call fails like an unreachable Redis -> local state fallback."""
+
+    async def set(self, *args, **kwargs):
+        raise ConnectionError("redis down")
+
+    async def get(self, *args, **kwargs):
+        raise ConnectionError("redis down")
+
+
+class TestQRAttendanceQueue(unittest.TestCase):
+
+    def setUp(self):
+        QRAttendanceQueue._redis = _RedisDown()
+        QRAttendanceQueue._local = {}
+        QRAttendanceQueue._events = {}
+        QRAttendanceQueue._queue = None
+        QRAttendanceQueue._workers = []
+        QRAttendanceQueue._latencies.clear()
+        for k in QRAttendanceQueue._stats:
+            QRAttendanceQueue._stats[k] = 0
+
+    def tearDown(self):
+        QRAttendanceQueue._redis = None
+
+    def run_with(self, handler, scenario):
+        async def main():
+            client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+            async def get_client():
+                return client
+
+            try:
+                with patch.object(HemisService, "get_priority_client", side_effect=get_client):
+                    return await scenario()
+            finally:
+                for w in QRAttendanceQueue._workers:
+                    w.cancel()
+                await client.aclose()
+        return asyncio.run(main())
+
+    def test_duplicate_submission_is_sent_once(self):
+        calls = []
+
+        async def handler(request):
+            calls.append(request)
+            await asyncio.sleep(0.05)
+            return httpx.Response(200, json={"success": True, "message": "OK"})
+
+        async def scenario():
+            first = await QRAttendanceQueue.submit(1, "t", "qr-1", "c")
+            second = await QRAttendanceQueue.submit(1, "t", "qr-1", "c")
+            other = await QRAttendanceQueue.submit(2, "t", "qr-1", "c")
+            final = await QRAttendanceQueue.wait(first["id"], 2)
+            await QRAttendanceQueue.wait(other["id"], 2)
+            again = await QRAttendanceQueue.submit(1, "t", "qr-1", "c")
+            return first, second, other, final, again
+
+        first, second, other, final, again = self.run_with(handler, scenario)
+        self.assertEqual(first["id"], second["id"])
+        self.assertNotEqual(first["id"], other["id"])
+        self.assertEqual(len(calls), 2)
+        self.assertEqual((final["status"], final["message"]), ("success", "OK"))
+        self.assertEqual(again["status"], "success")
+        self.assertEqual(QRAttendanceQueue.stats()["duplicates"], 2)
+
+    def test_transient_errors_retry_and_client_errors_do_not(self):
+        attempts = {"a": 0, "b": 0}
+
+        async def handler(request):
+            key = "a" if b"qr-a" in request.content else "b"
+            attempts[key] += 1
+            if key == "a" and attempts[key] < 3:
+                return httpx.Response(503)
+            if key == "b":
+                return httpx.Response(400, json={"message": "QR noto'g'ri"})
+            return httpx.Response(200, json={"success": True})
+
+        async def scenario():
+            with patch.object(QRAttendanceQueue, "BACKOFF", 0.01):
+                a = await QRAttendanceQueue.submit(1, "t", "qr-a", "c")
+                b = await QRAttendanceQueue.submit(1, "t", "qr-b", "c")
+                return await QRAttendanceQueue.wait(a["id"], 2), await QRAttendanceQueue.wait(b["id"], 2)
+
+        a, b = self.run_with(handler, scenario)
+        self.assertEqual((a["status"], a["attempts"]), ("success", 3))
+        self.assertEqual((b["status"], b["attempts"], b["message"]), ("failed", 1, "QR noto'g'ri"))
+
+    def test_rescan_after_failure_is_sent_again(self):
+        responses = [httpx.Response(400, json={"message": "Qayta skanerlang"}),
+                     httpx.Response(200, json={"success": True, "message": "OK"})]
+
+        async def handler(request):
+            return responses.pop(0)
+
+        async def scenario():
+            first = await QRAttendanceQueue.submit(1, "t", "qr-1", "c")
+            failed = await QRAttendanceQueue.wait(first["id"], 2)
+            rescan = await QRAttendanceQueue.submit(1, "t", "qr-1", "c")
+            return failed, rescan, await QRAttendanceQueue.wait(rescan["id"], 2)
+
+        failed, rescan, final = self.run_with(handler, scenario)
+        self.assertEqual(failed["status"], "failed")
+        self.assertEqual(rescan["status"], "pending")
+        self.assertEqual(final["status"], "success")
+        self.assertEqual(responses, [])
+        self.assertEqual(QRAttendanceQueue.stats()["duplicates"], 0)
+
+    def test_stale_pending_is_claimed_again(self):
+        """A pending state older than the QR code (worker died) must not block rescans for STATE_TTL."""
+        calls = []
+
+        async def handler(request):
+            calls.append(request)
+            return httpx.Response(200, json={"success": True, "message": "OK"})
+
+        async def scenario():
+            sub_id = QRAttendanceQueue.submission_id(1, "qr-1")
+            for accepted_ago, qr in ((QRAttendanceQueue.QR_VALIDITY + 5, "qr-1"), (5, "qr-2")):
+                sid = QRAttendanceQueue.submission_id(1, qr)
+                QRAttendanceQueue._local[sid] = (time.monotonic() + QRAttendanceQueue.STATE_TTL, {
+                    "id": sid, "student_id": 1, "status": "pending", "message": "",
+                    "accepted_at": time.time() - accepted_ago,
+                })
+            stale = await QRAttendanceQueue.submit(1, "t", "qr-1", "c")
+            live = await QRAttendanceQueue.submit(1, "t", "qr-2", "c")
+            return stale, live, await QRAttendanceQueue.wait(sub_id, 2)
+
+        stale, live, final = self.run_with(handler, scenario)
+        self.assertGreater(stale["accepted_at"], time.time() - 5)   # new submission
+        self.assertEqual(final["status"], "success")
+        self.assertLess(live["accepted_at"], time.time() - 4)       # still in flight: duplicate
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(QRAttendanceQueue.stats()["duplicates"], 1)
+
+    def test_gives_up_before_deadline(self):
+        async def handler(request):
+            raise httpx.ConnectError("down", request=request)
+
+        async def scenario():
+            with patch.object(QRAttendanceQueue, "BACKOFF", 0.05):
+                started = time.monotonic()
+                result = await QRAttendanceQueue.send_with_deadline("t", "qr", "c", None, started + 1.0)
+                return result, time.monotonic() - started
+
+        (status, message, attempts, http_status), elapsed = self.run_with(handler, scenario)
+        self.assertEqual(status, "expired")
+        self.assertGreater(attempts, 1)
+        self.assertIsNone(http_status)
+        self.assertLess(elapsed, 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
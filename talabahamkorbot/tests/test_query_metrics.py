@@ -0,0 +1,110 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+from database.query_metrics import QueryMetrics, fingerprint, sql_metrics_middleware
+
+
+class TestQueryMetrics(unittest.TestCase):
+
+    def setUp(self):
+        QueryMetrics.reset()
+
+    def test_fingerprint_normalises_values(self):
+        a = fingerprint("SELECT * FROM students WHERE id = $1 AND name = 'Ali'  LIMIT 20")
+        b = fingerprint("SELECT * FROM students WHERE id = $7 AND name = 'O''g''li'\n LIMIT 5")
+        self.assertEqual(a, b)
+        self.assertEqual(a, "SELECT * FROM students WHERE id = ? AND name = ? LIMIT ?")
+        self.assertEqual(fingerprint("SELECT x FROM t WHERE id IN ($1, $2, $3)"),
+                         fingerprint("SELECT x FROM t WHERE id IN (?)"))
+        self.assertEqual(fingerprint("INSERT INTO t (a, b) VALUES (?, ?), (?, ?), (?, ?)"),
+                         "INSERT INTO t (a, b) VALUES (?), ...")
+        self.assertIn("CAST(? AS regclass)::text", fingerprint("SELECT CAST(:t AS regclass)::text"))
+        self.assertIn("students_1", fingerprint("SELECT students_1.id FROM students AS students_1"))
+
+    def test_queries_attributed_to_request_and_n_plus_one(self):
+        try:
+            import aiosqlite  # noqa: F401
+        except ImportError:
+            self.skipTest("aiosqlite not installed")
+        from sqlalchemy import text
+        from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+        async def scenario():
+            engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+            QueryMetrics.install(engine)
+            QueryMetrics.install(engine)  # idempotent
+            Session = async_sessionmaker(engine, class_=AsyncSession)
+            async with Session() as s:
+                await s.execute(text("SELECT 1"))  # outside a request
+            token = QueryMetrics.start()
+            async with Session() as s:
+                for i in range(12):
+                    await s.execute(text("SELECT :i + 1"), {"i": i})
+
+                async def in_task():
+                    await s.execute(text("SELECT 'task'"))
+                await asyncio.create_task(in_task())
+            stats = QueryMetrics.finish(token, "GET", "/api/v1/chat/list", 200, 0.05)
+            await engine.dispose()
+            return stats
+
+        with patch.object(QueryMetrics, "SLOW_QUERY_MS", 1e9):
+            stats = asyncio.run(scenario())
+        self.assertEqual(stats.queries, 13)
+        self.assertEqual(stats.repeated(10), [("SELECT ? + ?", 12)])
+        report = QueryMetrics.stats()
+        self.assertEqual(report["totals"]["unattributed_queries"], 1)
+        self.assertEqual(report["routes"]["GET /api/v1/chat/list"]["queries_avg"], 13)
+        self.assertEqual([(f["route"], f["max_repeats"]) for f in report["n_plus_one"]],
+                         [("/api/v1/chat/list", 12)])
+        self.assertEqual(report["slow_queries"], {})
+
+    def test_slow_query_log(self):
+        class _Ctx:
+            pass
+
+        ctx = _Ctx()
+        with patch.object(QueryMetrics, "SLOW_QUERY_MS", 0), \
+                self.assertLogs("sql.slow", level="WARNING") as logs:
+            for student_id in (1, 2):
+                QueryMetrics._before(None, None, "", None, ctx, False)
+                QueryMetrics._after(None, None, f"SELECT * FROM ratings WHERE student_id = {student_id}", None, ctx, False)
+        (entry,) = QueryMetrics.stats()["slow_queries"].values()
+        self.assertEqual((entry["count"], entry["sql"]), (2, "SELECT * FROM ratings WHERE student_id = ?"))
+        self.assertEqual(len(logs.output), 2)
+
+    def test_middleware_headers_and_prometheus(self):
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+
+        app = FastAPI()
+        app.middleware("http")(sql_metrics_middleware)
+
+        @app.get("/items/{item_id}")
+        async def item(item_id: int):
+            ctx = type("Ctx", (), {})()
+            for _ in range(3):
+                QueryMetrics._before(None, None, "", None, ctx, False)
+                QueryMetrics._after(None, None, "SELECT 1", None, ctx, False)
+            return {"id": item_id}
+
+        client = TestClient(app)
+        for i in range(2):
+            response = client.get(f"/items/{i}")
+        self.assertEqual(response.headers["X-DB-Queries"], "3")
+        self.assertIn("db;dur=", response.headers["Server-Timing"])
+        client.get("/missing")
+
+        text = QueryMetrics.render_prometheus({"db_pool": {"primary": {"checkouts": 4, "buckets": {0.1: 4}}},
+                                               "activity_queue": {"buffered": 7, "enabled": True}})
+        self.assertIn('http_request_db_queries_bucket{method="GET",route="/items/{item_id}",le="5"} 2', text)
+        self.assertIn('http_request_duration_seconds_count{method="GET",route="unmatched"} 1', text)
+        self.assertIn("db_queries_total 6", text)
+        self.assertIn('db_pool_checkouts{name="primary"} 4', text)
+        self.assertIn("activity_queue_buffered 7", text)
+        self.assertNotIn("enabled", text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import asyncio
+import time
+import unittest
+from unittest.mock import patch
+
+from services.reference_index import GroupIndex, ReferenceIndex, SpecialtyIndex
+
+
+class _RedisDown:
+    async def get(self, *args, **kwargs):
+        raise ConnectionError("redis down")
+
+    async def set(self, *args, **kwargs):
+        raise ConnectionError("redis down")
+
+
+GROUPS = [
+    {"id": 10, "name": "25-23 Axborot tizimlari", "department": {"id": 4}, "educationForm": {"code": "11"}},
+    {"id": 11, "name": "25-23 Axborot tizimlari (sirtqi)", "department": {"id": 35}, "educationForm": {"code": "13"}},
+    {"id": 12, "name": "31-22 Iqtisodiyot", "department": {"id": 5}},
+    {"id": 13, "name": "31-22 Iqtisodiyot", "department": {"id": 5}},
+]
+
+SPECIALTIES = [
+    {"id": 1, "name": "Iqtisodiyot", "code": "60410100", "department": {"id": 5}},
+    {"id": 2, "name": "Iqtisodiyot", "code": "60410100", "department": {"id": 35}},
+    {"id": 3, "name": "Iqtisodiyot (tarmoqlar)", "code": "70410101", "department": {"id": 16}},
+    {"id": 4, "name": "Filologiya", "code": "60230100", "department": {"id": 6}},
+]
+
+
+class TestReferenceIndex(unittest.TestCase):
+
+    def test_group_resolution(self):
+        index = GroupIndex(GROUPS)
+        self.assertEqual(index.resolve("25-23 AXBOROT TIZIMLARI"), 10)
+        # Form named in the request decides between same-prefix groups
+        self.assertEqual(index.resolve("25-23 Axborot tizimlari (Sirtqi)"), 11)
+        self.assertEqual(index.resolve("25-23 Axborot tizimlari", faculty_id=35), 11)
+        # Identical names: deterministic (newest id)
+        self.assertEqual(index.resolve("31-22 iqtisodiyot"), 13)
+        # Prefix + rest of the name
+        self.assertEqual(index.resolve("25-23 axborot kunduzgi"), 10)
+        self.assertIsNone(index.resolve("99-99 Yo'q"))
+
+    def test_specialty_candidates(self):
+        index = SpecialtyIndex(SPECIALTIES)
+        self.assertEqual([c["id"] for c in index.candidates("Iqtisodiyot", "Bakalavr")], [2, 1])
+        self.assertEqual([c["id"] for c in index.candidates("Iqtisodiyot", "Bakalavr", faculty_id=5)], [1])
+        self.assertEqual([c["id"] for c in index.candidates("Iqtisodiyot", "Bakalavr", education_form="Sirtqi")], [2])
+        self.assertEqual([c["id"] for c in index.candidates("Iqtisodiyot", "Magistr")], [3])
+        self.assertEqual(index.candidates("Tarix"), [])
+
+    def test_ttl_and_single_fetch(self):
+        fetches = []
+
+        async def fake_fetch(kind, token):
+            fetches.append(kind)
+            return GROUPS
+
+        async def scenario():
+            ReferenceIndex._redis = _RedisDown()
+            ReferenceIndex._indexes = {}
+            ReferenceIndex._locks = {}
+            ReferenceIndex._refreshing = {}
+            with patch.object(ReferenceIndex, "_fetch", side_effect=fake_fetch), \
+                    patch("config.HEMIS_ADMIN_TOKEN", "admin"):
+                ids = await asyncio.gather(*[ReferenceIndex.resolve_group("31-22 Iqtisodiyot") for _ in range(10)])
+                # Expired: stale index still answers, one background refresh
+                ReferenceIndex._indexes["groups"].built_at = time.time() - ReferenceIndex.TTL - 1
+                stale = await ReferenceIndex.resolve_group("25-23 Axborot tizimlari")
+                await ReferenceIndex._refreshing["groups"]
+            ReferenceIndex._redis = None
+            return ids, stale
+
+        ids, stale = asyncio.run(scenario())
+        self.assertEqual(ids, [13] * 10)
+        self.assertEqual(stale, 10)
+        self.assertEqual(fetches, ["groups", "groups"])
+
+
+if __name__ == "__main__":
+    unittest.main()
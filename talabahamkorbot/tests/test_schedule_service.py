@@ -0,0 +1,75 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+from services import student_cache_codec as codec
+from services.schedule_service import ScheduleService
+
+DAY = 86400
+MONDAY = 1699988400   # 2023-11-15 00:00 Toshkent (chorshanba)
+
+
+def lesson(i, subject, t_code, day, start="08:30", topic=None):
+    return {
+        "id": i, "subject": {"id": subject, "name": f"Fan {subject}"},
+        "trainingType": {"code": t_code, "name": "Ma'ruza" if t_code == "11" else "Amaliy"},
+        "employee": {"name": "Domla"}, "group": {"id": 77},
+        "lessonPair": {"start_time": start, "end_time": "09:50"},
+        "auditorium": {"name": "204", "building": {"name": "A"}},
+        "lesson_date": MONDAY + day * DAY, "lesson_topic": topic,
+    }
+
+
+class TestScheduleService(unittest.TestCase):
+    RAW = [
+        lesson(1, 5, "11", 0),
+        lesson(2, 5, "11", 7),
+        lesson(3, 5, "12", 1, topic="Kirish"),
+        lesson(4, 6, "11", 8, start="10:00"),
+        lesson(5, 5, "11", 14),
+    ]
+
+    def test_week_index_and_topic_sequence(self):
+        records, _ = codec.normalize("schedule_11", self.RAW)
+        self.assertEqual(records["weeks"], {"2023-W46": [0, 2], "2023-W47": [1, 3], "2023-W48": [4]})
+        self.assertEqual([s["seq"] for s in records["slots"]], [0, 1, 0, 0, 2])
+
+    def test_enrich_fetches_each_pair_once(self):
+        records, _ = codec.normalize("schedule_11", self.RAW)
+        calls = []
+
+        async def fake_topic_names(token, group, subject, semester, t_code, base_url=None):
+            calls.append((group, subject, t_code))
+            return [f"{subject}/{t_code} mavzu {n}" for n in range(3)]
+
+        lessons = [dict(r) for r in self.RAW]
+        with patch.object(ScheduleService, "topic_names", side_effect=fake_topic_names):
+            filled = asyncio.run(ScheduleService.enrich_topics("t", lessons, records["slots"], "11"))
+
+        self.assertEqual(filled, 4)
+        self.assertEqual(sorted(calls), [(77, 5, "11"), (77, 6, "11")])
+        self.assertEqual([l["lesson_topic"] for l in lessons], [
+            "5/11 mavzu 0", "5/11 mavzu 1", "Kirish", "6/11 mavzu 0", "5/11 mavzu 2",
+        ])
+
+    def test_exports(self):
+        slots, _ = codec.normalize("schedule_11", self.RAW)
+        slots = slots["slots"]
+        ics = ScheduleService.export_ics(slots, "11")
+        self.assertEqual(ics.count("BEGIN:VEVENT"), 5)
+        # 08:30 Toshkent = 03:30 UTC
+        self.assertIn("DTSTART:20231115T033000Z", ics)
+        self.assertIn("LOCATION:204 (A)", ics)
+        self.assertTrue(all(len(line.encode()) <= 75 for line in ics.split("\r\n")))
+
+        data = ScheduleService.export_json(slots, "11")
+        self.assertEqual(data["subjects"], ["Fan 5", "Fan 6"])
+        self.assertEqual(sum(len(w) for w in data["weeks"].values()), 5)
+
+    def test_target_week(self):
+        self.assertEqual(ScheduleService.target_week("2023-11-19"), "2023-W46")
+        self.assertEqual(ScheduleService.target_week("2023-11-20"), "2023-W47")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import asyncio
+import json
+import unittest
+from datetime import datetime
+from decimal import Decimal
+from typing import Optional
+
+from pydantic import BaseModel
+
+from services.post_feed_service import PostFeedService
+from utils.serialization import FastJSONResponse, dumps, schema_columns
+
+
+class _Item(BaseModel):
+    id: int
+    full_name: str
+    role: str = "student"
+    created_at: Optional[datetime] = None
+
+
+class TestSerialization(unittest.TestCase):
+    """orjson response path, schema projections and lean post rows."""
+
+    def test_dumps_matches_stdlib_semantics(self):
+        payload = {
+            "id": 1, "name": "G'ofurov", "when": datetime(2026, 1, 2, 3, 4, 5, 678000),
+            "price": Decimal("12.5"), "tags": {"a"}, "item": _Item(id=2, full_name="X"), 3: "int key",
+        }
+        data = json.loads(dumps(payload))
+        self.assertEqual(data["when"], "2026-01-02T03:04:05.678000")
+        self.assertEqual(data["price"], 12.5)
+        self.assertEqual(data["tags"], ["a"])
+        self.assertEqual(data["item"], {"id": 2, "full_name": "X", "role": "student", "created_at": None})
+        self.assertEqual(data["3"], "int key")
+        self.assertEqual(json.loads(FastJSONResponse(content=[payload["item"]]).body)[0]["id"], 2)
+
+    def test_schema_columns(self):
+        from database.models import Student
+        columns, defaults = schema_columns(Student, _Item)
+        self.assertEqual([c.key for c in columns], ["id", "full_name", "created_at"])
+        self.assertEqual(defaults, {"role": "student"})
+
+    def test_post_rows(self):
+        try:
+            import aiosqlite  # noqa: F401
+        except ImportError:
+            self.skipTest("aiosqlite not installed")
+
+        async def run():
+            from sqlalchemy import insert
+            from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+            from database.models import ChoyxonaPost, Staff, Student
+
+            engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+            async with engine.begin() as conn:
+                for model in (Student, Staff, ChoyxonaPost):
+                    await conn.run_sync(lambda c, t=model.__table__: t.create(c))
+            Session = async_sessionmaker(engine, expire_on_commit=False)
+            async with Session() as db:
+                await db.execute(insert(Student), [{"id": 1, "full_name": "ALIYEV VALI SOBIROVICH", "hemis_login": "s1",
+                                                    "username": "vali", "is_premium": True}])
+                await db.execute(insert(Staff), [{"id": 5, "full_name": "Karimov Anvar", "role": "rahbariyat"}])
+                await db.execute(insert(ChoyxonaPost), [
+                    {"id": 1, "student_id": 1, "content": "a", "category_type": "university", "likes_count": 3},
+                    {"id": 2, "staff_id": 5, "content": "b", "category_type": "faculty"},
+                    {"id": 3, "student_id": 99, "content": "c", "category_type": "university"},
+                ])
+                await db.commit()
+                rows = (await db.execute(PostFeedService.projection().order_by(ChoyxonaPost.id))).all()
+
+            posts = [PostFeedService.map_row(r, 1, False, r.id == 1, False) for r in rows]
+            self.assertEqual(
+                (posts[0]["author_name"], posts[0]["author_role"], posts[0]["author_is_premium"], posts[0]["is_mine"]),
+                ("Vali Aliyev", "student", True, True),
+            )
+            self.assertEqual((posts[1]["author_id"], posts[1]["author_role"], posts[1]["is_mine"]), (5, "rahbariyat", False))
+            self.assertEqual((posts[2]["author_id"], posts[2]["author_name"]), (0, "Unknown"))
+            self.assertIsInstance(json.loads(dumps(posts))[0]["created_at"], str)
+            await engine.dispose()
+
+        asyncio.run(run())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import asyncio
+import unittest
+
+from services.social_graph_service import SocialGraphService
+
+
+class TestSocialGraph(unittest.TestCase):
+    """Counters, keyset pages and relations over SQLite."""
+
+    def setUp(self):
+        try:
+            import aiosqlite  # noqa: F401
+        except ImportError:
+            self.skipTest("aiosqlite not installed")
+
+    async def _db(self):
+        from sqlalchemy import insert
+        from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+        from database.models import Student, StudentSubscription
+
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with engine.begin() as conn:
+            await conn.run_sync(lambda c: Student.__table__.create(c))
+            await conn.run_sync(lambda c: StudentSubscription.__table__.create(c))
+        Session = async_sessionmaker(engine, expire_on_commit=False)
+        async with Session() as db:
+            await db.execute(insert(Student), [
+                {"id": i, "full_name": f"Familiya{i} Ism{i}", "hemis_login": f"s{i}"} for i in range(1, 8)
+            ])
+            await db.commit()
+        return engine, Session
+
+    def test_counters_pages_and_relations(self):
+        async def run():
+            engine, Session = await self._db()
+            async with Session() as db:
+                for follower in (2, 3, 4, 5, 6):
+                    created, count = await SocialGraphService.follow(db, follower, 1)
+                    self.assertTrue(created)
+                await db.commit()
+                self.assertEqual(count, 5)
+
+                created, count = await SocialGraphService.follow(db, 2, 1)  # duplicate
+                self.assertEqual((created, count), (False, 5))
+                await SocialGraphService.follow(db, 1, 2)
+                removed, count = await SocialGraphService.unfollow(db, 6, 1)
+                self.assertEqual((removed, count), (True, 4))
+                await db.commit()
+
+                self.assertEqual(await SocialGraphService.get_counts(db, 1), (4, 1))
+                self.assertEqual(await SocialGraphService.get_counts(db, 2), (1, 1))
+
+                page, cursor = await SocialGraphService.list_page(db, 1, "followers", None, 3)
+                self.assertEqual([r.id for r in page], [5, 4, 3])
+                page, cursor = await SocialGraphService.list_page(db, 1, "followers", cursor, 3)
+                self.assertEqual([r.id for r in page], [2])
+                self.assertIsNone(cursor)
+
+                rel = await SocialGraphService.relations(db, 1, [2, 3, 7, 1])
+                self.assertEqual(rel[2], {"following": True, "followed_by": True, "mutual": True})
+                self.assertEqual(rel[3], {"following": False, "followed_by": True, "mutual": False})
+                self.assertFalse(rel[7]["followed_by"])
+                self.assertNotIn(1, rel)
+            await engine.dispose()
+        asyncio.run(run())
+
+    def test_reconcile_repairs_drift(self):
+        async def run():
+            from sqlalchemy import insert, update
+            from database.models import Student, StudentSubscription
+            engine, Session = await self._db()
+            async with Session() as db:
+                await db.execute(insert(StudentSubscription), [
+                    {"follower_id": 2, "target_id": 1}, {"follower_id": 3, "target_id": 1},
+                ])
+                await db.execute(update(Student).where(Student.id == 4).values(followers_count=9))
+                await db.commit()
+                stats = await SocialGraphService.reconcile_counters(db)
+                self.assertEqual(stats, {"followers_fixed": 2, "following_fixed": 2})
+                self.assertEqual(await SocialGraphService.get_counts(db, 1), (2, 0))
+                self.assertEqual(await SocialGraphService.get_counts(db, 4), (0, 0))
+                self.assertEqual(await SocialGraphService.reconcile_counters(db),
+                                 {"followers_fixed": 0, "following_fixed": 0})
+            await engine.dispose()
+        asyncio.run(run())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+import asyncio
+import unittest
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from services import student360_service
+from services.student360_service import Student360Service
+
+
+class _RedisDown:
+    async def get(self, *args, **kwargs):
+        raise ConnectionError("redis down")
+
+    async def set(self, *args, **kwargs):
+        raise ConnectionError("redis down")
+
+    async def delete(self, *args, **kwargs):
+        raise ConnectionError("redis down")
+
+
+class TestStudent360(unittest.TestCase):
+    """Concurrent sections, cached academic data, partial results, commit invalidation."""
+
+    def setUp(self):
+        try:
+            import aiosqlite  # noqa: F401
+        except ImportError:
+            self.skipTest("aiosqlite not installed")
+        Student360Service._redis = _RedisDown()
+        Student360Service._local = {}
+        self.student = SimpleNamespace(id=1, hemis_login="s1")
+
+    def tearDown(self):
+        Student360Service._redis = None
+
+    async def _db(self):
+        from sqlalchemy import insert
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+        from database.models import (
+            StudentCache, StudentDocument, StudentFeedback, User, UserActivity, UserActivityImage,
+        )
+        from services import student_cache_codec
+
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with engine.begin() as conn:
+            for model in (User, StudentFeedback, UserActivity, UserActivityImage, StudentDocument, StudentCache):
+                await conn.run_sync(lambda c, t=model.__table__: t.create(c))
+        Session = async_sessionmaker(engine, expire_on_commit=False)
+
+        now = datetime.utcnow()
+        async with Session() as db:
+            db.add(User(hemis_login="s1", hemis_token="tok", full_name="Talaba", role="student"))
+            await db.execute(insert(StudentFeedback), [
+                {"id": 1, "student_id": 1, "text": "Murojaat", "status": "pending", "created_at": now},
+                {"id": 2, "student_id": 1, "text": "Javob", "parent_id": 1, "created_at": now},
+                {"id": 3, "student_id": 2, "text": "Boshqa", "created_at": now},
+            ])
+            await db.execute(insert(UserActivity), [
+                {"id": 1, "student_id": 1, "category": "sport", "name": "Futbol", "status": "approved", "created_at": now},
+            ])
+            await db.execute(insert(UserActivityImage), [{"activity_id": 1, "file_id": "img", "file_type": "photo"}])
+            await db.execute(insert(StudentDocument), [
+                {"id": 1, "student_id": 1, "telegram_file_id": "f1", "file_name": "passport.pdf", "file_type": "document"},
+                {"id": 2, "student_id": 1, "telegram_file_id": "f2", "file_name": "ielts.pdf", "file_type": "certificate"},
+            ])
+            cache = StudentCache(student_id=1, key="attendance_11", updated_at=now - timedelta(days=1))
+            student_cache_codec.apply(cache, "attendance_11", [
+                {"subject": {"name": "Fizika"}, "absent_on": 2, "absent_off": 0, "explicable": False},
+                {"subject": {"name": "Kimyo"}, "absent_on": 0, "absent_off": 2, "explicable": True},
+            ])
+            db.add(cache)
+            await db.commit()
+        return engine, Session
+
+    def run_view(self, scenario):
+        async def main():
+            engine, Session = await self._db()
+            enqueued = []
+
+            async def fake_enqueue(student_id, token, base_url=None, lane=None, semester=None):
+                enqueued.append((student_id, token))
+                return "new"
+
+            try:
+                with patch.object(student360_service, "AsyncSessionLocal", Session), \
+                        patch("services.prefetch_scheduler.PrefetchScheduler.enqueue", side_effect=fake_enqueue):
+                    return await scenario(Session), enqueued
+            finally:
+                await engine.dispose()
+        return asyncio.run(main())
+
+    def test_sections_and_stale_academic_refresh(self):
+        async def scenario(Session):
+            return await Student360Service.get_view(self.student)
+
+        view, enqueued = self.run_view(scenario)
+        sections = view["sections"]
+        self.assertEqual({s["status"] for s in sections.values()}, {"ok"})
+        self.assertEqual([a["id"] for a in sections["appeals"]["data"]], [1])
+        self.assertEqual(sections["activities"]["data"][0]["images"], [{"file_id": "img", "file_type": "photo"}])
+        self.assertEqual([d["title"] for d in sections["documents"]["data"]], ["passport.pdf"])
+        self.assertEqual([d["title"] for d in sections["certificates"]["data"]], ["ielts.pdf"])
+        self.assertEqual(sections["account"]["data"], {"is_app_user": True})
+        att = sections["academic"]["data"]["attendance"]
+        self.assertEqual((att["semester"], att["total"], att["excused"], att["unexcused"]), ("11", 4, 2, 2))
+        # Day-old HEMIS cache: served as is, refresh queued in the background
+        self.assertEqual(enqueued, [(1, "tok")])
+        self.assertFalse(view["cached"])
+
+    def test_slow_section_gives_partial_view_that_is_not_cached(self):
+        async def slow(student_id):
+            await asyncio.sleep(1)
+
+        async def scenario(Session):
+            with patch.object(Student360Service, "SECTION_TIMEOUT", 0.2), \
+                    patch.object(Student360Service, "_appeals", side_effect=slow):
+                view = await Student360Service.get_view(self.student)
+            return view, await Student360Service.get_view(self.student)
+
+        (partial, again), _ = self.run_view(scenario)
+        self.assertEqual(partial["sections"]["appeals"]["status"], "timeout")
+        self.assertIsNone(partial["sections"]["appeals"]["data"])
+        self.assertEqual(partial["sections"]["activities"]["status"], "ok")
+        self.assertFalse(again["cached"])
+
+    def test_commit_invalidates_cached_view(self):
+        async def scenario(Session):
+            from database.models import StudentFeedback
+            await Student360Service.get_view(self.student)
+            cached = await Student360Service.get_view(self.student)
+
+            async with Session() as db:
+                db.add(StudentFeedback(student_id=1, text="Yangi murojaat"))
+                await db.commit()
+            fresh = await Student360Service.get_view(self.student)
+            return cached, fresh
+
+        (cached, fresh), _ = self.run_view(scenario)
+        self.assertTrue(cached["cached"])
+        self.assertFalse(fresh["cached"])
+        self.assertEqual(len(fresh["sections"]["appeals"]["data"]), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+
+from services import student_cache_codec as codec
+from services.hemis_service import HemisService
+
+
+def subject(i, grades):
+    return {
+        "curriculumSubject": {
+            "subject": {"id": 100 + i, "name": f"Fan {i}"},
+            "credit": 4, "total_acload": 120,
+            "training_hours": [{"trainingType": {"name": "Ma'ruza"}, "hour": 30},
+                               {"trainingType": {"name": "Amaliy"}, "hour": 0}],
+        },
+        "overallScore": {"grade": 80 + i},
+        "gradesByExam": [
+            {"examType": {"code": code, "name": name}, "grade": val, "max_ball": max_b}
+            for code, name, val, max_b in grades
+        ],
+    }
+
+
+class TestStudentCacheCodec(unittest.TestCase):
+    """Compact rows must give callers exactly what the raw HEMIS JSON gave them."""
+
+    SUBJECTS = [
+        subject(1, [("11", "Joriy", 27, 30), ("12", "Oraliq", 18, 20), ("13", "Yakuniy", 40, 50)]),
+        subject(2, [("15", "Joriy", 4, 5), ("13", "Yakuniy", 35, 50)]),
+        subject(3, []),
+    ]
+    ATTENDANCE = [
+        {"subject": {"id": 101, "name": "Fan 1"}, "hour": 2, "explicable": True, "lesson_date": 1700000000},
+        {"subject": {"id": 101, "name": "Fan 1"}, "hour": 2, "absent_status": {"code": "12", "name": "Sababsiz"},
+         "absent_on": 2, "absent_off": 0, "lesson_date": 1700086400},
+        {"subject": {"id": 102, "name": "Fan 2"}, "hour": 4, "absent_status": {"code": "11", "name": "Kasallik"}},
+    ]
+
+    def test_grades_view_matches_parse_grades_detailed(self):
+        records, _ = codec.normalize("subjects_11", self.SUBJECTS)
+        for raw, rec in zip(self.SUBJECTS, records):
+            for skip in (False, True):
+                self.assertEqual(
+                    codec.grades_view(rec, skip_conversion=skip),
+                    HemisService.parse_grades_detailed(raw, skip_conversion=skip),
+                )
+        self.assertEqual(records[0]["training_hours"], {"Ma'ruza": 30})
+        self.assertEqual((records[0]["id"], records[0]["name"], records[0]["overall_grade"]), (101, "Fan 1", 81))
+
+    def test_attendance_summary_is_precomputed(self):
+        summary, payload, version = codec.encode("attendance_11", self.ATTENDANCE)
+        self.assertEqual(version, codec.SCHEMA_VERSION)
+        self.assertEqual((summary["total"], summary["excused"], summary["unexcused"]), (8, 6, 2))
+        self.assertEqual(codec.attendance_totals(self.ATTENDANCE), (8, 6, 2))
+
+        records = codec.decode_records(payload)
+        self.assertEqual(records["by_subject"], {"fan 1": 4, "fan 2": 4})
+        self.assertEqual([i["hours"] for i in records["items"]], [2, 2, 4])
+
+    def test_payload_round_trip_and_legacy_rows(self):
+        for key, raw in (("subjects_11", self.SUBJECTS), ("attendance_all", self.ATTENDANCE)):
+            data, payload, version = codec.encode(key, raw)
+            compact = codec.CacheEntry(key, data, payload, version)
+            legacy = codec.CacheEntry(key, raw)
+            self.assertEqual(compact.raw, raw)
+            self.assertEqual(codec.raw_of(data, payload, version), raw)
+            self.assertEqual(compact.records, legacy.records)
+            self.assertEqual(compact.get_summary(), legacy.get_summary())
+
+    def test_non_compact_keys_stay_plain_json(self):
+        data, payload, version = codec.encode("semesters_list", [{"code": "11"}])
+        self.assertEqual((data, payload, version), ([{"code": "11"}], None, None))
+        self.assertEqual(codec.CacheEntry("semesters_list", data).raw, [{"code": "11"}])
+
+    def test_schedule_slots(self):
+        lesson = {
+            "subject": {"id": 7, "name": "Fan 7"}, "trainingType": {"code": "11", "name": "Ma'ruza"},
+            "employee": {"name": "Domla"}, "lesson_date": 1700000000,
+            "lessonPair": {"name": "1", "start_time": "08:30", "end_time": "09:50"},
+            "auditorium": {"name": "204", "building": {"name": "A"}},
+        }
+        records, summary = codec.normalize("schedule_11", [lesson])
+        slot = records["slots"][0]
+        self.assertEqual(slot["start_time"], "08:30")
+        self.assertEqual((slot["auditorium"], slot["building"]), ("204", "A"))
+        self.assertEqual((summary["first"], summary["last"]), (1700000000, 1700000000))
+        # 1700000000 = 2023-11-15 03:13 Toshkent
+        self.assertEqual(records["weeks"], {"2023-W46": [0]})
+
+
+if __name__ == "__main__":
+    unittest.main()
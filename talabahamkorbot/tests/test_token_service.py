@@ -0,0 +1,55 @@
+import asyncio
+import time
+import unittest
+from services.token_service import TokenService
+
+
+class TestActionTokens(unittest.TestCase):
+
+    def setUp(self):
+        TokenService._local_nonces.clear()
+
+    def test_valid_token(self):
+        token = TokenService.generate_batch(7, "student", 1)[0]
+        nonce, exp, reason = TokenService.verify_token(token, 7, "student", "POST:/api/v1/community/posts/1/like")
+        self.assertTrue(nonce)
+        self.assertEqual(reason, "")
+        self.assertGreater(exp, time.time())
+
+    def test_rejects_other_user_and_type(self):
+        token = TokenService.generate_batch(7, "student", 1)[0]
+        self.assertEqual(TokenService.verify_token(token, 8, "student")[2], "owner")
+        self.assertEqual(TokenService.verify_token(token, 7, "staff")[2], "owner")
+
+    def test_rejects_tampered_and_expired(self):
+        token = TokenService.generate_batch(7, "student", 1)[0]
+        version, body, sig = token.split(".")
+        forged = TokenService.generate_batch(8, "student", 1)[0].split(".")[1]
+        self.assertEqual(TokenService.verify_token(f"{version}.{forged}.{sig}", 8)[2], "signature")
+        expired = TokenService.generate_batch(7, "student", 1, ttl_hours=-1)[0]
+        self.assertEqual(TokenService.verify_token(expired, 7)[2], "expired")
+        self.assertEqual(TokenService.verify_token("garbage", 7)[2], "malformed")
+
+    def test_scope(self):
+        token = TokenService.generate_batch(7, "student", 1, scope="DELETE:/api/v1/community/")[0]
+        self.assertEqual(TokenService.verify_token(token, 7, action="DELETE:/api/v1/community/posts/3")[2], "")
+        self.assertEqual(TokenService.verify_token(token, 7, action="POST:/api/v1/community/posts/3/like")[2], "scope")
+
+    def test_replay_rejected(self):
+        """Second use of the same token fails (Redis if available, local fallback otherwise)."""
+        token = TokenService.generate_batch(7, "student", 1)[0]
+
+        async def run():
+            first = await TokenService.consume_token(None, token, 7, "POST:/x")
+            second = await TokenService.consume_token(None, token, 7, "POST:/x")
+            TokenService._redis = None
+            return first, second
+
+        self.assertEqual(asyncio.run(run()), (True, False))
+
+    def test_legacy_token_without_db(self):
+        self.assertFalse(asyncio.run(TokenService.consume_token(None, "a" * 32, 7)))
+
+
+if __name__ == '__main__':
+    unittest.main()
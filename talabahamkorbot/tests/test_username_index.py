@@ -0,0 +1,185 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+from services.username_index import USERNAME_RE, BloomFilter, LocalBitmap, RedisBitmap, UsernameIndex
+
+
+class _FakeRedis:
+    """Strings as bytearrays (SETBIT/GETBIT bit order) + sets; enough for RedisBitmap."""
+
+    def __init__(self):
+        self.data = {}
+
+    async def set(self, key, value):
+        self.data[key] = bytearray(value)
+
+    async def rename(self, src, dst):
+        self.data[dst] = self.data.pop(src)
+
+    async def delete(self, key):
+        self.data.pop(key, None)
+
+    async def smembers(self, key):
+        return {v.encode() for v in self.data.get(key, set())}
+
+    def pipeline(self, transaction=False):
+        redis, ops = self, []
+
+        class _Pipe:
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *args):
+                return False
+
+            def __getattr__(self, name):
+                return lambda *args: ops.append((name, args))
+
+            async def execute(self):
+                return [redis._apply(name, *args) for name, args in ops]
+
+        return _Pipe()
+
+    def _apply(self, name, key, *args):
+        if name == "sadd":
+            self.data.setdefault(key, set()).add(args[0])
+            return 1
+        if name == "expire":
+            return 1
+        buf = self.data.setdefault(key, bytearray())
+        off = args[0]
+        if len(buf) <= off >> 3:
+            buf.extend(bytes((off >> 3) + 1 - len(buf)))
+        old = 1 if buf[off >> 3] & (0x80 >> (off & 7)) else 0
+        if name == "setbit":
+            buf[off >> 3] |= 0x80 >> (off & 7)
+        return old
+
+
+class TestUsernameIndex(unittest.TestCase):
+    """Bloom-backed availability must agree with taken_usernames."""
+
+    def setUp(self):
+        try:
+            import aiosqlite  # noqa: F401
+        except ImportError:
+            self.skipTest("aiosqlite not installed")
+        UsernameIndex._lru.clear()
+        UsernameIndex._stats = {k: 0 for k in UsernameIndex._stats}
+
+    def tearDown(self):
+        UsernameIndex._backend = None
+
+    async def _db(self, names):
+        from sqlalchemy import insert
+        from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+        from database.models import TakenUsername
+
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with engine.begin() as conn:
+            await conn.run_sync(lambda c: TakenUsername.__table__.create(c))
+        Session = async_sessionmaker(engine, expire_on_commit=False)
+        async with Session() as db:
+            await db.execute(insert(TakenUsername), [
+                {"username": n, "student_id": i} for i, n in enumerate(names, start=1)
+            ])
+            await db.commit()
+        return engine, Session
+
+    def test_bloom_has_no_false_negatives(self):
+        bloom = BloomFilter(1 << 16, 5)
+        names = [f"user_{i}" for i in range(2000)]
+        for n in names:
+            bloom.add(n)
+        self.assertTrue(all(n in bloom for n in names))
+        false_pos = sum(f"other_{i}" in bloom for i in range(2000))
+        self.assertLess(false_pos, 40)
+
+    def test_matches_database(self):
+        async def run():
+            from sqlalchemy import select
+            from database.models import TakenUsername
+
+            taken = [f"talaba_{i}" for i in range(3000)]
+            engine, Session = await self._db(taken)
+            async with Session() as db:
+                count = await UsernameIndex.rebuild(db, backend=LocalBitmap(BloomFilter(UsernameIndex.BITS, UsernameIndex.HASHES)))
+                self.assertEqual(count, 3000)
+
+                for i, name in enumerate(taken[:500], start=1):
+                    self.assertEqual(await UsernameIndex.get_owner(db, name), (i, None))
+                for i in range(3000):
+                    self.assertIsNone(await UsernameIndex.get_owner(db, f"erkin_{i}"))
+                # Free names almost never reach the DB
+                self.assertLess(UsernameIndex._stats["false_positives"], 30)
+
+                # Claim: visible immediately (Bloom + LRU); release clears the LRU entry
+                db.add(TakenUsername(username="yangi_nom", student_id=9999))
+                await db.commit()
+                await UsernameIndex.claim("yangi_nom", 9999)
+                self.assertEqual(await UsernameIndex.get_owner(db, "@Yangi_Nom"), (9999, None))
+                await db.execute(TakenUsername.__table__.delete().where(TakenUsername.username == "yangi_nom"))
+                await db.commit()
+                UsernameIndex.release(["yangi_nom"])
+                self.assertIsNone(await UsernameIndex.get_owner(db, "yangi_nom"))
+
+                suggestions = await UsernameIndex.suggest(db, "talaba_1", seed=1)
+                self.assertEqual(len(suggestions), 5)
+                db_taken = set((await db.execute(
+                    select(TakenUsername.username).where(TakenUsername.username.in_(suggestions))
+                )).scalars().all())
+                self.assertEqual(db_taken, set())
+                self.assertTrue(all(USERNAME_RE.match(s) for s in suggestions))
+            await engine.dispose()
+
+        asyncio.run(run())
+
+    def test_claims_during_rebuild_are_kept(self):
+        """A claim between the DB snapshot and the bitmap swap must survive the rebuild."""
+        async def run():
+            from database.models import TakenUsername
+
+            engine, Session = await self._db(["eski_nom"])
+            real_build = UsernameIndex.build_filter
+            backends = [RedisBitmap(_FakeRedis(), UsernameIndex.REDIS_KEY),
+                        LocalBitmap(BloomFilter(UsernameIndex.BITS, UsernameIndex.HASHES))]
+            results = []
+            for n, backend in enumerate(backends):
+                name = f"yangi_nom_{n}"
+
+                async def build_then_claim(db):
+                    snapshot = await real_build(db)
+                    async with Session() as other:
+                        other.add(TakenUsername(username=name, student_id=100 + n))
+                        await other.commit()
+                    await UsernameIndex.claim(name, 100 + n)
+                    return snapshot
+
+                async with Session() as db:
+                    await UsernameIndex.rebuild(db, backend=backend)
+                    with patch.object(UsernameIndex, "build_filter", build_then_claim):
+                        await UsernameIndex.rebuild(db, backend=backend)
+                    UsernameIndex._lru.clear()
+                    results.append(await UsernameIndex._maybe_taken([name, "eski_nom"]))
+                    self.assertEqual(await UsernameIndex.get_owner(db, name), (100 + n, None))
+            await engine.dispose()
+            return results
+
+        self.assertEqual(asyncio.run(run()), [[True, True], [True, True]])
+
+    def test_without_backend_falls_back_to_db(self):
+        async def run():
+            engine, Session = await self._db(["mavjud_nom"])
+            UsernameIndex._backend = None
+            async with Session() as db:
+                self.assertEqual(await UsernameIndex.get_owner(db, "mavjud_nom"), (1, None))
+                self.assertIsNone(await UsernameIndex.get_owner(db, "boshqa_nom"))
+                self.assertEqual(UsernameIndex._stats["db_lookups"], 2)
+            await engine.dispose()
+
+        asyncio.run(run())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,61 +1,114 @@
 
 import os
 import io
+import time
+import asyncio
+import hashlib
 import logging
-from pypdf import PdfReader
-from docx import Document
-from pptx import Presentation
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional, Set
 
 logger = logging.getLogger(__name__)
 
+SUPPORTED_FORMATS = ("pdf", "docx", "pptx", "txt")
+
+# Limits (bitta hujjat uchun)
+MAX_BYTES = 20 * 1024 * 1024     # 20 MB
+MAX_PAGES = 150                  # PDF sahifa / PPTX slayd
+MAX_CHARS = 200_000              # AI ga baribir shundan ko'p yuborilmaydi
+EXTRACT_TIMEOUT = 30             # sekund
+POOL_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+
+MSG_UNSUPPORTED = "Kechirasiz, bu fayl formati hozircha qo'llab-quvvatlanmaydi."
+MSG_BROKEN = "Faylni o'qishda xatolik yuz berdi. Fayl shikastlangan bo'lishi mumkin."
+MSG_TOO_LARGE = "Fayl hajmi juda katta (maksimum 20 MB)."
+MSG_TIMEOUT = "Faylni o'qish juda uzoq davom etdi. Iltimos, kichikroq fayl yuboring."
+
+
+def _normalize_ext(file_ext: str) -> str:
+    return (file_ext or "").lower().replace(".", "")
+
+
+def _iter_pages(file_stream, file_ext: str):
+    """Yields text page by page (slide / paragraph for DOCX)."""
+    if file_ext == "pdf":
+        from pypdf import PdfReader
+        reader = PdfReader(file_stream)
+        for page in reader.pages:
+            yield page.extract_text() or ""
+
+    elif file_ext == "docx":
+        from docx import Document
+        doc = Document(file_stream)
+        for para in doc.paragraphs:
+            yield para.text
+
+    elif file_ext == "pptx":
+        from pptx import Presentation
+        prs = Presentation(file_stream)
+        for slide in prs.slides:
+            yield "\n".join(shape.text for shape in slide.shapes if hasattr(shape, "text"))
+
+    elif file_ext == "txt":
+        content = file_stream.read()
+        yield content.decode("utf-8", errors="replace") if isinstance(content, bytes) else str(content)
+
+
+def _extract(file_stream, file_ext: str, max_pages: int, max_chars: int) -> str:
+    parts = []
+    size = 0
+    # DOCX paragraflari sahifa emas, shuning uchun ularga faqat belgi limiti qo'llanadi
+    page_limit = max_pages if file_ext in ("pdf", "pptx") else None
+    for i, text in enumerate(_iter_pages(file_stream, file_ext)):
+        if page_limit is not None and i >= page_limit:
+            break
+        if not text:
+            continue
+        parts.append(text)
+        size += len(text) + 1
+        if size >= max_chars:
+            break
+    return "\n".join(parts)[:max_chars].strip()
+
+
+def extract_text_from_bytes(data: bytes, file_ext: str, max_pages: int = MAX_PAGES, max_chars: int = MAX_CHARS) -> tuple:
+    """
+    Worker (alohida process) ichida ishlaydi.
+    Returns (text, error_message, elapsed_ms) - error_message None bo'lsa muvaffaqiyatli.
+    """
+    started = time.perf_counter()
+    file_ext = _normalize_ext(file_ext)
+    if file_ext not in SUPPORTED_FORMATS:
+        return "", MSG_UNSUPPORTED, 0.0
+    try:
+        text = _extract(io.BytesIO(data), file_ext, max_pages, max_chars)
+        return text, None, (time.perf_counter() - started) * 1000
+    except Exception as e:
+        logger.error(f"Faylni o'qishda xatolik: {e}")
+        return "", MSG_BROKEN, (time.perf_counter() - started) * 1000
+
+
 def extract_text_from_stream(file_stream, file_ext: str) -> str:
     """
     Turli fayl formatlaridan (PDF, DOCX, PPTX, TXT) matnni ajratib oladi.
     file_stream: file-like object (BytesIO, opened file, etc.)
+    Sinxron - async handlerlarda DocumentExtractor.extract() dan foydalaning.
     """
-    full_text = ""
-    file_ext = file_ext.lower().replace(".", "")
+    file_ext = _normalize_ext(file_ext)
+    if file_ext not in SUPPORTED_FORMATS:
+        return MSG_UNSUPPORTED
 
     try:
         # Move request to beginning of stream if needed
         if hasattr(file_stream, 'seek'):
             file_stream.seek(0)
-            
-        if file_ext == "pdf":
-            reader = PdfReader(file_stream)
-            for page in reader.pages:
-                text = page.extract_text()
-                if text:
-                    full_text += text + "\n"
-        
-        elif file_ext == "docx":
-            doc = Document(file_stream)
-            for para in doc.paragraphs:
-                full_text += para.text + "\n"
-        
-        elif file_ext == "pptx":
-            prs = Presentation(file_stream)
-            for slide in prs.slides:
-                for shape in slide.shapes:
-                    if hasattr(shape, "text"):
-                        full_text += shape.text + "\n"
-        
-        elif file_ext == "txt":
-            # Try decoding utf-8
-            content = file_stream.read()
-            if isinstance(content, bytes):
-                full_text = content.decode("utf-8")
-            else:
-                full_text = str(content)
-
-        else:
-            return "Kechirasiz, bu fayl formati hozircha qo'llab-quvvatlanmaydi."
-
+        return _extract(file_stream, file_ext, MAX_PAGES, MAX_CHARS)
     except Exception as e:
         logger.error(f"Faylni o'qishda xatolik: {e}")
-        return "Faylni o'qishda xatolik yuz berdi. Fayl shikastlangan bo'lishi mumkin."
+        return MSG_BROKEN
 
-    return full_text.strip()
 
 def extract_text_from_file(file_path: str, file_ext: str) -> str:
     """
@@ -63,3 +116,184 @@ def extract_text_from_file(file_path: str, file_ext: str) -> str:
     """
     with open(file_path, "rb") as f:
         return extract_text_from_stream(f, file_ext)
+
+
+class DocumentExtractor:
+    """
+    Event loopni bloklamasdan matn ajratish:
+      - parserlar ProcessPoolExecutor da (timeout + sahifa/bayt limitlari bilan); timeout bo'lsa
+        pool almashtiriladi, eski pooldagi boshqa ishlar tugagach osilgan process to'xtatiladi
+      - natija fayl kontenti hashi (yoki Telegram file_unique_id) bo'yicha keshlanadi
+      - har bir format uchun ajratish vaqti statistikasi
+    """
+
+    CACHE_SIZE = 64
+    CACHE_MAX_CHARS = 8 * 1024 * 1024  # keshdagi jami matn hajmi
+
+    _pool: Optional[ProcessPoolExecutor] = None
+    _inflight: Dict[ProcessPoolExecutor, Set[Future]] = {}
+    _retiring: Dict[ProcessPoolExecutor, asyncio.Task] = {}
+    _cache: "OrderedDict[str, str]" = OrderedDict()
+    _cache_chars = 0
+    _stats: dict = {}
+
+    @classmethod
+    def _get_pool(cls) -> ProcessPoolExecutor:
+        if cls._pool is None:
+            cls._pool = ProcessPoolExecutor(max_workers=POOL_WORKERS)
+        return cls._pool
+
+    @classmethod
+    def _submit(cls, pool: ProcessPoolExecutor, *args) -> Future:
+        future = pool.submit(extract_text_from_bytes, *args)
+        jobs = cls._inflight.setdefault(pool, set())
+        jobs.add(future)
+        future.add_done_callback(jobs.discard)
+        return future
+
+    @staticmethod
+    def _terminate(pool: ProcessPoolExecutor):
+        for proc in list((getattr(pool, "_processes", None) or {}).values()):
+            try:
+                proc.terminate()
+            except Exception:
+                pass
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    @classmethod
+    def _retire_pool(cls, pool: ProcessPoolExecutor, hung: Future):
+        """
+        Timeout: yangi ishlar yangi poolga ketadi; eski pooldagi boshqa foydalanuvchilarning
+        ishlari tugashini (ko'pi bilan EXTRACT_TIMEOUT) kutib, keyin osilib qolgan process to'xtatiladi.
+        """
+        if cls._pool is pool:
+            cls._pool = None
+        if pool in cls._retiring:
+            return
+        others = [f for f in cls._inflight.get(pool, ()) if f is not hung and not f.done()]
+
+        async def close():
+            try:
+                if others:
+                    await asyncio.wait([asyncio.wrap_future(f) for f in others], timeout=EXTRACT_TIMEOUT)
+            finally:
+                cls._terminate(pool)
+                cls._inflight.pop(pool, None)
+                cls._retiring.pop(pool, None)
+
+        cls._retiring[pool] = asyncio.get_running_loop().create_task(close())
+
+    @classmethod
+    def _drop_broken_pool(cls, pool: ProcessPoolExecutor):
+        """BrokenProcessPool: pooldagi barcha ishlar allaqachon xato bilan tugagan."""
+        if cls._pool is pool:
+            cls._pool = None
+        cls._inflight.pop(pool, None)
+        cls._terminate(pool)
+
+    @classmethod
+    def shutdown(cls):
+        if cls._pool is not None:
+            cls._pool.shutdown(wait=True, cancel_futures=True)
+            cls._pool = None
+
+    @staticmethod
+    def content_key(data: bytes, file_ext: str, file_unique_id: str = None) -> str:
+        if file_unique_id:
+            return f"tg:{file_unique_id}"
+        return f"{_normalize_ext(file_ext)}:{hashlib.sha256(data).hexdigest()}"
+
+    @classmethod
+    def _cache_get(cls, key: str) -> Optional[str]:
+        text = cls._cache.get(key)
+        if text is not None:
+            cls._cache.move_to_end(key)
+        return text
+
+    @classmethod
+    def _cache_set(cls, key: str, text: str):
+        if key in cls._cache:
+            cls._cache_chars -= len(cls._cache.pop(key))
+        cls._cache[key] = text
+        cls._cache_chars += len(text)
+        while cls._cache and (len(cls._cache) > cls.CACHE_SIZE or cls._cache_chars > cls.CACHE_MAX_CHARS):
+            _, old = cls._cache.popitem(last=False)
+            cls._cache_chars -= len(old)
+
+    @classmethod
+    def _record(cls, file_ext: str, field: str, elapsed_ms: float = None):
+        s = cls._stats.setdefault(file_ext, {
+            "count": 0, "cache_hits": 0, "errors": 0, "timeouts": 0, "rejected": 0,
+            "total_ms": 0.0, "max_ms": 0.0,
+        })
+        s[field] += 1
+        if elapsed_ms is not None:
+            s["total_ms"] += elapsed_ms
+            s["max_ms"] = max(s["max_ms"], elapsed_ms)
+
+    @classmethod
+    def stats(cls) -> dict:
+        result = {}
+        for ext, s in cls._stats.items():
+            item = dict(s)
+            item["avg_ms"] = round(s["total_ms"] / s["count"], 1) if s["count"] else 0.0
+            item["total_ms"] = round(s["total_ms"], 1)
+            item["max_ms"] = round(s["max_ms"], 1)
+            result[ext] = item
+        return result
+
+    @classmethod
+    async def extract(
+        cls,
+        data: bytes,
+        file_ext: str,
+        file_unique_id: str = None,
+        timeout: float = EXTRACT_TIMEOUT,
+        max_pages: int = MAX_PAGES,
+        max_chars: int = MAX_CHARS,
+    ) -> str:
+        """
+        Returns extracted text, or a user-facing error message (like extract_text_from_stream).
+        """
+        file_ext = _normalize_ext(file_ext)
+        if file_ext not in SUPPORTED_FORMATS:
+            return MSG_UNSUPPORTED
+        if len(data) > MAX_BYTES:
+            cls._record(file_ext, "rejected")
+            return MSG_TOO_LARGE
+
+        key = f"{cls.content_key(data, file_ext, file_unique_id)}:{max_pages}:{max_chars}"
+        cached = cls._cache_get(key)
+        if cached is not None:
+            cls._record(file_ext, "cache_hits")
+            return cached
+
+        started = time.perf_counter()
+        pool = cls._get_pool()
+        future = None
+        try:
+            future = cls._submit(pool, data, file_ext, max_pages, max_chars)
+            text, error, _ = await asyncio.wait_for(asyncio.wrap_future(future), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Document extraction timed out ({file_ext}, {len(data)} bytes)")
+            cls._record(file_ext, "timeouts")
+            cls._retire_pool(pool, future)
+            return MSG_TIMEOUT
+        except BrokenProcessPool as e:
+            logger.error(f"Document extraction pool error: {e}")
+            cls._record(file_ext, "errors")
+            cls._drop_broken_pool(pool)
+            return MSG_BROKEN
+        except Exception as e:
+            logger.error(f"Document extraction error: {e}")
+            cls._record(file_ext, "errors")
+            return MSG_BROKEN
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if error:
+            cls._record(file_ext, "errors", elapsed_ms)
+            return error
+
+        cls._record(file_ext, "count", elapsed_ms)
+        cls._cache_set(key, text)
+        return text
@@ -0,0 +1,96 @@
+"""
+Fast JSON response path.
+
+- FastJSONResponse: orjson-backed default response class (stdlib json fallback)
+- fast_json(): returns an already-shaped payload as a Response, so FastAPI skips
+  response_model validation and jsonable_encoder - only for trusted, hand-mapped dicts
+- schema_columns(): lean column projection for a pydantic schema (no ORM object load)
+"""
+
+import dataclasses
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import ColumnProperty
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+
+def _default(obj: Any):
+    """Types orjson (or json) does not handle natively."""
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(mode="json")
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, UUID):
+        return str(obj)
+    if isinstance(obj, bytes):
+        return obj.decode("utf-8", errors="replace")
+    if dataclasses.is_dataclass(obj):
+        return dataclasses.asdict(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(content: Any) -> bytes:
+        return orjson.dumps(content, default=_default, option=_ORJSON_OPTIONS)
+else:
+    def dumps(content: Any) -> bytes:
+        return json.dumps(
+            content, default=_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+        ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """Default response class for the app (FastAPI(default_response_class=...))."""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def fast_json(content: Any, status_code: int = 200, headers: Optional[dict] = None) -> FastJSONResponse:
+    """
+    Trusted path: the handler already produced plain dicts/lists, so skip
+    response_model re-validation and jsonable_encoder. The response_model on the
+    route still documents the shape in OpenAPI.
+    """
+    return FastJSONResponse(content=content, status_code=status_code, headers=headers)
+
+
+def schema_columns(model, schema) -> Tuple[List, Dict[str, Any]]:
+    """
+    Columns of `model` named like the fields of pydantic `schema`, plus defaults for
+    schema fields the model does not have. Use with select(*columns) + row_to_dict().
+    """
+    columns, defaults = [], {}
+    for name, field in schema.model_fields.items():
+        attr = getattr(model, name, None)
+        if isinstance(getattr(attr, "property", None), ColumnProperty):
+            columns.append(attr)
+        else:
+            defaults[name] = None if field.is_required() else field.get_default(call_default_factory=True)
+    return columns, defaults
+
+
+def row_to_dict(row, defaults: Optional[Dict[str, Any]] = None) -> dict:
+    data = dict(defaults) if defaults else {}
+    data.update(row._mapping)
+    return data